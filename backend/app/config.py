@@ -3,7 +3,7 @@ Configuration settings for AIP Core API
 """
 
 from pydantic_settings import BaseSettings
-from typing import List
+from typing import List, Optional
 
 
 class Settings(BaseSettings):
@@ -34,6 +34,10 @@ class Settings(BaseSettings):
     DEFAULT_ARRHENIUS_ACTIVATION_EV: float = 1.1
     DEFAULT_TEMP_REFERENCE_C: float = 110.0
     
+    # Network topology snapshot shared by all worker processes
+    # (e.g. /dev/shm/aip-topology); unset keeps a private copy per process
+    TOPOLOGY_SNAPSHOT_DIR: Optional[str] = None
+    
     class Config:
         env_file = ".env"
 
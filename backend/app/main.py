@@ -8,7 +8,7 @@ from contextlib import asynccontextmanager
 
 from app.config import settings
 from app.database import engine, Base
-from app.routers import assets, network, risk, condition, investment
+from app.routers import assets, network, risk, condition, investment, map
 
 
 @asynccontextmanager
@@ -62,6 +62,7 @@ app.include_router(network.router, prefix="/api/v1/network", tags=["Network"])
 app.include_router(risk.router, prefix="/api/v1/risk", tags=["Risk"])
 app.include_router(condition.router, prefix="/api/v1/condition", tags=["Condition"])
 app.include_router(investment.router, prefix="/api/v1/investment", tags=["Investment"])
+app.include_router(map.router, prefix="/api/v1/map", tags=["Map"])
 
 
 @app.get("/")
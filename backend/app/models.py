@@ -196,6 +196,18 @@ class SwitchingPath(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
+class NetworkScenario(Base):
+    """Planning what-if changes over the as-built network."""
+    __tablename__ = "network_scenarios"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    name = Column(String(200), nullable=False)
+    description = Column(Text)
+    base_version = Column(String(200))
+    changes = Column(JSONB, nullable=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class ConditionAssessment(Base):
     """Asset condition evaluation records."""
     __tablename__ = "condition_assessments"
@@ -273,6 +285,25 @@ class MonitoringData(Base):
     asset = relationship("Asset", back_populates="monitoring_data")
 
 
+class ThermalStress(Base):
+    """Monitored loading against edge ratings, used as a risk stress input."""
+    __tablename__ = "thermal_stress"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    asset_id = Column(UUID(as_uuid=True), ForeignKey("assets.id"), nullable=False)
+    period_start = Column(DateTime(timezone=True), nullable=False)
+    period_end = Column(DateTime(timezone=True), nullable=False)
+    rating_mva = Column(DECIMAL(8, 3))
+    peak_loading_pct = Column(DECIMAL(8, 2))
+    p95_loading_pct = Column(DECIMAL(8, 2))
+    hours_above_rating = Column(DECIMAL(10, 2))
+    hours_above_emergency = Column(DECIMAL(10, 2))
+    overload_days = Column(Integer, default=0)
+    aging_acceleration = Column(DECIMAL(12, 4))
+    chronic_overload = Column(Boolean, default=False)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class CustomerConnection(Base):
     """Customer impact mapping."""
     __tablename__ = "customer_connections"
@@ -394,6 +425,17 @@ class InvestmentProject(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now())
 
 
+class ProjectIntervention(Base):
+    """Interventions delivered by an investment project."""
+    __tablename__ = "project_interventions"
+    
+    id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
+    project_id = Column(UUID(as_uuid=True), ForeignKey("investment_projects.id"), nullable=False)
+    intervention_id = Column(UUID(as_uuid=True), ForeignKey("intervention_options.id"), nullable=False)
+    allocated_budget = Column(DECIMAL(12, 2))
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class PortfolioScenario(Base):
     """Investment portfolio optimization scenarios."""
     __tablename__ = "portfolio_scenarios"
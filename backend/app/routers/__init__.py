@@ -1,4 +1,4 @@
 # Router package initialization
-from app.routers import assets, network, risk, condition, investment
+from app.routers import assets, network, risk, condition, investment, map
 
-__all__ = ["assets", "network", "risk", "condition", "investment"]
+__all__ = ["assets", "network", "risk", "condition", "investment", "map"]
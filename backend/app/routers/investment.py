@@ -5,12 +5,16 @@ Investment and Portfolio API Router
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import func
+from sqlalchemy.exc import IntegrityError
 from typing import List, Optional
 from uuid import UUID
 
 from app.database import get_db
 from app import models, schemas
 from app.services.portfolio_optimizer import PortfolioOptimizer
+from app.services.capital_planner import CapitalPlanner
+from app.services.replacement_timing import ReplacementTimingAnalyzer
+from app.services.portfolio_state import portfolio_states
 
 router = APIRouter()
 
@@ -64,6 +68,29 @@ def create_intervention_option(
     return db_intervention
 
 
+@router.post("/interventions/generate")
+def generate_intervention_options(
+    request: schemas.InterventionGenerationRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Generate intervention options for the fleet, or for the given assets
+    or asset categories.
+    
+    Replace, refurbish (transformers), monitor and maintain options are
+    built from each asset's latest BASE_CASE risk and stored with their
+    benefit/cost ratio and priority score. Existing PROPOSED options of
+    those assets are replaced unless ``replace_proposed`` is false;
+    options linked to investment projects are kept.
+    """
+    optimizer = PortfolioOptimizer(db)
+    try:
+        return optimizer.generate_fleet_intervention_options(request)
+    except (ValueError, IntegrityError) as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+
+
 @router.put("/interventions/{intervention_id}", response_model=schemas.InterventionOptionResponse)
 def update_intervention_option(
     intervention_id: UUID,
@@ -150,6 +177,7 @@ def create_investment_project(
     db.add(db_project)
     db.commit()
     db.refresh(db_project)
+    portfolio_states.project_changed(db_project)
     return db_project
 
 
@@ -172,6 +200,7 @@ def update_investment_project(
     
     db.commit()
     db.refresh(project)
+    portfolio_states.project_changed(project)
     return project
 
 
@@ -252,10 +281,134 @@ def optimize_portfolio(
     
     Optimization methods:
     - KNAPSACK_GREEDY: Fast greedy algorithm by benefit/cost ratio
-    - MILP: Mixed Integer Linear Programming for optimal solution
+    - MILP: Exact selection with optimality bound and gap, honouring
+      mandatory projects and linear constraints within time_limit_seconds
+    - MULTIPLE_CHOICE: At most one intervention option per asset, valued by
+      the asset's monetized risk reduction; mandatory/excluded ids are
+      intervention option ids
+    - LAGRANGIAN: Intervention options as in MULTIPLE_CHOICE under several
+      resource limits at once (crew months, outages per substation,
+      territory budgets, category minimums in constraints), with the dual
+      bound and shadow prices of binding limits
+    - STOCHASTIC: Intervention options with uncertain costs and benefits;
+      maximizes expected risk reduction (or its CVaR) while the budget
+      overrun probability stays within risk_tolerance percent
+    """
+    optimizer = PortfolioOptimizer(db)
+    try:
+        return optimizer.optimize(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/optimize/frontier")
+def optimize_portfolio_frontier(
+    request: schemas.PortfolioFrontierRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Sweep the optimal portfolio across a range of budgets.
+    
+    Returns the risk reduction vs spend curve with the marginal return of
+    each budget step. No scenarios are saved; run `/optimize` at the chosen
+    budget to record one.
+    """
+    optimizer = PortfolioOptimizer(db)
+    try:
+        return optimizer.frontier(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/optimize/batch")
+def optimize_portfolio_batch(
+    request: schemas.PortfolioBatchRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Optimize several scenario variants in one call.
+    
+    Candidates are loaded once and the variants (budgets, exclusions,
+    mandatory projects, constraint sets) are solved concurrently. All
+    scenarios are saved together and returned with a comparison matrix of
+    investment, risk reduction, ROI and selection overlap. Supports the
+    KNAPSACK_GREEDY and MILP methods.
+    """
+    optimizer = PortfolioOptimizer(db)
+    try:
+        return optimizer.optimize_batch(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/optimize/multi-year")
+def optimize_capital_plan(
+    request: schemas.CapitalPlanRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Optimize a multi-year capital plan.
+    
+    Each candidate project is scheduled into at most one start year under
+    the annual budgets; deferring a project costs the risk its assets carry
+    meanwhile, growing along their POF trajectories. Returns the schedule
+    per year, the risk curve with and without the plan and the optimality
+    gap.
+    """
+    planner = CapitalPlanner(db)
+    try:
+        return planner.plan(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/replacement-timing")
+def analyze_replacement_timing(
+    request: schemas.ReplacementTimingRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Economic replacement year of each asset.
+    
+    Every candidate year over the horizon is priced as the discounted risk
+    of keeping the asset until then plus the equivalent annual cost of its
+    replacement afterwards. Returns the replacements due per year and the
+    assets with the highest cost of delaying past their optimum, with
+    their EAC curves.
+    """
+    analyzer = ReplacementTimingAnalyzer(db)
+    try:
+        return analyzer.analyze(request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/scenarios/{scenario_id}/reoptimize", response_model=schemas.PortfolioOptimizationResult)
+def reoptimize_portfolio_scenario(
+    scenario_id: UUID,
+    request: schemas.PortfolioReoptimizeRequest,
+    db: Session = Depends(get_db)
+):
     """
+    Re-optimize a saved MILP scenario after project edits.
+    
+    Project creates and updates since the last run are applied to the
+    scenario's kept solver state and the portfolio is re-solved from its
+    previous selection, typically in milliseconds. The budget and mandatory
+    projects may be changed in the same call. The scenario is updated in
+    place.
+    """
+    scenario = db.query(models.PortfolioScenario).filter(
+        models.PortfolioScenario.id == scenario_id
+    ).first()
+    if not scenario:
+        raise HTTPException(status_code=404, detail="Portfolio scenario not found")
+    
     optimizer = PortfolioOptimizer(db)
-    return optimizer.optimize(request)
+    try:
+        return optimizer.reoptimize(scenario, request)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/scenarios/{scenario_id}/details")
@@ -271,6 +424,20 @@ def get_scenario_details(
     if not scenario:
         raise HTTPException(status_code=404, detail="Portfolio scenario not found")
     
+    if scenario.optimization_method in ("MULTIPLE_CHOICE", "LAGRANGIAN", "STOCHASTIC"):
+        interventions = db.query(models.InterventionOption).filter(
+            models.InterventionOption.id.in_(scenario.selected_projects or [])
+        ).all()
+        return {
+            "scenario": scenario,
+            "selected_interventions": interventions,
+            "intervention_count": len(interventions),
+            "budget_utilization": (
+                sum(i.cost_estimate or 0 for i in interventions) / scenario.budget_constraint * 100
+                if scenario.budget_constraint else 0
+            )
+        }
+    
     # Get project details
     projects = []
     if scenario.selected_projects:
@@ -0,0 +1,93 @@
+"""
+Map Query API Router
+"""
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from typing import List, Optional
+
+from app.database import get_db
+from app.services.spatial_index import SpatialQueryService, MAX_CLUSTER_ZOOM
+
+router = APIRouter()
+
+
+@router.get("/bbox")
+def get_features_in_bbox(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    kinds: Optional[List[str]] = Query(None),
+    limit: int = Query(5000, ge=1, le=50000),
+    db: Session = Depends(get_db)
+):
+    """
+    Network nodes and assets inside a bounding box.
+    
+    Kinds: node, asset (default both). ``truncated`` is set when more
+    features matched than ``limit``. A box across the antimeridian has
+    ``min_lon`` greater than ``max_lon``; ``min_lat`` above ``max_lat`` is
+    rejected.
+    """
+    service = SpatialQueryService(db)
+    try:
+        return service.query_bbox(min_lat, min_lon, max_lat, max_lon, kinds, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/radius")
+def get_features_in_radius(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    radius_km: float = Query(..., gt=0, le=500),
+    kinds: Optional[List[str]] = Query(None),
+    limit: int = Query(5000, ge=1, le=50000),
+    db: Session = Depends(get_db)
+):
+    """Features within a radius of a point, nearest first."""
+    service = SpatialQueryService(db)
+    try:
+        return service.query_radius(latitude, longitude, radius_km, kinds, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/nearest")
+def get_nearest_features(
+    latitude: float = Query(..., ge=-90, le=90),
+    longitude: float = Query(..., ge=-180, le=180),
+    k: int = Query(10, ge=1, le=1000),
+    kinds: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """The k features nearest to a point."""
+    service = SpatialQueryService(db)
+    try:
+        return service.query_nearest(latitude, longitude, k, kinds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/clusters")
+def get_feature_clusters(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(..., ge=0, le=MAX_CLUSTER_ZOOM),
+    kinds: Optional[List[str]] = Query(None),
+    db: Session = Depends(get_db)
+):
+    """
+    Server-side clusters for a map view.
+    
+    Features are grouped into cells of 1/8 tile at the given zoom level;
+    cells holding a single feature are returned under ``points``.
+    """
+    service = SpatialQueryService(db)
+    try:
+        return service.query_clusters(min_lat, min_lon, max_lat, max_lon, zoom, kinds)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
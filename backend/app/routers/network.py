@@ -2,15 +2,26 @@
 Network Analysis API Router
 """
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
 from sqlalchemy.orm import Session
-from sqlalchemy import text
+from sqlalchemy import text, or_
 from typing import List, Optional
 from uuid import UUID
+from datetime import date
+import xml.etree.ElementTree as ET
 
 from app.database import get_db
 from app import models, schemas
 from app.services.network_analyzer import NetworkAnalyzer
+from app.services.contingency_analyzer import ContingencyAnalyzer
+from app.services.load_flow import LoadFlowSolver
+from app.services.network_topology import topology_store
+from app.services.restoration_paths import RestorationPathFinder
+from app.services.storm_simulation import StormSimulator
+from app.services.network_graph import NetworkGraphSimplifier, MAX_ZOOM
+from app.services.cim_import import CimImporter
+from app.services.network_scenarios import NetworkScenarioService
+from app.services.thermal_overload import ThermalOverloadScanner
 
 router = APIRouter()
 
@@ -43,9 +54,34 @@ def create_network_node(
     db.add(db_node)
     db.commit()
     db.refresh(db_node)
+    topology_store.node_added(db, db_node)
     return db_node
 
 
+@router.delete("/nodes/{node_id}", status_code=204)
+def delete_network_node(
+    node_id: UUID,
+    db: Session = Depends(get_db)
+):
+    """Delete a network node. Its edges and switching paths must be removed first."""
+    node = db.query(models.NetworkNode).filter(models.NetworkNode.id == node_id).first()
+    if not node:
+        raise HTTPException(status_code=404, detail="Network node not found")
+    
+    connected_edge = db.query(models.NetworkEdge).filter(
+        or_(models.NetworkEdge.from_node_id == node_id, models.NetworkEdge.to_node_id == node_id)
+    ).first()
+    connected_path = db.query(models.SwitchingPath).filter(
+        or_(models.SwitchingPath.source_node_id == node_id, models.SwitchingPath.target_node_id == node_id)
+    ).first()
+    if connected_edge or connected_path:
+        raise HTTPException(status_code=409, detail="Network node still has connected edges or switching paths")
+    
+    db.delete(node)
+    db.commit()
+    topology_store.node_removed(db, node_id)
+
+
 @router.get("/edges", response_model=List[schemas.NetworkEdgeResponse])
 def get_network_edges(
     edge_type: Optional[str] = None,
@@ -71,9 +107,26 @@ def create_network_edge(
     db.add(db_edge)
     db.commit()
     db.refresh(db_edge)
+    topology_store.edge_added(db, db_edge)
     return db_edge
 
 
+@router.delete("/edges/{edge_id}", status_code=204)
+def delete_network_edge(
+    edge_id: UUID,
+    db: Session = Depends(get_db)
+):
+    """Delete a network edge."""
+    edge = db.query(models.NetworkEdge).filter(models.NetworkEdge.id == edge_id).first()
+    if not edge:
+        raise HTTPException(status_code=404, detail="Network edge not found")
+    
+    from_node_id, to_node_id = edge.from_node_id, edge.to_node_id
+    db.delete(edge)
+    db.commit()
+    topology_store.edge_removed(db, edge_id, from_node_id, to_node_id)
+
+
 @router.get("/connectivity", response_model=List[schemas.NetworkConnectivity])
 def get_network_connectivity(
     db: Session = Depends(get_db)
@@ -108,6 +161,7 @@ def create_switching_path(
     db.add(db_path)
     db.commit()
     db.refresh(db_path)
+    topology_store.switching_path_added(db, db_path)
     return db_path
 
 
@@ -123,17 +177,133 @@ def analyze_network(
     - connectivity: Find all connected nodes
     - switching_paths: Find alternative feed paths
     - load_flow: Analyze load flow and identify at-risk customers
+      (load_flow_method SUMMATION, RADIAL_SWEEP or DC)
     """
+    if request.analysis_type == "load_flow" and request.load_flow_method not in ("SUMMATION", "RADIAL_SWEEP", "DC"):
+        raise HTTPException(status_code=400, detail=f"Unknown load flow method: {request.load_flow_method}")
+    
     analyzer = NetworkAnalyzer(db)
     
-    if request.analysis_type == "connectivity":
-        return analyzer.analyze_connectivity(request.node_id, request.max_depth)
-    elif request.analysis_type == "switching_paths":
-        return analyzer.analyze_switching_paths(request.node_id)
-    elif request.analysis_type == "load_flow":
-        return analyzer.analyze_load_flow(request.node_id)
-    else:
-        raise HTTPException(status_code=400, detail=f"Unknown analysis type: {request.analysis_type}")
+    try:
+        if request.analysis_type == "connectivity":
+            return analyzer.analyze_connectivity(request.node_id, request.max_depth)
+        elif request.analysis_type == "switching_paths":
+            return analyzer.analyze_switching_paths(request.node_id)
+        elif request.analysis_type == "load_flow":
+            return analyzer.analyze_load_flow(request.node_id, request.load_flow_method)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+    raise HTTPException(status_code=400, detail=f"Unknown analysis type: {request.analysis_type}")
+
+
+@router.post("/analyze/batch")
+def analyze_network_batch(
+    request: schemas.BatchNetworkAnalysisRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Perform network analysis for many nodes in one request.
+    
+    Loads the topology once and runs a single multi-source traversal, so a
+    whole substation can be analyzed without one /analyze call per node.
+    """
+    unknown = set(request.analysis_types) - {"connectivity", "switching_paths", "load_flow"}
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown analysis type: {', '.join(sorted(unknown))}")
+    
+    analyzer = NetworkAnalyzer(db)
+    return analyzer.analyze_batch(
+        node_ids=request.node_ids,
+        analysis_types=request.analysis_types,
+        max_depth=request.max_depth,
+        include_nodes=request.include_nodes
+    )
+
+
+@router.post("/load-flow")
+def solve_load_flow(
+    request: schemas.LoadFlowRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Solve branch flows, loading percentages and overloads for load snapshots.
+    
+    Methods:
+    - RADIAL_SWEEP: Backward/forward sweep over the radial feeder below the node
+    - DC: Sparse DC power flow over the meshed island containing the node;
+      the factorization is cached and reused across load cases and requests
+    """
+    if request.method not in ("RADIAL_SWEEP", "DC"):
+        raise HTTPException(status_code=400, detail=f"Unknown load flow method: {request.method}")
+    
+    solver = LoadFlowSolver(db)
+    try:
+        return solver.solve(
+            node_id=request.node_id,
+            method=request.method,
+            load_cases=request.load_cases,
+            power_factor=request.power_factor,
+            include_branch_flows=request.include_branch_flows
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post("/storm-simulation")
+def simulate_storms(
+    request: schemas.StormSimulationRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Monte Carlo distribution of customers out and customer-hours from storms.
+    
+    Failures are correlated by climate zone and asset category, propagated
+    through the feeder tree and partly restored by switching. Trials run in
+    vectorized chunks spread over a process pool; pass a seed for
+    reproducible results.
+    """
+    simulator = StormSimulator(db)
+    return simulator.simulate(
+        n_trials=request.n_trials,
+        scenario_type=request.scenario_type.upper(),
+        severity_multiplier=request.severity_multiplier,
+        category_multipliers={k.upper(): v for k, v in request.category_multipliers.items()},
+        climate_zones=request.climate_zones,
+        zone_correlation=request.zone_correlation,
+        category_correlation=request.category_correlation,
+        chunk_size=request.chunk_size,
+        workers=request.workers,
+        seed=request.seed
+    )
+
+
+@router.post("/thermal-overloads")
+def scan_thermal_overloads(
+    request: schemas.ThermalOverloadScanRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Compare monitored asset load with the ratings of their network edges.
+    
+    Load is averaged per time bucket and scanned in chunks for every rated
+    edge, giving loading percentiles, hours above thermal and emergency
+    ratings, the loading distribution and chronic overloads (overloaded on
+    at least chronic_days days). With record, per-asset results are stored
+    and chronic overloads add thermal aging in later risk calculations.
+    """
+    scanner = ThermalOverloadScanner(db)
+    try:
+        return scanner.scan(
+            start=request.start,
+            end=request.end,
+            bucket_minutes=request.bucket_minutes,
+            chronic_days=request.chronic_days,
+            limit=request.limit,
+            record=request.record,
+            chunk_size=request.chunk_size
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get("/asset/{asset_id}/downstream-customers")
@@ -153,3 +323,200 @@ def get_critical_paths(
     """Identify critical paths in the network based on customer impact."""
     analyzer = NetworkAnalyzer(db)
     return analyzer.identify_critical_paths()
+
+
+@router.get("/single-points-of-failure")
+def get_single_points_of_failure(
+    include_switching: bool = True,
+    limit: int = 100,
+    min_customers: int = 0,
+    db: Session = Depends(get_db)
+):
+    """
+    List bridges and articulation points whose loss interrupts customers.
+    
+    Uses a linear-time biconnectivity pass over the full topology. Active
+    switching paths count as alternate feeds when include_switching is set.
+    Results are cached until the topology changes.
+    """
+    analyzer = ContingencyAnalyzer(db)
+    return analyzer.find_single_points_of_failure(
+        include_switching=include_switching,
+        limit=limit,
+        min_customers=min_customers
+    )
+
+
+@router.post("/double-outages")
+def screen_double_outages(
+    request: schemas.DoubleOutageScreeningRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    N-2 screening: worst double outages by customers unrestorable.
+    
+    Instead of trying every element pair, only edge pairs that form a cut
+    together are evaluated, bounded by their single-outage impact, plus
+    common-mode pairs (shared right-of-way, same substation). The cut
+    structure is cached until the topology changes.
+    """
+    analyzer = ContingencyAnalyzer(db)
+    try:
+        return analyzer.screen_double_outages(
+            node_ids=request.node_ids,
+            include_switching=request.include_switching,
+            limit=request.limit,
+            min_customers=request.min_customers,
+            row_distance_m=request.row_distance_m
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/restoration-paths/{node_id}")
+def get_restoration_paths(
+    node_id: UUID,
+    k: int = Query(3, ge=1, le=10),
+    include_path: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Derived restoration paths for a node, shortest first.
+    
+    Alternate feeds are discovered through normally-open points (nodes in
+    the OPEN operational state) and checked against emergency ratings. All
+    nodes are precomputed in one pass and cached until the topology changes.
+    """
+    finder = RestorationPathFinder(db)
+    try:
+        return finder.find_restoration_paths(node_id, k=k, include_path=include_path)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/graph")
+def get_network_graph(
+    root_node_id: Optional[UUID] = None,
+    zoom: int = Query(4, ge=0, le=MAX_ZOOM),
+    max_elements: int = Query(2000, ge=10, le=20000),
+    scenario_type: str = "BASE_CASE",
+    db: Session = Depends(get_db)
+):
+    """
+    Risk-weighted level-of-detail graph for rendering.
+    
+    Series chains and low-risk laterals below the root are collapsed into
+    super-nodes carrying their aggregated risk, so the payload holds at most
+    max_elements nodes and edges. Higher zoom levels expand smaller risk
+    shares. Results are cached per topology and risk revision.
+    """
+    simplifier = NetworkGraphSimplifier(db)
+    try:
+        return simplifier.simplify(root_node_id, zoom, max_elements, scenario_type.upper())
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.post("/import/cim")
+def import_cim_model(
+    file: UploadFile = File(...),
+    install_date: Optional[date] = None,
+    db: Session = Depends(get_db)
+):
+    """
+    Bulk-load a CIM (IEC 61970/61968) RDF/XML network model.
+    
+    ConnectivityNodes, ACLineSegments, PowerTransformers and switches become
+    network nodes, edges and assets. The upload is streamed twice with
+    constant memory per object and inserted in chunks within one
+    transaction. install_date is applied to every created asset.
+    """
+    importer = CimImporter(db)
+    try:
+        return importer.import_model(file.file, install_date)
+    except ET.ParseError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid CIM XML: {e}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+# ============================================================================
+# Planning Scenario Endpoints
+# ============================================================================
+
+@router.get("/scenarios", response_model=List[schemas.NetworkScenarioResponse])
+def get_network_scenarios(
+    db: Session = Depends(get_db)
+):
+    """Get all planning scenarios, newest first."""
+    return db.query(models.NetworkScenario).order_by(
+        models.NetworkScenario.created_at.desc()
+    ).all()
+
+
+@router.post("/scenarios", response_model=schemas.NetworkScenarioResponse, status_code=201)
+def create_network_scenario(
+    scenario: schemas.NetworkScenarioCreate,
+    db: Session = Depends(get_db)
+):
+    """
+    Store a planning what-if as a delta over the current topology.
+    
+    Only the added nodes and edges and the removed ids are stored; the
+    as-built network is left untouched.
+    """
+    service = NetworkScenarioService(db)
+    try:
+        return service.create_scenario(scenario)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/scenarios/{scenario_id}", response_model=schemas.NetworkScenarioResponse)
+def get_network_scenario(
+    scenario_id: UUID,
+    db: Session = Depends(get_db)
+):
+    """Get a specific planning scenario."""
+    scenario = db.query(models.NetworkScenario).filter(
+        models.NetworkScenario.id == scenario_id
+    ).first()
+    if not scenario:
+        raise HTTPException(status_code=404, detail="Network scenario not found")
+    return scenario
+
+
+@router.delete("/scenarios/{scenario_id}", status_code=204)
+def delete_network_scenario(
+    scenario_id: UUID,
+    db: Session = Depends(get_db)
+):
+    """Delete a planning scenario."""
+    scenario = db.query(models.NetworkScenario).filter(
+        models.NetworkScenario.id == scenario_id
+    ).first()
+    if not scenario:
+        raise HTTPException(status_code=404, detail="Network scenario not found")
+    db.delete(scenario)
+    db.commit()
+
+
+@router.get("/scenarios/{scenario_id}/impact")
+def get_network_scenario_impact(
+    scenario_id: UUID,
+    limit: int = Query(100, ge=1, le=10000),
+    power_factor: float = Query(0.95, gt=0, le=1),
+    db: Session = Depends(get_db)
+):
+    """
+    Customer and loading impact of a planning scenario.
+    
+    The scenario is overlaid on a copy-on-write fork of the current topology
+    and compared with the as-built network: customers losing or gaining
+    supply, transfers between feeders and normal-state thermal overloads.
+    """
+    service = NetworkScenarioService(db)
+    try:
+        return service.analyze_scenario(scenario_id, limit, power_factor)
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
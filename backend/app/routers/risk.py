@@ -11,6 +11,8 @@ from uuid import UUID
 from app.database import get_db
 from app import models, schemas
 from app.services.risk_calculator import RiskCalculator
+from app.services.risk_rollup import RiskRollupService, LOCATION_LEVELS
+from app.services.reliability_projection import ReliabilityProjector
 
 router = APIRouter()
 
@@ -96,6 +98,82 @@ def calculate_risk_for_all_assets(
     }
 
 
+@router.get("/rollups/network/{node_id}")
+def get_network_risk_rollup(
+    node_id: UUID,
+    scenario_type: str = "BASE_CASE",
+    db: Session = Depends(get_db)
+):
+    """Risk totals for the feeder subtree below a network node."""
+    service = RiskRollupService(db)
+    try:
+        return service.get_network_rollup(node_id, scenario_type.upper())
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
+@router.get("/rollups/feeders")
+def get_feeder_risk_rollups(
+    scenario_type: str = "BASE_CASE",
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """Risk totals per feeder, highest expected annual cost first."""
+    service = RiskRollupService(db)
+    return service.get_feeder_rollups(scenario_type.upper(), limit)
+
+
+@router.get("/rollups/{level}")
+def get_location_risk_rollups(
+    level: str,
+    key: Optional[str] = None,
+    scenario_type: str = "BASE_CASE",
+    limit: int = 100,
+    db: Session = Depends(get_db)
+):
+    """
+    Risk totals by asset location.
+    
+    Levels:
+    - substation: grouped by AssetLocation.substation_id
+    - territory: grouped by AssetLocation.service_territory
+    
+    Rollups are maintained incrementally as risk results are written, so
+    each query is an index lookup.
+    """
+    if level not in LOCATION_LEVELS:
+        raise HTTPException(status_code=400, detail=f"Unknown rollup level: {level}")
+    
+    service = RiskRollupService(db)
+    return service.get_location_rollups(level, key, scenario_type.upper(), limit)
+
+
+@router.post("/reliability-projection")
+def project_reliability(
+    request: schemas.ReliabilityProjectionRequest,
+    db: Session = Depends(get_db)
+):
+    """
+    Expected SAIFI, SAIDI and CAIDI for the system, feeders and assets.
+    
+    Combines each asset's annual failure probability with failure mode
+    outage durations, the customers below it in the network and switching
+    restoration times. With a portfolio scenario or intervention options,
+    the indices are also projected with those interventions applied.
+    """
+    projector = ReliabilityProjector(db)
+    try:
+        return projector.project(
+            scenario_type=request.scenario_type.upper(),
+            portfolio_scenario_id=request.portfolio_scenario_id,
+            intervention_ids=request.intervention_ids,
+            feeder_limit=request.feeder_limit,
+            asset_limit=request.asset_limit
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+
 # ============================================================================
 # Consequence Profile Endpoints
 # ============================================================================
@@ -267,6 +267,7 @@ class NetworkAnalysisRequest(BaseModel):
     node_id: UUID
     analysis_type: str = "connectivity"  # connectivity, switching_paths, load_flow
     max_depth: int = 5
+    load_flow_method: str = "SUMMATION"  # SUMMATION, RADIAL_SWEEP, DC
 
 
 class NetworkAnalysisResponse(BaseModel):
@@ -277,6 +278,90 @@ class NetworkAnalysisResponse(BaseModel):
     switching_options: Optional[List[Dict[str, Any]]] = None
     customers_at_risk: Optional[int] = None
     load_at_risk_mw: Optional[Decimal] = None
+    branch_flows: Optional[List[Dict[str, Any]]] = None
+    overloaded_edges: Optional[List[Dict[str, Any]]] = None
+
+
+class BatchNetworkAnalysisRequest(BaseModel):
+    """Request for network analysis of many nodes in one call."""
+    node_ids: List[UUID] = Field(..., min_length=1, max_length=5000)
+    analysis_types: List[str] = ["connectivity"]  # connectivity, switching_paths, load_flow
+    max_depth: Optional[int] = 5
+    include_nodes: bool = True
+
+
+class LoadFlowRequest(BaseModel):
+    """Request for a branch load flow solve."""
+    node_id: UUID
+    method: str = "RADIAL_SWEEP"  # RADIAL_SWEEP, DC
+    load_cases: Optional[List[Dict[UUID, float]]] = None  # node_id -> load MW per snapshot
+    power_factor: float = Field(0.95, gt=0, le=1)
+    include_branch_flows: bool = True
+
+
+class DoubleOutageScreeningRequest(BaseModel):
+    """Request for N-2 contingency screening."""
+    node_ids: List[UUID] = []  # restrict to the feeders below these nodes
+    include_switching: bool = True
+    limit: int = Field(100, ge=1, le=10000)
+    min_customers: int = Field(1, ge=0)
+    row_distance_m: float = Field(50.0, ge=0)
+
+
+class StormSimulationRequest(BaseModel):
+    """Request for a correlated storm outage Monte Carlo run."""
+    n_trials: int = Field(10000, ge=1, le=1_000_000)
+    scenario_type: str = "BASE_CASE"
+    severity_multiplier: float = Field(1.0, gt=0)
+    category_multipliers: Dict[str, float] = {}  # asset category -> POF multiplier
+    climate_zones: List[str] = []  # empty exposes every zone
+    zone_correlation: float = Field(0.3, ge=0, lt=1)
+    category_correlation: float = Field(0.5, ge=0, le=1)
+    chunk_size: int = Field(1000, ge=1, le=100000)
+    workers: Optional[int] = Field(None, ge=1)
+    seed: Optional[int] = None
+
+
+class ThermalOverloadScanRequest(BaseModel):
+    """Request for a network-wide overload scan of monitored load."""
+    start: Optional[datetime] = None  # defaults to one year before end
+    end: Optional[datetime] = None  # defaults to now
+    bucket_minutes: int = Field(15, ge=1, le=1440)
+    chronic_days: int = Field(5, ge=1)
+    limit: int = Field(100, ge=1, le=10000)
+    record: bool = False  # store per-asset thermal stress for the risk model
+    chunk_size: int = Field(100000, ge=1000, le=1000000)
+
+
+class ScenarioNodeCreate(NetworkNodeCreate):
+    """Node added by a planning scenario."""
+    id: Optional[UUID] = None  # assigned when omitted; reference it from added edges
+
+
+class ScenarioEdgeCreate(NetworkEdgeCreate):
+    """Edge added by a planning scenario."""
+    id: Optional[UUID] = None
+
+
+class NetworkScenarioCreate(BaseModel):
+    """Planning what-if as a delta over the current topology."""
+    name: str = Field(..., min_length=1, max_length=200)
+    description: Optional[str] = None
+    added_nodes: List[ScenarioNodeCreate] = []
+    removed_node_ids: List[UUID] = []  # their edges are removed with them
+    added_edges: List[ScenarioEdgeCreate] = []
+    removed_edge_ids: List[UUID] = []
+
+
+class NetworkScenarioResponse(BaseModel):
+    model_config = ConfigDict(from_attributes=True)
+    
+    id: UUID
+    name: str
+    description: Optional[str] = None
+    base_version: Optional[str] = None
+    changes: Dict[str, Any]
+    created_at: datetime
 
 
 # ============================================================================
@@ -477,6 +562,15 @@ class RiskCalculationRequest(BaseModel):
     include_confidence_interval: bool = True
 
 
+class ReliabilityProjectionRequest(BaseModel):
+    """Request for SAIFI/SAIDI/CAIDI projection."""
+    scenario_type: str = "BASE_CASE"
+    portfolio_scenario_id: Optional[UUID] = None
+    intervention_ids: List[UUID] = []
+    feeder_limit: int = Field(50, ge=1)
+    asset_limit: int = Field(50, ge=1)
+
+
 class RiskCalculationResult(BaseModel):
     """Result of risk calculation."""
     asset_id: UUID
@@ -524,6 +618,13 @@ class InterventionOptionResponse(InterventionOptionBase):
     created_at: datetime
 
 
+class InterventionGenerationRequest(BaseModel):
+    """Request to generate intervention options across the fleet."""
+    asset_ids: Optional[List[UUID]] = None
+    categories: Optional[List[str]] = None
+    replace_proposed: bool = True
+
+
 class InvestmentProjectBase(BaseModel):
     project_name: str
     project_type: Optional[str] = None
@@ -591,6 +692,61 @@ class PortfolioOptimizationRequest(BaseModel):
     excluded_projects: Optional[List[UUID]] = None
     optimization_method: str = "KNAPSACK_GREEDY"
     constraints: Optional[Dict[str, Any]] = None
+    time_limit_seconds: float = Field(default=30.0, gt=0, le=600)
+
+
+class PortfolioFrontierRequest(BaseModel):
+    """Request for the optimal portfolio across a range of budgets."""
+    budget_year: int = 2025
+    budget_levels: Optional[List[Decimal]] = None
+    min_budget: Optional[Decimal] = Field(default=None, ge=0)
+    max_budget: Optional[Decimal] = Field(default=None, ge=0)
+    steps: int = Field(default=20, ge=2, le=200)
+    mandatory_projects: Optional[List[UUID]] = None
+    excluded_projects: Optional[List[UUID]] = None
+    constraints: Optional[Dict[str, Any]] = None
+    time_limit_seconds: float = Field(default=60.0, gt=0, le=600)
+
+
+class PortfolioBatchRequest(BaseModel):
+    """Request to optimize several portfolio scenarios over the same candidates."""
+    budget_year: int = 2025
+    scenarios: List[PortfolioOptimizationRequest] = Field(min_length=1, max_length=50)
+    workers: Optional[int] = Field(None, ge=1)
+
+
+class PortfolioReoptimizeRequest(BaseModel):
+    """Request to re-optimize a saved portfolio scenario after project edits."""
+    budget_year: Optional[int] = None
+    budget_constraint: Optional[Decimal] = Field(default=None, ge=0)
+    mandatory_projects: Optional[List[UUID]] = None
+    excluded_projects: Optional[List[UUID]] = None
+    time_limit_seconds: float = Field(default=30.0, gt=0, le=600)
+
+
+class CapitalPlanRequest(BaseModel):
+    """Request for a multi-year capital plan."""
+    scenario_name: str
+    start_year: Optional[int] = Field(default=None, ge=1900, le=2200)
+    time_horizon_years: int = Field(default=10, ge=1, le=50)
+    annual_budget: Optional[Decimal] = Field(default=None, ge=0)
+    annual_budgets: Optional[List[Decimal]] = None
+    mandatory_projects: Optional[List[UUID]] = None
+    excluded_projects: Optional[List[UUID]] = None
+    discount_rate: Optional[float] = Field(default=None, ge=0, le=1)
+    passes: int = Field(default=4, ge=1, le=20)
+    time_limit_seconds: float = Field(default=120.0, gt=0, le=600)
+
+
+class ReplacementTimingRequest(BaseModel):
+    """Request for minimum-EAC replacement timing."""
+    start_year: Optional[int] = Field(default=None, ge=1900, le=2200)
+    time_horizon_years: int = Field(default=30, ge=1, le=100)
+    discount_rate: Optional[float] = Field(default=None, gt=0, le=1)
+    asset_ids: Optional[List[UUID]] = None
+    categories: Optional[List[str]] = None
+    limit: int = Field(default=100, ge=1, le=10000)
+    include_curves: bool = True
 
 
 class PortfolioOptimizationResult(BaseModel):
@@ -605,3 +761,8 @@ class PortfolioOptimizationResult(BaseModel):
     budget_utilization_percent: Decimal
     optimization_method: str
     execution_time_seconds: float
+    solver_status: Optional[str] = None
+    objective_bound: Optional[Decimal] = None
+    optimality_gap_percent: Optional[float] = None
+    shadow_prices: Optional[Dict[str, float]] = None
+    risk_metrics: Optional[Dict[str, Any]] = None
@@ -2,5 +2,33 @@
 from app.services.risk_calculator import RiskCalculator
 from app.services.network_analyzer import NetworkAnalyzer
 from app.services.portfolio_optimizer import PortfolioOptimizer
+from app.services.contingency_analyzer import ContingencyAnalyzer
+from app.services.restoration_paths import RestorationPathFinder
+from app.services.risk_rollup import RiskRollupService
+from app.services.reliability_projection import ReliabilityProjector
+from app.services.storm_simulation import StormSimulator
+from app.services.spatial_index import SpatialQueryService
+from app.services.network_graph import NetworkGraphSimplifier
+from app.services.cim_import import CimImporter
+from app.services.network_scenarios import NetworkScenarioService
+from app.services.thermal_overload import ThermalOverloadScanner
+from app.services.capital_planner import CapitalPlanner
+from app.services.replacement_timing import ReplacementTimingAnalyzer
 
-__all__ = ["RiskCalculator", "NetworkAnalyzer", "PortfolioOptimizer"]
+__all__ = [
+    "RiskCalculator",
+    "NetworkAnalyzer",
+    "PortfolioOptimizer",
+    "ContingencyAnalyzer",
+    "RestorationPathFinder",
+    "RiskRollupService",
+    "ReliabilityProjector",
+    "StormSimulator",
+    "SpatialQueryService",
+    "NetworkGraphSimplifier",
+    "CimImporter",
+    "NetworkScenarioService",
+    "ThermalOverloadScanner",
+    "CapitalPlanner",
+    "ReplacementTimingAnalyzer"
+]
@@ -0,0 +1,465 @@
+"""
+Capital Planning Service
+
+Multi-year investment plans. Every candidate project may start in any year
+of the horizon, each year's spend is capped by that year's budget, and
+waiting costs the risk the project's assets carry in the meantime. That
+risk grows along each asset's Weibull POF trajectory from its latest
+BASE_CASE expected annual cost.
+
+Plans are built by rolling-horizon decomposition. Years are solved in
+order as exact single-year knapsacks (``solve_knapsack``) whose item value
+is the regret of deferral: the discounted risk a project avoids if started
+this year, less the best net value it could still earn later at the shadow
+prices of later budgets. Each pass re-estimates those prices from the LP
+multipliers of the yearly knapsacks. The best plan over the passes is kept,
+and the Lagrangian dual of the annual budget constraints bounds the optimum.
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import select, func
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import date
+from decimal import Decimal
+from uuid import UUID
+import time
+
+import numpy as np
+
+from app import models, schemas
+from app.config import settings
+from app.services.portfolio_solver import solve_knapsack
+
+
+DEFAULT_PASSES = 4
+MAX_ANNUAL_POF = 0.5
+
+
+def _lagrangian_bound(
+    values: np.ndarray,
+    costs: np.ndarray,
+    budgets: np.ndarray,
+    fixed: np.ndarray,
+    prices: np.ndarray
+) -> float:
+    """Upper bound on the plan value for budget prices ``prices`` >= 0."""
+    net = (values - prices[None, :] * costs[:, None]).max(axis=1)
+    net = np.where(fixed, net, np.maximum(net, 0.0))
+    return float(prices @ budgets + net.sum())
+
+
+def _tighten_bound(
+    values: np.ndarray,
+    costs: np.ndarray,
+    budgets: np.ndarray,
+    fixed: np.ndarray,
+    prices: np.ndarray,
+    target: float,
+    iterations: int = 200
+) -> float:
+    """Subgradient descent on the budget prices, returning the best bound seen."""
+    best = _lagrangian_bound(values, costs, budgets, fixed, prices)
+    prices = prices.copy()
+    rows = np.arange(len(values))
+    for _ in range(iterations):
+        net = values - prices[None, :] * costs[:, None]
+        pick = net.argmax(axis=1)
+        takes = fixed | (net[rows, pick] > 0)
+        spend = np.bincount(pick[takes], weights=costs[takes], minlength=len(budgets))
+        bound = float(prices @ budgets + net[rows, pick][takes].sum())
+        best = min(best, bound)
+        step = budgets - spend
+        norm = float(step @ step)
+        if norm == 0 or bound - target <= 1e-9 * abs(bound):
+            break
+        prices = np.maximum(prices - (bound - target) / norm * step, 0.0)
+    return best
+
+
+def _knapsack_price(gain: np.ndarray, costs: np.ndarray, capacity: int) -> float:
+    """LP multiplier of a single-year knapsack (value per cent at the break item)."""
+    useful = (gain > 0) & (costs > 0)
+    ratio = gain[useful] / costs[useful]
+    order = np.argsort(-ratio, kind="stable")
+    fits = np.searchsorted(np.cumsum(costs[useful][order]), capacity, side="right")
+    return float(ratio[order[fits]]) if fits < len(order) else 0.0
+
+
+def schedule_projects(
+    values: np.ndarray,
+    costs: np.ndarray,
+    budgets: np.ndarray,
+    earliest: np.ndarray,
+    fixed: np.ndarray,
+    passes: int = DEFAULT_PASSES,
+    time_limit: float = 120.0
+) -> Dict[str, Any]:
+    """
+    Assign projects to start years under annual budgets.
+    
+    ``values[p, s]`` is the value of starting project p in year s, ``costs``
+    and ``budgets`` are integer cents, ``earliest`` the first year each
+    project may start and ``fixed`` marks projects that must be scheduled,
+    in their earliest year or the first later one with budget left.
+    Returns the start year per project (-1 unscheduled), the plan value,
+    the best Lagrangian bound and the per-year budget prices.
+    """
+    started = time.perf_counter()
+    n, horizon = values.shape
+    years = np.arange(horizon)
+    allowed = years[None, :] >= earliest[:, None]
+    values = np.where(allowed, values, -np.inf)
+    
+    prices = np.zeros(horizon)
+    best_schedule = np.full(n, -1, dtype=np.int64)
+    best_value = -np.inf
+    best_bound = np.inf
+    passes_run = 0
+    
+    for _ in range(passes):
+        if passes_run and time.perf_counter() - started > time_limit:
+            break
+        passes_run += 1
+        schedule = np.full(n, -1, dtype=np.int64)
+        observed = np.zeros(horizon)
+        
+        for s in range(horizon):
+            # Net value of waiting for a later year at that year's price
+            if s + 1 < horizon:
+                later = values[:, s + 1:] - prices[None, s + 1:] * costs[:, None]
+                wait = np.maximum(later.max(axis=1), 0.0)
+            else:
+                wait = np.zeros(n)
+            gain = values[:, s] - wait
+            
+            open_ = (schedule < 0) & allowed[:, s]
+            # Mandatory projects are forced in every year from their earliest
+            # until placed, the longest waiting first; those that do not fit
+            # this year's budget move on to the next
+            forced = np.zeros(n, dtype=bool)
+            due = np.flatnonzero(open_ & fixed)
+            room = int(budgets[s])
+            for p in due[np.lexsort((-values[due, s], earliest[due]))].tolist():
+                if costs[p] <= room:
+                    forced[p] = True
+                    room -= int(costs[p])
+            cand = np.flatnonzero(open_ & ((gain > 0) | forced))
+            if not len(cand):
+                continue
+            
+            remaining = max(time_limit - (time.perf_counter() - started), 0.1)
+            result = solve_knapsack(
+                gain[cand],
+                costs[cand],
+                int(budgets[s]),
+                forced[cand],
+                remaining
+            )
+            schedule[cand[result["selected"]]] = s
+            
+            free = cand[~forced[cand]]
+            observed[s] = _knapsack_price(
+                gain[free], costs[free], int(budgets[s]) - int(costs[cand[forced[cand]]].sum())
+            )
+        
+        done = np.flatnonzero(schedule >= 0)
+        value = float(values[done, schedule[done]].sum())
+        if value > best_value:
+            best_value, best_schedule = value, schedule
+        best_bound = min(best_bound, _lagrangian_bound(values, costs, budgets, fixed, observed))
+        
+        # Damped update keeps the prices from oscillating between passes
+        prices = observed if passes_run == 1 else 0.5 * (prices + observed)
+    
+    if best_value > -np.inf:
+        best_bound = min(best_bound, _tighten_bound(values, costs, budgets, fixed, prices, best_value))
+    
+    return {
+        "schedule": best_schedule,
+        "value": best_value,
+        "bound": max(best_bound, best_value),
+        "prices": prices,
+        "passes": passes_run
+    }
+
+
+class CapitalPlanner:
+    """Service for multi-year capital plan optimization."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def plan(self, request: schemas.CapitalPlanRequest) -> Dict[str, Any]:
+        """
+        Optimize a year-by-year capital plan and persist it as a portfolio
+        scenario.
+        
+        Returns the schedule per year, the risk curve with and without the
+        plan, and the optimality bound of the plan.
+        """
+        started = time.perf_counter()
+        start_year = request.start_year or date.today().year
+        horizon = request.time_horizon_years
+        discount_rate = (
+            request.discount_rate if request.discount_rate is not None
+            else settings.DEFAULT_DISCOUNT_RATE
+        )
+        budgets = self._annual_budgets(request)
+        
+        filters = [models.InvestmentProject.status.in_(["PLANNED", "APPROVED"])]
+        if request.excluded_projects:
+            filters.append(~models.InvestmentProject.id.in_(request.excluded_projects))
+        projects = self.db.query(
+            models.InvestmentProject.id,
+            models.InvestmentProject.project_name,
+            models.InvestmentProject.total_budget,
+            models.InvestmentProject.risk_reduction_total,
+            models.InvestmentProject.budget_year
+        ).filter(*filters).all()
+        if not projects:
+            raise ValueError("No candidate projects to plan")
+        
+        avoided, baseline = self._avoided_risk(projects, filters, start_year, horizon)
+        
+        # Value of starting in year s: discounted risk avoided from s onwards
+        discount = (1 + discount_rate) ** -np.arange(horizon, dtype=np.float64)
+        values = np.cumsum((avoided * discount)[:, ::-1], axis=1)[:, ::-1]
+        costs = np.array([int(p[2] * 100) for p in projects], dtype=np.int64)
+        earliest = np.clip(np.array([(p[4] or start_year) - start_year for p in projects]), 0, None)
+        mandatory = set(request.mandatory_projects or [])
+        fixed = np.array([p[0] in mandatory for p in projects], dtype=bool)
+        if (fixed & (earliest >= horizon)).any():
+            raise ValueError("Mandatory projects start after the planning horizon")
+        
+        result = schedule_projects(
+            values, costs, budgets, earliest, fixed, request.passes, request.time_limit_seconds
+        )
+        schedule = result["schedule"]
+        if (fixed & (schedule < 0)).any():
+            raise ValueError("Mandatory projects do not fit the annual budgets")
+        
+        years = []
+        for s in range(horizon):
+            chosen = np.flatnonzero(schedule == s)
+            years.append({
+                "year": start_year + s,
+                "budget": float(budgets[s]) / 100,
+                "spend": float(costs[chosen].sum()) / 100,
+                "project_count": len(chosen),
+                "projects": [
+                    {
+                        "project_id": projects[i][0],
+                        "project_name": projects[i][1],
+                        "cost": float(projects[i][2]),
+                        "discounted_risk_reduction": round(float(values[i, s]), 2)
+                    }
+                    for i in chosen[np.argsort(-values[chosen, s])]
+                ]
+            })
+        
+        done = np.flatnonzero(schedule >= 0)
+        in_effect = np.zeros_like(avoided)
+        in_effect[done] = np.arange(horizon)[None, :] >= schedule[done, None]
+        planned = np.maximum(baseline - (avoided * in_effect).sum(axis=0), 0.0)
+        risk_curve = [
+            {
+                "year": start_year + s,
+                "baseline_risk": round(float(baseline[s]), 2),
+                "planned_risk": round(float(planned[s]), 2),
+                "risk_reduction": round(float(baseline[s] - planned[s]), 2)
+            }
+            for s in range(horizon)
+        ]
+        
+        total_investment = float(costs[done].sum()) / 100
+        total_risk_reduction = float(result["value"]) if len(done) else 0.0
+        expected_roi = total_risk_reduction / total_investment if total_investment > 0 else 0
+        bound = float(result["bound"]) if len(done) else 0.0
+        
+        scenario = models.PortfolioScenario(
+            scenario_name=request.scenario_name,
+            budget_constraint=Decimal(int(budgets.sum())) / 100,
+            time_horizon_years=horizon,
+            selected_projects=[projects[i][0] for i in done],
+            total_investment=Decimal(str(total_investment)),
+            total_risk_reduction=Decimal(str(round(total_risk_reduction, 2))),
+            expected_roi=Decimal(str(round(expected_roi, 4))),
+            risk_adjusted_return=Decimal(str(round(expected_roi * 0.85, 4))),
+            optimization_date=date.today(),
+            optimization_method="MULTI_YEAR",
+            constraints={
+                "start_year": start_year,
+                "annual_budgets": [float(b) / 100 for b in budgets],
+                "discount_rate": discount_rate,
+                "schedule": {str(projects[i][0]): start_year + int(schedule[i]) for i in done}
+            }
+        )
+        self.db.add(scenario)
+        self.db.commit()
+        self.db.refresh(scenario)
+        
+        return {
+            "scenario_id": scenario.id,
+            "scenario_name": request.scenario_name,
+            "start_year": start_year,
+            "time_horizon_years": horizon,
+            "candidates": len(projects),
+            "scheduled": len(done),
+            "total_investment": total_investment,
+            "total_risk_reduction": round(total_risk_reduction, 2),
+            "objective_bound": round(bound, 2),
+            "optimality_gap_percent": (bound - total_risk_reduction) / bound * 100 if bound > 0 else 0.0,
+            "passes": result["passes"],
+            "years": years,
+            "risk_curve": risk_curve,
+            "execution_time_seconds": time.perf_counter() - started
+        }
+    
+    def _annual_budgets(self, request: schemas.CapitalPlanRequest) -> np.ndarray:
+        """Budget per plan year in cents."""
+        if request.annual_budgets is not None:
+            if len(request.annual_budgets) != request.time_horizon_years:
+                raise ValueError("annual_budgets needs one entry per year of the horizon")
+            amounts = request.annual_budgets
+        elif request.annual_budget is not None:
+            amounts = [request.annual_budget] * request.time_horizon_years
+        else:
+            raise ValueError("Either annual_budget or annual_budgets is required")
+        return np.array([int(Decimal(a) * 100) for a in amounts], dtype=np.int64)
+    
+    def _avoided_risk(
+        self,
+        projects: List[Any],
+        filters: List[Any],
+        start_year: int,
+        horizon: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Annual risk each project avoids once done, per plan year, and the
+        baseline annual risk of all assets the candidates touch.
+        
+        A project avoids its interventions' ``risk_reduction_percent`` of
+        each asset's risk. Projects without interventions avoid their
+        ``risk_reduction_total`` spread evenly over the horizon, so started
+        in the first year they count the same total as in the single-year
+        modes.
+        """
+        project_index = {p[0]: i for i, p in enumerate(projects)}
+        links = self.db.query(
+            models.ProjectIntervention.project_id,
+            models.InterventionOption.asset_id,
+            models.InterventionOption.risk_reduction_percent
+        ).join(
+            models.InterventionOption,
+            models.InterventionOption.id == models.ProjectIntervention.intervention_id
+        ).filter(
+            models.ProjectIntervention.project_id.in_(
+                select(models.InvestmentProject.id).where(*filters)
+            )
+        ).all()
+        
+        asset_ids = sorted({link[1] for link in links})
+        asset_index = {a: i for i, a in enumerate(asset_ids)}
+        risk = self._risk_trajectories(asset_ids, start_year, horizon)
+        
+        avoided = np.zeros((len(projects), horizon))
+        linked = np.zeros(len(projects), dtype=bool)
+        if links:
+            rows = np.array([project_index[link[0]] for link in links])
+            share = np.array([float(link[2] or 0) / 100 for link in links])
+            assets = np.array([asset_index[link[1]] for link in links])
+            np.add.at(avoided, rows, risk[assets] * share[:, None])
+            linked[rows] = True
+        flat = np.array([float(p[3] or 0) for p in projects])
+        avoided[~linked] = flat[~linked, None] / horizon
+        
+        return avoided, risk.sum(axis=0)
+    
+    def _risk_trajectories(
+        self,
+        asset_ids: List[UUID],
+        start_year: int,
+        horizon: int
+    ) -> np.ndarray:
+        """
+        Expected annual risk cost per asset and plan year.
+        
+        The latest BASE_CASE expected annual cost is scaled by the growth of
+        the asset's annual POF (summed failure modes, Weibull where modelled,
+        base rate otherwise, capped like the risk calculator) between today
+        and each plan year.
+        """
+        risk = np.zeros((len(asset_ids), horizon))
+        if not asset_ids:
+            return risk
+        index = {a: i for i, a in enumerate(asset_ids)}
+        
+        latest = self.db.query(
+            models.RiskCalculation.asset_id,
+            func.max(models.RiskCalculation.created_at).label("created_at")
+        ).filter(
+            models.RiskCalculation.scenario_type == "BASE_CASE",
+            models.RiskCalculation.asset_id.in_(asset_ids)
+        ).group_by(models.RiskCalculation.asset_id).subquery()
+        current = np.zeros(len(asset_ids))
+        for asset_id, cost in self.db.query(
+            models.RiskCalculation.asset_id,
+            models.RiskCalculation.expected_annual_cost
+        ).join(
+            latest,
+            (models.RiskCalculation.asset_id == latest.c.asset_id)
+            & (models.RiskCalculation.created_at == latest.c.created_at)
+        ).filter(models.RiskCalculation.scenario_type == "BASE_CASE").all():
+            current[index[asset_id]] = float(cost or 0)
+        
+        assets = self.db.query(
+            models.Asset.id, models.Asset.asset_type_id, models.Asset.install_date
+        ).filter(models.Asset.id.in_(asset_ids)).all()
+        today = date.today()
+        rows = np.array([index[a[0]] for a in assets], dtype=np.int64)
+        type_ids = [a[1] for a in assets]
+        age = np.array([(today - a[2]).days / 365.25 for a in assets])
+        
+        # One Weibull model (or base rate) per failure mode, as in the risk calculator
+        modes: Dict[UUID, Dict[UUID, Tuple[float, Optional[Tuple[float, float, float]]]]] = {}
+        for type_id, mode_id, base_rate, shape, scale, location in self.db.query(
+            models.FailureMode.asset_type_id,
+            models.FailureMode.id,
+            models.FailureMode.failure_rate_base,
+            models.DegradationModel.weibull_shape,
+            models.DegradationModel.weibull_scale,
+            models.DegradationModel.weibull_location
+        ).outerjoin(
+            models.DegradationModel,
+            (models.DegradationModel.failure_mode_id == models.FailureMode.id)
+            & (models.DegradationModel.model_type == "WEIBULL")
+        ).filter(
+            models.FailureMode.asset_type_id.in_(set(type_ids))
+        ).all():
+            weibull = (float(shape), float(scale), float(location or 0)) if shape and scale else None
+            type_modes = modes.setdefault(type_id, {})
+            if type_modes.get(mode_id, (0, None))[1] is None:
+                type_modes[mode_id] = (float(base_rate or 0.01), weibull)
+        
+        # Ages today and at each plan year
+        offsets = np.r_[0.0, (start_year - today.year) + np.arange(horizon, dtype=np.float64)]
+        ages = age[:, None] + offsets[None, :]
+        pof = np.zeros_like(ages)
+        type_index = {t: i for i, t in enumerate(modes)}
+        type_of = np.array([type_index.get(t, -1) for t in type_ids], dtype=np.int64)
+        for type_id, type_modes in modes.items():
+            members = type_of == type_index[type_id]
+            for base_rate, weibull in type_modes.values():
+                if weibull is None:
+                    pof[members] += base_rate
+                    continue
+                shape, scale, location = weibull
+                effective = np.maximum(ages[members] - location, 0.0)
+                pof[members] += 1 - np.exp(-(effective / scale) ** shape)
+        pof = np.minimum(pof, MAX_ANNUAL_POF)
+        
+        growth = np.ones((len(assets), horizon))
+        known = pof[:, 0] > 0
+        growth[known] = pof[known, 1:] / pof[known, :1]
+        risk[rows] = current[rows, None] * growth
+        return risk
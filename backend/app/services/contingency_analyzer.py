@@ -0,0 +1,942 @@
+"""
+Contingency Analysis Service
+
+Identifies single points of failure in the network topology: bridges
+(edges whose loss splits the network), articulation points (nodes whose
+loss splits the network) and biconnected components, annotated with the
+customers and load that lose supply.
+
+N-2 screening finds the double outages that leave customers unrestorable
+(cut off from every supply point even after switching) without trying all
+element pairs; see ``screen_double_outages``.
+"""
+
+from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Optional, Tuple
+from uuid import UUID
+import threading
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order, depth_first_order
+
+from app import models
+from app.services.network_topology import NetworkTopology, get_topology, topology_store
+
+
+_spof_lock = threading.Lock()
+_spof_cache: Dict[Tuple[str, bool], Dict[str, Any]] = {}
+_cut_cache: Dict[Tuple[str, bool], Dict[str, np.ndarray]] = {}
+
+# Nodes sharing a substation are paired for common-mode screening only in
+# substations up to this size
+MAX_SUBSTATION_NODES = 50
+EARTH_RADIUS_M = 6371000.0
+
+
+def _on_topology_change(event: Dict[str, Any]) -> None:
+    """Drop cached results as soon as the topology changes."""
+    with _spof_lock:
+        _spof_cache.clear()
+        _cut_cache.clear()
+
+
+topology_store.subscribe(_on_topology_change)
+
+
+def dominator_tree(
+    eu: np.ndarray,
+    ev: np.ndarray,
+    root: int,
+    weight: np.ndarray
+) -> Dict[str, np.ndarray]:
+    """
+    Biconnected blocks and immediate dominators of an undirected graph.
+    
+    A depth-first tree from ``root`` leaves only back edges, so low points
+    follow from one pass in reverse preorder. A child whose low point does
+    not reach above its parent heads a block whose top is that parent;
+    every reached node belongs to exactly one block below its top, and
+    that top is its immediate dominator, the node whose loss cuts it off
+    from the root. Returns the preorder ``order``, per node its ``block``
+    (the head) and ``idom`` (-1 if unreached), the ``dominated`` weight
+    lost with it (its dominator subtree) and per edge its ``edge_block``.
+    """
+    size = len(weight)
+    adjacency = csr_matrix(
+        (np.ones(len(eu), dtype=np.int8), (eu, ev)), shape=(size, size)
+    )
+    order, pred = depth_first_order(adjacency, root, directed=False, return_predecessors=True)
+    disc = np.full(size, -1, dtype=np.int64)
+    disc[order] = np.arange(len(order))
+    
+    # Every non-tree edge runs to an ancestor and lifts the low point of
+    # its lower end; tree edges only repeat the parent's entry time
+    lower = np.where(disc[eu] > disc[ev], eu, ev)
+    upper = np.where(disc[eu] > disc[ev], ev, eu)
+    reached = disc[eu] >= 0
+    low = disc.copy()
+    np.minimum.at(low, lower[reached], disc[upper[reached]])
+    
+    walk = order[1:].tolist()
+    parent = pred.tolist()
+    disc_list = disc.tolist()
+    low_list = low.tolist()
+    for v in reversed(walk):
+        p = parent[v]
+        if low_list[v] < low_list[p]:
+            low_list[p] = low_list[v]
+    
+    block = [-1] * size
+    idom = [-1] * size
+    for v in walk:
+        p = parent[v]
+        head = v if low_list[v] >= disc_list[p] else block[p]
+        block[v] = head
+        idom[v] = parent[head]
+    
+    dominated = np.where(disc >= 0, weight, 0).astype(np.float64).tolist()
+    for v in reversed(walk):
+        d = idom[v]
+        if d != root:
+            dominated[d] += dominated[v]
+    
+    block = np.array(block, dtype=np.int64)
+    return {
+        "order": order,
+        "block": block,
+        "idom": np.array(idom, dtype=np.int64),
+        "dominated": np.array(dominated),
+        "edge_block": np.where(reached, block[lower], -1)
+    }
+
+
+class ContingencyAnalyzer:
+    """Service for outage contingency screening on the network graph."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def find_single_points_of_failure(
+        self,
+        include_switching: bool = True,
+        limit: int = 100,
+        min_customers: int = 0
+    ) -> Dict[str, Any]:
+        """
+        List bridges and articulation points ranked by customers at risk.
+        
+        Active switching paths are treated as optional edges when
+        ``include_switching`` is set, so an element backed up by an alternate
+        feed is not reported as a single point of failure. Results are cached
+        per topology version.
+        """
+        topology = get_topology(self.db)
+        result = self._get_biconnectivity(topology, include_switching)
+        
+        bridges = []
+        for customers, load, ref in result["bridges"]:
+            if customers < min_customers or len(bridges) >= limit:
+                break
+            bridges.append({
+                "edge_id": topology.edge_ids[ref],
+                "asset_id": topology.edge_asset_ids[ref],
+                "edge_type": topology.edge_types[ref],
+                "from_node": topology.node_names[int(topology.edge_from[ref])],
+                "to_node": topology.node_names[int(topology.edge_to[ref])],
+                "customers_at_risk": customers,
+                "load_at_risk_mw": load
+            })
+        
+        articulation_points = []
+        for customers, load, node, pieces in result["articulation_points"]:
+            if customers < min_customers or len(articulation_points) >= limit:
+                break
+            articulation_points.append({
+                **topology.node_summary(node),
+                "pieces": pieces,
+                "customers_at_risk": customers,
+                "load_at_risk_mw": load
+            })
+        
+        components = []
+        for node_count, customers, contains_source, members in result["components"][:limit]:
+            components.append({
+                "node_count": node_count,
+                "customers": customers,
+                "contains_source": contains_source,
+                "node_ids": [topology.node_ids[i] for i in members] if members else None
+            })
+        
+        return {
+            "topology_version": topology.version,
+            "include_switching": include_switching,
+            "total_nodes": int(topology.node_active.sum()),
+            "total_edges": int(topology.edge_active.sum()),
+            "bridge_count": len(result["bridges"]),
+            "articulation_point_count": len(result["articulation_points"]),
+            "biconnected_component_count": len(result["components"]),
+            "bridges": bridges,
+            "articulation_points": articulation_points,
+            "biconnected_components": components
+        }
+    
+    def _get_biconnectivity(
+        self,
+        topology: NetworkTopology,
+        include_switching: bool
+    ) -> Dict[str, List[Tuple]]:
+        """Return the cached biconnectivity result for this topology version."""
+        key = (topology.version, include_switching)
+        with _spof_lock:
+            result = _spof_cache.get(key)
+        
+        if result is None:
+            result = self._analyze_biconnectivity(topology, include_switching)
+            with _spof_lock:
+                # Only keep results for the current topology version
+                for stale in [k for k in _spof_cache if k[0] != topology.version]:
+                    del _spof_cache[stale]
+                _spof_cache[key] = result
+        
+        return result
+    
+    def _analyze_biconnectivity(
+        self,
+        topology: NetworkTopology,
+        include_switching: bool
+    ) -> Dict[str, List[Tuple]]:
+        """
+        Iterative Tarjan pass over the undirected graph.
+        
+        Runs in O(V + E). Subtree customer/load/source totals are accumulated
+        on the DFS tree so the supply lost by each cut can be read off without
+        a second traversal. Results are compact tuples sorted by customers at
+        risk:
+        
+        - bridges: ``(customers, load_mw, edge_index)``
+        - articulation_points: ``(customers, load_mw, node_index, pieces)``
+        - components: ``(node_count, customers, contains_source, members)``
+          where ``members`` lists node indices for small components only
+        """
+        n = topology.num_nodes
+        num_edges = topology.num_edges
+        offsets, targets, refs = topology.adjacency(
+            directed=False, include_switching=include_switching
+        )
+        offsets = offsets.tolist()
+        targets = targets.tolist()
+        refs = refs.tolist()
+        
+        node_customers = topology.node_customers.tolist()
+        node_load = topology.node_load_mw.tolist()
+        is_source = [False] * n
+        sources = topology.source_nodes().tolist()
+        for s in sources:
+            is_source[s] = True
+        
+        sub_customers = list(node_customers)
+        sub_load = list(node_load)
+        sub_sources = [1 if s else 0 for s in is_source]
+        
+        disc = [-1] * n
+        low = [0] * n
+        parent = [-1] * n
+        parent_ref = [-1] * n
+        ptr = offsets[:-1]
+        timer = 0
+        
+        bridges = []
+        articulation_points = []
+        components = []
+        # Vertex stack: nodes of the biconnected components still open
+        vertex_stack: List[int] = []
+        stack_pos = [0] * n
+        
+        # Start from supply points so DFS trees hang off the sources
+        for root in sources + list(range(n)):
+            if disc[root] != -1:
+                continue
+            
+            disc[root] = low[root] = timer
+            timer += 1
+            stack_pos[root] = len(vertex_stack)
+            vertex_stack.append(root)
+            stack = [root]
+            separated: Dict[int, List[int]] = {}
+            tree_bridges: List[int] = []
+            
+            while stack:
+                v = stack[-1]
+                k = ptr[v]
+                end = offsets[v + 1]
+                skip_ref = parent_ref[v]
+                low_v = low[v]
+                child = -1
+                while k < end:
+                    w = targets[k]
+                    r = refs[k]
+                    k += 1
+                    if r == skip_ref:
+                        continue
+                    dw = disc[w]
+                    if dw == -1:
+                        child = w
+                        break
+                    if dw < low_v:
+                        low_v = dw
+                ptr[v] = k
+                low[v] = low_v
+                
+                if child != -1:
+                    parent[child] = v
+                    parent_ref[child] = r
+                    disc[child] = low[child] = timer
+                    timer += 1
+                    stack_pos[child] = len(vertex_stack)
+                    vertex_stack.append(child)
+                    stack.append(child)
+                    continue
+                
+                stack.pop()
+                p = parent[v]
+                if p == -1:
+                    continue
+                
+                sub_customers[p] += sub_customers[v]
+                sub_load[p] += sub_load[v]
+                sub_sources[p] += sub_sources[v]
+                if low_v < low[p]:
+                    low[p] = low_v
+                
+                if low_v >= disc[p]:
+                    separated.setdefault(p, []).append(v)
+                    # Close the biconnected component hanging off tree edge (p, v)
+                    start = stack_pos[v]
+                    members = vertex_stack[start:]
+                    del vertex_stack[start:]
+                    members.append(p)
+                    customers = 0
+                    has_source = False
+                    for i in members:
+                        customers += node_customers[i]
+                        has_source = has_source or is_source[i]
+                    components.append((
+                        len(members), customers, has_source,
+                        members if len(members) <= 50 else None
+                    ))
+                    if low_v > disc[p]:
+                        tree_bridges.append(v)
+            
+            # The root stays on the vertex stack only if it is isolated
+            if vertex_stack and vertex_stack[-1] == root:
+                vertex_stack.pop()
+            
+            # Component totals are known once the DFS tree is complete
+            total_customers = sub_customers[root]
+            total_load = sub_load[root]
+            total_sources = sub_sources[root]
+            
+            for v in tree_bridges:
+                ref = parent_ref[v]
+                if ref >= num_edges:
+                    # Switching paths are optional; their loss is not an outage
+                    continue
+                if sub_sources[v] == 0:
+                    bridges.append((sub_customers[v], sub_load[v], ref))
+                elif total_sources == sub_sources[v]:
+                    bridges.append((
+                        total_customers - sub_customers[v],
+                        total_load - sub_load[v],
+                        ref
+                    ))
+                else:
+                    bridges.append((0, 0.0, ref))
+            
+            for p, children in separated.items():
+                if p == root and len(children) < 2:
+                    continue
+                customers = node_customers[p]
+                load = node_load[p]
+                rest_customers = total_customers - node_customers[p]
+                rest_load = total_load - node_load[p]
+                rest_sources = total_sources - (1 if is_source[p] else 0)
+                for v in children:
+                    rest_customers -= sub_customers[v]
+                    rest_load -= sub_load[v]
+                    rest_sources -= sub_sources[v]
+                    if sub_sources[v] == 0:
+                        customers += sub_customers[v]
+                        load += sub_load[v]
+                if p != root and rest_sources == 0:
+                    customers += rest_customers
+                    load += rest_load
+                articulation_points.append((
+                    customers, load, p, len(children) + (0 if p == root else 1)
+                ))
+        
+        bridges.sort(reverse=True)
+        articulation_points.sort(reverse=True)
+        components.sort(key=lambda x: x[0], reverse=True)
+        
+        return {
+            "bridges": bridges,
+            "articulation_points": articulation_points,
+            "components": components
+        }
+    
+    def screen_double_outages(
+        self,
+        node_ids: Optional[List[UUID]] = None,
+        include_switching: bool = True,
+        limit: int = 100,
+        min_customers: int = 1,
+        row_distance_m: float = 50.0
+    ) -> Dict[str, Any]:
+        """
+        Worst double outages ranked by customers unrestorable.
+        
+        Candidate pairs are pruned before evaluation:
+        
+        - cut structure: two edges only interact when they form a 2-edge cut,
+          i.e. the same set of cycles runs through both. Bridges already
+          cut on their own and combine additively, so they are not paired.
+        - single-outage impact: a cut pair never loses more than the two
+          subtrees below it, so whole groups of pairs are skipped once the
+          ``limit`` worst pairs found so far exceed that bound.
+        - common mode: edges on a shared right-of-way (endpoints within
+          ``row_distance_m``, or parallel between the same nodes) and nodes
+          in the same substation are always screened, whether or not they
+          form a cut.
+        
+        Edge pairs and node pairs are evaluated from the cached cut
+        structure; only node pairs inside one biconnected block are
+        recomputed, on that block alone. ``node_ids`` restricts the
+        candidate elements to the feeders below those nodes.
+        """
+        topology = get_topology(self.db)
+        cut = self._get_cut_structure(topology, include_switching)
+        
+        scope = np.ones(topology.num_nodes, dtype=bool)
+        if node_ids:
+            unknown = [i for i in node_ids if i not in topology.node_index]
+            if unknown:
+                raise ValueError(f"Node {unknown[0]} not found")
+            order, _, _ = topology.downstream_order([topology.node_index[i] for i in node_ids])
+            scope[:] = False
+            scope[order] = True
+        
+        candidates = np.flatnonzero(
+            topology.edge_active & cut["edge_fed"]
+            & scope[topology.edge_from] & scope[topology.edge_to]
+        )
+        pairs, evaluated, groups_skipped = self._screen_cut_pairs(
+            cut, candidates, limit, min_customers
+        )
+        
+        row_pairs = self._shared_row_pairs(topology, candidates, row_distance_m)
+        row_losses = self._edge_pair_losses(cut, row_pairs[:, 0], row_pairs[:, 1])
+        
+        node_pairs = self._substation_node_pairs(topology, cut["fed"] & scope)
+        node_losses = self._node_pair_losses(cut, node_pairs)
+        
+        single_nodes = self._single_node_losses(topology, include_switching)
+        combos = [
+            (float(loss), "EDGE", int(a), int(b), "CUT_PAIR") for loss, a, b in pairs
+        ] + [
+            (float(loss), "EDGE", int(a), int(b), "SHARED_ROW")
+            for loss, (a, b) in zip(row_losses.tolist(), row_pairs.tolist())
+        ] + [
+            (float(loss), "NODE", int(a), int(b), "SHARED_SUBSTATION")
+            for loss, (a, b) in zip(node_losses.tolist(), node_pairs.tolist())
+        ]
+        
+        # Common-mode pairs may also be cut pairs; keep one entry per pair
+        seen = set()
+        worst = []
+        for loss, kind, a, b, reason in sorted(combos, key=lambda c: -c[0]):
+            if loss < min_customers or len(worst) >= limit:
+                break
+            key = (kind, min(a, b), max(a, b))
+            if key in seen:
+                continue
+            seen.add(key)
+            elements = [
+                self._describe_element(topology, cut, single_nodes, kind, i) for i in (a, b)
+            ]
+            worst.append({
+                "elements": elements,
+                "reason": reason,
+                "customers_unrestorable": int(loss),
+                "customers_beyond_single_outages": int(max(
+                    loss - sum(e["single_outage_customers"] for e in elements), 0
+                ))
+            })
+        
+        total = len(candidates)
+        return {
+            "topology_version": topology.version,
+            "include_switching": include_switching,
+            "candidate_edges": total,
+            "brute_force_pairs": total * (total - 1) // 2,
+            "cut_pairs_evaluated": evaluated,
+            "cut_groups_pruned": groups_skipped,
+            "shared_row_pairs": len(row_pairs),
+            "shared_substation_pairs": len(node_pairs),
+            "double_outages": worst
+        }
+    
+    def _describe_element(
+        self,
+        topology: NetworkTopology,
+        cut: Dict[str, np.ndarray],
+        single_nodes: Dict[int, int],
+        kind: str,
+        i: int
+    ) -> Dict[str, Any]:
+        if kind == "EDGE":
+            return {
+                "element_type": "EDGE",
+                "edge_id": topology.edge_ids[i],
+                "asset_id": topology.edge_asset_ids[i],
+                "edge_type": topology.edge_types[i],
+                "from_node": topology.node_names[int(topology.edge_from[i])],
+                "to_node": topology.node_names[int(topology.edge_to[i])],
+                "single_outage_customers": int(cut["edge_single"][i])
+            }
+        return {
+            "element_type": "NODE",
+            **topology.node_summary(i),
+            "single_outage_customers": single_nodes.get(i, int(topology.node_customers[i]))
+        }
+    
+    def _single_node_losses(
+        self,
+        topology: NetworkTopology,
+        include_switching: bool
+    ) -> Dict[int, int]:
+        """N-1 customers lost for articulation points (others lose only their own)."""
+        result = self._get_biconnectivity(topology, include_switching)
+        return {node: customers for customers, _, node, _ in result["articulation_points"]}
+    
+    def _get_cut_structure(
+        self,
+        topology: NetworkTopology,
+        include_switching: bool
+    ) -> Dict[str, np.ndarray]:
+        """Return the cached cut structure for this topology version."""
+        key = (topology.version, include_switching)
+        with _spof_lock:
+            cut = _cut_cache.get(key)
+        
+        if cut is None:
+            cut = self._build_cut_structure(topology, include_switching)
+            with _spof_lock:
+                for stale in [k for k in _cut_cache if k[0] != topology.version]:
+                    del _cut_cache[stale]
+                _cut_cache[key] = cut
+        
+        return cut
+    
+    def _build_cut_structure(
+        self,
+        topology: NetworkTopology,
+        include_switching: bool
+    ) -> Dict[str, np.ndarray]:
+        """
+        Spanning forest of the supply graph with cut-space edge labels.
+        
+        The undirected graph (edges plus switching paths when included) gets
+        a virtual root tied to every supply point and a breadth-first
+        spanning tree from it. Each non-tree edge draws a random 64-bit
+        label; a tree edge's label is the XOR of the labels of the non-tree
+        edges that cross it (XOR over the subtree below it). Two edges form
+        a 2-edge cut exactly when their labels match (up to a 2^-64 chance
+        of collision); bridges have label 0. The dominator tree of the same
+        graph (see ``_build_dominator_tree``) covers node outages.
+        """
+        n = topology.num_nodes
+        num_edges = topology.num_edges
+        root = n
+        
+        active = np.flatnonzero(topology.edge_active)
+        sources = topology.source_nodes()
+        eu = [topology.edge_from[active]]
+        ev = [topology.edge_to[active]]
+        refs = [active]
+        if include_switching and len(topology.switch_ids):
+            eu.append(topology.switch_source)
+            ev.append(topology.switch_target)
+            refs.append(num_edges + np.arange(len(topology.switch_ids), dtype=np.int64))
+        eu.append(np.full(len(sources), root, dtype=np.int64))
+        ev.append(sources)
+        refs.append(np.full(len(sources), -1, dtype=np.int64))
+        eu, ev, refs = np.concatenate(eu), np.concatenate(ev), np.concatenate(refs)
+        loops = eu == ev
+        eu, ev, refs = eu[~loops], ev[~loops], refs[~loops]
+        
+        adjacency = csr_matrix(
+            (np.ones(len(eu), dtype=np.int8), (eu, ev)), shape=(n + 1, n + 1)
+        )
+        bfs, pred = breadth_first_order(adjacency, root, directed=False, return_predecessors=True)
+        order = bfs[1:]
+        parent = pred[:n].astype(np.int64)
+        parent[(parent < 0) | (parent == root)] = -1
+        fed = np.zeros(n, dtype=bool)
+        fed[order] = True
+        
+        # The first edge between each child and its BFS predecessor is the tree edge
+        span = n + 1
+        edge_keys = np.minimum(eu, ev) * span + np.maximum(eu, ev)
+        by_key = np.argsort(edge_keys, kind="stable")
+        child_keys = np.minimum(order, pred[order]) * span + np.maximum(order, pred[order])
+        tree_edges = by_key[np.searchsorted(edge_keys[by_key], child_keys)]
+        is_tree = np.zeros(len(eu), dtype=bool)
+        is_tree[tree_edges] = True
+        
+        rng = np.random.default_rng(0)
+        labels = rng.integers(1, np.iinfo(np.uint64).max, size=len(eu), dtype=np.uint64, endpoint=True)
+        crossing = np.zeros(n + 1, dtype=np.uint64)
+        np.bitwise_xor.at(crossing, eu[~is_tree], labels[~is_tree])
+        np.bitwise_xor.at(crossing, ev[~is_tree], labels[~is_tree])
+        
+        subtree = np.where(fed, topology.node_customers, 0).astype(np.float64)
+        levels = topology.tree_levels(order, parent)
+        for level in reversed(levels[1:]):
+            np.bitwise_xor.at(crossing, parent[level], crossing[level])
+            np.add.at(subtree, parent[level], subtree[level])
+        tin, tout = topology.preorder_intervals(order, parent)
+        
+        # Per network edge: label, tree child and N-1 loss
+        network = (refs >= 0) & (refs < num_edges)
+        edge_label = np.zeros(num_edges, dtype=np.uint64)
+        edge_child = np.full(num_edges, -1, dtype=np.int64)
+        edge_label[refs[network]] = labels[network]
+        tree_network = tree_edges[(refs[tree_edges] >= 0) & (refs[tree_edges] < num_edges)]
+        tree_children = order[(refs[tree_edges] >= 0) & (refs[tree_edges] < num_edges)]
+        edge_child[refs[tree_network]] = tree_children
+        edge_label[refs[tree_network]] = crossing[tree_children]
+        
+        bridge = (edge_child >= 0) & (edge_label == 0)
+        edge_single = np.where(bridge, subtree[np.maximum(edge_child, 0)], 0.0)
+        
+        return {
+            "fed": fed,
+            "edge_fed": fed[topology.edge_from] & fed[topology.edge_to],
+            "subtree": subtree,
+            "tin": tin,
+            "tout": tout,
+            "edge_label": edge_label,
+            "edge_child": edge_child,
+            "edge_single": edge_single,
+            **self._build_dominator_tree(topology, eu, ev)
+        }
+    
+    def _build_dominator_tree(
+        self,
+        topology: NetworkTopology,
+        eu: np.ndarray,
+        ev: np.ndarray
+    ) -> Dict[str, np.ndarray]:
+        """
+        Biconnected blocks and dominator tree of the supply graph (see
+        ``dominator_tree``), with dominator-tree intervals ``dom_tin`` /
+        ``dom_tout`` for ancestry checks.
+        """
+        n = topology.num_nodes
+        weight = np.zeros(n + 1)
+        weight[:n] = topology.node_customers
+        tree = dominator_tree(eu, ev, n, weight)
+        idom = tree["idom"][:n]
+        dom_tin, dom_tout = topology.preorder_intervals(
+            tree["order"][1:], np.where(idom == n, -1, idom)
+        )
+        return {
+            "block": tree["block"][:n],
+            "idom": idom,
+            "dominated": tree["dominated"][:n],
+            "dom_tin": dom_tin,
+            "dom_tout": dom_tout,
+            "graph": {"eu": eu, "ev": ev, "edge_block": tree["edge_block"]}
+        }
+    
+    def _edge_pair_losses(
+        self,
+        cut: Dict[str, np.ndarray],
+        a: np.ndarray,
+        b: np.ndarray
+    ) -> np.ndarray:
+        """
+        Customers unrestorable after losing edges ``a[j]`` and ``b[j]``.
+        
+        A 2-edge cut of nested tree edges cuts off the band between them;
+        of unrelated tree edges both subtrees; of a tree edge and its only
+        crossing non-tree edge the subtree. Otherwise only bridges cut,
+        each its own subtree.
+        """
+        label, child, single = cut["edge_label"], cut["edge_child"], cut["edge_single"]
+        subtree, tin, tout = cut["subtree"], cut["tin"], cut["tout"]
+        ca, cb = child[a], child[b]
+        sa, sb = subtree[np.maximum(ca, 0)], subtree[np.maximum(cb, 0)]
+        a_above = (ca >= 0) & (cb >= 0) & (tin[ca] <= tin[cb]) & (tin[cb] < tout[ca])
+        b_above = (ca >= 0) & (cb >= 0) & (tin[cb] <= tin[ca]) & (tin[ca] < tout[cb])
+        
+        paired = np.where(
+            a_above, sa - sb,
+            np.where(b_above, sb - sa, np.where(ca >= 0, sa, 0.0) + np.where(cb >= 0, sb, 0.0))
+        )
+        bridge_a = (ca >= 0) & (label[a] == 0)
+        bridge_b = (cb >= 0) & (label[b] == 0)
+        separate = np.where(
+            a_above & bridge_a, single[a],
+            np.where(b_above & bridge_b, single[b], single[a] + single[b])
+        )
+        is_cut = (label[a] == label[b]) & (label[a] != 0)
+        return np.where(is_cut, paired, separate)
+    
+    def _screen_cut_pairs(
+        self,
+        cut: Dict[str, np.ndarray],
+        candidates: np.ndarray,
+        limit: int,
+        min_customers: int
+    ) -> Tuple[List[Tuple[float, int, int]], int, int]:
+        """
+        Branch-and-bound over groups of edges with a shared cut label.
+        
+        Groups are visited by their bound (the two largest subtrees in the
+        group); rows within a group by their own bound. Returns the best
+        ``(loss, edge_a, edge_b)`` triples, the number of pairs evaluated
+        and the number of groups pruned without evaluation.
+        """
+        label = cut["edge_label"][candidates]
+        keep = label != 0
+        candidates, label = candidates[keep], label[keep]
+        child = cut["edge_child"][candidates]
+        size = np.where(child >= 0, cut["subtree"][np.maximum(child, 0)], 0.0)
+        
+        # Sort by label, then subtree size descending within each label
+        order = np.lexsort((-size, label))
+        candidates, label, size = candidates[order], label[order], size[order]
+        boundary = np.ones(len(label), dtype=bool)
+        boundary[1:] = label[1:] != label[:-1]
+        starts = np.flatnonzero(boundary)
+        ends = np.r_[starts[1:], len(label)].astype(np.int64)
+        multi = ends - starts >= 2
+        starts, ends = starts[multi], ends[multi]
+        bounds = size[starts] + size[starts + 1]
+        
+        found = np.empty(0)
+        found_a = np.empty(0, dtype=np.int64)
+        found_b = np.empty(0, dtype=np.int64)
+        threshold = float(min_customers)
+        evaluated = 0
+        visited = 0
+        for g in np.argsort(-bounds, kind="stable").tolist():
+            if bounds[g] < threshold:
+                break
+            visited += 1
+            start, end = int(starts[g]), int(ends[g])
+            members = candidates[start:end]
+            member_size = size[start:end]
+            m = end - start
+            # Rows in batches of at most ~1M pairs
+            batch = max(1, 1_000_000 // m)
+            for row in range(0, m - 1, batch):
+                if member_size[row] + member_size[row + 1] < threshold:
+                    break
+                rows = np.arange(row, min(row + batch, m - 1))
+                counts = m - 1 - rows
+                i = np.repeat(rows, counts)
+                offset = np.arange(len(i)) - np.repeat(np.cumsum(counts) - counts, counts)
+                j = np.repeat(rows + 1, counts) + offset
+                losses = self._edge_pair_losses(cut, members[i], members[j])
+                evaluated += len(losses)
+                hit = losses >= threshold
+                found = np.concatenate([found, losses[hit]])
+                found_a = np.concatenate([found_a, members[i[hit]]])
+                found_b = np.concatenate([found_b, members[j[hit]]])
+                if len(found) >= limit:
+                    top = np.argsort(-found, kind="stable")[:limit]
+                    found, found_a, found_b = found[top], found_a[top], found_b[top]
+                    threshold = max(threshold, float(found[-1]))
+        
+        return (
+            list(zip(found.tolist(), found_a.tolist(), found_b.tolist())),
+            evaluated,
+            len(starts) - visited
+        )
+    
+    def _shared_row_pairs(
+        self,
+        topology: NetworkTopology,
+        candidates: np.ndarray,
+        row_distance_m: float
+    ) -> np.ndarray:
+        """
+        Edge pairs on a shared right-of-way: parallel between the same nodes,
+        or with both ends within ``row_distance_m`` of each other.
+        """
+        a_end = topology.edge_from[candidates]
+        b_end = topology.edge_to[candidates]
+        pairs = []
+        
+        # Parallel edges between the same two nodes
+        span = topology.num_nodes
+        keys = np.minimum(a_end, b_end) * span + np.maximum(a_end, b_end)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        boundary = np.ones(len(keys), dtype=bool)
+        boundary[1:] = sorted_keys[1:] != sorted_keys[:-1]
+        starts = np.flatnonzero(boundary)
+        sizes = np.diff(np.r_[starts, len(keys)])
+        for start, m in zip(starts[sizes > 1].tolist(), sizes[sizes > 1].tolist()):
+            i, j = np.triu_indices(m, 1)
+            pairs.append(np.column_stack([candidates[order[start + i]], candidates[order[start + j]]]))
+        
+        # Co-located corridors: hash edge midpoints on a grid of the
+        # tolerance and compare endpoints within neighbouring cells
+        lat = np.radians(topology.node_latitude)
+        lon = np.radians(topology.node_longitude)
+        x = EARTH_RADIUS_M * lon * np.cos(np.nanmean(lat) if np.isfinite(lat).any() else 0.0)
+        y = EARTH_RADIUS_M * lat
+        located = np.isfinite(x[a_end]) & np.isfinite(x[b_end])
+        if row_distance_m > 0 and located.sum() > 1:
+            idx = np.flatnonzero(located)
+            ax, ay, bx, by = x[a_end[idx]], y[a_end[idx]], x[b_end[idx]], y[b_end[idx]]
+            cx = np.floor((ax + bx) / 2 / row_distance_m).astype(np.int64)
+            cy = np.floor((ay + by) / 2 / row_distance_m).astype(np.int64)
+            cx -= cx.min() - 1
+            cy -= cy.min() - 1
+            width = int(cy.max()) + 2
+            cell = cx * width + cy
+            order = np.argsort(cell, kind="stable")
+            sorted_cell = cell[order]
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    target = cell + dx * width + dy
+                    lo = np.searchsorted(sorted_cell, target, side="left")
+                    counts = np.searchsorted(sorted_cell, target, side="right") - lo
+                    i = np.repeat(np.arange(len(idx)), counts)
+                    offset = np.arange(len(i)) - np.repeat(np.cumsum(counts) - counts, counts)
+                    j = order[np.repeat(lo, counts) + offset]
+                    i, j = i[i < j], j[i < j]
+                    same = np.maximum(
+                        np.hypot(ax[i] - ax[j], ay[i] - ay[j]), np.hypot(bx[i] - bx[j], by[i] - by[j])
+                    )
+                    crossed = np.maximum(
+                        np.hypot(ax[i] - bx[j], ay[i] - by[j]), np.hypot(bx[i] - ax[j], by[i] - ay[j])
+                    )
+                    near = np.minimum(same, crossed) <= row_distance_m
+                    pairs.append(np.column_stack([candidates[idx[i[near]]], candidates[idx[j[near]]]]))
+        
+        if not pairs:
+            return np.empty((0, 2), dtype=np.int64)
+        pairs = np.sort(np.vstack(pairs), axis=1)
+        return np.unique(pairs, axis=0)
+    
+    def _substation_node_pairs(
+        self,
+        topology: NetworkTopology,
+        in_scope: np.ndarray
+    ) -> np.ndarray:
+        """Pairs of fed network nodes whose assets share a substation."""
+        substation_by_asset = dict(self.db.query(
+            models.Asset.id,
+            models.AssetLocation.substation_id
+        ).join(
+            models.AssetLocation, models.AssetLocation.id == models.Asset.location_id
+        ).all())
+        
+        members: Dict[str, List[int]] = {}
+        for i, asset_id in enumerate(topology.node_asset_ids):
+            substation = substation_by_asset.get(asset_id) if asset_id is not None else None
+            if substation is not None and in_scope[i]:
+                members.setdefault(substation, []).append(i)
+        
+        pairs = []
+        for nodes in members.values():
+            if 2 <= len(nodes) <= MAX_SUBSTATION_NODES:
+                i, j = np.triu_indices(len(nodes), 1)
+                nodes = np.array(nodes, dtype=np.int64)
+                pairs.append(np.column_stack([nodes[i], nodes[j]]))
+        return np.vstack(pairs) if pairs else np.empty((0, 2), dtype=np.int64)
+    
+    def _node_pair_losses(
+        self,
+        cut: Dict[str, np.ndarray],
+        pairs: np.ndarray
+    ) -> np.ndarray:
+        """
+        Customers unrestorable after losing both nodes of each pair.
+        
+        A node dominating the other cuts off its whole dominator subtree;
+        nodes in different blocks cut off their subtrees independently.
+        Only two nodes inside the same block can separate part of it
+        together, so those pairs are recomputed on that block alone.
+        """
+        if not len(pairs):
+            return np.empty(0)
+        a, b = pairs[:, 0], pairs[:, 1]
+        dominated, tin, tout = cut["dominated"], cut["dom_tin"], cut["dom_tout"]
+        a_above = (tin[a] <= tin[b]) & (tin[b] < tout[a])
+        b_above = (tin[b] <= tin[a]) & (tin[a] < tout[b])
+        losses = np.where(
+            a_above, dominated[a], np.where(b_above, dominated[b], dominated[a] + dominated[b])
+        )
+        
+        block = cut["block"]
+        joint = np.flatnonzero(block[a] == block[b])
+        if not len(joint):
+            return losses
+        node_order = np.argsort(block, kind="stable")
+        node_blocks = block[node_order]
+        edge_block = cut["graph"]["edge_block"]
+        edge_order = np.argsort(edge_block, kind="stable")
+        edge_blocks = edge_block[edge_order]
+        joint = joint[np.argsort(block[a[joint]], kind="stable")]
+        groups = np.flatnonzero(np.r_[True, np.diff(block[a[joint]]) != 0])
+        for rows in np.split(joint, groups[1:]):
+            head = int(block[a[rows[0]]])
+            members = node_order[
+                np.searchsorted(node_blocks, head):np.searchsorted(node_blocks, head, side="right")
+            ]
+            edges = edge_order[
+                np.searchsorted(edge_blocks, head):np.searchsorted(edge_blocks, head, side="right")
+            ]
+            losses[rows] = self._block_pair_losses(cut, members, edges, pairs[rows])
+        return losses
+    
+    def _block_pair_losses(
+        self,
+        cut: Dict[str, np.ndarray],
+        members: np.ndarray,
+        edges: np.ndarray,
+        pairs: np.ndarray
+    ) -> np.ndarray:
+        """
+        Node pair losses inside one block.
+        
+        Each member weighs the customers it dominates. No single member
+        separates the block, so once the first node of a pair is removed
+        the second cuts off exactly its dominator subtree in what remains:
+        one pass per first node covers all of its partners.
+        """
+        top = int(cut["idom"][members[0]])
+        nodes = np.sort(np.r_[members, top])
+        weight = np.zeros(len(nodes))
+        weight[np.searchsorted(nodes, members)] = cut["dominated"][members]
+        eu = np.searchsorted(nodes, cut["graph"]["eu"][edges])
+        ev = np.searchsorted(nodes, cut["graph"]["ev"][edges])
+        local_top = int(np.searchsorted(nodes, top))
+        local = np.searchsorted(nodes, pairs)
+        
+        losses = np.zeros(len(pairs))
+        by_first = np.argsort(local[:, 0], kind="stable")
+        groups = np.flatnonzero(np.r_[True, np.diff(local[by_first, 0]) != 0])
+        for rows in np.split(by_first, groups[1:]):
+            x = int(local[rows[0], 0])
+            keep = (eu != x) & (ev != x)
+            tree = dominator_tree(eu[keep], ev[keep], local_top, weight)
+            losses[rows] = weight[x] + tree["dominated"][local[rows, 1]]
+        return losses
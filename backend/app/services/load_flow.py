@@ -0,0 +1,375 @@
+"""
+Load Flow Service
+
+Branch flow solvers that use the impedance and thermal ratings stored on
+network edges:
+
+- Backward/forward sweep for radial distribution feeders
+- Sparse DC power flow for meshed transmission, with the factorized
+  susceptance matrix cached per topology version and reused across load cases
+"""
+
+from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Optional, Tuple
+from uuid import UUID
+import threading
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+from scipy.sparse.linalg import splu
+
+from app.services.network_topology import NetworkTopology, get_topology, topology_store
+
+
+BASE_MVA = 100.0
+DEFAULT_VOLTAGE_KV = 12.47
+# Per-unit reactance used for bus ties and edges without impedance data
+MIN_REACTANCE_PU = 1e-4
+
+
+_factor_lock = threading.Lock()
+# (version, island, reference node or -1) -> factorization
+_factor_cache: Dict[Tuple[str, int, int], Dict[str, Any]] = {}
+# version -> (island label of every node, supply points)
+_island_cache: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+
+
+def _on_topology_change(event: Dict[str, Any]) -> None:
+    """Drop factorizations as soon as the topology changes."""
+    with _factor_lock:
+        _factor_cache.clear()
+        _island_cache.clear()
+
+
+topology_store.subscribe(_on_topology_change)
+
+
+class LoadFlowSolver:
+    """Service for solving branch flows on the network topology."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def solve(
+        self,
+        node_id: UUID,
+        method: str = "RADIAL_SWEEP",
+        load_cases: Optional[List[Dict[UUID, float]]] = None,
+        power_factor: float = 0.95,
+        include_branch_flows: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Solve branch flows for one or more load snapshots.
+        
+        Each load case maps node IDs to load in MW; nodes not listed keep
+        their customer peak load. Without load cases the peak load snapshot
+        is solved.
+        
+        Methods:
+        - RADIAL_SWEEP: backward/forward sweep over the feeder below node_id
+        - DC: sparse DC power flow over the island containing node_id
+        """
+        topology = get_topology(self.db)
+        if node_id not in topology.node_index:
+            raise ValueError(f"Node {node_id} not found")
+        
+        loads = self._build_load_matrix(topology, load_cases)
+        
+        if method == "RADIAL_SWEEP":
+            result = self._radial_sweep(
+                topology, topology.node_index[node_id], loads, power_factor
+            )
+        elif method == "DC":
+            result = self._dc_power_flow(
+                topology, topology.node_index[node_id], loads
+            )
+        else:
+            raise ValueError(f"Unknown load flow method: {method}")
+        
+        cases = []
+        edges = result["edges"]
+        flows = result["flows_mva"]
+        ratings = topology.edge_thermal_rating_mva[edges]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            loading = np.where(
+                ratings[:, None] > 0, np.abs(flows) / ratings[:, None] * 100.0, np.nan
+            )
+        
+        for c in range(loads.shape[1]):
+            case_loading = loading[:, c]
+            overloaded = np.flatnonzero(case_loading > 100.0)
+            overloaded = overloaded[np.argsort(-case_loading[overloaded])]
+            
+            case = {
+                "case_index": c,
+                "total_load_mw": float(loads[result["buses"], c].sum()),
+                "max_loading_percent": (
+                    float(np.nanmax(case_loading))
+                    if np.any(~np.isnan(case_loading)) else None
+                ),
+                "overloaded_edges": [
+                    self._branch_summary(topology, edges[k], flows[k, c], case_loading[k])
+                    for k in overloaded
+                ]
+            }
+            if "voltage_pu" in result:
+                case["min_voltage_pu"] = float(result["voltage_pu"][:, c].min())
+                case["losses_mw"] = float(result["losses_mw"][c])
+            if include_branch_flows:
+                case["branch_flows"] = [
+                    self._branch_summary(topology, edges[k], flows[k, c], case_loading[k])
+                    for k in range(len(edges))
+                ]
+            cases.append(case)
+        
+        return {
+            "node_id": node_id,
+            "method": method,
+            "topology_version": topology.version,
+            "bus_count": len(result["buses"]),
+            "branch_count": len(edges),
+            "factorization_reused": result.get("factorization_reused", False),
+            "cases": cases
+        }
+    
+    def _build_load_matrix(
+        self,
+        topology: NetworkTopology,
+        load_cases: Optional[List[Dict[UUID, float]]]
+    ) -> np.ndarray:
+        """Node-by-case load matrix (MW), defaulting to customer peak load."""
+        if not load_cases:
+            return topology.node_load_mw[:, None].copy()
+        
+        loads = np.repeat(topology.node_load_mw[:, None], len(load_cases), axis=1)
+        for c, case in enumerate(load_cases):
+            for node_id, load_mw in case.items():
+                i = topology.node_index.get(UUID(str(node_id)))
+                if i is not None:
+                    loads[i, c] = float(load_mw)
+        return loads
+    
+    def _branch_summary(
+        self,
+        topology: NetworkTopology,
+        edge: int,
+        flow_mva: float,
+        loading_percent: float
+    ) -> Dict[str, Any]:
+        rating = topology.edge_thermal_rating_mva[edge]
+        return {
+            "edge_id": topology.edge_ids[edge],
+            "from_node": topology.node_names[int(topology.edge_from[edge])],
+            "to_node": topology.node_names[int(topology.edge_to[edge])],
+            "flow_mva": float(flow_mva),
+            "thermal_rating_mva": None if np.isnan(rating) else float(rating),
+            "loading_percent": None if np.isnan(loading_percent) else float(loading_percent)
+        }
+    
+    def _impedance_pu(
+        self,
+        topology: NetworkTopology,
+        edges: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Edge resistance and reactance in per unit on the from-node voltage base."""
+        kv = topology.node_voltage_kv[topology.edge_from[edges]]
+        kv = np.where(np.isnan(kv) | (kv <= 0), DEFAULT_VOLTAGE_KV, kv)
+        z_base = kv ** 2 / BASE_MVA
+        r = np.nan_to_num(topology.edge_impedance_r[edges]) / z_base
+        x = np.nan_to_num(topology.edge_impedance_x[edges]) / z_base
+        return r, x
+    
+    def _radial_sweep(
+        self,
+        topology: NetworkTopology,
+        root: int,
+        loads: np.ndarray,
+        power_factor: float,
+        max_iterations: int = 50,
+        tolerance: float = 1e-6
+    ) -> Dict[str, Any]:
+        """
+        Backward/forward sweep on the radial feeder below ``root``.
+        
+        Works level by level so each sweep is a handful of vectorized
+        operations, with all load cases solved simultaneously.
+        """
+        order, parent, parent_edge = topology.downstream_order([root])
+        n_local = len(order)
+        local = np.full(topology.num_nodes, -1, dtype=np.int64)
+        local[order] = np.arange(n_local)
+        
+        local_parent = np.where(parent[order] >= 0, local[parent[order]], -1)
+        local_parent[0] = -1
+        edges = parent_edge[order[1:]]
+        
+        r_pu, x_pu = self._impedance_pu(topology, edges)
+        z = np.zeros(n_local, dtype=np.complex128)
+        z[1:] = r_pu + 1j * x_pu
+        
+        # Depth levels (BFS order guarantees parents precede children)
+        parent_list = local_parent.tolist()
+        depth_list = [0] * n_local
+        for i in range(1, n_local):
+            depth_list[i] = depth_list[parent_list[i]] + 1
+        depth = np.array(depth_list, dtype=np.int64)
+        by_depth = np.argsort(depth, kind="stable")
+        level_sizes = np.bincount(depth)
+        levels = np.split(by_depth, np.cumsum(level_sizes)[:-1])[1:]
+        
+        tan_phi = np.tan(np.arccos(np.clip(power_factor, 0.01, 1.0)))
+        p = loads[order] / BASE_MVA
+        s_load = p + 1j * p * tan_phi
+        
+        v = np.ones_like(s_load)
+        i_branch = np.zeros_like(s_load)
+        for _ in range(max_iterations):
+            # Backward sweep: accumulate currents towards the root
+            i_branch = np.conj(s_load / v)
+            for level in reversed(levels):
+                np.add.at(i_branch, local_parent[level], i_branch[level])
+            
+            # Forward sweep: propagate voltage drops away from the root
+            v_new = np.ones_like(v)
+            for level in levels:
+                v_new[level] = v_new[local_parent[level]] - z[level, None] * i_branch[level]
+            
+            converged = np.max(np.abs(v_new - v)) < tolerance
+            v = v_new
+            if converged:
+                break
+        
+        branch = np.arange(1, n_local)
+        s_branch = v[local_parent[branch]] * np.conj(i_branch[branch]) * BASE_MVA
+        losses = (np.abs(i_branch[branch]) ** 2 * r_pu[:, None]).sum(axis=0) * BASE_MVA
+        
+        return {
+            "buses": order,
+            "edges": edges,
+            "flows_mva": np.abs(s_branch),
+            "voltage_pu": np.abs(v),
+            "losses_mw": losses
+        }
+    
+    def _dc_power_flow(
+        self,
+        topology: NetworkTopology,
+        node: int,
+        loads: np.ndarray
+    ) -> Dict[str, Any]:
+        """
+        Sparse DC power flow over the island containing ``node``.
+        
+        Supply points in the island are reference buses at zero angle. The
+        reduced susceptance matrix is LU-factorized once per topology version
+        and island; every load case is a back-substitution against it.
+        """
+        factor, reused = self._get_dc_factorization(topology, node)
+        buses = factor["buses"]
+        non_slack = factor["non_slack"]
+        
+        injections = -loads[buses[non_slack]] / BASE_MVA
+        theta = np.zeros((len(buses), loads.shape[1]))
+        if len(non_slack):
+            theta[non_slack] = factor["lu"].solve(injections)
+        
+        flows = (
+            (theta[factor["from_local"]] - theta[factor["to_local"]])
+            * factor["susceptance"][:, None] * BASE_MVA
+        )
+        
+        return {
+            "buses": buses,
+            "edges": factor["edges"],
+            "flows_mva": flows,
+            "factorization_reused": reused
+        }
+    
+    def _get_dc_factorization(
+        self,
+        topology: NetworkTopology,
+        node: int
+    ) -> Tuple[Dict[str, Any], bool]:
+        """
+        Build or fetch the cached B-matrix factorization for an island.
+        
+        Island labels and supply points are computed once per topology
+        version, so a cache hit costs a dictionary lookup.
+        """
+        n = topology.num_nodes
+        with _factor_lock:
+            islands = _island_cache.get(topology.version)
+        if islands is None:
+            active = np.flatnonzero(topology.edge_active)
+            graph = sparse.coo_matrix(
+                (np.ones(len(active)), (topology.edge_from[active], topology.edge_to[active])),
+                shape=(n, n)
+            )
+            _, labels = connected_components(graph, directed=False)
+            is_source = np.zeros(n, dtype=bool)
+            is_source[topology.source_nodes()] = True
+            # Islands with at least one supply point
+            supplied = np.zeros(labels.max() + 1 if n else 0, dtype=bool)
+            supplied[labels[is_source]] = True
+            islands = (labels, supplied)
+            with _factor_lock:
+                _island_cache.clear()
+                _island_cache[topology.version] = islands
+        labels, supplied = islands
+        island = int(labels[node])
+        
+        # An island without supply points is referenced to the queried node
+        key = (topology.version, island, -1 if supplied[island] else node)
+        with _factor_lock:
+            cached = _factor_cache.get(key)
+        if cached is not None:
+            return cached, True
+        
+        active = np.flatnonzero(topology.edge_active)
+        buses = np.flatnonzero(labels == island)
+        slack = np.intersect1d(topology.source_nodes(), buses)
+        if not len(slack):
+            slack = np.array([node], dtype=np.int64)
+        
+        local = np.full(n, -1, dtype=np.int64)
+        local[buses] = np.arange(len(buses))
+        edges = active[labels[topology.edge_from[active]] == island]
+        from_local = local[topology.edge_from[edges]]
+        to_local = local[topology.edge_to[edges]]
+        
+        _, x_pu = self._impedance_pu(topology, edges)
+        susceptance = 1.0 / np.maximum(np.abs(x_pu), MIN_REACTANCE_PU)
+        
+        m = len(buses)
+        b_matrix = sparse.coo_matrix(
+            (
+                np.concatenate([susceptance, susceptance, -susceptance, -susceptance]),
+                (
+                    np.concatenate([from_local, to_local, from_local, to_local]),
+                    np.concatenate([from_local, to_local, to_local, from_local])
+                )
+            ),
+            shape=(m, m)
+        ).tocsc()
+        
+        is_slack = np.zeros(m, dtype=bool)
+        is_slack[local[slack]] = True
+        non_slack = np.flatnonzero(~is_slack)
+        
+        factor = {
+            "buses": buses,
+            "non_slack": non_slack,
+            "edges": edges,
+            "from_local": from_local,
+            "to_local": to_local,
+            "susceptance": susceptance,
+            "lu": splu(b_matrix[non_slack][:, non_slack].tocsc()) if len(non_slack) else None
+        }
+        
+        with _factor_lock:
+            for stale in [k for k in _factor_cache if k[0] != topology.version]:
+                del _factor_cache[stale]
+            _factor_cache[key] = factor
+        
+        return factor, False
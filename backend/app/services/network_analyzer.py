@@ -7,11 +7,16 @@ and customer impact assessment.
 
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from typing import List, Dict, Any, Optional, Set
+from typing import List, Dict, Any, Optional, Set, Tuple
 from uuid import UUID
 from collections import deque
 
+import numpy as np
+
 from app import models
+from app.services.load_flow import LoadFlowSolver
+from app.services.network_topology import NetworkTopology, get_topology
+from app.services.restoration_paths import RestorationPathFinder
 
 
 class NetworkAnalyzer:
@@ -90,28 +95,17 @@ class NetworkAnalyzer:
     ) -> Dict[str, Any]:
         """
         Analyze available switching paths for a node.
+        
+        Lists the active switching paths entered for the node followed by the
+        restoration paths derived from normally-open points.
         """
-        # Get switching paths
-        paths = self.db.query(models.SwitchingPath).filter(
-            models.SwitchingPath.source_node_id == node_id,
-            models.SwitchingPath.is_active == True
-        ).all()
+        topology = get_topology(self.db)
+        if node_id not in topology.node_index:
+            raise ValueError(f"Node {node_id} not found")
         
-        switching_options = []
-        for path in paths:
-            target_node = self.db.query(models.NetworkNode).filter(
-                models.NetworkNode.id == path.target_node_id
-            ).first()
-            
-            switching_options.append({
-                "path_id": path.id,
-                "target_node_id": path.target_node_id,
-                "target_node_name": target_node.name if target_node else None,
-                "path_distance_km": float(path.path_distance_km) if path.path_distance_km else None,
-                "switching_time_min": path.switching_time_min,
-                "backup_capacity_mva": float(path.backup_capacity_mva) if path.backup_capacity_mva else None,
-                "automatic_switching": path.automatic_switching
-            })
+        source = topology.node_index[node_id]
+        manual = np.flatnonzero(topology.switch_source == source).tolist()
+        switching_options = self._switching_options(topology, source, manual)
         
         return {
             "node_id": node_id,
@@ -123,10 +117,15 @@ class NetworkAnalyzer:
     
     def analyze_load_flow(
         self,
-        node_id: UUID
+        node_id: UUID,
+        method: str = "SUMMATION"
     ) -> Dict[str, Any]:
         """
         Analyze load flow from a node to identify downstream load.
+        
+        SUMMATION totals downstream customer peak load. RADIAL_SWEEP and DC
+        additionally solve branch flows against edge impedances and thermal
+        ratings (see LoadFlowSolver).
         """
         # Get connected assets
         connected_assets = self._get_downstream_assets(node_id)
@@ -143,7 +142,7 @@ class NetworkAnalyzer:
                 total_load_mw += float(conn.peak_load_mw or 0)
                 total_customers += conn.customers_served or 0
         
-        return {
+        result = {
             "node_id": node_id,
             "analysis_type": "load_flow",
             "connected_nodes": [],
@@ -151,6 +150,210 @@ class NetworkAnalyzer:
             "customers_at_risk": total_customers,
             "load_at_risk_mw": total_load_mw
         }
+        
+        if method != "SUMMATION":
+            solution = LoadFlowSolver(self.db).solve(node_id, method=method)
+            case = solution["cases"][0]
+            result["branch_flows"] = case["branch_flows"]
+            result["overloaded_edges"] = case["overloaded_edges"]
+        
+        return result
+    
+    def analyze_batch(
+        self,
+        node_ids: List[UUID],
+        analysis_types: List[str],
+        max_depth: Optional[int] = 5,
+        include_nodes: bool = True
+    ) -> Dict[str, Any]:
+        """
+        Run connectivity, load_flow and switching_paths analyses for many
+        nodes at once.
+        
+        The topology is loaded once and all sources are traversed together in
+        a single multi-source BFS: each node carries a bitmask of the sources
+        that have reached it, so subtrees shared by several sources are
+        expanded once. connectivity honours max_depth; load_flow follows the
+        full downstream network like analyze_load_flow.
+        """
+        topology = get_topology(self.db)
+        
+        sources = []
+        not_found = []
+        for node_id in dict.fromkeys(node_ids):
+            if node_id in topology.node_index:
+                sources.append(topology.node_index[node_id])
+            else:
+                not_found.append(node_id)
+        
+        depth_limit = None if "load_flow" in analysis_types else max_depth
+        hits, nodes_visited = self._multi_source_reach(topology, sources, depth_limit)
+        
+        switching_by_source: Dict[int, List[int]] = {}
+        if "switching_paths" in analysis_types:
+            for k, source in enumerate(topology.switch_source.tolist()):
+                switching_by_source.setdefault(source, []).append(k)
+        
+        results = []
+        for bit, source in enumerate(sources):
+            reached = hits[bit]
+            result = {
+                "node_id": topology.node_ids[source],
+                "node_name": topology.node_names[source]
+            }
+            
+            if "connectivity" in analysis_types:
+                within = [
+                    (node, distance) for node, distance in reached
+                    if max_depth is None or distance <= max_depth
+                ]
+                subgraph = [source] + [node for node, _ in within]
+                connectivity = {
+                    "total_connected": len(within),
+                    "customers_at_risk": int(topology.node_customers[subgraph].sum()),
+                    "load_at_risk_mw": float(topology.node_load_mw[subgraph].sum())
+                }
+                if include_nodes:
+                    connectivity["connected_nodes"] = [
+                        {
+                            "node_id": topology.node_ids[node],
+                            "name": topology.node_names[node],
+                            "type": topology.node_types[node],
+                            "voltage_level": topology.node_voltage_levels[node],
+                            "distance": distance
+                        }
+                        for node, distance in within
+                    ]
+                result["connectivity"] = connectivity
+            
+            if "load_flow" in analysis_types:
+                # Count each downstream asset once, as _get_downstream_assets does
+                assets: Dict[UUID, int] = {}
+                for node, _ in reached:
+                    asset_id = topology.node_asset_ids[node]
+                    if asset_id and asset_id not in assets:
+                        assets[asset_id] = node
+                downstream = list(assets.values())
+                result["load_flow"] = {
+                    "downstream_assets": len(downstream),
+                    "customers_at_risk": int(topology.node_customers[downstream].sum()),
+                    "load_at_risk_mw": float(topology.node_load_mw[downstream].sum())
+                }
+            
+            if "switching_paths" in analysis_types:
+                options = self._switching_options(
+                    topology, source, switching_by_source.get(source, [])
+                )
+                result["switching_paths"] = {
+                    "switching_options": options,
+                    "total_paths": len(options)
+                }
+            
+            results.append(result)
+        
+        return {
+            "topology_version": topology.version,
+            "analysis_types": analysis_types,
+            "max_depth": max_depth,
+            "total_requested": len(node_ids),
+            "nodes_visited": nodes_visited,
+            "results": results,
+            "not_found": not_found
+        }
+    
+    def _switching_options(
+        self,
+        topology: NetworkTopology,
+        source: int,
+        manual: List[int]
+    ) -> List[Dict[str, Any]]:
+        """
+        Entered switching paths ``manual`` plus the derived restoration paths
+        for node index ``source`` (read from the precomputed lookup table).
+        """
+        options = [
+            {
+                "path_id": topology.switch_ids[k],
+                "target_node_id": topology.node_ids[topology.switch_target[k]],
+                "target_node_name": topology.node_names[topology.switch_target[k]],
+                "path_distance_km": (
+                    None if np.isnan(topology.switch_distance_km[k])
+                    else float(topology.switch_distance_km[k])
+                ),
+                "switching_time_min": (
+                    None if np.isnan(topology.switch_time_min[k])
+                    else int(topology.switch_time_min[k])
+                ),
+                "backup_capacity_mva": (
+                    None if np.isnan(topology.switch_backup_capacity_mva[k])
+                    else float(topology.switch_backup_capacity_mva[k])
+                ),
+                "automatic_switching": bool(topology.switch_automatic[k]),
+                "derived": False
+            }
+            for k in manual
+        ]
+        
+        finder = RestorationPathFinder(self.db)
+        table = finder.get_lookup_table(topology)
+        for option in finder.describe_options(topology, table, source):
+            options.append({
+                "path_id": None,
+                "target_node_id": option["backup_node_id"],
+                "target_node_name": topology.node_names[topology.node_index[option["backup_node_id"]]],
+                "path_distance_km": option["path_distance_km"],
+                "switching_time_min": None,
+                "backup_capacity_mva": option["backup_capacity_mva"],
+                "automatic_switching": False,
+                "derived": True,
+                "tie_node_id": option["tie_node_id"],
+                "sufficient_capacity": option["sufficient_capacity"]
+            })
+        return options
+    
+    def _multi_source_reach(
+        self,
+        topology: NetworkTopology,
+        sources: List[int],
+        max_depth: Optional[int] = None
+    ) -> Tuple[List[List[Tuple[int, int]]], int]:
+        """
+        Level-synchronous BFS from all sources at once.
+        
+        Returns, per source, the downstream nodes it reaches with their BFS
+        distance, plus the number of distinct nodes visited. A node is expanded
+        once per level at which new sources arrive, not once per source.
+        """
+        offsets, targets, _ = topology.adjacency(directed=True)
+        offsets = offsets.tolist()
+        targets = targets.tolist()
+        
+        hits: List[List[Tuple[int, int]]] = [[] for _ in sources]
+        frontier: Dict[int, int] = {}
+        for bit, source in enumerate(sources):
+            frontier[source] = frontier.get(source, 0) | (1 << bit)
+        seen = dict(frontier)
+        
+        depth = 0
+        while frontier and (max_depth is None or depth < max_depth):
+            depth += 1
+            next_frontier: Dict[int, int] = {}
+            for v, bits in frontier.items():
+                for k in range(offsets[v], offsets[v + 1]):
+                    w = targets[k]
+                    new_bits = bits & ~seen.get(w, 0)
+                    if new_bits:
+                        seen[w] = seen.get(w, 0) | new_bits
+                        next_frontier[w] = next_frontier.get(w, 0) | new_bits
+            
+            for w, new_bits in next_frontier.items():
+                while new_bits:
+                    lowest = new_bits & -new_bits
+                    hits[lowest.bit_length() - 1].append((w, depth))
+                    new_bits ^= lowest
+            frontier = next_frontier
+        
+        return hits, len(seen)
     
     def get_downstream_customers(
         self,
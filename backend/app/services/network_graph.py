@@ -0,0 +1,308 @@
+"""
+Network Graph Service
+
+Level-of-detail views of the feeder tree for graph rendering.
+
+Instead of shipping every node and edge, the tree below a root is shown as
+a small set of clusters:
+
+- series chains (runs of nodes with a single downstream neighbour) are
+  collapsed into one segment super-node
+- laterals whose share of the aggregated risk is below the zoom threshold
+  stay collapsed into one subtree super-node
+
+Clusters are expanded greedily, highest risk first, until the element
+budget is spent. Every cluster carries the risk rolled up over its members,
+taken from the incrementally maintained risk rollups, and results are
+cached per topology version and risk revision.
+"""
+
+from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+from uuid import UUID
+import heapq
+import threading
+
+import numpy as np
+
+from app.services.network_topology import NetworkTopology, get_topology, topology_store
+from app.services.risk_rollup import RiskRollupIndex, risk_rollups
+
+
+MAX_ZOOM = 20
+MAX_CACHED_GRAPHS = 256
+
+_graph_lock = threading.Lock()
+_tree_cache: Dict[str, Dict[str, np.ndarray]] = {}
+_weight_cache: Dict[Tuple[str, str], Tuple[int, Dict[str, np.ndarray]]] = {}
+_graph_cache: "OrderedDict[Tuple, Dict[str, Any]]" = OrderedDict()
+
+
+def _on_topology_change(event: Dict[str, Any]) -> None:
+    """Drop cached graphs as soon as the topology changes."""
+    with _graph_lock:
+        _tree_cache.clear()
+        _weight_cache.clear()
+        _graph_cache.clear()
+
+
+topology_store.subscribe(_on_topology_change)
+
+
+class NetworkGraphSimplifier:
+    """Service for compact, risk-weighted views of the network graph."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def simplify(
+        self,
+        root_node_id: Optional[UUID] = None,
+        zoom: int = 4,
+        max_elements: int = 2000,
+        scenario_type: str = "BASE_CASE"
+    ) -> Dict[str, Any]:
+        """
+        Simplified graph of the feeder tree below a node.
+        
+        Without a root, every supply point starts as a cluster. A cluster is
+        expanded when its share of the total expected annual cost (or of the
+        node count when no risk is recorded) is at least ``2^-zoom`` and the
+        nodes and edges it adds fit in ``max_elements``.
+        
+        Cluster kinds:
+        - node: a single network node
+        - segment: a series chain, listed from ``node_id`` to ``last_node_id``
+        - subtree: a collapsed lateral; request it as ``root_node_id`` to
+          drill down
+        """
+        if not 0 <= zoom <= MAX_ZOOM:
+            raise ValueError(f"Zoom must be between 0 and {MAX_ZOOM}")
+        
+        topology = get_topology(self.db)
+        root = None
+        if root_node_id is not None:
+            if root_node_id not in topology.node_index:
+                raise ValueError(f"Node {root_node_id} not found")
+            root = topology.node_index[root_node_id]
+        
+        index = risk_rollups.get(self.db, scenario_type)
+        key = (topology.version, scenario_type, index.revision, root, zoom, max_elements)
+        with _graph_lock:
+            graph = _graph_cache.get(key)
+            if graph is not None:
+                _graph_cache.move_to_end(key)
+                return graph
+        
+        tree = self._get_tree(topology)
+        weights = self._get_weights(topology, index, tree)
+        graph = self._build_graph(topology, tree, weights, root, zoom, max_elements)
+        graph["scenario_type"] = scenario_type
+        
+        with _graph_lock:
+            _graph_cache[key] = graph
+            while len(_graph_cache) > MAX_CACHED_GRAPHS:
+                _graph_cache.popitem(last=False)
+        return graph
+    
+    def _get_tree(self, topology: NetworkTopology) -> Dict[str, np.ndarray]:
+        """
+        Preorder layout of the rollup feeder tree.
+        
+        In preorder every subtree and every series chain is a contiguous
+        range, so cluster membership and cluster totals are slices.
+        """
+        with _graph_lock:
+            tree = _tree_cache.get(topology.version)
+        if tree is not None:
+            return tree
+        
+        # Same traversal the rollups were accumulated over
+        order, parent, _ = topology.downstream_order()
+        tin, tout = topology.preorder_intervals(order, parent)
+        reached = np.flatnonzero(tin >= 0)
+        preorder = reached[np.argsort(tin[reached])]
+        
+        # Children grouped by parent in preorder
+        children = preorder[parent[preorder] >= 0]
+        children = children[np.argsort(parent[children], kind="stable")]
+        child_count = np.bincount(parent[children], minlength=topology.num_nodes)
+        child_offsets = np.zeros(topology.num_nodes + 1, dtype=np.int64)
+        np.cumsum(child_count, out=child_offsets[1:])
+        
+        # Last node of the series chain starting at each node
+        chain_end = np.arange(topology.num_nodes)
+        for level in reversed(topology.tree_levels(order, parent)[1:]):
+            single = child_count[parent[level]] == 1
+            chain_end[parent[level][single]] = chain_end[level[single]]
+        
+        tree = {
+            "tin": tin,
+            "tout": tout,
+            "preorder": preorder,
+            "children": children,
+            "child_offsets": child_offsets,
+            "chain_end": chain_end,
+            "roots": preorder[parent[preorder] < 0]
+        }
+        with _graph_lock:
+            _tree_cache[topology.version] = tree
+        return tree
+    
+    def _get_weights(
+        self,
+        topology: NetworkTopology,
+        index: RiskRollupIndex,
+        tree: Dict[str, np.ndarray]
+    ) -> Dict[str, np.ndarray]:
+        """Preorder prefix sums of per-node risk and customers."""
+        key = (topology.version, index.scenario_type)
+        with _graph_lock:
+            cached = _weight_cache.get(key)
+        if cached is not None and cached[0] == index.revision:
+            return cached[1]
+        
+        parent = index.parent
+        totals = index.node_totals[:, :2]
+        own = totals.copy()
+        below = np.flatnonzero(parent >= 0)
+        np.subtract.at(own, parent[below], totals[below])
+        
+        preorder = tree["preorder"]
+        weights = {}
+        for name, values in (
+            ("expected_annual_cost", own[:, 0]),
+            ("pof_weighted_customers", own[:, 1]),
+            ("customers", topology.node_customers.astype(np.float64))
+        ):
+            prefix = np.zeros(len(preorder) + 1)
+            np.cumsum(values[preorder], out=prefix[1:])
+            weights[name] = prefix
+        
+        with _graph_lock:
+            _weight_cache[key] = (index.revision, weights)
+        return weights
+    
+    def _build_graph(
+        self,
+        topology: NetworkTopology,
+        tree: Dict[str, np.ndarray],
+        weights: Dict[str, np.ndarray],
+        root: Optional[int],
+        zoom: int,
+        max_elements: int
+    ) -> Dict[str, Any]:
+        tin, tout = tree["tin"], tree["tout"]
+        chain_end = tree["chain_end"]
+        children, child_offsets = tree["children"], tree["child_offsets"]
+        cost = weights["expected_annual_cost"]
+        
+        if root is not None:
+            if tin[root] < 0:
+                raise ValueError(f"Node {topology.node_ids[root]} is not fed from any source")
+            starts = [root]
+        else:
+            starts = tree["roots"].tolist()
+        
+        def span(start: int, end: int) -> float:
+            return float(cost[end] - cost[start])
+        
+        total_cost = sum(span(tin[v], tout[v]) for v in starts)
+        total_size = sum(int(tout[v] - tin[v]) for v in starts)
+        threshold = 2.0 ** -zoom
+        
+        def share(v: int) -> float:
+            if total_cost > 0:
+                return span(tin[v], tout[v]) / total_cost
+            return (tout[v] - tin[v]) / max(total_size, 1)
+        
+        # Highest-risk starting clusters first when they exceed the budget
+        starts.sort(key=lambda v: -share(v))
+        truncated = len(starts) > max_elements
+        starts = starts[:max_elements]
+        
+        # Visible clusters by head node: [kind, last node]
+        clusters: Dict[int, List] = {v: ["subtree", v] for v in starts}
+        feeder_edges: List[Tuple[int, int]] = []
+        used = len(starts)
+        heap = [(-share(v), int(tin[v]), v) for v in starts]
+        heapq.heapify(heap)
+        while heap:
+            priority, _, v = heapq.heappop(heap)
+            if -priority < threshold:
+                break
+            end = int(chain_end[v])
+            below = children[child_offsets[end]:child_offsets[end + 1]].tolist()
+            if used + 2 * len(below) > max_elements:
+                truncated = True
+                continue
+            
+            used += 2 * len(below)
+            clusters[v] = ["node" if end == v else "segment", end]
+            for c in below:
+                clusters[c] = ["subtree", c]
+                feeder_edges.append((v, c))
+                heapq.heappush(heap, (-share(c), int(tin[c]), c))
+        
+        heads = sorted(clusters, key=lambda v: tin[v])
+        position = {v: j for j, v in enumerate(heads)}
+        nodes = []
+        label = np.full(topology.num_nodes, -1, dtype=np.int64)
+        preorder = tree["preorder"]
+        for j, v in enumerate(heads):
+            kind, end = clusters[v]
+            start = int(tin[v])
+            stop = int(tout[v]) if kind == "subtree" else int(tin[end]) + 1
+            if stop - start == 1:
+                kind = "node"
+            label[preorder[start:stop]] = j
+            nodes.append({
+                "id": j,
+                **topology.node_summary(v),
+                "kind": kind,
+                "last_node_id": topology.node_ids[end] if kind == "segment" else None,
+                "member_count": stop - start,
+                "customers": int(round(weights["customers"][stop] - weights["customers"][start])),
+                "expected_annual_cost": span(start, stop),
+                "pof_weighted_customers": float(
+                    weights["pof_weighted_customers"][stop] - weights["pof_weighted_customers"][start]
+                )
+            })
+        
+        edges = [
+            {"source": position[u], "target": position[c], "kind": "feeder", "count": 1}
+            for u, c in feeder_edges
+        ]
+        
+        # Meshed and tie connections between visible clusters, most connections first
+        active = np.flatnonzero(topology.edge_active)
+        a = label[topology.edge_from[active]]
+        b = label[topology.edge_to[active]]
+        cross = (a >= 0) & (b >= 0) & (a != b)
+        pairs = np.stack([np.minimum(a[cross], b[cross]), np.maximum(a[cross], b[cross])], axis=1)
+        tree_pairs = {
+            (min(position[u], position[c]), max(position[u], position[c]))
+            for u, c in feeder_edges
+        }
+        tie_edges = []
+        if len(pairs):
+            unique, counts = np.unique(pairs, axis=0, return_counts=True)
+            for j in np.argsort(-counts, kind="stable").tolist():
+                pair = (int(unique[j, 0]), int(unique[j, 1]))
+                if pair not in tree_pairs:
+                    tie_edges.append({"source": pair[0], "target": pair[1], "kind": "tie", "count": int(counts[j])})
+        remaining = max(max_elements - used, 0)
+        truncated = truncated or len(tie_edges) > remaining
+        edges.extend(tie_edges[:remaining])
+        
+        return {
+            "root_node_id": topology.node_ids[root] if root is not None else None,
+            "zoom": zoom,
+            "max_elements": max_elements,
+            "total_nodes": total_size,
+            "expected_annual_cost": total_cost,
+            "truncated": truncated,
+            "nodes": nodes,
+            "edges": edges
+        }
@@ -0,0 +1,417 @@
+"""
+Network Scenario Service
+
+Planning what-ifs (a new tie switch, a reconductored feeder, a retired
+substation) as copy-on-write deltas over the as-built network.
+
+A scenario stores only the nodes and edges it adds and the ids it removes,
+together with the topology version it was drawn up against. Analysis forks
+the current topology snapshot, applies the delta to the fork and compares
+supply and normal loading with the base. Neither the database nor the shared
+snapshot is modified and the network is never copied, so a scenario is
+analyzed in roughly the time of one vectorized traversal of the network.
+"""
+
+from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Optional, Tuple
+from uuid import UUID, uuid4
+import threading
+
+import numpy as np
+from scipy.sparse import csr_matrix
+from scipy.sparse.csgraph import breadth_first_order
+
+from app import models, schemas
+from app.services.network_topology import NetworkTopology, get_topology, topology_store
+from app.services.restoration_paths import NORMALLY_OPEN_STATE
+from app.services.topology_overlay import fork_topology, own_arrays
+
+
+DEFAULT_POWER_FACTOR = 0.95
+
+_base_lock = threading.Lock()
+_base_cache: Dict[Tuple[str, float], Dict[str, np.ndarray]] = {}
+
+
+def _on_topology_change(event: Dict[str, Any]) -> None:
+    """Drop the cached base state as soon as the topology changes."""
+    with _base_lock:
+        _base_cache.clear()
+
+
+topology_store.subscribe(_on_topology_change)
+
+
+def _uuid(value: Optional[str]) -> Optional[UUID]:
+    return UUID(value) if value else None
+
+
+def _supply_state(
+    topology: NetworkTopology,
+    roots: np.ndarray,
+    is_open: np.ndarray,
+    power_factor: float
+) -> Dict[str, np.ndarray]:
+    """
+    Feeder tree grown from ``roots`` without entering open points.
+    
+    One breadth-first search from a virtual root joined to every supply
+    point. In breadth-first order the parents of consecutive nodes never
+    move backwards, so each depth level is a slice found by binary search
+    and feeder heads and normal-state flows (subtree loads, deepest level
+    first) take one vectorized step per level.
+    """
+    n = topology.num_nodes
+    kept = np.flatnonzero(topology.edge_active)
+    kept = kept[topology.node_active[topology.edge_from[kept]] & ~is_open[topology.edge_to[kept]]]
+    src = np.concatenate([topology.edge_from[kept], np.full(len(roots), n)])
+    dst = np.concatenate([topology.edge_to[kept], roots])
+    graph = csr_matrix((np.ones(len(src), dtype=np.int8), (src, dst)), shape=(n + 1, n + 1))
+    order, pred = breadth_first_order(graph, n, directed=True, return_predecessors=True)
+    order = order[1:]
+    
+    reached = np.zeros(n, dtype=bool)
+    reached[order] = True
+    position = np.full(n + 1, -1, dtype=np.int64)
+    position[order] = np.arange(len(order))
+    parent_position = position[pred[order]]
+    
+    # Level k + 1 holds the nodes whose parents sit in level k
+    bounds = [0, len(roots)]
+    while bounds[-1] < len(order):
+        bounds.append(int(np.searchsorted(parent_position, bounds[-1], side="left")))
+    levels = [order[a:b] for a, b in zip(bounds[:-1], bounds[1:])]
+    
+    head = np.full(n, -1, dtype=np.int64)
+    head[levels[0]] = levels[0]
+    for level in levels[1:]:
+        head[level] = head[pred[level]]
+    
+    # Edge each node was reached through
+    tree = kept[pred[topology.edge_to[kept]] == topology.edge_from[kept]]
+    to, first = np.unique(topology.edge_to[tree], return_index=True)
+    parent_edge = np.full(n, -1, dtype=np.int64)
+    parent_edge[to] = tree[first]
+    
+    load = np.where(reached, topology.node_load_mw[:n], 0.0)
+    for level in reversed(levels[1:]):
+        np.add.at(load, pred[level], load[level])
+    
+    flow = np.zeros(topology.num_edges)
+    fed = order[len(roots):]
+    flow[parent_edge[fed]] = load[fed] / power_factor
+    
+    return {
+        "reached": reached,
+        "head": head,
+        "flow": flow
+    }
+
+
+class NetworkScenarioService:
+    """Service for copy-on-write planning scenarios over the network topology."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def create_scenario(self, request: schemas.NetworkScenarioCreate) -> models.NetworkScenario:
+        """
+        Validate a delta against the current topology and store it.
+        
+        Added nodes and edges without an id get one, so later scenario
+        edges and analyses can refer to them.
+        """
+        topology = get_topology(self.db)
+        
+        added_nodes = []
+        added_node_ids = set()
+        for node in request.added_nodes:
+            node_id = node.id or uuid4()
+            if node_id in topology.node_index or node_id in added_node_ids:
+                raise ValueError(f"Node {node_id} already exists")
+            added_node_ids.add(node_id)
+            added_nodes.append({**node.model_dump(mode="json"), "id": str(node_id)})
+        
+        removed_node_ids = set(request.removed_node_ids)
+        for node_id in removed_node_ids:
+            if node_id not in topology.node_index:
+                raise ValueError(f"Node {node_id} not found")
+        
+        added_edges = []
+        added_edge_ids = set()
+        for edge in request.added_edges:
+            edge_id = edge.id or uuid4()
+            if edge_id in topology.edge_index or edge_id in added_edge_ids:
+                raise ValueError(f"Edge {edge_id} already exists")
+            for node_id in (edge.from_node_id, edge.to_node_id):
+                if node_id in removed_node_ids or (
+                    node_id not in topology.node_index and node_id not in added_node_ids
+                ):
+                    raise ValueError(f"Edge {edge_id} references missing node {node_id}")
+            added_edge_ids.add(edge_id)
+            added_edges.append({**edge.model_dump(mode="json"), "id": str(edge_id)})
+        
+        removed_edge_ids = set(request.removed_edge_ids)
+        for edge_id in removed_edge_ids:
+            if edge_id not in topology.edge_index:
+                raise ValueError(f"Edge {edge_id} not found")
+        
+        scenario = models.NetworkScenario(
+            name=request.name,
+            description=request.description,
+            base_version=topology.version,
+            changes={
+                "added_nodes": added_nodes,
+                "removed_node_ids": [str(i) for i in removed_node_ids],
+                "added_edges": added_edges,
+                "removed_edge_ids": [str(i) for i in removed_edge_ids]
+            }
+        )
+        self.db.add(scenario)
+        self.db.commit()
+        self.db.refresh(scenario)
+        return scenario
+    
+    def analyze_scenario(
+        self,
+        scenario_id: UUID,
+        limit: int = 100,
+        power_factor: float = DEFAULT_POWER_FACTOR
+    ) -> Dict[str, Any]:
+        """
+        Customer and loading impact of a scenario against the current network.
+        
+        The delta is applied to a fork of the current topology. When the
+        network changed after the scenario was created, changes that no
+        longer apply (ids already present or no longer present) are skipped
+        and listed under ``unresolved``.
+        
+        Impact compares supply from the base supply points (plus added
+        substations) through closed switches only:
+        - customers and load served, and the nodes losing or gaining supply
+        - customers moved between feeders
+        - edges loaded beyond their thermal rating in normal operation
+        """
+        scenario = self.db.query(models.NetworkScenario).filter(
+            models.NetworkScenario.id == scenario_id
+        ).first()
+        if not scenario:
+            raise ValueError(f"Network scenario {scenario_id} not found")
+        
+        topology = get_topology(self.db)
+        base = self._get_base_state(topology, power_factor)
+        fork, applied, unresolved = self._apply_changes(
+            topology, scenario.changes, f"{topology.version}+{scenario.id}"
+        )
+        
+        n_base, n = topology.num_nodes, fork.num_nodes
+        added = range(n_base, n)
+        is_open = np.concatenate([
+            base["is_open"],
+            np.array([fork.node_states[i] == NORMALLY_OPEN_STATE for i in added], dtype=bool)
+        ]) & fork.node_active
+        new_substations = np.array(
+            [i for i in added if fork.node_types[i] == "SUBSTATION"], dtype=np.int64
+        )
+        roots = np.concatenate([base["roots"], new_substations])
+        roots = roots[fork.node_active[roots] & ~is_open[roots]]
+        state = _supply_state(fork, roots, is_open, power_factor)
+        
+        # Base customers at base nodes, so removed nodes count as losing supply
+        base_customers = topology.node_customers
+        served_before = base["reached"]
+        served_after = state["reached"][:n_base]
+        lost = np.flatnonzero(served_before & ~served_after)
+        gained = np.flatnonzero(state["reached"] & ~np.pad(served_before, (0, n - n_base)))
+        kept = np.flatnonzero(served_before & served_after)
+        transferred = kept[base["head"][kept] != state["head"][kept]]
+        
+        def customers_served(t: NetworkTopology, reached: np.ndarray) -> Dict[str, Any]:
+            return {
+                "customers_served": int(t.node_customers[reached].sum()),
+                "load_served_mw": float(t.node_load_mw[reached].sum())
+            }
+        
+        before = customers_served(topology, served_before)
+        after = customers_served(fork, state["reached"])
+        
+        def node_list(nodes: np.ndarray, customers: np.ndarray) -> List[Dict[str, Any]]:
+            top = nodes[np.argsort(-customers[nodes], kind="stable")[:limit]]
+            return [
+                {**fork.node_summary(i), "customers": int(customers[i]), "removed": not fork.node_active[i]}
+                for i in top.tolist()
+            ]
+        
+        # Feeder customer totals by feeder head
+        def feeder_customers(t: NetworkTopology, reached: np.ndarray, head: np.ndarray) -> np.ndarray:
+            served = np.flatnonzero(reached)
+            return np.bincount(
+                head[served], weights=t.node_customers[served], minlength=n
+            ).astype(np.int64)
+        
+        feeders_before = feeder_customers(topology, served_before, base["head"])
+        feeders_after = feeder_customers(fork, state["reached"], state["head"])
+        changed = np.flatnonzero(feeders_before != feeders_after)
+        changed = changed[np.argsort(-np.abs(feeders_after[changed] - feeders_before[changed]), kind="stable")]
+        feeders = [
+            {
+                **fork.node_summary(i),
+                "base_customers": int(feeders_before[i]),
+                "scenario_customers": int(feeders_after[i]),
+                "customer_change": int(feeders_after[i] - feeders_before[i])
+            }
+            for i in changed[:limit].tolist()
+        ]
+        
+        # Normal-state overloads
+        rating = np.nan_to_num(fork.edge_thermal_rating_mva, nan=np.inf)
+        rating[rating <= 0] = np.inf
+        loading = state["flow"] / rating
+        base_loading = np.zeros(fork.num_edges)
+        base_loading[:topology.num_edges] = base["flow"] / rating[:topology.num_edges]
+        overloaded = np.flatnonzero(loading > 1.0)
+        relieved = np.flatnonzero(base_loading > 1.0)
+        relieved = relieved[loading[relieved] <= 1.0]
+        overloaded = overloaded[np.argsort(-loading[overloaded], kind="stable")]
+        overloaded_edges = [
+            {
+                "edge_id": fork.edge_ids[k],
+                "from_node_id": fork.node_ids[fork.edge_from[k]],
+                "to_node_id": fork.node_ids[fork.edge_to[k]],
+                "edge_type": fork.edge_types[k],
+                "flow_mva": float(state["flow"][k]),
+                "thermal_rating_mva": float(rating[k]),
+                "loading_pct": float(loading[k] * 100),
+                "base_loading_pct": float(base_loading[k] * 100) if k < topology.num_edges else None
+            }
+            for k in overloaded[:limit].tolist()
+        ]
+        
+        return {
+            "scenario_id": scenario.id,
+            "name": scenario.name,
+            "base_version": scenario.base_version,
+            "current_version": topology.version,
+            "base_changed": scenario.base_version != topology.version,
+            "applied": applied,
+            "unresolved": unresolved,
+            "base": {**before, "overloaded_edges": int((base["flow"] > rating[:topology.num_edges]).sum())},
+            "scenario": {**after, "overloaded_edges": len(overloaded)},
+            "customers_served_change": after["customers_served"] - before["customers_served"],
+            "load_served_change_mw": after["load_served_mw"] - before["load_served_mw"],
+            "customers_losing_supply": int(base_customers[lost].sum()),
+            "customers_gaining_supply": int(fork.node_customers[gained].sum()),
+            "customers_transferred": int(base_customers[transferred].sum()),
+            "overloads_relieved": len(relieved),
+            "nodes_losing_supply": node_list(lost, np.pad(base_customers, (0, n - n_base))),
+            "nodes_gaining_supply": node_list(gained, fork.node_customers),
+            "feeder_changes": feeders,
+            "overloaded_edges": overloaded_edges
+        }
+    
+    def _get_base_state(self, topology: NetworkTopology, power_factor: float) -> Dict[str, np.ndarray]:
+        """Supply state of the unmodified network, cached per topology version."""
+        key = (topology.version, power_factor)
+        with _base_lock:
+            state = _base_cache.get(key)
+        if state is not None:
+            return state
+        
+        is_open = np.array(
+            [s == NORMALLY_OPEN_STATE for s in topology.node_states], dtype=bool
+        ) & topology.node_active
+        roots = topology.source_nodes()
+        roots = roots[~is_open[roots]]
+        state = _supply_state(topology, roots, is_open, power_factor)
+        state.update(is_open=is_open, roots=roots)
+        
+        with _base_lock:
+            for stale in [k for k in _base_cache if k[0] != topology.version]:
+                del _base_cache[stale]
+            _base_cache[key] = state
+        return state
+    
+    def _apply_changes(
+        self,
+        topology: NetworkTopology,
+        changes: Dict[str, Any],
+        version: str
+    ) -> Tuple[NetworkTopology, Dict[str, int], Dict[str, List[str]]]:
+        """
+        Fork of ``topology`` with the scenario delta applied.
+        
+        Removed nodes take their remaining edges with them. Only the arrays
+        that are tombstoned in place are copied; everything else is shared
+        with the base.
+        """
+        fork = fork_topology(topology, version)
+        unresolved: Dict[str, List[str]] = {
+            "added_nodes": [], "removed_node_ids": [], "added_edges": [], "removed_edge_ids": []
+        }
+        
+        for node in changes.get("added_nodes", []):
+            node_id = UUID(node["id"])
+            if node_id in fork.node_index:
+                unresolved["added_nodes"].append(node["id"])
+                continue
+            fork.add_node(
+                node_id, _uuid(node.get("asset_id")), node["node_type"], node["name"],
+                node.get("voltage_level"), node.get("operational_state"),
+                node.get("latitude"), node.get("longitude")
+            )
+        
+        removed_nodes = []
+        for node_id in changes.get("removed_node_ids", []):
+            i = fork.node_index.get(UUID(node_id))
+            if i is None:
+                unresolved["removed_node_ids"].append(node_id)
+            else:
+                removed_nodes.append(i)
+        
+        edges_added = 0
+        for edge in changes.get("added_edges", []):
+            edge_id = UUID(edge["id"])
+            from_id, to_id = UUID(edge["from_node_id"]), UUID(edge["to_node_id"])
+            if (
+                edge_id in fork.edge_index
+                or from_id not in fork.node_index
+                or to_id not in fork.node_index
+            ):
+                unresolved["added_edges"].append(edge["id"])
+                continue
+            fork.add_edge(
+                edge_id, from_id, to_id, _uuid(edge.get("asset_id")), edge["edge_type"],
+                edge.get("length_km"), edge.get("impedance_r"), edge.get("impedance_x"),
+                edge.get("thermal_rating_mva"), edge.get("emergency_rating_mva")
+            )
+            edges_added += 1
+        
+        removed_edges = set()
+        for edge_id in changes.get("removed_edge_ids", []):
+            k = fork.edge_index.get(UUID(edge_id))
+            if k is None:
+                unresolved["removed_edge_ids"].append(edge_id)
+            else:
+                removed_edges.add(k)
+        if removed_nodes:
+            gone = np.zeros(fork.num_nodes, dtype=bool)
+            gone[removed_nodes] = True
+            incident = fork.edge_active & (gone[fork.edge_from] | gone[fork.edge_to])
+            removed_edges.update(np.flatnonzero(incident).tolist())
+        
+        if removed_edges:
+            own_arrays(fork, ["edge_active"])
+            for k in removed_edges:
+                fork.remove_edge(fork.edge_ids[k])
+        if removed_nodes:
+            own_arrays(fork, ["node_active", "node_customers", "node_load_mw"])
+            for i in removed_nodes:
+                fork.remove_node(fork.node_ids[i])
+        
+        applied = {
+            "nodes_added": fork.num_nodes - topology.num_nodes,
+            "nodes_removed": len(removed_nodes),
+            "edges_added": edges_added,
+            "edges_removed": len(removed_edges)
+        }
+        return fork, applied, unresolved
@@ -0,0 +1,925 @@
+"""
+Network Topology Snapshot
+
+Loads the network graph (nodes, edges, switching paths and customer
+connections) in a handful of bulk queries and holds it as index-based
+arrays so graph algorithms can run in memory instead of issuing one
+query per node.
+
+Writes made through the API patch the in-memory topology in place
+(see TopologyStore) instead of forcing a full reload, and publish change
+events that dependent caches subscribe to. With ``TOPOLOGY_SNAPSHOT_DIR``
+set, snapshots are shared between worker processes through memory-mapped
+files (see topology_snapshot).
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import List, Dict, Any, Optional, Tuple, Callable
+from uuid import UUID
+from datetime import datetime
+from collections import deque
+import threading
+
+import numpy as np
+
+from app import models
+from app.config import settings
+
+
+def _to_float_array(values: List[Any]) -> np.ndarray:
+    """Convert a list of nullable numerics to a float array (NaN for missing)."""
+    return np.array(
+        [float(v) if v is not None else np.nan for v in values],
+        dtype=np.float64
+    )
+
+
+def parse_voltage_kv(voltage_level: Optional[str]) -> Optional[float]:
+    """Parse a voltage level label such as '138kV' or '13.8 kV' into kV."""
+    if not voltage_level:
+        return None
+    label = voltage_level.strip().upper().replace(" ", "")
+    try:
+        if label.endswith("KV"):
+            return float(label[:-2])
+        if label.endswith("V"):
+            return float(label[:-1]) / 1000.0
+        return float(label)
+    except ValueError:
+        return None
+
+
+class NetworkTopology:
+    """
+    In-memory snapshot of the network graph.
+    
+    Nodes, edges and switching paths are addressed by dense integer indices;
+    ``node_index`` maps database IDs to those indices. Edge direction follows
+    the database convention (``from_node_id`` is upstream of ``to_node_id``).
+    
+    Indices are never reused: removed nodes and edges are tombstoned via
+    ``node_active``/``edge_active`` until the next full reload.
+    """
+    
+    def __init__(
+        self,
+        version: str,
+        nodes: List[Tuple],
+        edges: List[Tuple],
+        switching_paths: List[Tuple],
+        customer_rows: List[Tuple]
+    ):
+        self.version = version
+        # True when the arrays are read-only views of a shared snapshot
+        self.shared = False
+        
+        # Nodes
+        self.node_ids: List[UUID] = [n[0] for n in nodes]
+        self.node_index: Dict[UUID, int] = {
+            node_id: i for i, node_id in enumerate(self.node_ids)
+        }
+        self.node_asset_ids: List[Optional[UUID]] = [n[1] for n in nodes]
+        self.node_types: List[str] = [n[2] for n in nodes]
+        self.node_names: List[str] = [n[3] for n in nodes]
+        self.node_voltage_levels: List[Optional[str]] = [n[4] for n in nodes]
+        self.node_voltage_kv = _to_float_array(
+            [parse_voltage_kv(v) for v in self.node_voltage_levels]
+        )
+        self.node_states: List[Optional[str]] = [n[5] for n in nodes]
+        self.node_latitude = _to_float_array([n[6] for n in nodes])
+        self.node_longitude = _to_float_array([n[7] for n in nodes])
+        
+        self.node_active = np.ones(len(nodes), dtype=bool)
+        
+        # Customer impact per node (aggregated over the node's asset)
+        self._customers_by_asset: Dict[UUID, int] = {}
+        self._load_by_asset: Dict[UUID, float] = {}
+        for asset_id, customers, peak_load in customer_rows:
+            self._customers_by_asset[asset_id] = self._customers_by_asset.get(asset_id, 0) + (customers or 0)
+            self._load_by_asset[asset_id] = self._load_by_asset.get(asset_id, 0.0) + float(peak_load or 0)
+        
+        self.node_customers = np.array(
+            [self._customers_by_asset.get(a, 0) if a else 0 for a in self.node_asset_ids],
+            dtype=np.int64
+        )
+        self.node_load_mw = np.array(
+            [self._load_by_asset.get(a, 0.0) if a else 0.0 for a in self.node_asset_ids],
+            dtype=np.float64
+        )
+        
+        # Edges (skip edges that reference unknown nodes)
+        edges = [
+            e for e in edges
+            if e[1] in self.node_index and e[2] in self.node_index
+        ]
+        self.edge_ids: List[UUID] = [e[0] for e in edges]
+        self.edge_index: Dict[UUID, int] = {
+            edge_id: i for i, edge_id in enumerate(self.edge_ids)
+        }
+        self.edge_from = np.array([self.node_index[e[1]] for e in edges], dtype=np.int64)
+        self.edge_to = np.array([self.node_index[e[2]] for e in edges], dtype=np.int64)
+        self.edge_asset_ids: List[Optional[UUID]] = [e[3] for e in edges]
+        self.edge_types: List[str] = [e[4] for e in edges]
+        self.edge_length_km = _to_float_array([e[5] for e in edges])
+        self.edge_impedance_r = _to_float_array([e[6] for e in edges])
+        self.edge_impedance_x = _to_float_array([e[7] for e in edges])
+        self.edge_thermal_rating_mva = _to_float_array([e[8] for e in edges])
+        self.edge_emergency_rating_mva = _to_float_array([e[9] for e in edges])
+        self.edge_active = np.ones(len(edges), dtype=bool)
+        
+        # Switching paths (alternate feeds)
+        switching_paths = [
+            s for s in switching_paths
+            if s[1] in self.node_index and s[2] in self.node_index
+        ]
+        self.switch_ids: List[UUID] = [s[0] for s in switching_paths]
+        self.switch_source = np.array(
+            [self.node_index[s[1]] for s in switching_paths], dtype=np.int64
+        )
+        self.switch_target = np.array(
+            [self.node_index[s[2]] for s in switching_paths], dtype=np.int64
+        )
+        self.switch_time_min = _to_float_array([s[3] for s in switching_paths])
+        self.switch_backup_capacity_mva = _to_float_array([s[4] for s in switching_paths])
+        self.switch_automatic: List[bool] = [bool(s[5]) for s in switching_paths]
+        self.switch_distance_km = _to_float_array([s[6] for s in switching_paths])
+        
+        self._csr_cache: Dict[Tuple[bool, bool], Tuple[np.ndarray, np.ndarray, np.ndarray]] = {}
+        self._buffers: Dict[str, np.ndarray] = {}
+        
+        # Feeder tree maintained incrementally once built (see _ensure_tree)
+        self._tree_parent: Optional[List[int]] = None
+        self._tree_parent_edge: Optional[List[int]] = None
+        self._subtree_customers: Optional[List[int]] = None
+        self._subtree_load: Optional[List[float]] = None
+        self._in_offsets: Optional[np.ndarray] = None
+        self._in_refs: Optional[np.ndarray] = None
+        self._in_delta: Dict[int, List[int]] = {}
+    
+    @property
+    def num_nodes(self) -> int:
+        return len(self.node_ids)
+    
+    @property
+    def num_edges(self) -> int:
+        return len(self.edge_ids)
+    
+    def adjacency(
+        self,
+        directed: bool = True,
+        include_switching: bool = False
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Build (and memoize) a CSR adjacency structure.
+        
+        Returns ``(offsets, targets, edge_refs)``. Neighbours of node ``i`` are
+        ``targets[offsets[i]:offsets[i + 1]]``. ``edge_refs`` holds the edge
+        index for network edges and ``num_edges + k`` for switching path ``k``.
+        """
+        key = (directed, include_switching)
+        if key in self._csr_cache:
+            return self._csr_cache[key]
+        
+        active = np.flatnonzero(self.edge_active)
+        sources = [self.edge_from[active]]
+        targets = [self.edge_to[active]]
+        refs = [active]
+        
+        if include_switching and len(self.switch_ids):
+            sources.append(self.switch_source)
+            targets.append(self.switch_target)
+            refs.append(np.arange(len(self.switch_ids), dtype=np.int64) + self.num_edges)
+        
+        src = np.concatenate(sources)
+        dst = np.concatenate(targets)
+        ref = np.concatenate(refs)
+        
+        if not directed:
+            src, dst = np.concatenate([src, dst]), np.concatenate([dst, src])
+            ref = np.concatenate([ref, ref])
+        
+        order = np.argsort(src, kind="stable")
+        counts = np.bincount(src, minlength=self.num_nodes)
+        offsets = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(counts, out=offsets[1:])
+        
+        result = (offsets, dst[order], ref[order])
+        self._csr_cache[key] = result
+        return result
+    
+    def source_nodes(self) -> np.ndarray:
+        """
+        Indices of supply points: substations plus any node without an
+        upstream edge.
+        """
+        has_upstream = np.zeros(self.num_nodes, dtype=bool)
+        has_upstream[self.edge_to[self.edge_active]] = True
+        is_substation = np.array(
+            [t == "SUBSTATION" for t in self.node_types], dtype=bool
+        )
+        return np.flatnonzero((is_substation | ~has_upstream) & self.node_active)
+    
+    def downstream_order(
+        self,
+        roots: Optional[List[int]] = None,
+        blocked: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Breadth-first order of the feeder tree below ``roots``.
+        
+        Returns ``(order, parent, parent_edge)`` where ``parent[i]`` is the
+        upstream node through which ``i`` was first reached and
+        ``parent_edge[i]`` the edge used (-1 for roots and unreached nodes).
+        Nodes flagged in the boolean mask ``blocked`` are never entered.
+        """
+        offsets, targets, refs = self.adjacency(directed=True)
+        offsets_list = offsets.tolist()
+        targets_list = targets.tolist()
+        refs_list = refs.tolist()
+        
+        if roots is None:
+            roots = self.source_nodes().tolist()
+        
+        parent = [-1] * self.num_nodes
+        parent_edge = [-1] * self.num_nodes
+        seen = [False] * self.num_nodes if blocked is None else blocked.tolist()
+        order = []
+        queue = deque()
+        for r in roots:
+            if not seen[r]:
+                seen[r] = True
+                queue.append(r)
+        
+        while queue:
+            v = queue.popleft()
+            order.append(v)
+            for k in range(offsets_list[v], offsets_list[v + 1]):
+                w = targets_list[k]
+                if not seen[w]:
+                    seen[w] = True
+                    parent[w] = v
+                    parent_edge[w] = refs_list[k]
+                    queue.append(w)
+        
+        return (
+            np.array(order, dtype=np.int64),
+            np.array(parent, dtype=np.int64),
+            np.array(parent_edge, dtype=np.int64)
+        )
+    
+    def tree_levels(self, order: np.ndarray, parent: np.ndarray) -> List[np.ndarray]:
+        """
+        Group the nodes of a breadth-first ``order`` by depth.
+        
+        ``levels[0]`` holds the roots; walking the levels in reverse lets
+        subtree sums run as one vectorized step per level.
+        """
+        if not len(order):
+            return []
+        parent_list = parent.tolist()
+        depth = {}
+        for v in order.tolist():
+            p = parent_list[v]
+            depth[v] = 0 if p < 0 else depth[p] + 1
+        depths = np.fromiter((depth[v] for v in order.tolist()), dtype=np.int64, count=len(order))
+        by_depth = order[np.argsort(depths, kind="stable")]
+        return np.split(by_depth, np.cumsum(np.bincount(depths))[:-1])
+    
+    def preorder_intervals(
+        self,
+        order: np.ndarray,
+        parent: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Depth-first entry positions ``(tin, tout)`` for the feeder tree.
+        
+        Node ``u`` is an ancestor-or-self of ``v`` exactly when
+        ``tin[u] <= tin[v] < tout[u]``, so ancestry checks for many node
+        pairs vectorize. Nodes outside the tree get ``tin = tout = -1``.
+        """
+        n = self.num_nodes
+        tin = np.full(n, -1, dtype=np.int64)
+        size = np.zeros(n, dtype=np.int64)
+        size[order] = 1
+        levels = self.tree_levels(order, parent)
+        for level in reversed(levels[1:]):
+            np.add.at(size, parent[level], size[level])
+        
+        if levels:
+            tin[levels[0]] = np.cumsum(size[levels[0]]) - size[levels[0]]
+        for level in levels[1:]:
+            # Siblings take consecutive ranges after their parent
+            level = level[np.argsort(parent[level], kind="stable")]
+            up = parent[level]
+            ends = np.cumsum(size[level])
+            group_start = np.r_[True, up[1:] != up[:-1]]
+            before = np.maximum.accumulate(np.where(group_start, ends - size[level], 0))
+            tin[level] = tin[up] + 1 + ends - size[level] - before
+        
+        tout = np.where(tin >= 0, tin + size, -1)
+        return tin, tout
+    
+    def subtree_totals(
+        self,
+        roots: Optional[List[int]] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Customers and peak load (MW) fed through each node of the feeder tree,
+        including the node itself.
+        
+        For the default roots the incrementally maintained totals are returned.
+        """
+        if roots is None:
+            self._ensure_tree()
+            return (
+                np.array(self._subtree_customers, dtype=np.int64),
+                np.array(self._subtree_load, dtype=np.float64)
+            )
+        
+        order, parent, _ = self.downstream_order(roots)
+        return self._accumulate_subtrees(order, parent)
+    
+    def subtree_total(self, i: int) -> Tuple[int, float]:
+        """Customers and peak load fed through node ``i`` (O(1) lookup)."""
+        self._ensure_tree()
+        return int(self._subtree_customers[i]), float(self._subtree_load[i])
+    
+    def _accumulate_subtrees(
+        self,
+        order: np.ndarray,
+        parent: np.ndarray
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        parent_list = parent.tolist()
+        customers_list = self.node_customers.tolist()
+        load_list = self.node_load_mw.tolist()
+        for v in reversed(order.tolist()):
+            p = parent_list[v]
+            if p >= 0:
+                customers_list[p] += customers_list[v]
+                load_list[p] += load_list[v]
+        
+        return (
+            np.array(customers_list, dtype=np.int64),
+            np.array(load_list, dtype=np.float64)
+        )
+    
+    def _ensure_tree(self) -> None:
+        """Build the feeder tree and its subtree aggregates on first use."""
+        if self._tree_parent is not None:
+            return
+        order, parent, parent_edge = self.downstream_order()
+        customers, load = self._accumulate_subtrees(order, parent)
+        self._tree_parent = parent.tolist()
+        self._tree_parent_edge = parent_edge.tolist()
+        self._subtree_customers = customers.tolist()
+        self._subtree_load = load.tolist()
+        
+        # Incoming-edge index used to re-feed nodes when a tree edge is removed
+        counts = np.bincount(self.edge_to, minlength=self.num_nodes)
+        self._in_offsets = np.zeros(self.num_nodes + 1, dtype=np.int64)
+        np.cumsum(counts, out=self._in_offsets[1:])
+        self._in_refs = np.argsort(self.edge_to, kind="stable")
+        self._in_delta = {}
+    
+    def _incoming_edges(self, v: int) -> List[int]:
+        """Active upstream edges of node ``v``: indexed edges plus later inserts."""
+        edges = []
+        if v + 1 < len(self._in_offsets):
+            edges = self._in_refs[self._in_offsets[v]:self._in_offsets[v + 1]].tolist()
+        edges += self._in_delta.get(v, [])
+        return [k for k in edges if self.edge_active[k]]
+    
+    # ------------------------------------------------------------------
+    # Incremental patches
+    # ------------------------------------------------------------------
+    
+    def _append(self, attr: str, value: Any) -> None:
+        """Append to a numpy attribute with amortized O(1) growth."""
+        current = getattr(self, attr)
+        n = len(current)
+        buffer = self._buffers.get(attr)
+        if buffer is None or len(buffer) <= n or current.base is not buffer:
+            buffer = np.empty(max(16, 2 * n), dtype=current.dtype)
+            buffer[:n] = current
+            self._buffers[attr] = buffer
+        buffer[n] = value
+        setattr(self, attr, buffer[:n + 1])
+    
+    def _add_to_ancestors(self, node: int, customers: int, load: float) -> None:
+        """Add (or with negative values, remove) totals along the root path."""
+        while node >= 0:
+            self._subtree_customers[node] += customers
+            self._subtree_load[node] += load
+            node = self._tree_parent[node]
+    
+    def _is_ancestor(self, candidate: int, node: int) -> bool:
+        while node >= 0:
+            if node == candidate:
+                return True
+            node = self._tree_parent[node]
+        return False
+    
+    def _invalidate_tree(self) -> None:
+        """Drop the feeder tree so the next query rebuilds it from the edges."""
+        self._tree_parent = None
+        self._tree_parent_edge = None
+        self._subtree_customers = None
+        self._subtree_load = None
+    
+    def _is_fed(self, node: int) -> bool:
+        """Whether the tree root above ``node`` is a supply point."""
+        while self._tree_parent[node] >= 0:
+            node = self._tree_parent[node]
+        return self.node_types[node] == "SUBSTATION" or not self._incoming_edges(node)
+    
+    def add_node(
+        self,
+        node_id: UUID,
+        asset_id: Optional[UUID],
+        node_type: str,
+        name: str,
+        voltage_level: Optional[str] = None,
+        operational_state: Optional[str] = None,
+        latitude: Optional[float] = None,
+        longitude: Optional[float] = None
+    ) -> int:
+        """Insert a node. New nodes start unconnected; O(1) amortized."""
+        i = self.num_nodes
+        self.node_ids.append(node_id)
+        self.node_index[node_id] = i
+        self.node_asset_ids.append(asset_id)
+        self.node_types.append(node_type)
+        self.node_names.append(name)
+        self.node_voltage_levels.append(voltage_level)
+        self.node_states.append(operational_state)
+        self._append("node_voltage_kv", parse_voltage_kv(voltage_level) or np.nan)
+        self._append("node_latitude", float(latitude) if latitude is not None else np.nan)
+        self._append("node_longitude", float(longitude) if longitude is not None else np.nan)
+        self._append("node_active", True)
+        customers = self._customers_by_asset.get(asset_id, 0) if asset_id else 0
+        load = self._load_by_asset.get(asset_id, 0.0) if asset_id else 0.0
+        self._append("node_customers", customers)
+        self._append("node_load_mw", load)
+        
+        if self._tree_parent is not None:
+            self._tree_parent.append(-1)
+            self._tree_parent_edge.append(-1)
+            self._subtree_customers.append(customers)
+            self._subtree_load.append(load)
+        
+        self._csr_cache.clear()
+        return i
+    
+    def remove_node(self, node_id: UUID) -> int:
+        """
+        Tombstone a node. Its edges must already have been removed, so the
+        node is a detached root and no ancestor totals change.
+        """
+        i = self.node_index.pop(node_id)
+        self.node_active[i] = False
+        if self._tree_parent is not None:
+            self._add_to_ancestors(i, -int(self.node_customers[i]), -float(self.node_load_mw[i]))
+            self._tree_parent[i] = -1
+        self.node_customers[i] = 0
+        self.node_load_mw[i] = 0.0
+        self._csr_cache.clear()
+        return i
+    
+    def add_edge(
+        self,
+        edge_id: UUID,
+        from_node_id: UUID,
+        to_node_id: UUID,
+        asset_id: Optional[UUID],
+        edge_type: str,
+        length_km: Optional[float] = None,
+        impedance_r: Optional[float] = None,
+        impedance_x: Optional[float] = None,
+        thermal_rating_mva: Optional[float] = None,
+        emergency_rating_mva: Optional[float] = None
+    ) -> int:
+        """
+        Insert an edge and patch the feeder tree in O(depth).
+        
+        If the downstream node was a supply point only for lack of an
+        upstream edge, it is attached below the fed upstream node and its
+        subtree totals are added along the root path. An edge into an
+        already-fed node is a mesh edge and leaves the tree unchanged. When
+        the edge changes which nodes are fed otherwise (it feeds an unfed
+        node, or takes away a supply point), the effect can reach beyond one
+        subtree, so the tree is rebuilt on next use instead.
+        """
+        u = self.node_index[from_node_id]
+        v = self.node_index[to_node_id]
+        k = self.num_edges
+        self.edge_ids.append(edge_id)
+        self.edge_index[edge_id] = k
+        self.edge_asset_ids.append(asset_id)
+        self.edge_types.append(edge_type)
+        self._append("edge_from", u)
+        self._append("edge_to", v)
+        for attr, value in (
+            ("edge_length_km", length_km),
+            ("edge_impedance_r", impedance_r),
+            ("edge_impedance_x", impedance_x),
+            ("edge_thermal_rating_mva", thermal_rating_mva),
+            ("edge_emergency_rating_mva", emergency_rating_mva)
+        ):
+            self._append(attr, float(value) if value is not None else np.nan)
+        self._append("edge_active", True)
+        self._csr_cache.clear()
+        
+        if self._tree_parent is None or self.node_types[v] == "SUBSTATION":
+            return k
+        
+        # Fed only as a root without upstream edges, checked before indexing
+        source = self._tree_parent[v] == -1 and self._is_fed(v)
+        self._in_delta.setdefault(v, []).append(k)
+        if source and not self._is_ancestor(v, u) and self._is_fed(u):
+            self._tree_parent[v] = u
+            self._tree_parent_edge[v] = k
+            self._add_to_ancestors(u, self._subtree_customers[v], self._subtree_load[v])
+        elif source or (self._is_fed(u) and not self._is_fed(v)):
+            self._invalidate_tree()
+        
+        return k
+    
+    def remove_edge(self, edge_id: UUID) -> int:
+        """
+        Tombstone an edge and patch the feeder tree in O(depth).
+        
+        Removing a tree edge detaches the downstream subtree; it is re-fed
+        through any remaining upstream edge of the same node, or becomes a
+        feeder of its own when the node has none left. Otherwise nodes deeper
+        in the subtree may still be fed over other edges, and an unfed node
+        losing its last upstream edge turns into a supply point; in both
+        cases the tree is rebuilt on next use.
+        """
+        k = self.edge_index.pop(edge_id)
+        v = int(self.edge_to[k])
+        was_fed = self._tree_parent is not None and self._is_fed(v)
+        self.edge_active[k] = False
+        self._csr_cache.clear()
+        
+        if self._tree_parent is None:
+            return k
+        
+        incoming = self._incoming_edges(v)
+        if self._tree_parent_edge[v] == k:
+            u = self._tree_parent[v]
+            self._add_to_ancestors(u, -self._subtree_customers[v], -self._subtree_load[v])
+            self._tree_parent[v] = -1
+            self._tree_parent_edge[v] = -1
+            
+            if was_fed:
+                # Re-feed from another upstream edge if one exists
+                for alt in incoming:
+                    w = int(self.edge_from[alt])
+                    if not self._is_ancestor(v, w) and self._is_fed(w):
+                        self._tree_parent[v] = w
+                        self._tree_parent_edge[v] = alt
+                        self._add_to_ancestors(w, self._subtree_customers[v], self._subtree_load[v])
+                        break
+                else:
+                    if incoming:
+                        self._invalidate_tree()
+                return k
+        
+        if not was_fed and not incoming:
+            self._invalidate_tree()
+        
+        return k
+    
+    def add_switching_path(
+        self,
+        path_id: UUID,
+        source_node_id: UUID,
+        target_node_id: UUID,
+        switching_time_min: Optional[int] = None,
+        backup_capacity_mva: Optional[float] = None,
+        automatic_switching: bool = False,
+        path_distance_km: Optional[float] = None
+    ) -> int:
+        """Insert an active switching path (alternate feed); O(1) amortized."""
+        k = len(self.switch_ids)
+        self.switch_ids.append(path_id)
+        self._append("switch_source", self.node_index[source_node_id])
+        self._append("switch_target", self.node_index[target_node_id])
+        self._append("switch_time_min", float(switching_time_min) if switching_time_min is not None else np.nan)
+        self._append("switch_backup_capacity_mva", float(backup_capacity_mva) if backup_capacity_mva is not None else np.nan)
+        self.switch_automatic.append(bool(automatic_switching))
+        self._append("switch_distance_km", float(path_distance_km) if path_distance_km is not None else np.nan)
+        self._csr_cache.pop((True, True), None)
+        self._csr_cache.pop((False, True), None)
+        return k
+    
+    def asset_outage_nodes(self) -> Dict[UUID, int]:
+        """
+        Tree node whose subtree loses supply when an asset fails: the node
+        the asset sits on, or the downstream end of its edge.
+        """
+        nodes: Dict[UUID, int] = {}
+        for k, asset_id in enumerate(self.edge_asset_ids):
+            if asset_id is not None and self.edge_active[k]:
+                nodes.setdefault(asset_id, int(self.edge_to[k]))
+        for i, asset_id in enumerate(self.node_asset_ids):
+            if asset_id is not None and self.node_active[i]:
+                nodes[asset_id] = i
+        return nodes
+    
+    def node_summary(self, i: int) -> Dict[str, Any]:
+        """Identifying details for node index ``i``."""
+        return {
+            "node_id": self.node_ids[i],
+            "name": self.node_names[i],
+            "type": self.node_types[i],
+            "voltage_level": self.node_voltage_levels[i],
+            "asset_id": self.node_asset_ids[i]
+        }
+
+
+_SIGNATURE_MODELS = (
+    models.NetworkNode,
+    models.NetworkEdge,
+    models.SwitchingPath,
+    models.CustomerConnection
+)
+
+
+def read_topology_signature(db: Session) -> Tuple[Tuple[int, Optional[datetime]], ...]:
+    """
+    Cheap signature of the stored topology.
+    
+    Row count and latest insert timestamp of every table that feeds the
+    snapshot (nodes, edges, switching paths, customer connections).
+    """
+    return tuple(
+        tuple(db.query(func.count(model.id), func.max(model.created_at)).one())
+        for model in _SIGNATURE_MODELS
+    )
+
+
+def _format_signature(signature: Tuple[Tuple[int, Optional[datetime]], ...]) -> str:
+    return "|".join(
+        f"{count}:{latest.isoformat() if latest else '-'}" for count, latest in signature
+    )
+
+
+def get_topology_version(db: Session) -> str:
+    """Topology version string derived from the stored signature."""
+    return _format_signature(read_topology_signature(db))
+
+
+def load_topology(db: Session, version: Optional[str] = None) -> NetworkTopology:
+    """Load a fresh topology snapshot using bulk column queries."""
+    if version is None:
+        version = get_topology_version(db)
+    
+    nodes = db.query(
+        models.NetworkNode.id,
+        models.NetworkNode.asset_id,
+        models.NetworkNode.node_type,
+        models.NetworkNode.name,
+        models.NetworkNode.voltage_level,
+        models.NetworkNode.operational_state,
+        models.NetworkNode.latitude,
+        models.NetworkNode.longitude
+    ).all()
+    
+    edges = db.query(
+        models.NetworkEdge.id,
+        models.NetworkEdge.from_node_id,
+        models.NetworkEdge.to_node_id,
+        models.NetworkEdge.asset_id,
+        models.NetworkEdge.edge_type,
+        models.NetworkEdge.length_km,
+        models.NetworkEdge.impedance_r,
+        models.NetworkEdge.impedance_x,
+        models.NetworkEdge.thermal_rating_mva,
+        models.NetworkEdge.emergency_rating_mva
+    ).all()
+    
+    switching_paths = db.query(
+        models.SwitchingPath.id,
+        models.SwitchingPath.source_node_id,
+        models.SwitchingPath.target_node_id,
+        models.SwitchingPath.switching_time_min,
+        models.SwitchingPath.backup_capacity_mva,
+        models.SwitchingPath.automatic_switching,
+        models.SwitchingPath.path_distance_km
+    ).filter(
+        models.SwitchingPath.is_active == True
+    ).all()
+    
+    customer_rows = db.query(
+        models.CustomerConnection.asset_id,
+        models.CustomerConnection.customers_served,
+        models.CustomerConnection.peak_load_mw
+    ).all()
+    
+    return NetworkTopology(version, nodes, edges, switching_paths, customer_rows)
+
+
+class TopologyStore:
+    """
+    Process-wide holder of the current topology snapshot.
+    
+    Reads reload the snapshot only when the database signature no longer
+    matches. Writes made through the API are applied as in-place patches
+    (O(depth) for edges), after which the expected signature is verified so
+    concurrent writers elsewhere still trigger a full reload. Every change
+    bumps ``revision`` and is published to subscribers.
+    
+    With a ``snapshot_dir`` the snapshot is shared across processes: one
+    worker builds and publishes it, the others attach the memory-mapped
+    arrays. Patches are applied to a private copy and republished.
+    """
+    
+    def __init__(self, snapshot_dir: Optional[str] = None):
+        self.snapshot_dir = snapshot_dir
+        self._lock = threading.RLock()
+        self._topology: Optional[NetworkTopology] = None
+        self._signature: Optional[Tuple] = None
+        self._listeners: List[Callable[[Dict[str, Any]], None]] = []
+        self.revision = 0
+    
+    def subscribe(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        """Register a callback invoked with every topology change event."""
+        with self._lock:
+            if listener not in self._listeners:
+                self._listeners.append(listener)
+    
+    def unsubscribe(self, listener: Callable[[Dict[str, Any]], None]) -> None:
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+    
+    def get(self, db: Session) -> NetworkTopology:
+        """Return the current snapshot, reloading if the database has changed."""
+        signature = read_topology_signature(db)
+        reloaded = False
+        with self._lock:
+            if self._topology is None or self._signature != signature:
+                self._topology = self._load(db, _format_signature(signature))
+                self._signature = signature
+                self.revision += 1
+                reloaded = True
+            topology = self._topology
+        
+        if reloaded:
+            self._publish({"change": "reloaded", "affected_node_ids": []}, topology)
+        return topology
+    
+    def _load(self, db: Session, version: str) -> NetworkTopology:
+        """Load a snapshot, attaching the shared one when it is current."""
+        if not self.snapshot_dir:
+            return load_topology(db, version)
+        
+        from app.services import topology_snapshot as snapshots
+        
+        with snapshots.snapshot_lock(self.snapshot_dir, exclusive=False):
+            manifest = snapshots.read_manifest(self.snapshot_dir)
+            if manifest and manifest["version"] == version:
+                return snapshots.attach_snapshot(self.snapshot_dir, manifest["name"])
+        
+        with snapshots.snapshot_lock(self.snapshot_dir, exclusive=True):
+            # Another worker may have published it while we waited
+            manifest = snapshots.read_manifest(self.snapshot_dir)
+            if manifest and manifest["version"] == version:
+                return snapshots.attach_snapshot(self.snapshot_dir, manifest["name"])
+            name = snapshots.publish_snapshot(load_topology(db, version), self.snapshot_dir)
+            return snapshots.attach_snapshot(self.snapshot_dir, name)
+    
+    def _share(self, topology: NetworkTopology) -> NetworkTopology:
+        """Publish a patched private snapshot and swap to the shared mapping."""
+        from app.services import topology_snapshot as snapshots
+        
+        with snapshots.snapshot_lock(self.snapshot_dir, exclusive=True):
+            name = snapshots.publish_snapshot(topology, self.snapshot_dir)
+            return snapshots.attach_snapshot(self.snapshot_dir, name)
+    
+    def invalidate(self) -> None:
+        """Drop the snapshot so the next read reloads from the database."""
+        with self._lock:
+            self._topology = None
+            self._signature = None
+    
+    def node_added(self, db: Session, node: models.NetworkNode) -> None:
+        self._patch(db, 0, +1, "node_added", node.id, [node.id], lambda t: t.add_node(
+            node.id, node.asset_id, node.node_type, node.name, node.voltage_level,
+            node.operational_state, node.latitude, node.longitude
+        ))
+    
+    def node_removed(self, db: Session, node_id: UUID) -> None:
+        self._patch(db, 0, -1, "node_removed", node_id, [node_id], lambda t: t.remove_node(node_id))
+    
+    def edge_added(self, db: Session, edge: models.NetworkEdge) -> None:
+        self._patch(
+            db, 1, +1, "edge_added", edge.id, [edge.from_node_id, edge.to_node_id],
+            lambda t: t.add_edge(
+                edge.id, edge.from_node_id, edge.to_node_id, edge.asset_id, edge.edge_type,
+                edge.length_km, edge.impedance_r, edge.impedance_x,
+                edge.thermal_rating_mva, edge.emergency_rating_mva
+            )
+        )
+    
+    def edge_removed(
+        self,
+        db: Session,
+        edge_id: UUID,
+        from_node_id: UUID,
+        to_node_id: UUID
+    ) -> None:
+        self._patch(
+            db, 1, -1, "edge_removed", edge_id, [from_node_id, to_node_id],
+            lambda t: t.remove_edge(edge_id)
+        )
+    
+    def switching_path_added(self, db: Session, path: models.SwitchingPath) -> None:
+        def apply(topology: NetworkTopology) -> None:
+            if path.is_active:
+                topology.add_switching_path(
+                    path.id, path.source_node_id, path.target_node_id,
+                    path.switching_time_min, path.backup_capacity_mva,
+                    path.automatic_switching, path.path_distance_km
+                )
+        
+        self._patch(
+            db, 2, +1, "switching_path_added", path.id,
+            [path.source_node_id, path.target_node_id], apply
+        )
+    
+    def _patch(
+        self,
+        db: Session,
+        table: int,
+        delta: int,
+        change: str,
+        entity_id: UUID,
+        affected_node_ids: List[UUID],
+        apply: Callable[[NetworkTopology], Any]
+    ) -> None:
+        """
+        Apply a committed write to the cached snapshot.
+        
+        The new database signature must differ from the cached one only by
+        this write; otherwise another writer got in between and the snapshot
+        is dropped for a full reload.
+        """
+        signature = read_topology_signature(db)
+        with self._lock:
+            topology = self._topology
+            expected = self._signature
+            consistent = (
+                topology is not None
+                and expected is not None
+                and all(
+                    signature[i] == expected[i]
+                    for i in range(len(signature)) if i != table
+                )
+                and signature[table][0] == expected[table][0] + delta
+            )
+            
+            if consistent:
+                if topology.shared:
+                    from app.services.topology_snapshot import detach_snapshot
+                    topology = detach_snapshot(topology)
+                try:
+                    apply(topology)
+                except KeyError:
+                    consistent = False
+            
+            if consistent:
+                topology.version = _format_signature(signature)
+                if self.snapshot_dir:
+                    topology = self._share(topology)
+                self._topology = topology
+                self._signature = signature
+            else:
+                self._topology = None
+                self._signature = None
+            self.revision += 1
+        
+        self._publish({
+            "change": change,
+            "entity_id": entity_id,
+            "affected_node_ids": affected_node_ids,
+            "patched": consistent
+        }, topology if consistent else None)
+    
+    def _publish(self, event: Dict[str, Any], topology: Optional[NetworkTopology]) -> None:
+        event["revision"] = self.revision
+        event["version"] = topology.version if topology is not None else None
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            listener(event)
+
+
+topology_store = TopologyStore(settings.TOPOLOGY_SNAPSHOT_DIR)
+
+
+def get_topology(db: Session) -> NetworkTopology:
+    """Return the cached topology snapshot, reloading if the DB has changed."""
+    return topology_store.get(db)
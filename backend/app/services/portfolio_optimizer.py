@@ -6,13 +6,164 @@ under budget and risk constraints.
 """
 
 from sqlalchemy.orm import Session
-from typing import List, Dict, Any, Optional
+from sqlalchemy import func, cast, insert, select, String, BigInteger, Float
+from typing import List, Dict, Any, Iterable, Optional, Set, Tuple
 from uuid import UUID
 from datetime import date
 from decimal import Decimal
+from operator import itemgetter
+from concurrent.futures import ProcessPoolExecutor
+import os
 import time
 
+import numpy as np
+from scipy import sparse
+
 from app import models, schemas
+from app.services.portfolio_solver import (
+    DEFAULT_TIME_LIMIT,
+    IncrementalKnapsack,
+    solve_knapsack_frontier,
+    solve_binary_program,
+    solve_multiple_choice,
+    solve_lagrangian
+)
+from app.services.portfolio_state import PortfolioState, portfolio_states
+from app.services.portfolio_uncertainty import (
+    DEFAULT_BENEFIT_UNCERTAINTY,
+    DEFAULT_CORRELATION,
+    DEFAULT_OVERRUN_PROBABILITY,
+    DEFAULT_SAMPLES,
+    exceedance,
+    log_spread,
+    lower_tail_loading,
+    quantile_loading,
+    sample_totals,
+    seeded_rng,
+    tail_draws,
+    tail_mean,
+    weighted_quantile
+)
+
+
+# Budget rescaling rounds of the stochastic mode, and how far below the
+# budget the sampled cost quantile may settle
+MAX_CHANCE_ROUNDS = 5
+CHANCE_TOLERANCE = 0.005
+
+BATCH_METHODS = ("KNAPSACK_GREEDY", "MILP")
+
+INSERT_CHUNK_SIZE = 100000
+
+# Replacement cost of asset types without failure mode cost data
+DEFAULT_REPLACEMENT_COSTS = {
+    "TRANSFORMER": 800000,
+    "BREAKER": 400000,
+    "LINE": 200000,
+    "SWITCH": 50000,
+    "REGULATOR": 150000,
+    "CAPACITOR": 75000,
+    "RECLOSER": 50000,
+    "SECTIONALIZER": 30000
+}
+DEFAULT_REPLACEMENT_COST = 100000
+
+# Generated options: type, cost as a share of replacement, risk reduction
+# percent, life extension years (None: the type's lifespan), years of
+# current annual risk counted as benefit (None: benefit/cost ratio of 1)
+# and the asset categories it applies to (None: all)
+INTERVENTION_TEMPLATES = (
+    ("REPLACE", 1.0, 95.0, None, 10.0, None),
+    ("REFURBISH_MAJOR", 0.4, 70.0, 15.0, 7.0, ("TRANSFORMER",)),
+    ("MONITOR_ENHANCE", 0.08, 25.0, 0.0, 2.5, None),
+    ("MAINTAIN_PREVENTIVE", 0.03, 10.0, 3.0, None, None)
+)
+INTERVENTION_DESCRIPTIONS = {
+    "REFURBISH_MAJOR": "Major refurbishment: rewind, new bushings, OLTC rebuild",
+    "MONITOR_ENHANCE": "Install online monitoring and predictive analytics",
+    "MAINTAIN_PREVENTIVE": "Continue preventive maintenance program"
+}
+
+
+def intervention_priority(
+    risk_reduction_percent: np.ndarray,
+    cost: np.ndarray,
+    criticality: np.ndarray,
+    life_extension_years: np.ndarray
+) -> np.ndarray:
+    """
+    Priority scores of intervention options, capped at 10.
+    
+    Risk reduction per dollar weighted by asset criticality (3 when
+    unset), plus the life extension on a 0-1 scale per decade. Missing or
+    zero costs count as one dollar.
+    """
+    risk_reduction_percent = np.nan_to_num(np.asarray(risk_reduction_percent, dtype=np.float64))
+    cost = np.asarray(cost, dtype=np.float64)
+    cost = np.where(np.isnan(cost) | (cost == 0), 1.0, cost)
+    criticality = np.asarray(criticality, dtype=np.float64)
+    criticality = np.where(np.isnan(criticality) | (criticality == 0), 3.0, criticality)
+    life_score = np.nan_to_num(np.asarray(life_extension_years, dtype=np.float64)) / 10.0
+    
+    risk_score = risk_reduction_percent / cost * 1000
+    return np.minimum((risk_score * criticality + life_score) / 10.0, 10.0)
+
+
+def _solve_projects(
+    values: np.ndarray,
+    cents: np.ndarray,
+    task: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    Exact project selection for one task built by
+    ``PortfolioOptimizer._milp_task``.
+    
+    ``values`` and ``cents`` cover the task's candidates. The budget-only
+    problem goes to the expanding-core knapsack, kept under ``knapsack`` in
+    the report for warm-started re-optimization; linear rows switch to
+    HiGHS branch-and-bound.
+    """
+    min_risk_reduction = task["min_risk_reduction"]
+    if task["rows"] is not None:
+        rows = [task["rows"], (cents / 100.0)[None, :]]
+        lower = [task["lower"], [-np.inf]]
+        upper = [task["upper"], [task["budget_cents"] / 100.0]]
+        if min_risk_reduction:
+            rows.append(values[None, :])
+            lower.append([float(min_risk_reduction)])
+            upper.append([np.inf])
+        return solve_binary_program(
+            values, np.vstack(rows), np.concatenate(lower), np.concatenate(upper),
+            task["fixed"], task["time_limit"]
+        )
+    
+    # Kept as the scenario's state for warm-started re-optimization
+    knapsack = IncrementalKnapsack(values, cents, task["fixed"])
+    result = knapsack.solve(task["budget_cents"], task["time_limit"])
+    result["knapsack"] = knapsack
+    # Risk reduction is the objective, so the minimum only fails when even
+    # the optimum cannot reach it
+    if min_risk_reduction and result["bound"] < float(min_risk_reduction):
+        raise ValueError(
+            f"No portfolio within the budget reaches a risk reduction of {min_risk_reduction}"
+        )
+    return result
+
+
+# Candidate values and costs of the current pool worker, set once by the
+# initializer
+_worker_candidates: Optional[Tuple[np.ndarray, np.ndarray]] = None
+
+
+def _init_worker(values: np.ndarray, cents: np.ndarray) -> None:
+    global _worker_candidates
+    _worker_candidates = (values, cents)
+
+
+def _run_task(task: Dict[str, Any]) -> Dict[str, Any]:
+    values, cents = _worker_candidates
+    members = task["members"]
+    return _solve_projects(values[members], cents[members], task)
 
 
 class PortfolioOptimizer:
@@ -30,36 +181,52 @@ class PortfolioOptimizer:
         """
         start_time = time.time()
         
-        # Get available projects
-        projects = self._get_available_projects(
-            request.budget_year if hasattr(request, 'budget_year') else 2025,
-            request.excluded_projects
-        )
+        solve_info: Optional[Dict[str, Any]] = None
+        budget_year = request.budget_year if hasattr(request, 'budget_year') else 2025
+        projects: List[models.InvestmentProject] = []
         
-        if request.optimization_method == "KNAPSACK_GREEDY":
-            selected_projects = self._knapsack_greedy(
-                projects,
-                request.budget_constraint,
-                request.mandatory_projects
+        if request.optimization_method == "MULTIPLE_CHOICE":
+            selected_ids, total_investment, total_risk_reduction, solve_info = (
+                self._multiple_choice_optimize(request)
             )
-        elif request.optimization_method == "MILP":
-            selected_projects = self._milp_optimize(
-                projects,
-                request.budget_constraint,
-                request.mandatory_projects,
-                request.constraints
+        elif request.optimization_method == "LAGRANGIAN":
+            selected_ids, total_investment, total_risk_reduction, solve_info = (
+                self._lagrangian_optimize(request)
             )
-        else:
-            # Default to greedy
-            selected_projects = self._knapsack_greedy(
-                projects,
-                request.budget_constraint,
-                request.mandatory_projects
+        elif request.optimization_method == "STOCHASTIC":
+            selected_ids, total_investment, total_risk_reduction, solve_info = (
+                self._stochastic_optimize(request)
             )
-        
-        # Calculate portfolio metrics
-        total_investment = sum(p.total_budget for p in selected_projects)
-        total_risk_reduction = sum(p.risk_reduction_total or 0 for p in selected_projects)
+        else:
+            # Get available projects
+            projects = self._get_available_projects(budget_year, request.excluded_projects)
+            
+            if request.optimization_method == "KNAPSACK_GREEDY":
+                selected_projects = self._knapsack_greedy(
+                    projects,
+                    request.budget_constraint,
+                    request.mandatory_projects
+                )
+            elif request.optimization_method == "MILP":
+                selected_projects, solve_info = self._milp_optimize(
+                    projects,
+                    request.budget_constraint,
+                    request.mandatory_projects,
+                    request.constraints,
+                    request.time_limit_seconds
+                )
+            else:
+                # Default to greedy
+                selected_projects = self._knapsack_greedy(
+                    projects,
+                    request.budget_constraint,
+                    request.mandatory_projects
+                )
+            
+            # Calculate portfolio metrics
+            selected_ids = [p.id for p in selected_projects]
+            total_investment = sum(float(p.total_budget) for p in selected_projects)
+            total_risk_reduction = sum(float(p.risk_reduction_total or 0) for p in selected_projects)
         
         expected_roi = (
             total_risk_reduction / total_investment if total_investment > 0 else 0
@@ -74,37 +241,446 @@ class PortfolioOptimizer:
             budget_constraint=request.budget_constraint,
             risk_tolerance=request.risk_tolerance,
             time_horizon_years=request.time_horizon_years,
-            selected_projects=[p.id for p in selected_projects],
+            selected_projects=selected_ids,
             total_investment=Decimal(str(total_investment)),
             total_risk_reduction=Decimal(str(total_risk_reduction)),
             expected_roi=Decimal(str(expected_roi)),
             risk_adjusted_return=Decimal(str(risk_adjusted_return)),
             optimization_date=date.today(),
             optimization_method=request.optimization_method,
-            constraints=request.constraints
+            constraints=(
+                self._scenario_constraints(
+                    request.constraints, budget_year,
+                    request.mandatory_projects, request.excluded_projects
+                ) if request.optimization_method not in ("MULTIPLE_CHOICE", "LAGRANGIAN", "STOCHASTIC")
+                else request.constraints
+            )
         )
         self.db.add(scenario)
         self.db.commit()
         self.db.refresh(scenario)
         
-        execution_time = time.time() - start_time
+        if solve_info and "knapsack" in solve_info:
+            portfolio_states.put(PortfolioState(
+                scenario.id,
+                budget_year,
+                projects,
+                set(request.mandatory_projects or []),
+                set(request.excluded_projects or []),
+                solve_info.pop("knapsack")
+            ))
+        
+        return self._result(
+            scenario.id, request.scenario_name, request.optimization_method,
+            request.budget_constraint, selected_ids, total_investment,
+            total_risk_reduction, start_time, solve_info
+        )
+    
+    def reoptimize(
+        self,
+        scenario: models.PortfolioScenario,
+        request: schemas.PortfolioReoptimizeRequest
+    ) -> schemas.PortfolioOptimizationResult:
+        """
+        Re-solve a saved MILP scenario after project edits and update it.
+        
+        The scenario's cached state (``portfolio_state``) has the edited
+        projects re-positioned in its sorted candidates and is solved again
+        starting from the previous portfolio. Budget year, budget, mandatory
+        and excluded projects may change with the request and otherwise are
+        those saved with the scenario. Without a usable state (another
+        process changed the candidates, budget year or excluded projects
+        changed, linear constraints, or the state was evicted) the
+        candidates are read again and solved in full, and the new state is
+        kept.
+        """
+        start_time = time.time()
+        
+        if scenario.optimization_method != "MILP":
+            raise ValueError("Only MILP project portfolios can be re-optimized; run /optimize again")
+        
+        state, changes = portfolio_states.checkout(scenario.id)
+        constraints = scenario.constraints or {}
+        budget = Decimal(
+            request.budget_constraint if request.budget_constraint is not None
+            else scenario.budget_constraint
+        )
+        budget_cents = int(budget * 100)
+        
+        # Candidate set the scenario was solved over, as saved with it
+        budget_year = (
+            request.budget_year if request.budget_year is not None
+            else constraints.get("budget_year")
+        )
+        saved = {}
+        for key in ("mandatory_projects", "excluded_projects"):
+            value = getattr(request, key)
+            if value is None and key in constraints:
+                value = [UUID(str(project_id)) for project_id in constraints[key] or []]
+            saved[key] = value
+        missing = [
+            key for key, value in (("budget_year", budget_year), *saved.items()) if value is None
+        ]
+        if missing:
+            raise ValueError(
+                f"Scenario {scenario.id} was saved without its {', '.join(missing)}; "
+                f"pass them to re-optimize it"
+            )
+        mandatory = set(saved["mandatory_projects"])
+        excluded = set(saved["excluded_projects"])
+        
+        result = None
+        if state is not None and state.budget_year == budget_year and state.excluded == excluded:
+            with state.lock:
+                state.apply(changes)
+                if state.signature() == portfolio_states.read_signature(
+                    self.db, state.budget_year, excluded
+                ):
+                    if mandatory != state.mandatory:
+                        state.set_mandatory(mandatory)
+                    result = state.model.solve(budget_cents, request.time_limit_seconds)
+                    selected_ids = state.selected_ids()
+                    total_investment = float(state.model.costs[result["selected"]].sum()) / 100
+                    total_risk_reduction = result["objective"]
+        
+        if result is None:
+            projects = self._get_available_projects(budget_year, list(excluded))
+            selected_projects, result = self._milp_optimize(
+                projects, budget, list(mandatory), constraints, request.time_limit_seconds
+            )
+            selected_ids = [p.id for p in selected_projects]
+            total_investment = sum(float(p.total_budget) for p in selected_projects)
+            total_risk_reduction = sum(float(p.risk_reduction_total or 0) for p in selected_projects)
+            if "knapsack" in result:
+                portfolio_states.put(PortfolioState(
+                    scenario.id, budget_year, projects, mandatory, excluded,
+                    result.pop("knapsack")
+                ))
+            else:
+                portfolio_states.discard(scenario.id)
+        
+        min_risk_reduction = constraints.get("min_risk_reduction")
+        if min_risk_reduction and result["bound"] < float(min_risk_reduction):
+            raise ValueError(
+                f"No portfolio within the budget reaches a risk reduction of {min_risk_reduction}"
+            )
+        
+        expected_roi = total_risk_reduction / total_investment if total_investment > 0 else 0
+        
+        scenario.budget_constraint = budget
+        scenario.constraints = self._scenario_constraints(
+            constraints, budget_year, mandatory, excluded
+        )
+        scenario.selected_projects = selected_ids
+        scenario.total_investment = Decimal(str(total_investment))
+        scenario.total_risk_reduction = Decimal(str(total_risk_reduction))
+        scenario.expected_roi = Decimal(str(expected_roi))
+        scenario.risk_adjusted_return = Decimal(str(expected_roi * 0.85))
+        scenario.optimization_date = date.today()
+        self.db.commit()
+        
+        return self._result(
+            scenario.id, scenario.scenario_name, scenario.optimization_method,
+            budget, selected_ids, total_investment, total_risk_reduction,
+            start_time, result
+        )
+    
+    def _scenario_constraints(
+        self,
+        constraints: Optional[Dict[str, Any]],
+        budget_year: int,
+        mandatory: Optional[Iterable[UUID]],
+        excluded: Optional[Iterable[UUID]]
+    ) -> Dict[str, Any]:
+        """
+        Scenario constraints with the candidate set they were solved over,
+        so ``reoptimize`` can rebuild it without a cached state.
+        """
+        return {
+            **(constraints or {}),
+            "budget_year": budget_year,
+            "mandatory_projects": [str(project_id) for project_id in mandatory or []],
+            "excluded_projects": [str(project_id) for project_id in excluded or []]
+        }
+    
+    def optimize_batch(
+        self,
+        request: schemas.PortfolioBatchRequest
+    ) -> Dict[str, Any]:
+        """
+        Optimize several scenario variants over one load of candidates.
+        
+        Candidate projects of ``budget_year`` are read once; each variant
+        applies its own exclusions, mandatory projects, budget and
+        constraints. MILP variants are solved concurrently in a process
+        pool, greedy ones inline. All scenarios are saved in one
+        transaction, so either every variant is recorded or none is. The
+        comparison matrix gives investment, risk reduction and ROI per
+        scenario, the number of projects each pair shares and their
+        overlap (shared over combined selections).
+        """
+        start_time = time.time()
+        
+        variants = request.scenarios
+        for variant in variants:
+            if variant.optimization_method not in BATCH_METHODS:
+                raise ValueError(
+                    f"Scenario '{variant.scenario_name}': batch optimization supports "
+                    f"{', '.join(BATCH_METHODS)}, not {variant.optimization_method}"
+                )
+        
+        projects = self._get_available_projects(request.budget_year)
+        values = np.array([float(p.risk_reduction_total or 0) for p in projects])
+        cents = np.array([int(p.total_budget * 100) for p in projects], dtype=np.int64)
+        
+        members: List[np.ndarray] = []
+        selections: List[Optional[np.ndarray]] = [None] * len(variants)
+        results: List[Optional[Dict[str, Any]]] = [None] * len(variants)
+        tasks: Dict[int, Dict[str, Any]] = {}
+        for k, variant in enumerate(variants):
+            excluded = set(variant.excluded_projects or [])
+            members.append(np.array(
+                [i for i, p in enumerate(projects) if p.id not in excluded], dtype=np.int64
+            ))
+            subset = [projects[i] for i in members[k]]
+            if variant.optimization_method == "MILP":
+                try:
+                    tasks[k] = self._milp_task(
+                        subset, variant.budget_constraint, variant.mandatory_projects,
+                        variant.constraints, variant.time_limit_seconds
+                    )
+                except ValueError as e:
+                    raise ValueError(f"Scenario '{variant.scenario_name}': {e}")
+                tasks[k]["members"] = members[k]
+            else:
+                chosen = {p.id for p in self._knapsack_greedy(
+                    subset, variant.budget_constraint, variant.mandatory_projects
+                )}
+                selections[k] = np.array([p.id in chosen for p in subset], dtype=bool)
+        
+        workers = min(request.workers or os.cpu_count() or 1, len(tasks))
+        if workers > 1:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(values, cents)
+            ) as pool:
+                futures = {k: pool.submit(_run_task, task) for k, task in tasks.items()}
+                for k, future in futures.items():
+                    try:
+                        results[k] = future.result()
+                    except ValueError as e:
+                        raise ValueError(f"Scenario '{variants[k].scenario_name}': {e}")
+        else:
+            for k, task in tasks.items():
+                try:
+                    results[k] = _solve_projects(values[members[k]], cents[members[k]], task)
+                except ValueError as e:
+                    raise ValueError(f"Scenario '{variants[k].scenario_name}': {e}")
+        
+        # Selection matrix over all candidates, one row per scenario
+        chosen = np.zeros((len(variants), len(projects)), dtype=bool)
+        for k in range(len(variants)):
+            picked = results[k]["selected"] if results[k] is not None else selections[k]
+            chosen[k, members[k][picked]] = True
+        investment = chosen @ (cents / 100.0)
+        reduction = chosen @ values
+        roi = np.divide(reduction, investment, out=np.zeros(len(variants)), where=investment > 0)
+        
+        scenarios = []
+        for k, variant in enumerate(variants):
+            scenario = models.PortfolioScenario(
+                scenario_name=variant.scenario_name,
+                budget_constraint=variant.budget_constraint,
+                risk_tolerance=variant.risk_tolerance,
+                time_horizon_years=variant.time_horizon_years,
+                selected_projects=[projects[i].id for i in np.flatnonzero(chosen[k])],
+                total_investment=Decimal(str(float(investment[k]))),
+                total_risk_reduction=Decimal(str(float(reduction[k]))),
+                expected_roi=Decimal(str(float(roi[k]))),
+                risk_adjusted_return=Decimal(str(float(roi[k]) * 0.85)),
+                optimization_date=date.today(),
+                optimization_method=variant.optimization_method,
+                constraints=self._scenario_constraints(
+                    variant.constraints, request.budget_year,
+                    variant.mandatory_projects, variant.excluded_projects
+                )
+            )
+            self.db.add(scenario)
+            scenarios.append(scenario)
+        self.db.flush()
+        scenario_ids = [scenario.id for scenario in scenarios]
+        self.db.commit()
+        
+        for k, variant in enumerate(variants):
+            if results[k] is not None and "knapsack" in results[k]:
+                portfolio_states.put(PortfolioState(
+                    scenario_ids[k],
+                    request.budget_year,
+                    [projects[i] for i in members[k]],
+                    set(variant.mandatory_projects or []),
+                    set(variant.excluded_projects or []),
+                    results[k].pop("knapsack")
+                ))
+        
+        shared = chosen.astype(np.int64) @ chosen.T.astype(np.int64)
+        counts = np.diag(shared)
+        combined = counts[:, None] + counts[None, :] - shared
+        overlap = np.divide(shared, combined, out=np.ones(shared.shape), where=combined > 0)
+        
+        return {
+            "budget_year": request.budget_year,
+            "candidate_projects": len(projects),
+            "workers": max(workers, 1),
+            "scenarios": [
+                self._result(
+                    scenario_ids[k], variant.scenario_name, variant.optimization_method,
+                    variant.budget_constraint, scenarios[k].selected_projects,
+                    float(investment[k]), float(reduction[k]), start_time, results[k]
+                )
+                for k, variant in enumerate(variants)
+            ],
+            "comparison": {
+                "scenario_ids": scenario_ids,
+                "scenario_names": [variant.scenario_name for variant in variants],
+                "total_investment": investment.tolist(),
+                "total_risk_reduction": reduction.tolist(),
+                "expected_roi": roi.tolist(),
+                "shared_projects": shared.tolist(),
+                "overlap": overlap.round(4).tolist()
+            },
+            "execution_time_seconds": time.time() - start_time
+        }
+    
+    def _result(
+        self,
+        scenario_id: UUID,
+        scenario_name: str,
+        method: str,
+        budget_constraint: Decimal,
+        selected_ids: List[UUID],
+        total_investment: float,
+        total_risk_reduction: float,
+        start_time: float,
+        solve_info: Optional[Dict[str, Any]]
+    ) -> schemas.PortfolioOptimizationResult:
+        expected_roi = (
+            total_risk_reduction / total_investment if total_investment > 0 else 0
+        )
         
         return schemas.PortfolioOptimizationResult(
-            scenario_id=scenario.id,
-            scenario_name=request.scenario_name,
-            selected_projects=[p.id for p in selected_projects],
+            scenario_id=scenario_id,
+            scenario_name=scenario_name,
+            selected_projects=selected_ids,
             total_investment=Decimal(str(total_investment)),
             total_risk_reduction=Decimal(str(total_risk_reduction)),
             expected_roi=Decimal(str(expected_roi)),
-            risk_adjusted_return=Decimal(str(risk_adjusted_return)),
+            risk_adjusted_return=Decimal(str(expected_roi * 0.85)),
             budget_utilization_percent=Decimal(str(
-                (total_investment / float(request.budget_constraint)) * 100
-                if request.budget_constraint > 0 else 0
+                (total_investment / float(budget_constraint)) * 100
+                if budget_constraint > 0 else 0
             )),
-            optimization_method=request.optimization_method,
-            execution_time_seconds=execution_time
+            optimization_method=method,
+            execution_time_seconds=time.time() - start_time,
+            solver_status=solve_info["status"] if solve_info else None,
+            objective_bound=Decimal(str(round(solve_info["bound"], 2))) if solve_info else None,
+            optimality_gap_percent=solve_info["gap"] * 100 if solve_info else None,
+            shadow_prices=solve_info.get("shadow_prices") if solve_info else None,
+            risk_metrics=solve_info.get("risk_metrics") if solve_info else None
         )
     
+    def frontier(
+        self,
+        request: schemas.PortfolioFrontierRequest
+    ) -> Dict[str, Any]:
+        """
+        Optimal portfolios for a range of budget levels.
+        
+        Candidate projects are read once and every level is solved exactly
+        in one sweep (``solve_knapsack_frontier``), or with HiGHS per level
+        when ``constraints`` add linear rows. Nothing is persisted. Each
+        point reports the risk reduction bought, the marginal return of
+        the extra spend over the previous level and the projects that
+        enter or leave the portfolio.
+        """
+        start_time = time.time()
+        
+        levels = self._budget_levels(request)
+        projects = self._get_available_projects(request.budget_year, request.excluded_projects)
+        mandatory = set(request.mandatory_projects or [])
+        constraints = request.constraints or {}
+        
+        values = np.array([float(p.risk_reduction_total or 0) for p in projects])
+        cents = np.array([int(p.total_budget * 100) for p in projects], dtype=np.int64)
+        fixed = np.array([p.id in mandatory for p in projects], dtype=bool)
+        capacities = np.array([int(level * 100) for level in levels], dtype=np.int64)
+        
+        rows, lower, upper = self._constraint_rows(projects, constraints)
+        if rows:
+            rows.append(cents / 100.0)
+            lower.append(-np.inf)
+            upper.append(0.0)
+            rows, lower, upper = np.array(rows), np.array(lower), np.array(upper)
+            results = []
+            for capacity in capacities.tolist():
+                upper[-1] = capacity / 100.0
+                results.append(solve_binary_program(
+                    values, rows, lower, upper.copy(), fixed,
+                    max(request.time_limit_seconds - (time.time() - start_time), 0.1)
+                ))
+        else:
+            results = solve_knapsack_frontier(
+                values, cents, capacities, fixed, request.time_limit_seconds
+            )
+        
+        points = []
+        previous = np.zeros(len(projects), dtype=bool)
+        previous_investment = 0.0
+        previous_reduction = 0.0
+        for level, result in zip(levels, results):
+            chosen = result["selected"]
+            investment = float(cents[chosen].sum()) / 100
+            reduction = float(values[chosen].sum())
+            spend = investment - previous_investment
+            
+            points.append({
+                "budget": float(level),
+                "total_investment": investment,
+                "total_risk_reduction": reduction,
+                "project_count": int(np.count_nonzero(chosen)),
+                "expected_roi": reduction / investment if investment > 0 else 0,
+                "marginal_return": (reduction - previous_reduction) / spend if spend > 0 else 0,
+                "added_projects": [projects[i].id for i in np.flatnonzero(chosen & ~previous)],
+                "removed_projects": [projects[i].id for i in np.flatnonzero(previous & ~chosen)],
+                "solver_status": result["status"],
+                "optimality_gap_percent": result["gap"] * 100
+            })
+            previous = chosen
+            previous_investment = investment
+            previous_reduction = reduction
+        
+        return {
+            "budget_year": request.budget_year,
+            "candidate_projects": len(projects),
+            "points": points,
+            "execution_time_seconds": time.time() - start_time
+        }
+    
+    def _budget_levels(self, request: schemas.PortfolioFrontierRequest) -> List[Decimal]:
+        """Ascending budget levels of a frontier request, in whole cents."""
+        if request.budget_levels:
+            levels = [Decimal(level) for level in request.budget_levels]
+            if min(levels) < 0:
+                raise ValueError("Budget levels must not be negative")
+            if len(levels) > 200:
+                raise ValueError("At most 200 budget levels can be swept at once")
+        elif request.min_budget is not None and request.max_budget is not None:
+            if request.min_budget > request.max_budget:
+                raise ValueError("min_budget must not exceed max_budget")
+            step = (Decimal(request.max_budget) - Decimal(request.min_budget)) / (request.steps - 1)
+            levels = [Decimal(request.min_budget) + step * i for i in range(request.steps)]
+        else:
+            raise ValueError("Either budget_levels or min_budget and max_budget are required")
+        return sorted({level.quantize(Decimal("0.01")) for level in levels})
+    
     def _get_available_projects(
         self,
         budget_year: int,
@@ -174,49 +750,452 @@ class PortfolioOptimizer:
         projects: List[models.InvestmentProject],
         budget_constraint: Decimal,
         mandatory_projects: Optional[List[UUID]] = None,
-        constraints: Optional[Dict[str, Any]] = None
-    ) -> List[models.InvestmentProject]:
+        constraints: Optional[Dict[str, Any]] = None,
+        time_limit: float = DEFAULT_TIME_LIMIT
+    ) -> Tuple[List[models.InvestmentProject], Dict[str, Any]]:
         """
-        Mixed Integer Linear Programming optimization.
+        Exact selection maximizing total risk reduction within the budget.
         
-        This is a simplified implementation. In production, you would use
-        a proper MILP solver like PuLP, Gurobi, or CPLEX.
+        The budget-only problem is solved by the expanding-core knapsack in
+        ``portfolio_solver``, returned under ``knapsack`` in the report so
+        the scenario can later be re-optimized from it. Additional linear
+        constraints (see ``_constraint_rows``) switch to HiGHS
+        branch-and-bound. Mandatory projects are forced in. Returns the
+        selection and the solver report (status, bound and relative gap).
         """
-        # For now, fall back to greedy with some additional constraints
-        selected = self._knapsack_greedy(projects, budget_constraint, mandatory_projects)
+        values = np.array([float(p.risk_reduction_total or 0) for p in projects])
+        cents = np.array([int(p.total_budget * 100) for p in projects], dtype=np.int64)
+        task = self._milp_task(projects, budget_constraint, mandatory_projects, constraints, time_limit)
+        result = _solve_projects(values, cents, task)
         
-        # Apply additional constraints if specified
-        if constraints:
-            # Min risk reduction constraint
-            min_risk_reduction = constraints.get("min_risk_reduction")
-            if min_risk_reduction:
-                total_risk_reduction = sum(
-                    p.risk_reduction_total or 0 for p in selected
+        selected = [p for p, chosen in zip(projects, result["selected"]) if chosen]
+        return selected, result
+    
+    def _milp_task(
+        self,
+        projects: List[models.InvestmentProject],
+        budget_constraint: Decimal,
+        mandatory_projects: Optional[List[UUID]],
+        constraints: Optional[Dict[str, Any]],
+        time_limit: float
+    ) -> Dict[str, Any]:
+        """Everything ``_solve_projects`` needs besides values and costs."""
+        constraints = constraints or {}
+        mandatory = set(mandatory_projects or [])
+        rows, lower, upper = self._constraint_rows(projects, constraints)
+        return {
+            "fixed": np.array([p.id in mandatory for p in projects], dtype=bool),
+            "budget_cents": int(Decimal(budget_constraint) * 100),
+            "rows": np.array(rows).reshape(len(rows), len(projects)) if rows else None,
+            "lower": np.array(lower),
+            "upper": np.array(upper),
+            "min_risk_reduction": constraints.get("min_risk_reduction"),
+            "time_limit": time_limit
+        }
+    
+    def _multiple_choice_optimize(
+        self,
+        request: schemas.PortfolioOptimizationRequest
+    ) -> Tuple[List[UUID], float, float, Dict[str, Any]]:
+        """
+        Pick at most one intervention option per asset within the budget.
+        
+        Each option is worth its share of the asset's latest BASE_CASE
+        expected annual risk cost over the time horizon. In this mode
+        mandatory and excluded ids refer to intervention options.
+        """
+        candidates = self._intervention_candidates(request)
+        cents, values = candidates["cents"], candidates["values"]
+        
+        result = solve_multiple_choice(
+            values,
+            cents,
+            candidates["groups"],
+            int(Decimal(request.budget_constraint) * 100),
+            candidates["fixed"],
+            request.time_limit_seconds
+        )
+        chosen = np.flatnonzero(result["selected"])
+        return (
+            [UUID(candidates["ids"][i]) for i in chosen],
+            float(cents[chosen].sum()) / 100,
+            float(values[chosen].sum()),
+            result
+        )
+    
+    def _lagrangian_optimize(
+        self,
+        request: schemas.PortfolioOptimizationRequest
+    ) -> Tuple[List[UUID], float, float, Dict[str, Any]]:
+        """
+        Pick at most one intervention option per asset under several
+        resource limits at once.
+        
+        Options are valued as in MULTIPLE_CHOICE mode. Besides the budget,
+        ``constraints`` may set ``crew_months`` (total
+        implementation_time_months), ``outages_per_substation`` or
+        ``substation_outages`` ({substation_id: limit}) counting the options
+        of ``outage_intervention_types`` (default all) at each substation,
+        ``territory_budgets`` ({service_territory: max spend}),
+        ``category_minimums`` ({asset category: min spend}) and
+        ``min_risk_reduction``. Solved by Lagrangian relaxation; the result
+        carries the dual bound and the shadow price of each binding limit.
+        """
+        constraints = request.constraints or {}
+        candidates = self._intervention_candidates(request, resources=True)
+        cents, values = candidates["cents"], candidates["values"]
+        cost = cents / 100.0
+        n = len(values)
+        
+        names: List[str] = []
+        limits: List[float] = []
+        blocks: List[Tuple[np.ndarray, np.ndarray, np.ndarray]] = []
+        
+        def add_row(name: str, members: np.ndarray, coefficients: np.ndarray, limit: float) -> None:
+            blocks.append((np.full(len(members), len(names)), members, coefficients[members]))
+            names.append(name)
+            limits.append(limit)
+        
+        def add_keyed(prefix: str, keys: np.ndarray, coefficients: np.ndarray, keyed: Dict[str, float]) -> None:
+            # One row per key; options are grouped by key once
+            known = np.flatnonzero(keys != None)
+            labels, codes = np.unique(keys[known].astype(str), return_inverse=True)
+            order = known[np.argsort(codes, kind="stable")]
+            bounds = np.searchsorted(np.sort(codes), np.arange(len(labels) + 1))
+            position = {label: i for i, label in enumerate(labels.tolist())}
+            for key, limit in keyed.items():
+                i = position.get(str(key))
+                members = order[bounds[i]:bounds[i + 1]] if i is not None else np.zeros(0, dtype=np.int64)
+                add_row(f"{prefix}:{key}", members, coefficients, limit)
+        
+        everything = np.arange(n)
+        add_row("budget", everything, cost, float(request.budget_constraint))
+        if constraints.get("crew_months") is not None:
+            add_row("crew_months", everything, candidates["months"], float(constraints["crew_months"]))
+        
+        substations = candidates["substations"]
+        outage_limits = {str(k): float(v) for k, v in (constraints.get("substation_outages") or {}).items()}
+        if constraints.get("outages_per_substation") is not None:
+            default = float(constraints["outages_per_substation"])
+            for key in np.unique(substations[substations != None].astype(str)).tolist():
+                outage_limits.setdefault(key, default)
+        if outage_limits:
+            outage_types = constraints.get("outage_intervention_types")
+            needs_outage = np.ones(n) if outage_types is None else np.isin(
+                candidates["intervention_types"], list(outage_types)
+            ).astype(np.float64)
+            add_keyed("substation", substations, needs_outage, outage_limits)
+        
+        territory_budgets = {str(k): float(v) for k, v in (constraints.get("territory_budgets") or {}).items()}
+        add_keyed("territory", candidates["territories"], cost, territory_budgets)
+        
+        # Minimums enter as negated upper limits
+        minimums = {str(k): -float(v) for k, v in (constraints.get("category_minimums") or {}).items()}
+        add_keyed("category", candidates["categories"], -cost, minimums)
+        if constraints.get("min_risk_reduction"):
+            add_row("min_risk_reduction", everything, -values, -float(constraints["min_risk_reduction"]))
+        
+        row_index, column_index, data = (np.concatenate(parts) for parts in zip(*blocks))
+        rows = sparse.csr_matrix((data, (row_index, column_index)), shape=(len(names), n))
+        
+        result = solve_lagrangian(
+            values,
+            rows,
+            np.array(limits),
+            candidates["groups"],
+            candidates["fixed"],
+            request.time_limit_seconds
+        )
+        result["shadow_prices"] = {
+            name: float(price) for name, price in zip(names, result.pop("multipliers")) if price > 0
+        }
+        chosen = np.flatnonzero(result["selected"])
+        return (
+            [UUID(candidates["ids"][i]) for i in chosen],
+            float(cents[chosen].sum()) / 100,
+            float(values[chosen].sum()),
+            result
+        )
+    
+    def _stochastic_optimize(
+        self,
+        request: schemas.PortfolioOptimizationRequest
+    ) -> Tuple[List[UUID], float, float, Dict[str, Any]]:
+        """
+        Pick at most one intervention option per asset when costs and risk
+        reductions are uncertain.
+        
+        Costs vary by each option's ``cost_uncertainty_percent`` and risk
+        reductions by ``benefit_uncertainty_percent`` in ``constraints``
+        (one figure or one per intervention type, default 20), correlated
+        across options by ``cost_correlation`` and ``benefit_correlation``
+        (default 0.3). The portfolio may overrun the budget with at most
+        ``risk_tolerance`` percent probability (default 5). The objective is
+        the expected risk reduction, or with ``"objective": "CVAR"`` its mean
+        over the worst ``cvar_level`` (default 0.1) of outcomes.
+        
+        Costs are loaded to their level at the overrun quantile, values to
+        their CVaR share, and the result is solved as a multiple-choice
+        knapsack. ``samples`` sampled scenarios then check the chance
+        constraint, and the loaded budget is adjusted by secant steps on
+        the sampled cost quantile until it binds, never below the loaded
+        cost of the mandatory options.
+        """
+        constraints = request.constraints or {}
+        overrun = (
+            float(request.risk_tolerance) / 100
+            if request.risk_tolerance is not None else DEFAULT_OVERRUN_PROBABILITY
+        )
+        if not 0 < overrun < 1:
+            raise ValueError("risk_tolerance is the accepted budget overrun probability in percent, between 0 and 100")
+        cost_correlation = float(constraints.get("cost_correlation", DEFAULT_CORRELATION))
+        benefit_correlation = float(constraints.get("benefit_correlation", DEFAULT_CORRELATION))
+        if not (0 <= cost_correlation <= 1 and 0 <= benefit_correlation <= 1):
+            raise ValueError("Correlations must be between 0 and 1")
+        objective = str(constraints.get("objective", "EXPECTED")).upper()
+        if objective not in ("EXPECTED", "CVAR"):
+            raise ValueError(f"Unsupported objective '{objective}'")
+        level = float(constraints.get("cvar_level", 0.1))
+        if not 0 < level < 1:
+            raise ValueError("cvar_level must be between 0 and 1")
+        n_samples = int(constraints.get("samples", DEFAULT_SAMPLES))
+        if not 100 <= n_samples <= 100_000:
+            raise ValueError("samples must be between 100 and 100000")
+        
+        started = time.time()
+        candidates = self._intervention_candidates(request, uncertainty=True)
+        cents, values, groups, fixed = (
+            candidates["cents"], candidates["values"], candidates["groups"], candidates["fixed"]
+        )
+        
+        benefit = constraints.get("benefit_uncertainty_percent", DEFAULT_BENEFIT_UNCERTAINTY)
+        if isinstance(benefit, dict):
+            benefit = [float(benefit.get(t, DEFAULT_BENEFIT_UNCERTAINTY)) for t in candidates["intervention_types"]]
+        cost_spread = log_spread(candidates["cost_uncertainty"])
+        benefit_spread = log_spread(np.broadcast_to(np.asarray(benefit, dtype=np.float64), values.shape))
+        
+        weights = np.ceil(cents * quantile_loading(cost_spread, cost_correlation, overrun)).astype(np.int64)
+        scores = values
+        if objective == "CVAR":
+            scores = values * lower_tail_loading(benefit_spread, benefit_correlation, level)
+        
+        rng, seed = seeded_rng(constraints.get("seed"))
+        cost_market, cost_weights = tail_draws(n_samples, overrun, rng)
+        cost_noise = rng.standard_normal(n_samples)
+        budget = int(Decimal(request.budget_constraint) * 100)
+        if int(cents[fixed].sum()) > budget:
+            raise ValueError("Mandatory projects exceed the budget constraint")
+        target = budget * (1 - CHANCE_TOLERANCE / 2)
+        floor = int(weights[fixed].sum())
+        capacity = max(budget, floor)
+        tried: List[Tuple[int, float]] = []
+        best: Optional[Tuple[Dict[str, Any], np.ndarray, np.ndarray]] = None
+        
+        for rounds in range(1, MAX_CHANCE_ROUNDS + 1):
+            result = solve_multiple_choice(
+                scores, weights, groups, capacity, fixed,
+                max(request.time_limit_seconds - (time.time() - started), 0.1)
+            )
+            chosen = np.flatnonzero(result["selected"])
+            totals = sample_totals(
+                cents[chosen].astype(np.float64), cost_spread[chosen], cost_market, cost_correlation,
+                cost_noise
+            )
+            quantile = weighted_quantile(totals, cost_weights, 1 - overrun)
+            if quantile <= budget and (best is None or result["objective"] > best[0]["objective"]):
+                best = (result, chosen, totals)
+            if quantile <= 0 or budget * (1 - CHANCE_TOLERANCE) <= quantile <= budget:
+                break
+            
+            # Secant step on the sampled quantile once two budgets were tried
+            tried.append((capacity, quantile))
+            (c0, q0), (c1, q1) = tried[-2:] if len(tried) > 1 else ((0, 0.0), tried[-1])
+            if q1 != q0:
+                capacity = int(c1 + (target - q1) * (c1 - c0) / (q1 - q0))
+            else:
+                capacity = int(c1 * target / q1)
+            if capacity <= floor:
+                if c1 == floor:
+                    break
+                capacity = floor
+        
+        if best is None:
+            if fixed.any() and capacity <= floor:
+                raise ValueError(
+                    f"The mandatory options alone overrun the budget with more than "
+                    f"{100 * overrun:g}% probability"
                 )
-                
-                # If constraint not met, try to add more projects
-                if total_risk_reduction < min_risk_reduction:
-                    remaining = [p for p in projects if p not in selected]
-                    remaining_budget = float(budget_constraint) - sum(
-                        p.total_budget for p in selected
-                    )
-                    
-                    # Sort remaining by risk reduction
-                    remaining.sort(
-                        key=lambda p: p.risk_reduction_total or 0,
-                        reverse=True
-                    )
-                    
-                    for project in remaining:
-                        if float(project.total_budget) <= remaining_budget:
-                            selected.append(project)
-                            remaining_budget -= float(project.total_budget)
-                            
-                            total_risk_reduction += project.risk_reduction_total or 0
-                            if total_risk_reduction >= min_risk_reduction:
-                                break
+            raise ValueError(
+                f"No portfolio stays within the budget with {100 * (1 - overrun):g}% confidence"
+            )
+        result, chosen, totals = best
+        benefit_market, benefit_weights = tail_draws(n_samples, level, rng, upper=False)
+        benefits = sample_totals(
+            values[chosen], benefit_spread[chosen], benefit_market, benefit_correlation,
+            rng.standard_normal(n_samples)
+        )
+        result["risk_metrics"] = {
+            "samples": n_samples,
+            "seed": seed,
+            "rounds": rounds,
+            "overrun_probability": exceedance(totals, cost_weights, budget),
+            "cost_at_confidence": weighted_quantile(totals, cost_weights, 1 - overrun) / 100,
+            "risk_reduction_cvar": tail_mean(benefits, benefit_weights, level)
+        }
+        return (
+            [UUID(candidates["ids"][i]) for i in chosen],
+            float(cents[chosen].sum()) / 100,
+            float(values[chosen].sum()),
+            result
+        )
+    
+    def latest_risk(self) -> Any:
+        """Subquery of each asset's latest BASE_CASE POF and annual risk cost."""
+        latest = self.db.query(
+            models.RiskCalculation.asset_id,
+            func.max(models.RiskCalculation.created_at).label("created_at")
+        ).filter(
+            models.RiskCalculation.scenario_type == "BASE_CASE"
+        ).group_by(models.RiskCalculation.asset_id).subquery()
+        return self.db.query(
+            models.RiskCalculation.asset_id,
+            models.RiskCalculation.annual_failure_probability,
+            models.RiskCalculation.expected_annual_cost
+        ).join(
+            latest,
+            (models.RiskCalculation.asset_id == latest.c.asset_id)
+            & (models.RiskCalculation.created_at == latest.c.created_at)
+        ).filter(models.RiskCalculation.scenario_type == "BASE_CASE").subquery()
+    
+    def _intervention_candidates(
+        self,
+        request: schemas.PortfolioOptimizationRequest,
+        resources: bool = False,
+        uncertainty: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Proposed and approved intervention options as arrays.
         
-        return selected
+        Returns option ids (text), asset group numbers, costs in cents,
+        values and the mandatory mask. With ``resources`` also the
+        implementation months, substation, service territory, asset
+        category and intervention type of every option; with
+        ``uncertainty`` the intervention type and cost uncertainty percent.
+        """
+        risk = self.latest_risk()
+        
+        # Assets numbered in SQL and ids read as text keep UUID parsing to
+        # the selected options only
+        columns = [
+            cast(models.InterventionOption.id, String),
+            func.dense_rank().over(order_by=models.InterventionOption.asset_id),
+            cast(func.round(models.InterventionOption.cost_estimate * 100), BigInteger),
+            cast(
+                func.coalesce(risk.c.expected_annual_cost, 0)
+                * func.coalesce(models.InterventionOption.risk_reduction_percent, 0) / 100,
+                Float
+            )
+        ]
+        numeric = {}
+        labels = {}
+        if resources:
+            numeric["months"] = func.coalesce(models.InterventionOption.implementation_time_months, 0)
+            labels["substations"] = models.AssetLocation.substation_id
+            labels["territories"] = models.AssetLocation.service_territory
+            labels["categories"] = models.AssetType.category
+        if resources or uncertainty:
+            labels["intervention_types"] = models.InterventionOption.intervention_type
+        if uncertainty:
+            numeric["cost_uncertainty"] = cast(
+                func.coalesce(models.InterventionOption.cost_uncertainty_percent, 0), Float
+            )
+        columns += list(numeric.values()) + list(labels.values())
+        query = self.db.query(*columns).outerjoin(
+            risk, risk.c.asset_id == models.InterventionOption.asset_id
+        )
+        if resources:
+            query = query.join(
+                models.Asset, models.Asset.id == models.InterventionOption.asset_id
+            ).join(
+                models.AssetType, models.AssetType.id == models.Asset.asset_type_id
+            ).outerjoin(
+                models.AssetLocation, models.AssetLocation.id == models.Asset.location_id
+            )
+        query = query.filter(
+            models.InterventionOption.status.in_(["PROPOSED", "APPROVED"]),
+            models.InterventionOption.cost_estimate.isnot(None)
+        )
+        if request.excluded_projects:
+            query = query.filter(
+                ~models.InterventionOption.id.in_(request.excluded_projects)
+            )
+        rows = query.all()
+        
+        n = len(rows)
+        ids = [r[0] for r in rows]
+        candidates = {
+            "ids": ids,
+            "groups": np.fromiter(map(itemgetter(1), rows), dtype=np.int64, count=n),
+            "cents": np.fromiter(map(itemgetter(2), rows), dtype=np.int64, count=n),
+            "values": np.fromiter(map(itemgetter(3), rows), dtype=np.float64, count=n) * request.time_horizon_years,
+            "fixed": np.zeros(n, dtype=bool)
+        }
+        if request.mandatory_projects:
+            mandatory = {UUID(str(i)) for i in request.mandatory_projects}
+            candidates["fixed"] = np.fromiter((UUID(i) in mandatory for i in ids), dtype=bool, count=n)
+        for column, key in enumerate(list(numeric) + list(labels), start=4):
+            if key in numeric:
+                candidates[key] = np.fromiter(map(itemgetter(column), rows), dtype=np.float64, count=n)
+            else:
+                candidates[key] = np.array([r[column] for r in rows], dtype=object)
+        return candidates
+    
+    def _constraint_rows(
+        self,
+        projects: List[models.InvestmentProject],
+        constraints: Dict[str, Any]
+    ) -> Tuple[List[np.ndarray], List[float], List[float]]:
+        """
+        Linear constraint rows from a scenario's ``constraints``.
+        
+        Supports ``max_projects`` and ``linear_constraints``, a list of
+        ``{"coefficients": {project_id: value}, "min": .., "max": ..}`` or
+        ``{"project_types": [..], "attribute": "total_budget" |
+        "risk_reduction_total" | "count", "min": .., "max": ..}`` entries.
+        """
+        rows: List[np.ndarray] = []
+        lower: List[float] = []
+        upper: List[float] = []
+        
+        if constraints.get("max_projects") is not None:
+            rows.append(np.ones(len(projects)))
+            lower.append(-np.inf)
+            upper.append(float(constraints["max_projects"]))
+        
+        for spec in constraints.get("linear_constraints") or []:
+            if spec.get("min") is None and spec.get("max") is None:
+                raise ValueError("Linear constraints need a min or a max")
+            
+            if "coefficients" in spec:
+                coefficients = {str(k): float(c) for k, c in spec["coefficients"].items()}
+                row = np.array([coefficients.get(str(p.id), 0.0) for p in projects])
+            else:
+                attribute = spec.get("attribute", "total_budget")
+                if attribute not in ("total_budget", "risk_reduction_total", "count"):
+                    raise ValueError(f"Unsupported constraint attribute '{attribute}'")
+                types = spec.get("project_types")
+                row = np.array([
+                    0.0 if types is not None and p.project_type not in types
+                    else 1.0 if attribute == "count"
+                    else float(getattr(p, attribute) or 0)
+                    for p in projects
+                ])
+            
+            rows.append(row)
+            lower.append(float(spec["min"]) if spec.get("min") is not None else -np.inf)
+            upper.append(float(spec["max"]) if spec.get("max") is not None else np.inf)
+        
+        return rows, lower, upper
     
     def calculate_intervention_priority(
         self,
@@ -238,23 +1217,12 @@ class PortfolioOptimizer:
         if not asset:
             return 0.0
         
-        # Base score from risk reduction
-        risk_reduction = intervention.risk_reduction_percent or 0
-        cost = float(intervention.cost_estimate or 1)
-        
-        risk_score = risk_reduction / cost * 1000  # Normalize
-        
-        # Criticality multiplier
-        criticality_multiplier = asset.criticality or 3
-        
-        # Life extension value
-        life_extension = intervention.life_extension_years or 0
-        life_score = life_extension / 10.0  # Normalize to 0-1
-        
-        # Combined priority score
-        priority = (risk_score * criticality_multiplier + life_score) / 10.0
-        
-        return min(priority, 10.0)  # Cap at 10
+        return float(intervention_priority(
+            [float(intervention.risk_reduction_percent or 0)],
+            [float(intervention.cost_estimate or 0)],
+            [asset.criticality or 0],
+            [float(intervention.life_extension_years or 0)]
+        )[0])
     
     def generate_intervention_options(
         self,
@@ -336,6 +1304,159 @@ class PortfolioOptimizer:
         
         return options
     
+    def generate_fleet_intervention_options(
+        self,
+        request: schemas.InterventionGenerationRequest
+    ) -> Dict[str, Any]:
+        """
+        Generate and store intervention options for many assets at once.
+        
+        The bulk form of ``generate_intervention_options``: replacement
+        cost is computed once per asset type, the latest BASE_CASE risk of
+        every asset is joined in one query, and options, benefit/cost
+        ratios and priority scores (``intervention_priority``) are built
+        as array expressions and bulk-inserted. With ``replace_proposed``
+        the assets' existing PROPOSED options are deleted first, so
+        regenerating does not duplicate them. Options already linked to an
+        investment project are kept, and are not generated again.
+        """
+        start_time = time.time()
+        
+        asset_types = self.replacement_costs_by_type()
+        
+        risk = self.latest_risk()
+        query = self.db.query(
+            models.Asset.id,
+            models.Asset.name,
+            models.Asset.asset_type_id,
+            models.Asset.criticality,
+            risk.c.asset_id,
+            risk.c.annual_failure_probability,
+            risk.c.expected_annual_cost
+        ).outerjoin(risk, risk.c.asset_id == models.Asset.id)
+        if request.asset_ids:
+            query = query.filter(models.Asset.id.in_(request.asset_ids))
+        if request.categories:
+            query = query.join(
+                models.AssetType, models.AssetType.id == models.Asset.asset_type_id
+            ).filter(models.AssetType.category.in_(request.categories))
+        assets = query.all()
+        
+        replaced = 0
+        kept: Set[Tuple[UUID, str]] = set()
+        if request.replace_proposed and assets:
+            proposed = self.db.query(models.InterventionOption).filter(
+                models.InterventionOption.status == "PROPOSED"
+            )
+            if request.asset_ids or request.categories:
+                proposed = proposed.filter(models.InterventionOption.asset_id.in_([a[0] for a in assets]))
+            linked = models.InterventionOption.id.in_(select(models.ProjectIntervention.intervention_id))
+            kept = set(proposed.filter(linked).with_entities(
+                models.InterventionOption.asset_id,
+                models.InterventionOption.intervention_type
+            ).all())
+            replaced = proposed.filter(~linked).delete(synchronize_session=False)
+        
+        n = len(assets)
+        type_info = [asset_types.get(a[2], ("", DEFAULT_REPLACEMENT_COST, 30)) for a in assets]
+        category = np.array([t[0] for t in type_info], dtype=object)
+        replacement = np.array([t[1] for t in type_info], dtype=np.float64)
+        lifespan = np.array([t[2] for t in type_info], dtype=np.float64)
+        criticality = np.array([a[3] or 0 for a in assets], dtype=np.float64)
+        # Assets without a risk result get the single-asset defaults
+        pof = np.array([0.05 if a[4] is None else float(a[5] or 0) for a in assets])
+        annual_risk = np.array([50000.0 if a[4] is None else float(a[6] or 0) for a in assets])
+        
+        rows: List[Dict[str, Any]] = []
+        by_type: Dict[str, int] = {}
+        for intervention_type, cost_share, reduction, life, benefit_years, categories in INTERVENTION_TEMPLATES:
+            members = (
+                np.arange(n) if categories is None
+                else np.flatnonzero(np.isin(category, categories))
+            )
+            if kept:
+                members = members[np.array(
+                    [(assets[i][0], intervention_type) not in kept for i in members.tolist()], dtype=bool
+                )]
+            if not len(members):
+                continue
+            cost = replacement[members] * cost_share
+            life_extension = lifespan[members] if life is None else np.full(len(members), life)
+            if benefit_years is None:
+                ratio = np.ones(len(members))
+            else:
+                ratio = np.divide(
+                    annual_risk[members] * benefit_years, cost,
+                    out=np.zeros(len(members)), where=cost > 0
+                )
+            priority = intervention_priority(
+                np.full(len(members), reduction), cost, criticality[members], life_extension
+            )
+            
+            rows.extend(
+                {
+                    "asset_id": assets[i][0],
+                    "intervention_type": intervention_type,
+                    "description": INTERVENTION_DESCRIPTIONS.get(
+                        intervention_type, f"Replace {assets[i][1]} with new equipment"
+                    ),
+                    "cost_estimate": c,
+                    "risk_reduction_percent": reduction,
+                    "failure_probability_reduction": f,
+                    "life_extension_years": e,
+                    "priority_score": p,
+                    "benefit_cost_ratio": r,
+                    "status": "PROPOSED"
+                }
+                for i, c, f, e, p, r in zip(
+                    members.tolist(),
+                    np.round(cost, 2).tolist(),
+                    np.round(pof[members] * reduction / 100, 6).tolist(),
+                    np.round(life_extension, 2).tolist(),
+                    np.round(priority, 4).tolist(),
+                    # Stored with four digits before the point
+                    np.round(np.minimum(ratio, 9999.9999), 4).tolist()
+                )
+            )
+            by_type[intervention_type] = len(members)
+        
+        for i in range(0, len(rows), INSERT_CHUNK_SIZE):
+            self.db.execute(insert(models.InterventionOption.__table__), rows[i:i + INSERT_CHUNK_SIZE])
+        self.db.commit()
+        
+        return {
+            "assets": n,
+            "options_created": len(rows),
+            "options_replaced": replaced,
+            "by_intervention_type": by_type,
+            "execution_time_seconds": time.time() - start_time
+        }
+    
+    def replacement_costs_by_type(self) -> Dict[UUID, Tuple[str, float, int]]:
+        """
+        Category, replacement cost and lifespan of every asset type, as
+        ``_estimate_replacement_cost`` prices them, in one grouped query.
+        """
+        cost_per_type = self.db.query(
+            models.FailureMode.asset_type_id,
+            func.avg(func.coalesce(models.FailureMode.replacement_cost_avg, 0)).label("cost")
+        ).group_by(models.FailureMode.asset_type_id).subquery()
+        type_rows = self.db.query(
+            models.AssetType.id,
+            models.AssetType.category,
+            models.AssetType.typical_lifespan_years,
+            cost_per_type.c.cost
+        ).outerjoin(cost_per_type, cost_per_type.c.asset_type_id == models.AssetType.id).all()
+        return {
+            type_id: (
+                category,
+                float(cost) if cost is not None
+                else DEFAULT_REPLACEMENT_COSTS.get(category, DEFAULT_REPLACEMENT_COST),
+                lifespan or 30
+            )
+            for type_id, category, lifespan, cost in type_rows
+        }
+    
     def _estimate_replacement_cost(self, asset: models.Asset) -> float:
         """Estimate replacement cost for an asset."""
         # Get failure modes for cost reference
@@ -350,19 +1471,10 @@ class PortfolioOptimizer:
             return avg_cost
         
         # Default estimates by category
-        defaults = {
-            "TRANSFORMER": 800000,
-            "BREAKER": 400000,
-            "LINE": 200000,
-            "SWITCH": 50000,
-            "REGULATOR": 150000,
-            "CAPACITOR": 75000,
-            "RECLOSER": 50000,
-            "SECTIONALIZER": 30000
-        }
-        
         asset_type = self.db.query(models.AssetType).filter(
             models.AssetType.id == asset.asset_type_id
         ).first()
         
-        return defaults.get(asset_type.category if asset_type else "", 100000)
+        return DEFAULT_REPLACEMENT_COSTS.get(
+            asset_type.category if asset_type else "", DEFAULT_REPLACEMENT_COST
+        )
@@ -0,0 +1,1070 @@
+"""
+Portfolio Solver
+
+Exact 0-1 selection solvers used by the portfolio optimizer.
+
+``solve_knapsack`` handles the single-budget case with an expanding-core
+dynamic program: items are ordered by value/cost ratio, the greedy break
+solution is the starting state, and items around the break item are added
+to or removed from a Pareto list of (cost, value) states. States whose
+LP-relaxation bound cannot beat the incumbent are discarded, so only the
+few items near the break item are ever enumerated and optimality is proven
+when the list runs empty. Costs are integers (cents), so state costs are
+exact. ``solve_knapsack_frontier`` repeats the search over a range of
+capacities, sharing the sorted items and warm-starting each point from the
+previous optimum. ``IncrementalKnapsack`` keeps the sorted items and the
+last optimum between calls, so a portfolio can be re-solved after a few
+edits without re-reading or re-sorting its candidates.
+
+``solve_binary_program`` covers portfolios with additional linear
+constraints by handing the model to the HiGHS branch-and-bound solver
+shipped with SciPy. ``solve_multiple_choice`` picks at most one option per
+group, and ``solve_lagrangian`` does so under many resource limits at once,
+too many candidates for branch-and-bound, by Lagrangian relaxation.
+
+Both return the selection together with an upper bound on the optimum and
+the relative optimality gap, so a run cut short by its time limit still
+reports how far from optimal it can be.
+"""
+
+from typing import Any, Dict, List, Optional, Tuple
+import time
+
+import numpy as np
+from scipy.optimize import linprog, milp, LinearConstraint, Bounds
+
+
+DEFAULT_TIME_LIMIT = 30.0
+MAX_STATES = 2_000_000
+
+
+def _gap(value: float, bound: float) -> float:
+    if bound <= value:
+        return 0.0
+    return (bound - value) / max(abs(bound), 1e-12)
+
+
+def _result(
+    selected: np.ndarray,
+    value: float,
+    bound: float,
+    status: str,
+    started: float,
+    **extra: Any
+) -> Dict[str, Any]:
+    return {
+        "selected": selected,
+        "objective": float(value),
+        "bound": float(max(bound, value)),
+        "gap": _gap(value, bound),
+        "status": status,
+        "solve_seconds": time.perf_counter() - started,
+        **extra
+    }
+
+
+def _knapsack_core(
+    v: np.ndarray,
+    w: np.ndarray,
+    cum_w: np.ndarray,
+    capacity: int,
+    started: float,
+    time_limit: float,
+    warm: Optional[np.ndarray] = None
+) -> Dict[str, Any]:
+    """
+    Expanding-core search over items already sorted by decreasing ratio.
+    
+    ``cum_w`` is the running total of ``w``. ``warm`` is an optional
+    feasible selection over the sorted items; it is topped up greedily and
+    kept as incumbent when it beats the greedy break solution. Returns the
+    chosen mask with its value, upper bound, status and search statistics.
+    """
+    ratio = v / w
+    m = len(v)
+    b = int(np.searchsorted(cum_w, capacity, side="right"))
+    if b == m:
+        total = float(v.sum())
+        return {"chosen": np.ones(m, dtype=bool), "value": total, "upper": total,
+                "status": "OPTIMAL", "states_explored": 1, "core_size": 0}
+    
+    break_w = int(cum_w[b - 1]) if b > 0 else 0
+    break_v = float(v[:b].sum())
+    
+    # Greedy fill after the break item is the first incumbent
+    def fill(chosen: np.ndarray, room: int, start: int) -> np.ndarray:
+        # Only items fitting the starting room can ever be added
+        for j in (np.flatnonzero(~chosen[start:] & (w[start:] <= room)) + start).tolist():
+            if w[j] <= room:
+                chosen[j] = True
+                room -= int(w[j])
+        return chosen
+    
+    greedy = np.zeros(m, dtype=bool)
+    greedy[:b] = True
+    greedy = fill(greedy, capacity - break_w, b)
+    best_value = float(v[greedy].sum())
+    if warm is not None:
+        warm = fill(warm.copy(), capacity - int(w[warm].sum()), 0)
+        if float(v[warm].sum()) > best_value:
+            greedy, best_value = warm, float(v[warm].sum())
+    best_state: Optional[tuple] = None
+    
+    tol = 1e-9 * max(1.0, abs(best_value))
+    
+    # Reduced-cost fixing: flipping an item away from the break solution
+    # costs at least |v - r w| at the break ratio r, so items costing more
+    # than the LP gap keep their break value in every better solution
+    slack = break_v + (capacity - break_w) * ratio[b] - best_value
+    flippable = np.flatnonzero(np.abs(v - ratio[b] * w) <= slack + tol)
+    n_flip = len(flippable)
+    
+    # Pareto states over the flippable core [s, t]; items before s are in,
+    # after t out
+    state_w = np.array([break_w], dtype=np.int64)
+    state_v = np.array([break_v])
+    origins: List[np.ndarray] = []
+    core_items: List[int] = []
+    s = int(np.searchsorted(flippable, b))
+    t = s - 1
+    explored = 1
+    status = "OPTIMAL"
+    
+    # LP bounds: residual capacity filled at the next item's ratio, excess
+    # weight shed at the ratio of the last item still in
+    def bound(sw: np.ndarray, sv: np.ndarray) -> np.ndarray:
+        add_ratio = ratio[flippable[t + 1]] if t + 1 < n_flip else 0.0
+        drop_ratio = ratio[flippable[s - 1]] if s > 0 else np.inf
+        over = sw - capacity
+        with np.errstate(invalid="ignore"):
+            return np.where(over <= 0, sv - over * add_ratio, sv - over * drop_ratio)
+    
+    while len(state_w) and (s > 0 or t + 1 < n_flip):
+        if time.perf_counter() - started > time_limit or len(state_w) > MAX_STATES:
+            status = "TIME_LIMIT" if len(state_w) <= MAX_STATES else "STATE_LIMIT"
+            break
+        
+        for direction in (1, -1):
+            if direction == 1:
+                if t + 1 >= n_flip:
+                    continue
+                t += 1
+                j = int(flippable[t])
+                moved_w, moved_v = state_w + w[j], state_v + v[j]
+            else:
+                if s == 0:
+                    continue
+                s -= 1
+                j = int(flippable[s])
+                moved_w, moved_v = state_w - w[j], state_v - v[j]
+            
+            all_w = np.concatenate([state_w, moved_w])
+            all_v = np.concatenate([state_v, moved_v])
+            origin = np.concatenate([
+                np.arange(len(state_w), dtype=np.int64) * 2,
+                np.arange(len(state_w), dtype=np.int64) * 2 + 1
+            ])
+            
+            # Keep states not dominated by a cheaper or equally cheap one
+            idx = np.lexsort((-all_v, all_w))
+            all_w, all_v, origin = all_w[idx], all_v[idx], origin[idx]
+            keep = np.ones(len(all_v), dtype=bool)
+            keep[1:] = all_v[1:] > np.maximum.accumulate(all_v)[:-1]
+            all_w, all_v, origin = all_w[keep], all_v[keep], origin[keep]
+            
+            feasible = all_w <= capacity
+            if feasible.any():
+                k = int(np.flatnonzero(feasible)[-1])
+                if all_v[k] > best_value + tol:
+                    best_value = float(all_v[k])
+                    best_state = (len(origins), int(origin[k]))
+            
+            live = bound(all_w, all_v) > best_value + tol
+            state_w, state_v = all_w[live], all_v[live]
+            origins.append(origin[live])
+            core_items.append(j)
+            explored += len(state_w)
+            if not len(state_w):
+                break
+    
+    upper = best_value
+    if status != "OPTIMAL" and len(state_w):
+        upper = max(best_value, float(bound(state_w, state_v).max()))
+    
+    if best_state is None:
+        chosen = greedy
+    else:
+        chosen = np.zeros(m, dtype=bool)
+        chosen[:b] = True
+        step, code = best_state
+        while True:
+            if code & 1:
+                chosen[core_items[step]] = core_items[step] >= b
+            step -= 1
+            if step < 0:
+                break
+            code = int(origins[step][code >> 1])
+    
+    return {"chosen": chosen, "value": best_value, "upper": upper, "status": status,
+            "states_explored": explored, "core_size": len(core_items)}
+
+
+def _knapsack_items(
+    values: np.ndarray,
+    costs: np.ndarray,
+    capacity: int,
+    fixed: Optional[np.ndarray]
+) -> Tuple[np.ndarray, float, int, np.ndarray]:
+    """
+    Split items into those decided up front and the ratio-sorted rest.
+    
+    Returns the decided mask, its value, the capacity left by fixed items
+    and the sorted candidate indices. Raises ValueError when the fixed
+    items alone exceed ``capacity``.
+    """
+    n = len(values)
+    fixed = np.zeros(n, dtype=bool) if fixed is None else np.asarray(fixed, dtype=bool)
+    
+    capacity = int(capacity) - int(costs[fixed].sum())
+    if capacity < 0:
+        raise ValueError("Mandatory projects exceed the budget constraint")
+    
+    # Free items with value are always taken; worthless or oversized ones never
+    free = ~fixed & (costs <= 0) & (values > 0)
+    selected = fixed | free
+    candidates = np.flatnonzero(~selected & (costs > 0) & (values > 0) & (costs <= capacity))
+    order = candidates[np.argsort(-(values[candidates] / costs[candidates]), kind="stable")]
+    return selected, float(values[selected].sum()), capacity, order
+
+
+def solve_knapsack(
+    values: np.ndarray,
+    costs: np.ndarray,
+    capacity: int,
+    fixed: Optional[np.ndarray] = None,
+    time_limit: float = DEFAULT_TIME_LIMIT
+) -> Dict[str, Any]:
+    """
+    Maximize ``values @ x`` subject to ``costs @ x <= capacity``, x binary.
+    
+    ``costs`` and ``capacity`` must be non-negative integers and ``fixed``
+    marks items forced to 1. Returns a boolean ``selected`` mask with
+    objective, bound, gap and status ("OPTIMAL", or "TIME_LIMIT" /
+    "STATE_LIMIT" with the best solution found). Raises ValueError when the
+    fixed items alone exceed the capacity.
+    """
+    started = time.perf_counter()
+    values = np.asarray(values, dtype=np.float64)
+    costs = np.asarray(costs, dtype=np.int64)
+    selected, base_value, capacity, order = _knapsack_items(values, costs, capacity, fixed)
+    
+    if len(order) == 0:
+        return _result(selected, base_value, base_value, "OPTIMAL", started, states_explored=0)
+    
+    w = costs[order]
+    core = _knapsack_core(values[order], w, np.cumsum(w), capacity, started, time_limit)
+    selected[order[core["chosen"]]] = True
+    return _result(
+        selected,
+        base_value + core["value"],
+        base_value + core["upper"],
+        core["status"],
+        started,
+        states_explored=core["states_explored"],
+        core_size=core["core_size"]
+    )
+
+
+def solve_knapsack_frontier(
+    values: np.ndarray,
+    costs: np.ndarray,
+    capacities: np.ndarray,
+    fixed: Optional[np.ndarray] = None,
+    time_limit: float = DEFAULT_TIME_LIMIT
+) -> List[Dict[str, Any]]:
+    """
+    ``solve_knapsack`` for every capacity in ``capacities``.
+    
+    Items are filtered and ratio-sorted once for the largest capacity and
+    the running cost totals are shared by all points. Capacities are solved
+    in ascending order and each optimum seeds the next point's incumbent,
+    since it stays feasible under a larger budget. ``time_limit`` covers
+    the whole sweep. Returns one report per capacity, in the given order.
+    Raises ValueError when the fixed items exceed the smallest capacity.
+    """
+    started = time.perf_counter()
+    values = np.asarray(values, dtype=np.float64)
+    costs = np.asarray(costs, dtype=np.int64)
+    capacities = np.asarray(capacities, dtype=np.int64)
+    n_points = len(capacities)
+    if not n_points:
+        return []
+    
+    ascending = np.argsort(capacities, kind="stable")
+    _knapsack_items(values, costs, capacities[ascending[0]], fixed)
+    selected, base_value, top, order = _knapsack_items(values, costs, capacities[ascending[-1]], fixed)
+    spent = int(capacities[ascending[-1]]) - top
+    v = values[order]
+    w = costs[order]
+    cum_w = np.cumsum(w)
+    
+    reports: List[Optional[Dict[str, Any]]] = [None] * n_points
+    warm: Optional[np.ndarray] = None
+    for point in ascending.tolist():
+        point_started = time.perf_counter()
+        capacity = int(capacities[point]) - spent
+        chosen = selected.copy()
+        if len(order):
+            # Sorted items dearer than this budget cannot be taken
+            usable = w <= capacity
+            if usable.all():
+                core = _knapsack_core(v, w, cum_w, capacity, started, time_limit, warm)
+                picked = core["chosen"]
+            else:
+                sub_w = w[usable]
+                core = _knapsack_core(
+                    v[usable], sub_w, np.cumsum(sub_w), capacity, started, time_limit,
+                    None if warm is None else warm[usable]
+                )
+                picked = np.zeros(len(order), dtype=bool)
+                picked[usable] = core["chosen"]
+            chosen[order[picked]] = True
+            warm = picked
+        else:
+            core = {"value": 0.0, "upper": 0.0, "status": "OPTIMAL", "states_explored": 0, "core_size": 0}
+        
+        reports[point] = _result(
+            chosen,
+            base_value + core["value"],
+            base_value + core["upper"],
+            core["status"],
+            point_started,
+            states_explored=core["states_explored"],
+            core_size=core["core_size"]
+        )
+    return reports
+
+
+class IncrementalKnapsack:
+    """
+    Single-budget knapsack kept between solves.
+    
+    Holds the items in value/cost ratio order together with the last
+    optimum. ``update`` re-positions one changed or new item in the order
+    (a binary search and an array shift, no re-sort), and ``solve`` re-runs
+    the expanding core with the previous optimum as incumbent, trimmed back
+    to the budget if an edit made it infeasible. A close incumbent leaves
+    only a few items within the reduced-cost slack, so small edits re-solve
+    in milliseconds.
+    """
+    
+    def __init__(
+        self,
+        values: np.ndarray,
+        costs: np.ndarray,
+        fixed: Optional[np.ndarray] = None,
+        available: Optional[np.ndarray] = None
+    ):
+        n = len(values)
+        self.values = np.asarray(values, dtype=np.float64).copy()
+        self.costs = np.asarray(costs, dtype=np.int64).copy()
+        self.fixed = np.zeros(n, dtype=bool) if fixed is None else np.array(fixed, dtype=bool)
+        self.available = np.ones(n, dtype=bool) if available is None else np.array(available, dtype=bool)
+        self.selected = np.zeros(n, dtype=bool)
+        keys = self._keys(self.values, self.costs)
+        self._order = np.argsort(keys, kind="stable")
+        self._sorted_keys = keys[self._order]
+    
+    def __len__(self) -> int:
+        return len(self.values)
+    
+    @staticmethod
+    def _keys(values: np.ndarray, costs: np.ndarray) -> np.ndarray:
+        """Sort keys: negated ratio, free items first."""
+        with np.errstate(divide="ignore", invalid="ignore"):
+            return np.where(costs > 0, -values / np.maximum(costs, 1), -np.inf)
+    
+    def update(
+        self,
+        index: int,
+        value: float,
+        cost: int,
+        available: bool = True,
+        fixed: Optional[bool] = None
+    ) -> int:
+        """
+        Set an item's value, cost and availability; ``index`` equal to the
+        item count appends a new item. Returns the item's index.
+        """
+        n = len(self.values)
+        if index == n:
+            self.values = np.append(self.values, 0.0)
+            self.costs = np.append(self.costs, 0)
+            self.fixed = np.append(self.fixed, False)
+            self.available = np.append(self.available, False)
+            self.selected = np.append(self.selected, False)
+        else:
+            position = int(np.flatnonzero(self._order == index)[0])
+            self._order = np.delete(self._order, position)
+            self._sorted_keys = np.delete(self._sorted_keys, position)
+        
+        self.values[index] = value
+        self.costs[index] = cost
+        self.available[index] = available
+        if fixed is not None:
+            self.fixed[index] = fixed
+        if not available:
+            self.selected[index] = False
+        
+        key = float(self._keys(self.values[index:index + 1], self.costs[index:index + 1])[0])
+        position = int(np.searchsorted(self._sorted_keys, key, side="right"))
+        self._order = np.insert(self._order, position, index)
+        self._sorted_keys = np.insert(self._sorted_keys, position, key)
+        return index
+    
+    def set_fixed(self, fixed: np.ndarray) -> None:
+        """Replace the mandatory mask, e.g. when mandatory projects change."""
+        self.fixed = np.array(fixed, dtype=bool)
+    
+    def solve(self, capacity: int, time_limit: float = DEFAULT_TIME_LIMIT) -> Dict[str, Any]:
+        """
+        ``solve_knapsack`` over the available items, warm-started from the
+        previous optimum. The result becomes the incumbent of the next call.
+        """
+        started = time.perf_counter()
+        values, costs = self.values, self.costs
+        fixed = self.fixed & self.available
+        capacity = int(capacity) - int(costs[fixed].sum())
+        if capacity < 0:
+            raise ValueError("Mandatory projects exceed the budget constraint")
+        
+        selected = fixed | (self.available & ~fixed & (costs <= 0) & (values > 0))
+        base_value = float(values[selected].sum())
+        order = self._order
+        order = order[
+            self.available[order] & ~fixed[order] & (costs[order] > 0)
+            & (values[order] > 0) & (costs[order] <= capacity)
+        ]
+        
+        if len(order):
+            v = values[order]
+            w = costs[order]
+            warm = self.selected[order]
+            # Edits may have pushed the old optimum over budget; shed its
+            # lowest-ratio items until it fits again
+            excess = int(w[warm].sum()) - capacity
+            if excess > 0:
+                picked = np.flatnonzero(warm)[::-1]
+                shed = int(np.searchsorted(np.cumsum(w[picked]), excess))
+                warm[picked[:shed + 1]] = False
+            core = _knapsack_core(v, w, np.cumsum(w), capacity, started, time_limit, warm)
+            selected[order[core["chosen"]]] = True
+        else:
+            core = {"value": 0.0, "upper": 0.0, "status": "OPTIMAL", "states_explored": 0, "core_size": 0}
+        
+        self.selected = selected
+        return _result(
+            selected.copy(),
+            base_value + core["value"],
+            base_value + core["upper"],
+            core["status"],
+            started,
+            states_explored=core["states_explored"],
+            core_size=core["core_size"]
+        )
+
+
+def solve_binary_program(
+    values: np.ndarray,
+    rows: np.ndarray,
+    lower: np.ndarray,
+    upper: np.ndarray,
+    fixed: Optional[np.ndarray] = None,
+    time_limit: float = DEFAULT_TIME_LIMIT,
+    gap: float = 1e-6
+) -> Dict[str, Any]:
+    """
+    Maximize ``values @ x`` subject to ``lower <= rows @ x <= upper``.
+    
+    The LP relaxation is solved first. Its rounded-down solution, when
+    feasible, is the incumbent, and reduced costs fix every variable that
+    cannot move without dropping the LP bound below it. Only the remainder
+    goes to branch-and-bound. ``fixed`` marks variables forced to 1. Raises
+    ValueError when the constraints cannot be satisfied or no solution is
+    found in time.
+    """
+    started = time.perf_counter()
+    values = np.asarray(values, dtype=np.float64)
+    n = len(values)
+    lb = np.zeros(n)
+    ub = np.ones(n)
+    if fixed is not None:
+        lb[fixed] = 1
+    
+    has_upper = np.isfinite(upper)
+    has_lower = np.isfinite(lower)
+    lp = linprog(
+        -values,
+        A_ub=np.vstack([rows[has_upper], -rows[has_lower]]),
+        b_ub=np.r_[upper[has_upper], -lower[has_lower]],
+        bounds=np.c_[lb, ub],
+        method="highs"
+    )
+    if lp.status == 2:
+        raise ValueError("No portfolio satisfies the budget and constraints")
+    
+    lp_bound = -float(lp.fun)
+    incumbent = np.floor(lp.x + 1e-9).astype(bool)
+    activity = rows @ incumbent
+    tol = 1e-9 * (1 + np.abs(upper[has_upper]))
+    
+    # Top up the rounded solution, cheapest reduced cost first
+    limit = upper[has_upper] + tol
+    for j in np.argsort(lp.lower.marginals, kind="stable"):
+        if incumbent[j] or values[j] <= 0:
+            continue
+        moved = activity + rows[:, j]
+        if np.all(moved[has_upper] <= limit):
+            incumbent[j] = True
+            activity = moved
+    
+    tol = 1e-9 * (1 + np.abs(activity))
+    if np.all(activity <= upper + tol) and np.all(activity >= lower - tol):
+        value = float(values[incumbent].sum())
+        slack = lp_bound - value
+        if slack <= gap * max(abs(lp_bound), 1e-12):
+            return _result(incumbent, value, lp_bound, "OPTIMAL", started, fixed_by_bound=n, nodes=0)
+        margin = slack * (1 + 1e-9) + 1e-9
+        at_zero = ~incumbent & (lp.lower.marginals > margin)
+        at_one = incumbent & (-lp.upper.marginals > margin)
+        ub[at_zero] = 0
+        lb[at_one] = 1
+    else:
+        incumbent = None
+        value = -np.inf
+    
+    res = milp(
+        -values,
+        constraints=[LinearConstraint(rows, lower, upper)] if len(rows) else None,
+        integrality=np.ones(n),
+        bounds=Bounds(lb, ub),
+        options={"time_limit": max(time_limit - (time.perf_counter() - started), 0.1), "mip_rel_gap": gap}
+    )
+    
+    if res.x is not None and -res.fun >= value:
+        selected = res.x > 0.5
+        value = float(values[selected].sum())
+    elif incumbent is not None:
+        selected = incumbent
+    elif res.status == 2:
+        raise ValueError("No portfolio satisfies the budget and constraints")
+    else:
+        raise ValueError(f"No feasible portfolio found within {time_limit:g}s")
+    
+    # Fixing only cut off solutions no better than the incumbent, so the
+    # restricted problem's bound holds for the full one
+    dual = getattr(res, "mip_dual_bound", None)
+    bound = -float(dual) if dual is not None and np.isfinite(dual) else lp_bound
+    return _result(
+        selected,
+        value,
+        min(bound, lp_bound),
+        "OPTIMAL" if res.status == 0 else "TIME_LIMIT",
+        started,
+        fixed_by_bound=int(np.count_nonzero(lb == ub)),
+        nodes=getattr(res, "mip_node_count", None)
+    )
+
+
+def _group_prefix_max(values: np.ndarray, groups: np.ndarray) -> np.ndarray:
+    """Running maximum of ``values`` before each position within its group run."""
+    scan = values.copy()
+    shift = 1
+    while shift < len(scan):
+        same = groups[shift:] == groups[:-shift]
+        scan[shift:] = np.where(same, np.maximum(scan[shift:], scan[:-shift]), scan[shift:])
+        shift *= 2
+    previous = np.zeros(len(values))
+    continues = groups[1:] == groups[:-1]
+    previous[1:][continues] = scan[:-1][continues]
+    return previous
+
+
+def solve_multiple_choice(
+    values: np.ndarray,
+    costs: np.ndarray,
+    groups: np.ndarray,
+    capacity: int,
+    fixed: Optional[np.ndarray] = None,
+    time_limit: float = DEFAULT_TIME_LIMIT,
+    gap: float = 1e-6
+) -> Dict[str, Any]:
+    """
+    Maximize ``values @ x`` picking at most one item per group within
+    ``costs @ x <= capacity``.
+    
+    Options beaten by a cheaper option of the same group (or by doing
+    nothing) are pruned. The convex hull of each group gives the LP
+    relaxation, whose multiplier fixes every option that cannot beat the
+    greedy incumbent. The few groups left with a real choice are solved
+    by a Pareto-state dynamic program to within the relative ``gap``.
+    ``fixed`` marks options forced in. Returns the same report as
+    ``solve_knapsack``.
+    """
+    started = time.perf_counter()
+    values = np.asarray(values, dtype=np.float64)
+    costs = np.asarray(costs, dtype=np.int64)
+    _, groups = np.unique(np.asarray(groups), return_inverse=True)
+    n = len(values)
+    n_groups = int(groups.max()) + 1 if n else 0
+    fixed = np.zeros(n, dtype=bool) if fixed is None else np.asarray(fixed, dtype=bool)
+    
+    if n and np.bincount(groups[fixed], minlength=n_groups).max(initial=0) > 1:
+        raise ValueError("At most one option per asset can be mandatory")
+    capacity = int(capacity) - int(costs[fixed].sum())
+    if capacity < 0:
+        raise ValueError("Mandatory projects exceed the budget constraint")
+    base_value = float(values[fixed].sum())
+    stats = {"options": n, "pareto_options": 0, "core_groups": 0, "states_explored": 0}
+    
+    # Non-dominated options per group, by ascending cost
+    decided = np.zeros(n_groups, dtype=bool)
+    decided[groups[fixed]] = True
+    cand = np.flatnonzero(~decided[groups] & (values > 0) & (costs >= 0) & (costs <= capacity))
+    cand = cand[np.lexsort((-values[cand], costs[cand], groups[cand]))]
+    cand = cand[values[cand] > _group_prefix_max(values[cand], groups[cand])]
+    stats["pareto_options"] = len(cand)
+    
+    if not len(cand):
+        return _result(fixed.copy(), base_value, base_value, "OPTIMAL", started, **stats)
+    
+    # Upper convex hull from "do nothing": drop points under their neighbours' chord
+    hull = cand
+    while True:
+        g, w, v = groups[hull], costs[hull], values[hull]
+        first = np.r_[True, g[1:] != g[:-1]]
+        dw = np.where(first, w, w - np.r_[0, w[:-1]])
+        dv = np.where(first, v, v - np.r_[0.0, v[:-1]])
+        with np.errstate(divide="ignore", invalid="ignore"):
+            eff = np.where(dw > 0, dv / np.maximum(dw, 1), np.inf)
+        last = np.r_[g[1:] != g[:-1], True]
+        under = ~last & (np.r_[eff[1:], -np.inf] > eff)
+        if not under.any():
+            break
+        hull = hull[~under]
+    
+    # LP relaxation: hull increments by decreasing efficiency
+    order = np.argsort(-eff, kind="stable")
+    inc_opt, inc_group, inc_w, inc_v = hull[order], g[order], dw[order], dv[order]
+    split = int(np.searchsorted(np.cumsum(inc_w), capacity, side="right"))
+    
+    choice = np.full(n_groups, -1, dtype=np.int64)
+    rank = np.full(n_groups, -1, dtype=np.int64)
+    np.maximum.at(rank, inc_group[:split], order[:split])
+    has = rank >= 0
+    choice[has] = hull[rank[has]]
+    
+    def solution(picks: np.ndarray) -> np.ndarray:
+        chosen = fixed.copy()
+        chosen[picks[picks >= 0]] = True
+        return chosen
+    
+    current_w = int(costs[choice[has]].sum())
+    current_v = float(values[choice[has]].sum())
+    if split == len(inc_opt):
+        return _result(solution(choice), base_value + current_v, base_value + current_v, "OPTIMAL", started, **stats)
+    
+    lam = float(eff[order[split]])
+    upper = current_v + lam * (capacity - current_w)
+    
+    # Greedy incumbent: keep taking increments that still fit
+    greedy = choice.copy()
+    best_value = current_v
+    room = capacity - current_w
+    blocked = np.zeros(n_groups, dtype=bool)
+    rest_min = np.minimum.accumulate(inc_w[::-1])[::-1]
+    for k in range(split, len(inc_opt)):
+        if room < rest_min[k]:
+            break
+        gk = inc_group[k]
+        if blocked[gk]:
+            continue
+        if inc_w[k] <= room:
+            greedy[gk] = inc_opt[k]
+            room -= int(inc_w[k])
+            best_value += float(inc_v[k])
+        else:
+            blocked[gk] = True
+    
+    tol = max(gap, 1e-9) * max(1.0, abs(upper))
+    if upper - best_value <= tol:
+        return _result(solution(greedy), base_value + best_value, base_value + upper, "OPTIMAL", started, **stats)
+    
+    # Lagrangian fixing: options whose loss against their group's best
+    # exceeds the duality gap cannot appear in a solution better by the tolerance
+    lag = values[cand] - lam * costs[cand]
+    best_lag = np.zeros(n_groups)
+    np.maximum.at(best_lag, groups[cand], lag)
+    slack = upper - best_value - tol
+    live = cand[best_lag[groups[cand]] - lag <= slack]
+    live_groups = groups[live]
+    null_live = best_lag <= slack
+    n_live = np.bincount(live_groups, minlength=n_groups) + null_live
+    core = np.flatnonzero(n_live >= 2)
+    stats["core_groups"] = len(core)
+    
+    # Closest alternatives first
+    alt_loss = np.where(null_live, best_lag, np.inf)
+    losses = best_lag[live_groups] - (values[live] - lam * costs[live])
+    losses[live == choice[live_groups]] = np.inf
+    np.minimum.at(alt_loss, live_groups, losses)
+    core = core[np.argsort(alt_loss[core], kind="stable")]
+    
+    grouped = np.argsort(live_groups, kind="stable")
+    by_group = live[grouped]
+    starts = np.searchsorted(live_groups[grouped], core)
+    ends = starts + np.bincount(live_groups, minlength=n_groups)[core]
+    
+    state_w = np.array([current_w], dtype=np.int64)
+    state_v = np.array([current_v])
+    origins: List[np.ndarray] = []
+    step_options: List[np.ndarray] = []
+    best_state: Optional[tuple] = None
+    status = "OPTIMAL"
+    
+    for step, gk in enumerate(core.tolist()):
+        if time.perf_counter() - started > time_limit or len(state_w) > MAX_STATES:
+            status = "TIME_LIMIT" if len(state_w) <= MAX_STATES else "STATE_LIMIT"
+            break
+        
+        options = by_group[starts[step]:ends[step]]
+        if null_live[gk]:
+            options = np.r_[options, -1]
+        cur = choice[gk]
+        cur_w = int(costs[cur]) if cur >= 0 else 0
+        cur_v = float(values[cur]) if cur >= 0 else 0.0
+        opt_w = np.where(options >= 0, costs[options], 0) - cur_w
+        opt_v = np.where(options >= 0, values[options], 0.0) - cur_v
+        
+        k = len(options)
+        all_w = (state_w[:, None] + opt_w[None, :]).ravel()
+        all_v = (state_v[:, None] + opt_v[None, :]).ravel()
+        origin = np.arange(len(all_w), dtype=np.int64)
+        
+        idx = np.lexsort((-all_v, all_w))
+        all_w, all_v, origin = all_w[idx], all_v[idx], origin[idx]
+        keep = np.ones(len(all_v), dtype=bool)
+        keep[1:] = all_v[1:] > np.maximum.accumulate(all_v)[:-1]
+        all_w, all_v, origin = all_w[keep], all_v[keep], origin[keep]
+        
+        feasible = all_w <= capacity
+        if feasible.any():
+            j = int(np.flatnonzero(feasible)[-1])
+            if all_v[j] > best_value:
+                best_value = float(all_v[j])
+                best_state = (step, int(origin[j]))
+        
+        alive = all_v + lam * (capacity - all_w) > best_value + tol
+        state_w, state_v = all_w[alive], all_v[alive]
+        origins.append(origin[alive])
+        step_options.append(options)
+        stats["states_explored"] += len(state_w)
+        if not len(state_w):
+            break
+    
+    bound_value = best_value
+    if status != "OPTIMAL" and len(state_w):
+        bound_value = max(best_value, float((state_v + lam * (capacity - state_w)).max()))
+    
+    if best_state is None:
+        picks = greedy
+    else:
+        picks = choice.copy()
+        step, code = best_state
+        while step >= 0:
+            k = len(step_options[step])
+            picks[core[step]] = step_options[step][code % k]
+            step -= 1
+            if step >= 0:
+                code = int(origins[step][code // k])
+    
+    return _result(
+        solution(picks),
+        base_value + best_value,
+        base_value + bound_value,
+        status,
+        started,
+        **stats
+    )
+
+
+def _repair(
+    values: np.ndarray,
+    groups: np.ndarray,
+    col_ptr: List[int],
+    col_rows: List[int],
+    col_coef: List[float],
+    upper: List[float],
+    fixed: np.ndarray,
+    priority: np.ndarray,
+    preferred: np.ndarray,
+    tol: float = 1e-9
+) -> Optional[np.ndarray]:
+    """
+    Feasible selection built greedily around a Lagrangian solution.
+    
+    Options are tried by decreasing ``priority``, ``preferred`` ones (the
+    relaxed solution) first. Rows still under their minimum (negative
+    rows) are filled first from the options that count towards them. An
+    option is added when no row goes over its limit, or replaces its
+    group's current pick when it is worth more and still fits. Returns
+    None when a minimum cannot be met.
+    """
+    n_rows = len(upper)
+    usage = [0.0] * n_rows
+    limit = [u + tol * max(1.0, abs(u)) for u in upper]
+    pick = {}
+    
+    def shift(j: int, sign: float) -> None:
+        for k in range(col_ptr[j], col_ptr[j + 1]):
+            usage[col_rows[k]] += sign * col_coef[k]
+    
+    def fits(j: int, out: int = -1) -> bool:
+        delta = {}
+        for k in range(col_ptr[j], col_ptr[j + 1]):
+            delta[col_rows[k]] = delta.get(col_rows[k], 0.0) + col_coef[k]
+        if out >= 0:
+            for k in range(col_ptr[out], col_ptr[out + 1]):
+                delta[col_rows[k]] = delta.get(col_rows[k], 0.0) - col_coef[k]
+        for r, d in delta.items():
+            if d > 0 and usage[r] + d > max(limit[r], usage[r]):
+                return False
+        return True
+    
+    for j in np.flatnonzero(fixed).tolist():
+        pick[int(groups[j])] = j
+        shift(j, 1.0)
+    
+    def consider(j: int) -> None:
+        g = int(groups[j])
+        current = pick.get(g)
+        if current is None:
+            if fits(j):
+                pick[g] = j
+                shift(j, 1.0)
+        elif current != j and not fixed[current] and values[j] > values[current] and fits(j, current):
+            shift(current, -1.0)
+            pick[g] = j
+            shift(j, 1.0)
+    
+    order = np.lexsort((-priority, ~preferred))
+    order = order[~fixed[order]]
+    
+    # Minimums first, from the options counting towards an unmet one
+    unmet = [r for r in range(n_rows) if usage[r] > limit[r]]
+    if unmet:
+        short = set(unmet)
+        for j in order.tolist():
+            if any(col_rows[k] in short and usage[col_rows[k]] > limit[col_rows[k]]
+                   for k in range(col_ptr[j], col_ptr[j + 1])):
+                consider(j)
+    for j in order[values[order] > 0].tolist():
+        consider(j)
+    
+    if any(usage[r] > limit[r] for r in range(n_rows)):
+        return None
+    selected = np.zeros(len(values), dtype=bool)
+    selected[list(pick.values())] = True
+    return selected
+
+
+def _value_scale(values: np.ndarray, rows: Any, upper: np.ndarray) -> np.ndarray:
+    """
+    Per-row factors expressing each constraint in units of value.
+    
+    A row's factor is the value/usage ratio at which its items, taken by
+    decreasing ratio, would fill it on their own, or the row's average
+    value density when they never do. Scaled rows put all multipliers on
+    a comparable footing, which a subgradient method needs when crew
+    months, outage counts and dollars share one step length.
+    """
+    coo = rows.tocoo()
+    n_rows = rows.shape[0]
+    r, c, a = coo.row, coo.col, coo.data
+    usage = np.where(a > 0, a, 0.0)
+    ratio = np.where(a > 0, values[c] / np.where(a > 0, a, 1.0), 0.0)
+    
+    order = np.lexsort((-ratio, r))
+    r, usage, ratio = r[order], usage[order], ratio[order]
+    cum = np.cumsum(usage)
+    starts = np.searchsorted(r, np.arange(n_rows))
+    before = np.where(starts > 0, cum[np.maximum(starts - 1, 0)], 0.0)
+    over = np.flatnonzero(cum - before[r] > upper[r])
+    
+    scale = np.bincount(coo.row, weights=values[coo.col], minlength=n_rows) / np.maximum(
+        np.bincount(coo.row, weights=np.abs(coo.data), minlength=n_rows), 1e-300
+    )
+    hit, first = np.unique(r[over], return_index=True)
+    scale[hit] = ratio[over[first]]
+    return np.where(scale > 0, scale, 1.0)
+
+
+def solve_lagrangian(
+    values: np.ndarray,
+    rows: Any,
+    upper: np.ndarray,
+    groups: np.ndarray,
+    fixed: Optional[np.ndarray] = None,
+    time_limit: float = DEFAULT_TIME_LIMIT,
+    gap: float = 1e-4,
+    max_iterations: int = 1000,
+    repair_every: Optional[int] = None,
+    alpha: float = 0.2
+) -> Dict[str, Any]:
+    """
+    Maximize ``values @ x`` subject to ``rows @ x <= upper`` with at most
+    one item per group, by Lagrangian relaxation.
+    
+    ``rows`` is a sparse matrix; minimums are passed as negated rows.
+    Relaxing every row leaves one independent choice per group, so each
+    step costs a sparse product and a per-group maximum. Multipliers move
+    along the violation of the exponentially averaged relaxed solution
+    (the volume algorithm), which converges far better than the raw
+    subgradient when many rows bind; Polyak steps aim at the best
+    feasible value and halve after stalling. Every ``repair_every`` steps
+    the relaxed solution is repaired greedily, by reduced value, into a
+    feasible portfolio; by default the interval grows with the problem
+    size, up to 100 steps. Returns the ``solve_knapsack`` report plus the
+    ``multipliers`` of the rows. Raises ValueError when ``fixed`` items
+    break a limit or no feasible selection is found.
+    """
+    started = time.perf_counter()
+    values = np.asarray(values, dtype=np.float64)
+    upper = np.asarray(upper, dtype=np.float64)
+    _, groups = np.unique(np.asarray(groups), return_inverse=True)
+    n = len(values)
+    fixed = np.zeros(n, dtype=bool) if fixed is None else np.asarray(fixed, dtype=bool)
+    n_groups = int(groups.max()) + 1 if n else 0
+    if n and np.bincount(groups[fixed], minlength=n_groups).max(initial=0) > 1:
+        raise ValueError("At most one option per asset can be mandatory")
+    if repair_every is None:
+        repair_every = max(1, min(100, n // 200))
+    
+    scale = _value_scale(values, rows, upper)
+    rows = (rows.tocsr().multiply(scale[:, None])).tocsr()
+    upper = upper * scale
+    columns = rows.tocsc()
+    col_ptr = columns.indptr.tolist()
+    col_rows = columns.indices.tolist()
+    col_coef = columns.data.tolist()
+    transposed = columns.T.tocsr()
+    n_rows = len(upper)
+    
+    fixed_usage = rows @ fixed.astype(np.float64)
+    row_tol = 1e-9 * np.maximum(np.abs(upper), 1.0)
+    if np.any((fixed_usage > upper + row_tol) & (upper >= 0)):
+        raise ValueError("Mandatory projects exceed the budget or a resource limit")
+    
+    decided = np.zeros(n_groups, dtype=bool)
+    decided[groups[fixed]] = True
+    order = np.flatnonzero(~decided[groups])
+    order = order[np.argsort(groups[order], kind="stable")]
+    sorted_groups = groups[order]
+    starts = np.flatnonzero(np.r_[True, sorted_groups[1:] != sorted_groups[:-1]]) if len(order) else np.zeros(0, dtype=np.int64)
+    counts = np.diff(np.r_[starts, len(order)])
+    
+    def relaxed(lam: np.ndarray):
+        reduced = values - transposed @ lam
+        x = fixed.copy()
+        value = float(reduced[fixed].sum())
+        if len(order):
+            red = reduced[order]
+            best = np.maximum.reduceat(red, starts)
+            top = np.flatnonzero(red == np.repeat(best, counts))
+            top = top[np.r_[True, sorted_groups[top[1:]] != sorted_groups[top[:-1]]]]
+            take = best > 0
+            x[order[top[take]]] = True
+            value += float(best[take].sum())
+        return value + float(lam @ upper), x, reduced
+    
+    lam = np.zeros(n_rows)
+    best_lam = lam.copy()
+    best_bound = np.inf
+    best_value = -np.inf
+    incumbent: Optional[np.ndarray] = None
+    average: Optional[np.ndarray] = None
+    theta = 2.0
+    stall = 0
+    restart = False
+    repairs = 0
+    status = "ITERATION_LIMIT"
+    iteration = 0
+    
+    def repair(x: np.ndarray, reduced: np.ndarray) -> None:
+        nonlocal best_value, incumbent, repairs
+        candidate = _repair(values, groups, col_ptr, col_rows, col_coef, upper.tolist(), fixed, reduced, x)
+        repairs += 1
+        if candidate is not None and float(values[candidate].sum()) > best_value:
+            best_value, incumbent = float(values[candidate].sum()), candidate
+    
+    for iteration in range(1, max_iterations + 1):
+        bound, x, reduced = relaxed(lam)
+        if bound < best_bound - 1e-9 * max(1.0, abs(bound)):
+            best_bound, best_lam = bound, lam.copy()
+            stall = 0
+        else:
+            stall += 1
+            if stall >= 40:
+                theta /= 2
+                stall = 0
+                restart = True
+        
+        subgradient = upper - rows @ x.astype(np.float64)
+        if np.all(subgradient >= -row_tol) and float(lam @ subgradient) <= 1e-9 * max(1.0, abs(bound)):
+            # A feasible relaxed solution meeting complementary slackness is optimal
+            best_value, incumbent = float(values[x].sum()), x
+            best_bound = min(best_bound, bound)
+            status = "OPTIMAL"
+            break
+        average = x.astype(np.float64) if average is None else alpha * x + (1 - alpha) * average
+        
+        if incumbent is None or iteration % repair_every == 0:
+            repair(x, reduced)
+        if incumbent is not None and best_bound - best_value <= gap * max(abs(best_bound), 1e-12):
+            status = "OPTIMAL"
+            break
+        if time.perf_counter() - started > time_limit:
+            status = "TIME_LIMIT"
+            break
+        if theta < 1e-6:
+            status = "CONVERGED"
+            break
+        
+        if restart:
+            # Steps that stopped paying off restart from the best multipliers
+            lam, average, restart = best_lam.copy(), None, False
+            continue
+        direction = upper - rows @ average
+        norm = float(direction @ direction)
+        if norm <= 0:
+            continue
+        target = best_value if incumbent is not None else 0.95 * bound
+        step = theta * max(bound - target, 1e-9 * max(1.0, abs(bound))) / norm
+        lam = np.maximum(lam - step * direction, 0.0)
+    
+    if status != "OPTIMAL":
+        _, x, reduced = relaxed(best_lam)
+        repair(x, reduced)
+    
+    if incumbent is None:
+        raise ValueError("No portfolio satisfies the budget and constraints")
+    return _result(
+        incumbent,
+        best_value,
+        best_bound,
+        status,
+        started,
+        iterations=iteration,
+        repairs=repairs,
+        multipliers=best_lam * scale
+    )
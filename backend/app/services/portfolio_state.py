@@ -0,0 +1,167 @@
+"""
+Portfolio State Service
+
+Solver state of exact project portfolios kept between optimization runs.
+
+A scenario optimized with ``MILP`` under the budget alone keeps its
+candidate projects as an ``IncrementalKnapsack``: values and costs in
+value/cost ratio order together with the last optimum. Project writes made
+through the API are recorded with ``project_changed`` and applied to the
+affected states when the scenario is next re-optimized, which then only
+re-positions the edited projects and restarts the search from the previous
+portfolio instead of re-reading and re-sorting every candidate.
+
+Like the risk rollups, a re-optimization compares a cheap signature of the
+scenario's candidate projects (count and totals) with the state and
+rebuilds it from the database when they differ, e.g. after a write by
+another worker process.
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import List, Dict, Optional, Set, Tuple
+from collections import OrderedDict
+from decimal import Decimal
+from uuid import UUID
+import threading
+
+import numpy as np
+
+from app import models
+from app.services.portfolio_solver import IncrementalKnapsack
+
+
+MAX_CACHED_STATES = 64
+CANDIDATE_STATUSES = ("PLANNED", "APPROVED")
+
+# (risk reduction, cost in cents, still a candidate) of an edited project
+ProjectChange = Tuple[float, int, bool]
+
+
+class PortfolioState:
+    """Candidate projects and last optimum of one portfolio scenario."""
+    
+    def __init__(
+        self,
+        scenario_id: UUID,
+        budget_year: int,
+        projects: List[models.InvestmentProject],
+        mandatory: Set[UUID],
+        excluded: Set[UUID],
+        model: IncrementalKnapsack
+    ):
+        self.scenario_id = scenario_id
+        self.budget_year = budget_year
+        self.ids = [p.id for p in projects]
+        self.index = {project_id: i for i, project_id in enumerate(self.ids)}
+        self.mandatory = set(mandatory)
+        self.excluded = set(excluded)
+        self.model = model
+        self.pending: Dict[UUID, ProjectChange] = {}
+        # Held for the whole re-optimization of this scenario
+        self.lock = threading.Lock()
+    
+    def apply(self, changes: Dict[UUID, ProjectChange]) -> None:
+        """Apply recorded project edits to the candidate model."""
+        for project_id, (value, cents, candidate) in changes.items():
+            if project_id in self.excluded:
+                continue
+            i = self.index.get(project_id)
+            if i is None:
+                if not candidate:
+                    continue
+                i = len(self.ids)
+                self.ids.append(project_id)
+                self.index[project_id] = i
+            self.model.update(i, value, cents, candidate, project_id in self.mandatory)
+    
+    def set_mandatory(self, mandatory: Set[UUID]) -> None:
+        self.mandatory = set(mandatory)
+        self.model.set_fixed(np.array([project_id in self.mandatory for project_id in self.ids], dtype=bool))
+    
+    def signature(self) -> Tuple[int, int, Decimal]:
+        """Count, cost in cents and risk reduction of the candidates held."""
+        model = self.model
+        return (
+            int(np.count_nonzero(model.available)),
+            int(model.costs[model.available].sum()),
+            Decimal(str(round(float(model.values[model.available].sum()), 2)))
+        )
+    
+    def selected_ids(self) -> List[UUID]:
+        return [self.ids[i] for i in np.flatnonzero(self.model.selected)]
+
+
+class PortfolioStateStore:
+    """
+    Process-wide portfolio states, least recently used first out.
+    
+    Edits recorded through ``project_changed`` are queued on every state
+    they may affect; ``checkout`` hands a state over with its queue drained.
+    """
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._states: "OrderedDict[UUID, PortfolioState]" = OrderedDict()
+    
+    def put(self, state: PortfolioState) -> None:
+        with self._lock:
+            self._states[state.scenario_id] = state
+            self._states.move_to_end(state.scenario_id)
+            while len(self._states) > MAX_CACHED_STATES:
+                self._states.popitem(last=False)
+    
+    def discard(self, scenario_id: UUID) -> None:
+        with self._lock:
+            self._states.pop(scenario_id, None)
+    
+    def checkout(self, scenario_id: UUID) -> Tuple[Optional[PortfolioState], Dict[UUID, ProjectChange]]:
+        """The scenario's state, if cached, and the edits queued for it."""
+        with self._lock:
+            state = self._states.get(scenario_id)
+            if state is None:
+                return None, {}
+            self._states.move_to_end(scenario_id)
+            changes, state.pending = state.pending, {}
+            return state, changes
+    
+    def project_changed(self, project: models.InvestmentProject) -> None:
+        """Queue a created or updated project for the states it may affect."""
+        value = float(project.risk_reduction_total or 0)
+        cents = int(Decimal(project.total_budget) * 100)
+        with self._lock:
+            for state in self._states.values():
+                if project.budget_year != state.budget_year and project.id not in state.index:
+                    continue
+                candidate = (
+                    project.budget_year == state.budget_year
+                    and project.status in CANDIDATE_STATUSES
+                )
+                state.pending[project.id] = (value, cents, candidate)
+    
+    def read_signature(
+        self,
+        db: Session,
+        budget_year: int,
+        excluded: Set[UUID]
+    ) -> Tuple[int, int, Decimal]:
+        """``PortfolioState.signature`` of the candidates in the database."""
+        query = db.query(
+            func.count(models.InvestmentProject.id),
+            func.coalesce(func.sum(models.InvestmentProject.total_budget), 0),
+            func.coalesce(func.sum(models.InvestmentProject.risk_reduction_total), 0)
+        ).filter(
+            models.InvestmentProject.budget_year == budget_year,
+            models.InvestmentProject.status.in_(CANDIDATE_STATUSES)
+        )
+        if excluded:
+            query = query.filter(~models.InvestmentProject.id.in_(excluded))
+        count, cost, value = query.one()
+        return (
+            int(count),
+            int(Decimal(str(cost)) * 100),
+            Decimal(str(value)).quantize(Decimal("0.01"))
+        )
+
+
+portfolio_states = PortfolioStateStore()
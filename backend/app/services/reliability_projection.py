@@ -0,0 +1,372 @@
+"""
+Reliability Projection Service
+
+Projects expected SAIFI, SAIDI and CAIDI from the data already held:
+
+- annual failure probability per asset (latest risk result, falling back
+  to the failure mode base rates)
+- repair duration from ``FailureMode.outage_hours_avg``
+- customers losing supply from the topology (feeder subtree below the asset)
+- switching restoration: customers that can be back-fed through a switching
+  path or derived restoration path with enough capacity are restored after
+  ``SwitchingPath.switching_time_min`` instead of the repair time
+
+The whole fleet is evaluated as arrays in one pass, per asset, per feeder
+and for the system, optionally with a portfolio of interventions applied.
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import List, Dict, Any, Optional
+from uuid import UUID
+
+import numpy as np
+
+from app import models
+from app.services.network_topology import get_topology
+from app.services.restoration_paths import RestorationPathFinder
+
+
+# Used when a failure mode has no outage duration / a path no switching time
+DEFAULT_OUTAGE_HOURS = 4.0
+DEFAULT_SWITCHING_TIME_MIN = 60.0
+MAX_ANNUAL_POF = 0.5
+
+
+class ReliabilityProjector:
+    """Service for projecting customer reliability indices."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def project(
+        self,
+        scenario_type: str = "BASE_CASE",
+        portfolio_scenario_id: Optional[UUID] = None,
+        intervention_ids: Optional[List[UUID]] = None,
+        feeder_limit: int = 50,
+        asset_limit: int = 50
+    ) -> Dict[str, Any]:
+        """
+        Expected annual SAIFI/SAIDI/CAIDI for the system, each feeder and
+        each asset's contribution.
+        
+        When a portfolio scenario (its selected projects' interventions) or
+        explicit intervention options are given, indices are also projected
+        with those interventions applied and the difference reported.
+        """
+        fleet = self.load_fleet(scenario_type)
+        base = self._indices(fleet, fleet["pof"])
+        
+        applied = None
+        if portfolio_scenario_id is not None or intervention_ids:
+            interventions = self._get_interventions(portfolio_scenario_id, intervention_ids)
+            pof_after = self._apply_interventions(fleet, interventions)
+            applied = self._indices(fleet, pof_after)
+            applied["interventions_applied"] = len(interventions)
+        
+        topology = fleet["topology"]
+        customers = fleet["customers_served"]
+        result = {
+            "scenario_type": scenario_type,
+            "topology_version": topology.version,
+            "customers_served": int(customers),
+            "assets_evaluated": len(fleet["asset_ids"]),
+            "system": self._format_indices(base["ci"].sum(), base["cmi"].sum(), customers)
+        }
+        if applied is not None:
+            result["with_portfolio"] = {
+                **self._format_indices(applied["ci"].sum(), applied["cmi"].sum(), customers),
+                "interventions_applied": applied["interventions_applied"]
+            }
+            result["improvement"] = {
+                key: result["system"][key] - result["with_portfolio"][key]
+                for key in ("saifi", "saidi_minutes", "customer_interruptions",
+                            "customer_minutes_interrupted")
+            }
+        
+        # Feeder indices: interruptions grouped by the feeder of the outage node
+        feeder = fleet["feeder"]
+        heads = fleet["feeder_heads"]
+        slot = np.searchsorted(heads, feeder)
+        on_feeder = feeder >= 0
+        feeder_ci = np.bincount(slot[on_feeder], base["ci"][on_feeder], minlength=len(heads))
+        feeder_cmi = np.bincount(slot[on_feeder], base["cmi"][on_feeder], minlength=len(heads))
+        if applied is not None:
+            feeder_ci_after = np.bincount(slot[on_feeder], applied["ci"][on_feeder], minlength=len(heads))
+            feeder_cmi_after = np.bincount(slot[on_feeder], applied["cmi"][on_feeder], minlength=len(heads))
+        
+        feeders = []
+        for j in np.argsort(-feeder_cmi, kind="stable")[:feeder_limit].tolist():
+            head = int(heads[j])
+            served = float(fleet["subtree_customers"][head])
+            entry = {
+                **topology.node_summary(head),
+                "customers_served": int(served),
+                **self._format_indices(feeder_ci[j], feeder_cmi[j], served)
+            }
+            if applied is not None:
+                entry["with_portfolio"] = self._format_indices(
+                    feeder_ci_after[j], feeder_cmi_after[j], served
+                )
+            feeders.append(entry)
+        result["feeders"] = feeders
+        
+        top_assets = []
+        for i in np.argsort(-base["cmi"], kind="stable")[:asset_limit].tolist():
+            entry = {
+                "asset_id": fleet["asset_ids"][i],
+                "asset_name": fleet["asset_names"][i],
+                "annual_pof": float(fleet["pof"][i]),
+                "customers_interrupted": int(fleet["customers"][i]),
+                "restorable_customers": int(fleet["restorable"][i]),
+                "restoration_minutes": (
+                    None if np.isinf(fleet["switch_minutes"][i])
+                    else float(fleet["switch_minutes"][i])
+                ),
+                "outage_hours": float(fleet["outage_hours"][i]),
+                "saifi_contribution": float(base["ci"][i] / customers) if customers else 0.0,
+                "saidi_contribution_minutes": float(base["cmi"][i] / customers) if customers else 0.0
+            }
+            if applied is not None:
+                entry["annual_pof_with_portfolio"] = float(applied["pof"][i])
+            top_assets.append(entry)
+        result["top_assets"] = top_assets
+        
+        return result
+    
+    def _indices(self, fleet: Dict[str, Any], pof: np.ndarray) -> Dict[str, np.ndarray]:
+        """Expected customer interruptions and customer-minutes per asset."""
+        return {
+            "pof": pof,
+            "ci": pof * fleet["customers"],
+            "cmi": pof * fleet["minutes_per_failure"]
+        }
+    
+    def _format_indices(
+        self,
+        ci: float,
+        cmi: float,
+        customers: float
+    ) -> Dict[str, Any]:
+        saifi = ci / customers if customers else 0.0
+        saidi = cmi / customers if customers else 0.0
+        return {
+            "saifi": float(saifi),
+            "saidi_minutes": float(saidi),
+            "caidi_minutes": float(saidi / saifi) if saifi > 0 else None,
+            "customer_interruptions": float(ci),
+            "customer_minutes_interrupted": float(cmi)
+        }
+    
+    def load_fleet(self, scenario_type: str) -> Dict[str, Any]:
+        """
+        Bulk-load every in-service asset into aligned arrays.
+        
+        Per asset: annual POF from the latest ``scenario_type`` risk (type
+        base rate otherwise), outage hours, customers interrupted and
+        restorable by switching, switching minutes, customer-minutes per
+        failure, outage node and feeder. Also returns the topology the
+        arrays index into; the storm simulation builds on the same fleet.
+        """
+        topology = get_topology(self.db)
+        
+        assets = self.db.query(
+            models.Asset.id, models.Asset.name, models.Asset.asset_type_id
+        ).filter(models.Asset.status == "IN_SERVICE").all()
+        asset_ids = [a[0] for a in assets]
+        
+        # Latest annual POF per asset
+        latest = self.db.query(
+            models.RiskCalculation.asset_id,
+            func.max(models.RiskCalculation.created_at).label("created_at")
+        ).filter(
+            models.RiskCalculation.scenario_type == scenario_type
+        ).group_by(models.RiskCalculation.asset_id).subquery()
+        risk_pof = dict(self.db.query(
+            models.RiskCalculation.asset_id,
+            models.RiskCalculation.annual_failure_probability
+        ).join(
+            latest,
+            (models.RiskCalculation.asset_id == latest.c.asset_id)
+            & (models.RiskCalculation.created_at == latest.c.created_at)
+        ).filter(models.RiskCalculation.scenario_type == scenario_type).all())
+        
+        # Failure mode base rate and rate-weighted outage duration per asset type
+        type_rate: Dict[UUID, float] = {}
+        type_hours: Dict[UUID, List[float]] = {}
+        for type_id, rate, hours in self.db.query(
+            models.FailureMode.asset_type_id,
+            models.FailureMode.failure_rate_base,
+            models.FailureMode.outage_hours_avg
+        ).all():
+            rate = float(rate or 0)
+            type_rate[type_id] = type_rate.get(type_id, 0.0) + rate
+            if hours is not None:
+                weights = type_hours.setdefault(type_id, [0.0, 0.0, 0.0, 0])
+                weights[0] += rate * float(hours)
+                weights[1] += rate
+                weights[2] += float(hours)
+                weights[3] += 1
+        outage_by_type = {
+            type_id: (w[0] / w[1] if w[1] > 0 else w[2] / w[3])
+            for type_id, w in type_hours.items()
+        }
+        
+        pof = np.array([
+            float(risk_pof[a[0]]) if risk_pof.get(a[0]) is not None
+            else type_rate.get(a[2], 0.0)
+            for a in assets
+        ], dtype=np.float64)
+        pof = np.clip(pof, 0.0, MAX_ANNUAL_POF)
+        outage_hours = np.array(
+            [outage_by_type.get(a[2], DEFAULT_OUTAGE_HOURS) for a in assets], dtype=np.float64
+        )
+        
+        # Customers losing supply: feeder subtree below the outage node
+        order, parent, _ = topology.downstream_order()
+        levels = topology.tree_levels(order, parent)
+        subtree_customers, _ = topology._accumulate_subtrees(order, parent)
+        outage_nodes = topology.asset_outage_nodes()
+        node = np.array([outage_nodes.get(a, -1) for a in asset_ids], dtype=np.int64)
+        on_tree = node >= 0
+        safe_node = np.maximum(node, 0)
+        
+        direct_customers = dict(self.db.query(
+            models.CustomerConnection.asset_id,
+            func.sum(models.CustomerConnection.customers_served)
+        ).group_by(models.CustomerConnection.asset_id).all())
+        customers = np.where(
+            on_tree,
+            subtree_customers[safe_node],
+            np.array([float(direct_customers.get(a) or 0) for a in asset_ids])
+        ).astype(np.float64)
+        
+        # Customers below a failed node asset can be back-fed; those at the
+        # node itself (or behind an edge asset, all of them) only if fed around it
+        is_node_asset = np.array([
+            node[i] >= 0 and topology.node_asset_ids[node[i]] == asset_id
+            for i, asset_id in enumerate(asset_ids)
+        ], dtype=bool)
+        restorable = np.where(
+            on_tree,
+            customers - np.where(is_node_asset, topology.node_customers[safe_node], 0),
+            0.0
+        )
+        
+        restore_minutes = self._restoration_minutes(topology)
+        switch_minutes = np.where(on_tree, restore_minutes[safe_node], np.inf)
+        restorable = np.where(np.isinf(switch_minutes), 0.0, restorable)
+        
+        # Customer-minutes per failure: restorable customers wait for switching
+        # (never longer than the repair), the rest for the repair
+        repair_minutes = outage_hours * 60.0
+        minutes_per_failure = (
+            restorable * np.minimum(switch_minutes, repair_minutes)
+            + (customers - restorable) * repair_minutes
+        )
+        
+        # Feeder of each outage node: first node below its supply point
+        n = topology.num_nodes
+        head = np.full(n, -1, dtype=np.int64)
+        for level in levels[1:]:
+            up = parent[level]
+            head[level] = np.where(parent[up] < 0, level, head[up])
+        feeder = np.where(on_tree, head[safe_node], -1)
+        
+        return {
+            "topology": topology,
+            "asset_ids": asset_ids,
+            "asset_names": [a[1] for a in assets],
+            "asset_index": {a: i for i, a in enumerate(asset_ids)},
+            "pof": pof,
+            "outage_hours": outage_hours,
+            "customers": customers,
+            "node": node,
+            "own_customers": np.where(is_node_asset, topology.node_customers[safe_node], 0),
+            "restorable": restorable,
+            "switch_minutes": switch_minutes,
+            "minutes_per_failure": minutes_per_failure,
+            "feeder": feeder,
+            "feeder_heads": np.unique(head[head >= 0]),
+            "subtree_customers": subtree_customers,
+            "customers_served": float(topology.node_customers[topology.node_active].sum())
+        }
+    
+    def _restoration_minutes(self, topology) -> np.ndarray:
+        """
+        Switching time (minutes) to back-feed each node's subtree, or inf when
+        no switching path or derived restoration path has enough capacity.
+        """
+        table = RestorationPathFinder(self.db).get_lookup_table(topology)
+        transfer = table["transfer_mva"]
+        minutes = np.full(topology.num_nodes, np.inf)
+        
+        derived_ok = (table["capacity_mva"] >= transfer[:, None]).any(axis=1)
+        minutes[derived_ok] = DEFAULT_SWITCHING_TIME_MIN
+        
+        if len(topology.switch_ids):
+            source = topology.switch_source
+            capacity = np.where(
+                np.isnan(topology.switch_backup_capacity_mva), np.inf,
+                topology.switch_backup_capacity_mva
+            )
+            time_min = np.where(
+                np.isnan(topology.switch_time_min), DEFAULT_SWITCHING_TIME_MIN,
+                topology.switch_time_min
+            )
+            usable = capacity >= transfer[source]
+            np.minimum.at(minutes, source[usable], time_min[usable])
+        
+        return minutes
+    
+    def _get_interventions(
+        self,
+        portfolio_scenario_id: Optional[UUID],
+        intervention_ids: Optional[List[UUID]]
+    ) -> List[models.InterventionOption]:
+        """Intervention options of a portfolio scenario plus explicit ones."""
+        ids = set(intervention_ids or [])
+        if portfolio_scenario_id is not None:
+            scenario = self.db.query(models.PortfolioScenario).filter(
+                models.PortfolioScenario.id == portfolio_scenario_id
+            ).first()
+            if not scenario:
+                raise ValueError(f"Portfolio scenario {portfolio_scenario_id} not found")
+            if scenario.selected_projects:
+                ids.update(
+                    row[0] for row in self.db.query(
+                        models.ProjectIntervention.intervention_id
+                    ).filter(
+                        models.ProjectIntervention.project_id.in_(scenario.selected_projects)
+                    ).all()
+                )
+        if not ids:
+            return []
+        return self.db.query(models.InterventionOption).filter(
+            models.InterventionOption.id.in_(ids)
+        ).all()
+    
+    def _apply_interventions(
+        self,
+        fleet: Dict[str, Any],
+        interventions: List[models.InterventionOption]
+    ) -> np.ndarray:
+        """
+        Annual POF after interventions. ``failure_probability_reduction`` is
+        an absolute reduction; without it ``risk_reduction_percent`` scales the
+        POF. The largest reduction per asset applies.
+        """
+        pof = fleet["pof"]
+        reduction = np.zeros_like(pof)
+        index = fleet["asset_index"]
+        for option in interventions:
+            i = index.get(option.asset_id)
+            if i is None:
+                continue
+            if option.failure_probability_reduction is not None:
+                amount = float(option.failure_probability_reduction)
+            else:
+                amount = pof[i] * float(option.risk_reduction_percent or 0) / 100.0
+            reduction[i] = max(reduction[i], amount)
+        return np.maximum(pof - reduction, 0.0)
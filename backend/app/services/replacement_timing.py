@@ -0,0 +1,341 @@
+"""
+Replacement Timing Service
+
+Economic replacement year of every asset by minimum equivalent annual cost.
+
+Keeping an asset (the defender) another year costs its expected risk that
+year: annual POF times consequence per failure. The POF trajectory sums the
+failure modes of the asset type, Weibull where modelled and the base rate
+otherwise, capped like the risk calculator. Ageing runs at the Arrhenius
+acceleration factor where the type has an ARRHENIUS model and the asset has
+monitored top-oil temperatures. The consequence per failure is the latest
+BASE_CASE annual risk cost over its POF, or the failure modes' average
+replacement and repair cost without one.
+
+The replacement (the challenger) is a new asset of the same type at the
+replacement cost ``PortfolioOptimizer`` uses. Its own EAC is minimized over
+its service life, and replacing in year ``k`` costs the defender's
+discounted risk up to ``k`` plus the challenger's EAC in perpetuity from
+then on. The EAC curve is that present value annualized; its minimum is the
+optimal year and the cost of delay is the extra present value of replacing
+one year after it.
+
+Every candidate year of every asset is evaluated as one array computation,
+in chunks of assets.
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import date
+from uuid import UUID
+import time
+
+import numpy as np
+
+from app import models, schemas
+from app.config import settings
+from app.services.portfolio_optimizer import DEFAULT_REPLACEMENT_COST, PortfolioOptimizer
+
+
+MAX_ANNUAL_POF = 0.5
+MAX_SERVICE_LIFE = 100
+ASSET_CHUNK = 20000
+BOLTZMANN_EV_PER_K = 8.617333262e-5
+
+
+class ReplacementTimingAnalyzer:
+    """Service for minimum-EAC replacement timing across the fleet."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def analyze(self, request: schemas.ReplacementTimingRequest) -> Dict[str, Any]:
+        """
+        Optimal replacement year, EAC curve and cost of delay per asset.
+        
+        Returns fleet totals, the replacements due in each year of the
+        horizon and the ``limit`` assets with the highest cost of delay,
+        each with its EAC per candidate year.
+        """
+        started = time.perf_counter()
+        start_year = request.start_year or date.today().year
+        horizon = request.time_horizon_years
+        rate = (
+            request.discount_rate if request.discount_rate is not None
+            else settings.DEFAULT_DISCOUNT_RATE
+        )
+        if rate <= 0:
+            raise ValueError("Replacement timing needs a positive discount rate")
+        
+        fleet = self._load_fleet(request, start_year)
+        n = len(fleet["asset_ids"])
+        if not n:
+            raise ValueError("No assets to evaluate")
+        
+        optimal = np.empty(n, dtype=np.int64)
+        optimal_cost = np.empty(n)
+        delay = np.empty(n)
+        immediate = np.empty(n)
+        challenger = np.empty(n)
+        life = np.empty(n, dtype=np.int64)
+        for start in range(0, n, ASSET_CHUNK):
+            chunk = slice(start, start + ASSET_CHUNK)
+            result = self._evaluate(fleet, chunk, horizon, rate)
+            present = result["present_value"]
+            k = np.argmin(present[:, :horizon + 1], axis=1)
+            rows = np.arange(len(k))
+            optimal[chunk] = k
+            optimal_cost[chunk] = rate * present[rows, k]
+            delay[chunk] = present[rows, k + 1] - present[rows, k]
+            immediate[chunk] = present[:, 0] - present[rows, k]
+            challenger[chunk] = result["challenger_eac"]
+            life[chunk] = result["economic_life"]
+        
+        # Still cheapest to wait at the end of the horizon
+        beyond = (optimal == horizon) & (delay < 0)
+        years = []
+        for k in range(horizon + 1):
+            due = (optimal == k) & ~beyond
+            years.append({
+                "year": start_year + k,
+                "assets": int(np.count_nonzero(due)),
+                "replacement_cost": round(float(fleet["replacement_cost"][due].sum()), 2)
+            })
+        
+        top = np.argsort(-delay, kind="stable")[:request.limit]
+        curves = None
+        if request.include_curves:
+            # Re-evaluated for the reported assets only
+            curves = rate * self._evaluate(fleet, top, horizon, rate)["present_value"]
+        assets = [
+            {
+                "asset_id": fleet["asset_ids"][i],
+                "asset_name": fleet["names"][i],
+                "category": fleet["categories"][i],
+                "replacement_cost": round(float(fleet["replacement_cost"][i]), 2),
+                "current_annual_pof": round(float(fleet["current_pof"][i]), 6),
+                "optimal_year": None if beyond[i] else start_year + int(optimal[i]),
+                "optimal_eac": round(float(optimal_cost[i]), 2),
+                "challenger_eac": round(float(challenger[i]), 2),
+                "challenger_economic_life_years": int(life[i]),
+                "cost_of_delay": round(float(delay[i]), 2),
+                "savings_vs_immediate": round(float(immediate[i]), 2),
+                "eac_curve": [
+                    {"year": start_year + k, "eac": round(float(curves[row, k]), 2)}
+                    for k in range(horizon + 1)
+                ] if curves is not None else None
+            }
+            for row, i in enumerate(top.tolist())
+        ]
+        
+        return {
+            "start_year": start_year,
+            "time_horizon_years": horizon,
+            "discount_rate": rate,
+            "assets_evaluated": n,
+            "replace_within_horizon": int(np.count_nonzero(~beyond)),
+            "replace_now": int(np.count_nonzero((optimal == 0) & ~beyond)),
+            "total_cost_of_delay": round(float(np.maximum(delay[~beyond], 0).sum()), 2),
+            "years": years,
+            "assets": assets,
+            "execution_time_seconds": time.perf_counter() - started
+        }
+    
+    def _evaluate(
+        self,
+        fleet: Dict[str, Any],
+        chunk: Any,
+        horizon: int,
+        rate: float
+    ) -> Dict[str, np.ndarray]:
+        """
+        Present value of replacing in each year 0..horizon + 1, with the
+        challenger's EAC and economic life, for the assets selected by
+        ``chunk`` (a slice or index array).
+        """
+        age = fleet["age"][chunk]
+        acceleration = fleet["acceleration"][chunk]
+        type_of = fleet["type_of"][chunk]
+        consequence = fleet["consequence"][chunk]
+        cost = fleet["replacement_cost"][chunk]
+        
+        years = np.arange(max(horizon + 2, MAX_SERVICE_LIFE), dtype=np.float64)
+        discount = (1 + rate) ** -years
+        
+        # Defender risk in years 0..horizon, then its running discounted sum
+        old_pof = self._pof(
+            fleet["modes"], type_of, (age[:, None] + years[None, :horizon + 1]) * acceleration[:, None]
+        )
+        running = np.cumsum(old_pof * consequence[:, None] * discount[None, :horizon + 1], axis=1)
+        defender = np.concatenate([np.zeros((len(age), 1)), running], axis=1)
+        
+        # Challenger EAC for every service life 1..MAX_SERVICE_LIFE
+        new_pof = self._pof(
+            fleet["modes"], type_of, years[None, :MAX_SERVICE_LIFE] * acceleration[:, None]
+        )
+        lives = years[:MAX_SERVICE_LIFE] + 1
+        recovery = rate / (1 - (1 + rate) ** -lives)
+        present = cost[:, None] + np.cumsum(
+            new_pof * consequence[:, None] * discount[None, :MAX_SERVICE_LIFE], axis=1
+        )
+        eac = present * recovery[None, :]
+        best_life = np.argmin(eac, axis=1)
+        challenger = eac[np.arange(len(age)), best_life]
+        
+        # Replace in year k: defender risk before k, challenger forever after
+        return {
+            "present_value": defender + discount[None, :horizon + 2] * (challenger / rate)[:, None],
+            "challenger_eac": challenger,
+            "economic_life": best_life + 1
+        }
+    
+    def _pof(
+        self,
+        modes: List[Tuple[np.ndarray, float, Optional[Tuple[float, float, float]]]],
+        type_of: np.ndarray,
+        ages: np.ndarray
+    ) -> np.ndarray:
+        """Annual POF at ``ages`` (one row per asset), summed over failure modes and capped."""
+        pof = np.zeros_like(ages)
+        for type_index, base_rate, weibull in modes:
+            members = type_of == type_index
+            if not members.any():
+                continue
+            if weibull is None:
+                pof[members] += base_rate
+                continue
+            shape, scale, location = weibull
+            effective = np.maximum(ages[members] - location, 0.0)
+            pof[members] += 1 - np.exp(-(effective / scale) ** shape)
+        return np.minimum(pof, MAX_ANNUAL_POF)
+    
+    def _load_fleet(
+        self,
+        request: schemas.ReplacementTimingRequest,
+        start_year: int
+    ) -> Dict[str, Any]:
+        """Assets with their age, ageing rate, consequence and replacement cost as arrays."""
+        optimizer = PortfolioOptimizer(self.db)
+        asset_types = optimizer.replacement_costs_by_type()
+        risk = optimizer.latest_risk()
+        
+        query = self.db.query(
+            models.Asset.id,
+            models.Asset.name,
+            models.Asset.asset_type_id,
+            models.Asset.install_date,
+            risk.c.annual_failure_probability,
+            risk.c.expected_annual_cost
+        ).outerjoin(risk, risk.c.asset_id == models.Asset.id)
+        if request.asset_ids:
+            query = query.filter(models.Asset.id.in_(request.asset_ids))
+        if request.categories:
+            query = query.join(
+                models.AssetType, models.AssetType.id == models.Asset.asset_type_id
+            ).filter(models.AssetType.category.in_(request.categories))
+        assets = query.all()
+        
+        type_ids = sorted({a[2] for a in assets}, key=str)
+        type_index = {t: i for i, t in enumerate(type_ids)}
+        type_of = np.array([type_index[a[2]] for a in assets], dtype=np.int64)
+        
+        # One Weibull model (or base rate) per failure mode, as in the
+        # risk calculator, plus the type's Arrhenius parameters
+        modes: Dict[UUID, Tuple[int, float, Optional[Tuple[float, float, float]]]] = {}
+        failure_costs: Dict[int, List[float]] = {}
+        arrhenius: Dict[int, Tuple[float, float]] = {}
+        for row in self.db.query(
+            models.FailureMode.asset_type_id,
+            models.FailureMode.id,
+            models.FailureMode.failure_rate_base,
+            models.FailureMode.replacement_cost_avg,
+            models.FailureMode.repair_cost_avg,
+            models.DegradationModel.model_type,
+            models.DegradationModel.weibull_shape,
+            models.DegradationModel.weibull_scale,
+            models.DegradationModel.weibull_location,
+            models.DegradationModel.temp_reference_c,
+            models.DegradationModel.arrhenius_activation_ev
+        ).outerjoin(
+            models.DegradationModel,
+            models.DegradationModel.failure_mode_id == models.FailureMode.id
+        ).filter(
+            models.FailureMode.asset_type_id.in_(type_ids)
+        ).all():
+            t = type_index[row.asset_type_id]
+            if row.model_type == "ARRHENIUS":
+                arrhenius.setdefault(t, (
+                    float(row.temp_reference_c or 110), float(row.arrhenius_activation_ev or 1.1)
+                ))
+            weibull = (
+                (float(row.weibull_shape), float(row.weibull_scale), float(row.weibull_location or 0))
+                if row.model_type == "WEIBULL" and row.weibull_shape and row.weibull_scale else None
+            )
+            if row.id not in modes:
+                failure_costs.setdefault(t, []).append(
+                    float(row.replacement_cost_avg or 0) + float(row.repair_cost_avg or 0)
+                )
+            if modes.get(row.id, (t, 0.0, None))[2] is None:
+                modes[row.id] = (t, float(row.failure_rate_base or 0.01), weibull)
+        
+        temperatures = dict(self.db.query(
+            models.MonitoringData.asset_id,
+            func.avg(models.MonitoringData.temperature_top_oil_c)
+        ).filter(
+            models.MonitoringData.temperature_top_oil_c.isnot(None),
+            models.MonitoringData.asset_id.in_(
+                self.db.query(models.Asset.id).filter(models.Asset.asset_type_id.in_(
+                    [type_ids[t] for t in arrhenius]
+                ))
+            )
+        ).group_by(models.MonitoringData.asset_id).all()) if arrhenius else {}
+        
+        today = date.today()
+        offset = start_year - today.year
+        age = np.array([(today - a[3]).days / 365.25 + offset for a in assets])
+        
+        # Ageing rate relative to the reference temperature; chronological
+        # without temperature data
+        reference = np.full(len(type_ids), np.nan)
+        activation = np.zeros(len(type_ids))
+        for t, (reference_c, activation_ev) in arrhenius.items():
+            reference[t], activation[t] = reference_c, activation_ev
+        temperature = np.array([float(temperatures.get(a[0], np.nan)) for a in assets])
+        acceleration = np.exp(
+            activation[type_of] / BOLTZMANN_EV_PER_K
+            * (1 / (reference[type_of] + 273.15) - 1 / (temperature + 273.15))
+        )
+        acceleration[np.isnan(acceleration)] = 1.0
+        
+        mode_list = [
+            (t, base_rate, weibull) for t, base_rate, weibull in modes.values()
+        ]
+        current_pof = self._pof(mode_list, type_of, (age * acceleration)[:, None])[:, 0]
+        
+        # Consequence per failure from the latest risk, else the failure
+        # modes' average replacement and repair cost
+        fallback = np.array([
+            np.mean(failure_costs[t]) if t in failure_costs else 0.0 for t in range(len(type_ids))
+        ])
+        risk_pof = np.array([float(a[4] or 0) for a in assets])
+        risk_cost = np.array([float(a[5] or 0) for a in assets])
+        consequence = np.where(
+            (risk_pof > 0) & (risk_cost > 0),
+            risk_cost / np.where(risk_pof > 0, risk_pof, 1.0),
+            fallback[type_of]
+        )
+        
+        type_info = [asset_types.get(a[2], ("", DEFAULT_REPLACEMENT_COST, 30)) for a in assets]
+        return {
+            "asset_ids": [a[0] for a in assets],
+            "names": [a[1] for a in assets],
+            "categories": [info[0] for info in type_info],
+            "replacement_cost": np.array([info[1] for info in type_info], dtype=np.float64),
+            "type_of": type_of,
+            "age": age,
+            "acceleration": acceleration,
+            "current_pof": current_pof,
+            "consequence": consequence,
+            "modes": mode_list
+        }
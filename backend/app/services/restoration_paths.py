@@ -0,0 +1,312 @@
+"""
+Restoration Path Service
+
+Derives alternate feeds from normally-open points instead of relying on
+hand-entered switching paths. Nodes whose operational state is ``OPEN``
+(normally-open switches) split the network into feeders; an open point with
+neighbours on two different feeders is a tie through which one feeder can
+pick up load from the other.
+
+For every node the k shortest restoration paths (by ``length_km``) that can
+re-supply its subtree after an upstream fault are precomputed in one
+bottom-up pass over the feeder trees, with the bottleneck emergency capacity
+of each path. The resulting lookup table is cached per topology version.
+"""
+
+from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Tuple
+from uuid import UUID
+import threading
+
+import numpy as np
+
+from app.services.network_topology import NetworkTopology, get_topology, topology_store
+
+
+NORMALLY_OPEN_STATE = "OPEN"
+
+
+_table_lock = threading.Lock()
+_table_cache: Dict[Tuple[str, int, float], Dict[str, np.ndarray]] = {}
+
+
+def _on_topology_change(event: Dict[str, Any]) -> None:
+    """Drop lookup tables as soon as the topology changes."""
+    with _table_lock:
+        _table_cache.clear()
+
+
+topology_store.subscribe(_on_topology_change)
+
+
+class RestorationPathFinder:
+    """Service for deriving restoration (alternate feed) paths."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def find_restoration_paths(
+        self,
+        node_id: UUID,
+        k: int = 3,
+        power_factor: float = 0.95,
+        include_path: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Restoration options for a node, shortest first.
+        
+        Each option restores the node's subtree through one open point from a
+        neighbouring feeder. ``sufficient_capacity`` compares the path's
+        bottleneck emergency headroom (MVA) with the subtree load to transfer.
+        """
+        topology = get_topology(self.db)
+        if node_id not in topology.node_index:
+            raise ValueError(f"Node {node_id} not found")
+        
+        node = topology.node_index[node_id]
+        table = self.get_lookup_table(topology, k, power_factor)
+        options = self.describe_options(topology, table, node, include_path)
+        
+        return {
+            "node_id": node_id,
+            "topology_version": topology.version,
+            "feeder_source": (
+                topology.node_summary(int(table["root"][node]))
+                if table["root"][node] >= 0 else None
+            ),
+            "is_open_point": bool(table["open"][node]),
+            "transfer_load_mva": float(table["transfer_mva"][node]),
+            "restoration_paths": options,
+            "total_paths": len(options)
+        }
+    
+    def describe_options(
+        self,
+        topology: NetworkTopology,
+        table: Dict[str, np.ndarray],
+        node: int,
+        include_path: bool = False
+    ) -> List[Dict[str, Any]]:
+        """Expand the lookup table row for ``node`` into option records."""
+        options = []
+        transfer = float(table["transfer_mva"][node])
+        for slot in range(table["tie"].shape[1]):
+            tie = int(table["tie"][node, slot])
+            if tie < 0:
+                break
+            entry = int(table["entry"][node, slot])
+            backup = int(table["backup"][node, slot])
+            capacity = float(table["capacity_mva"][node, slot])
+            option = {
+                "tie_node_id": topology.node_ids[tie],
+                "tie_node_name": topology.node_names[tie],
+                "entry_node_id": topology.node_ids[entry],
+                "backup_node_id": topology.node_ids[backup],
+                "backup_source": topology.node_summary(int(table["root"][backup])),
+                "path_distance_km": float(table["distance_km"][node, slot]),
+                "backup_capacity_mva": None if np.isinf(capacity) else capacity,
+                "sufficient_capacity": capacity >= transfer
+            }
+            if include_path:
+                option["path_node_ids"] = [
+                    topology.node_ids[i]
+                    for i in self._expand_path(table, node, entry, tie, backup)
+                ]
+            options.append(option)
+        return options
+    
+    def _expand_path(
+        self,
+        table: Dict[str, np.ndarray],
+        node: int,
+        entry: int,
+        tie: int,
+        backup: int
+    ) -> List[int]:
+        """Node sequence from the backup source through the tie to ``node``."""
+        parent = table["parent"]
+        backup_side = [backup]
+        while parent[backup_side[-1]] >= 0:
+            backup_side.append(int(parent[backup_side[-1]]))
+        own_side = [entry]
+        while own_side[-1] != node:
+            own_side.append(int(parent[own_side[-1]]))
+        return backup_side[::-1] + [tie] + own_side
+    
+    def get_lookup_table(
+        self,
+        topology: NetworkTopology,
+        k: int = 3,
+        power_factor: float = 0.95
+    ) -> Dict[str, np.ndarray]:
+        """Return the cached restoration table for this topology version."""
+        key = (topology.version, k, power_factor)
+        with _table_lock:
+            table = _table_cache.get(key)
+        
+        if table is None:
+            table = self._build_lookup_table(topology, k, power_factor)
+            with _table_lock:
+                for stale in [c for c in _table_cache if c[0] != topology.version]:
+                    del _table_cache[stale]
+                _table_cache[key] = table
+        
+        return table
+    
+    def _build_lookup_table(
+        self,
+        topology: NetworkTopology,
+        k: int,
+        power_factor: float
+    ) -> Dict[str, np.ndarray]:
+        """
+        Precompute the k best restoration options for every node.
+        
+        1. Feeder trees are grown from the supply points without passing
+           through open points; each node gets its feeder root, distance to
+           the root and the bottleneck emergency headroom (rating minus
+           normal flow) on that route.
+        2. Each tie seeds options on its own-feeder neighbours (the entry
+           nodes), reaching back to the other feeder's source.
+        3. Options move up the tree level by level, deepest first: an option
+           at a child restores its parent too, extended by the parent edge.
+           The k shortest candidates are kept per node. Restoring node ``v``
+           thus only uses paths entering its subtree, never the faulted
+           upstream edge.
+        """
+        n = topology.num_nodes
+        is_open = np.array(
+            [state == NORMALLY_OPEN_STATE for state in topology.node_states], dtype=bool
+        ) & topology.node_active
+        
+        sources = topology.source_nodes()
+        sources = sources[~is_open[sources]]
+        order, parent, parent_edge = topology.downstream_order(sources.tolist(), blocked=is_open)
+        
+        edge_length = np.nan_to_num(topology.edge_length_km)
+        # Unrated edges do not constrain the transfer
+        edge_emergency = np.where(
+            np.isnan(topology.edge_emergency_rating_mva), np.inf,
+            topology.edge_emergency_rating_mva
+        )
+        
+        levels = topology.tree_levels(order, parent)
+        
+        # Normal-state subtree load and the flow it puts on each parent edge
+        subtree_mva = np.zeros(n)
+        subtree_mva[order] = topology.node_load_mw[order] / power_factor
+        for level in reversed(levels[1:]):
+            np.add.at(subtree_mva, parent[level], subtree_mva[level])
+        
+        root = np.full(n, -1, dtype=np.int64)
+        dist_to_root = np.zeros(n)
+        headroom = np.full(n, np.inf)
+        if levels:
+            root[levels[0]] = levels[0]
+        for level in levels[1:]:
+            edges = parent_edge[level]
+            root[level] = root[parent[level]]
+            dist_to_root[level] = dist_to_root[parent[level]] + edge_length[edges]
+            headroom[level] = np.minimum(
+                headroom[parent[level]], edge_emergency[edges] - subtree_mva[level]
+            )
+        
+        # Seed options at the own-feeder neighbours of every tie
+        offsets, targets, refs = topology.adjacency(directed=False)
+        tie_rows = []
+        for tie in np.flatnonzero(is_open).tolist():
+            start, end = offsets[tie], offsets[tie + 1]
+            neighbours = targets[start:end]
+            neighbour_edges = refs[start:end]
+            fed = root[neighbours] >= 0
+            neighbours, neighbour_edges = neighbours[fed], neighbour_edges[fed]
+            for a, edge_a in zip(neighbours.tolist(), neighbour_edges.tolist()):
+                for b, edge_b in zip(neighbours.tolist(), neighbour_edges.tolist()):
+                    if root[a] == root[b]:
+                        continue
+                    tie_rows.append((
+                        a, tie, a, b,
+                        edge_length[edge_a] + edge_length[edge_b] + dist_to_root[b],
+                        min(edge_emergency[edge_a], edge_emergency[edge_b], headroom[b])
+                    ))
+        
+        best = {
+            "tie": np.full((n, k), -1, dtype=np.int64),
+            "entry": np.full((n, k), -1, dtype=np.int64),
+            "backup": np.full((n, k), -1, dtype=np.int64),
+            "distance_km": np.full((n, k), np.inf),
+            "capacity_mva": np.full((n, k), -np.inf)
+        }
+        if tie_rows:
+            seeds = np.array(tie_rows, dtype=np.float64)
+            self._merge_into(best, seeds[:, 0].astype(np.int64), seeds[:, 1:], k)
+        
+        for level in reversed(levels[1:]):
+            has_option = best["tie"][level, 0] >= 0
+            children = level[has_option]
+            if not len(children):
+                continue
+            edges = parent_edge[children]
+            slots = best["tie"][children] >= 0
+            child_rows, slot_idx = np.nonzero(slots)
+            child = children[child_rows]
+            candidates = np.column_stack([
+                best["tie"][child, slot_idx],
+                best["entry"][child, slot_idx],
+                best["backup"][child, slot_idx],
+                best["distance_km"][child, slot_idx] + edge_length[edges[child_rows]],
+                np.minimum(best["capacity_mva"][child, slot_idx], edge_emergency[edges[child_rows]])
+            ]).astype(np.float64)
+            self._merge_into(best, parent[child], candidates, k)
+        
+        best["root"] = root
+        best["parent"] = parent
+        best["open"] = is_open
+        best["transfer_mva"] = subtree_mva
+        return best
+    
+    def _merge_into(
+        self,
+        best: Dict[str, np.ndarray],
+        owners: np.ndarray,
+        candidates: np.ndarray,
+        k: int
+    ) -> None:
+        """
+        Merge candidate options ``(tie, entry, backup, distance, capacity)``
+        into the k-best table rows of ``owners``, keeping the shortest.
+        """
+        targets = np.unique(owners)
+        slots = best["tie"][targets] >= 0
+        row_idx, slot_idx = np.nonzero(slots)
+        existing_owner = targets[row_idx]
+        existing = np.column_stack([
+            best["tie"][existing_owner, slot_idx],
+            best["entry"][existing_owner, slot_idx],
+            best["backup"][existing_owner, slot_idx],
+            best["distance_km"][existing_owner, slot_idx],
+            best["capacity_mva"][existing_owner, slot_idx]
+        ]).astype(np.float64)
+        
+        all_owners = np.concatenate([existing_owner, owners])
+        rows = np.concatenate([existing.reshape(-1, 5), candidates])
+        order = np.lexsort((rows[:, 3], all_owners))
+        all_owners, rows = all_owners[order], rows[order]
+        
+        # Rank within each owner group and keep the first k
+        group_start = np.flatnonzero(np.r_[True, all_owners[1:] != all_owners[:-1]])
+        group_sizes = np.diff(np.r_[group_start, len(all_owners)])
+        rank = np.arange(len(all_owners)) - np.repeat(group_start, group_sizes)
+        keep = rank < k
+        all_owners, rows, rank = all_owners[keep], rows[keep], rank[keep]
+        
+        best["tie"][targets] = -1
+        best["entry"][targets] = -1
+        best["backup"][targets] = -1
+        best["distance_km"][targets] = np.inf
+        best["capacity_mva"][targets] = -np.inf
+        best["tie"][all_owners, rank] = rows[:, 0].astype(np.int64)
+        best["entry"][all_owners, rank] = rows[:, 1].astype(np.int64)
+        best["backup"][all_owners, rank] = rows[:, 2].astype(np.int64)
+        best["distance_km"][all_owners, rank] = rows[:, 3]
+        best["capacity_mva"][all_owners, rank] = rows[:, 4]
@@ -15,6 +15,7 @@ import math
 
 from app import models
 from app.config import settings
+from app.services.risk_rollup import risk_rollups
 
 
 class RiskCalculator:
@@ -99,6 +100,25 @@ class RiskCalculator:
         ).scalar()
         return float(result) if result else None
     
+    def _get_thermal_stress_years(self, asset_id: UUID) -> float:
+        """
+        Extra insulation aging (years) from the latest thermal overload scan.
+        
+        A chronically overloaded asset aged at its equivalent aging factor
+        during the scanned period, i.e. (factor - 1) * period beyond its
+        chronological age; other assets get no extra aging.
+        """
+        stress = self.db.query(models.ThermalStress).filter(
+            models.ThermalStress.asset_id == asset_id
+        ).order_by(
+            models.ThermalStress.period_end.desc(),
+            models.ThermalStress.created_at.desc()
+        ).first()
+        if not stress or not stress.chronic_overload:
+            return 0.0
+        period_years = (stress.period_end - stress.period_start).total_seconds() / (365.25 * 86400)
+        return max(float(stress.aging_acceleration or 1) - 1.0, 0.0) * period_years
+    
     def calculate_asset_risk(
         self,
         asset_id: UUID,
@@ -123,6 +143,9 @@ class RiskCalculator:
             models.FailureMode.asset_type_id == asset.asset_type_id
         ).all()
         
+        # Chronic overloads found by the thermal overload scan add aging
+        thermal_aging_years = self._get_thermal_stress_years(asset_id)
+        
         # Calculate failure probability for each mode
         total_pof = 0.0
         failure_mode_results = []
@@ -136,7 +159,7 @@ class RiskCalculator:
             
             if deg_model and deg_model.weibull_shape and deg_model.weibull_scale:
                 # Calculate adjusted age
-                adjusted_age = self.calculate_adjusted_age(asset, deg_model)
+                adjusted_age = self.calculate_adjusted_age(asset, deg_model) + thermal_aging_years
                 
                 # Calculate POF using Weibull
                 pof = self.calculate_weibull_pof(
@@ -200,6 +223,7 @@ class RiskCalculator:
             "load_factor": 0.7,
             "ambient_temperature": 20,
             "maintenance_quality": "good",
+            "thermal_aging_years": thermal_aging_years,
             "degradation_model": "WEIBULL_ARRHENIUS",
             "time_horizon_years": time_horizon_years,
             "discount_rate": discount_rate
@@ -223,6 +247,7 @@ class RiskCalculator:
         )
         self.db.add(risk_calc)
         self.db.commit()
+        risk_rollups.record(self.db, risk_calc)
         
         return {
             "asset_id": asset_id,
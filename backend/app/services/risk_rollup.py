@@ -0,0 +1,371 @@
+"""
+Risk Rollup Service
+
+Hierarchical aggregation of per-asset risk results:
+
+- along the network tree: every node holds the totals of its feeder
+  subtree, so feeder and substation rollups are a single array lookup
+- by asset location: totals per ``substation_id`` and ``service_territory``
+
+Rolled-up metrics are expected annual cost, POF-weighted customers at risk
+(annual failure probability x customers losing supply), consequence per
+event and the number of assets with a risk result. The index is built in
+bulk from the latest result per asset and kept current incrementally as new
+risk results are written.
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import List, Dict, Any, Optional, Tuple
+from datetime import datetime
+from uuid import UUID
+import itertools
+import threading
+
+import numpy as np
+
+from app import models
+from app.services.network_topology import NetworkTopology, get_topology, topology_store
+
+
+METRICS = ("expected_annual_cost", "pof_weighted_customers", "consequence", "asset_count")
+LOCATION_LEVELS = ("substation", "territory")
+
+_revisions = itertools.count(1)
+
+
+def _asset_metrics(pof: float, eac: float, customers: int) -> np.ndarray:
+    """Metric vector contributed by one asset's latest risk result."""
+    return np.array([
+        eac,
+        pof * customers,
+        eac / pof if pof > 0 else 0.0,
+        1.0
+    ])
+
+
+def _format_metrics(values: np.ndarray) -> Dict[str, Any]:
+    return {
+        "expected_annual_cost": float(values[0]),
+        "pof_weighted_customers": float(values[1]),
+        "consequence": float(values[2]),
+        "asset_count": int(values[3])
+    }
+
+
+class RiskRollupIndex:
+    """Rollup totals for one scenario on one topology version."""
+    
+    def __init__(
+        self,
+        topology: NetworkTopology,
+        scenario_type: str,
+        parent: np.ndarray,
+        node_totals: np.ndarray,
+        assets: Dict[UUID, Tuple[int, Optional[str], Optional[str], int, np.ndarray]],
+        groups: Dict[str, Dict[str, np.ndarray]],
+        asset_nodes: Dict[UUID, int]
+    ):
+        self.topology_version = topology.version
+        self.scenario_type = scenario_type
+        self.parent = parent
+        self.node_totals = node_totals
+        # asset_id -> (node, substation_id, territory, customers, metrics)
+        self.assets = assets
+        self.groups = groups
+        self.asset_nodes = asset_nodes
+        self.total = sum(
+            (row[4] for row in assets.values()), np.zeros(len(METRICS))
+        )
+        # Changes whenever any total does, so derived views can be cached
+        self.revision = next(_revisions)
+    
+    def apply(
+        self,
+        asset_id: UUID,
+        pof: float,
+        eac: float,
+        location: Optional[Tuple[Optional[str], Optional[str]]],
+        customers: int,
+        node: int
+    ) -> None:
+        """Replace an asset's contribution, updating every rollup it feeds."""
+        previous = self.assets.get(asset_id)
+        if previous is not None:
+            node, substation_id, territory, customers, old = previous
+        else:
+            substation_id, territory = location or (None, None)
+            old = np.zeros(len(METRICS))
+        
+        new = _asset_metrics(pof, eac, customers)
+        delta = new - old
+        self.assets[asset_id] = (node, substation_id, territory, customers, new)
+        self.total += delta
+        self.revision = next(_revisions)
+        
+        # O(depth) walk up the feeder tree
+        while node >= 0:
+            self.node_totals[node] += delta
+            node = int(self.parent[node])
+        
+        for level, key in (("substation", substation_id), ("territory", territory)):
+            if key is not None:
+                group = self.groups[level]
+                group[key] = group.get(key, np.zeros(len(METRICS))) + delta
+
+
+class RiskRollupStore:
+    """
+    Process-wide rollup indexes, one per scenario type.
+    
+    Like TopologyStore, reads compare a cheap signature of the
+    risk_calculations table and rebuild on mismatch. Writes recorded through
+    ``record`` are applied as deltas and advance the expected signature by
+    that one row without querying, so a write made elsewhere in between
+    shows up as a mismatch on the next read.
+    """
+    
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._indexes: Dict[str, RiskRollupIndex] = {}
+        self._signature: Optional[Tuple[int, Optional[datetime]]] = None
+    
+    def invalidate(self, event: Optional[Dict[str, Any]] = None) -> None:
+        with self._lock:
+            self._indexes.clear()
+    
+    def get(self, db: Session, scenario_type: str = "BASE_CASE") -> RiskRollupIndex:
+        """Return the rollup index, rebuilding it if risk results or topology changed."""
+        topology = get_topology(db)
+        signature = self._read_signature(db)
+        with self._lock:
+            if signature != self._signature:
+                self._indexes.clear()
+                self._signature = signature
+            index = self._indexes.get(scenario_type)
+            if index is None or index.topology_version != topology.version:
+                index = self._build(db, topology, scenario_type)
+                self._indexes[scenario_type] = index
+            return index
+    
+    def record(self, db: Session, risk_calc: models.RiskCalculation) -> None:
+        """Apply a newly committed risk result to the cached rollups."""
+        created_at = risk_calc.created_at
+        with self._lock:
+            expected = self._signature
+            if expected is None:
+                return
+            count, latest = expected
+            if latest is None or (created_at is not None and created_at > latest):
+                latest = created_at
+            self._signature = (count + 1, latest)
+            index = self._indexes.get(risk_calc.scenario_type or "BASE_CASE")
+            if index is None:
+                return
+            
+            asset_id = risk_calc.asset_id
+            location = None
+            customers = 0
+            node = -1
+            if asset_id not in index.assets:
+                location, customers, node = self._locate_asset(db, index, asset_id)
+            index.apply(
+                asset_id,
+                float(risk_calc.annual_failure_probability or 0),
+                float(risk_calc.expected_annual_cost or 0),
+                location, customers, node
+            )
+    
+    def _read_signature(self, db: Session) -> Tuple[int, Optional[datetime]]:
+        return tuple(db.query(
+            func.count(models.RiskCalculation.id),
+            func.max(models.RiskCalculation.created_at)
+        ).one())
+    
+    def _locate_asset(
+        self,
+        db: Session,
+        index: RiskRollupIndex,
+        asset_id: UUID
+    ) -> Tuple[Tuple[Optional[str], Optional[str]], int, int]:
+        """Location keys, customers affected and tree node of an asset new to ``index``."""
+        topology = get_topology(db)
+        location = db.query(
+            models.AssetLocation.substation_id,
+            models.AssetLocation.service_territory
+        ).join(
+            models.Asset, models.Asset.location_id == models.AssetLocation.id
+        ).filter(models.Asset.id == asset_id).first()
+        
+        node = index.asset_nodes.get(asset_id, -1)
+        if node >= 0:
+            customers = topology.subtree_total(node)[0]
+        else:
+            customers = int(db.query(
+                func.coalesce(func.sum(models.CustomerConnection.customers_served), 0)
+            ).filter(models.CustomerConnection.asset_id == asset_id).scalar())
+        return (tuple(location) if location else (None, None)), customers, node
+    
+    def _build(
+        self,
+        db: Session,
+        topology: NetworkTopology,
+        scenario_type: str
+    ) -> RiskRollupIndex:
+        """Bulk build from the latest risk result of every asset."""
+        latest = db.query(
+            models.RiskCalculation.asset_id,
+            func.max(models.RiskCalculation.created_at).label("created_at")
+        ).filter(
+            models.RiskCalculation.scenario_type == scenario_type
+        ).group_by(models.RiskCalculation.asset_id).subquery()
+        
+        rows = db.query(
+            models.RiskCalculation.asset_id,
+            models.RiskCalculation.annual_failure_probability,
+            models.RiskCalculation.expected_annual_cost,
+            models.AssetLocation.substation_id,
+            models.AssetLocation.service_territory
+        ).join(
+            latest,
+            (models.RiskCalculation.asset_id == latest.c.asset_id)
+            & (models.RiskCalculation.created_at == latest.c.created_at)
+        ).join(
+            models.Asset, models.Asset.id == models.RiskCalculation.asset_id
+        ).outerjoin(
+            models.AssetLocation, models.AssetLocation.id == models.Asset.location_id
+        ).filter(
+            models.RiskCalculation.scenario_type == scenario_type
+        ).all()
+        
+        direct_customers = dict(db.query(
+            models.CustomerConnection.asset_id,
+            func.sum(models.CustomerConnection.customers_served)
+        ).group_by(models.CustomerConnection.asset_id).all())
+        
+        order, parent, _ = topology.downstream_order()
+        subtree_customers, _ = topology._accumulate_subtrees(order, parent)
+        asset_nodes = topology.asset_outage_nodes()
+        
+        n = topology.num_nodes
+        node_totals = np.zeros((n, len(METRICS)))
+        assets = {}
+        group_keys: Dict[str, List[Optional[str]]] = {level: [] for level in LOCATION_LEVELS}
+        values = []
+        for asset_id, pof, eac, substation_id, territory in rows:
+            if asset_id in assets:
+                continue
+            node = asset_nodes.get(asset_id, -1)
+            customers = (
+                int(subtree_customers[node]) if node >= 0
+                else int(direct_customers.get(asset_id) or 0)
+            )
+            metrics = _asset_metrics(float(pof or 0), float(eac or 0), customers)
+            assets[asset_id] = (node, substation_id, territory, customers, metrics)
+            if node >= 0:
+                node_totals[node] += metrics
+            group_keys["substation"].append(substation_id)
+            group_keys["territory"].append(territory)
+            values.append(metrics)
+        
+        # Subtree sums, one vectorized step per tree level
+        for level in reversed(topology.tree_levels(order, parent)[1:]):
+            np.add.at(node_totals, parent[level], node_totals[level])
+        
+        values = np.array(values).reshape(-1, len(METRICS))
+        groups: Dict[str, Dict[str, np.ndarray]] = {}
+        for level, keys in group_keys.items():
+            present = [i for i, key in enumerate(keys) if key is not None]
+            labels, inverse = np.unique(
+                np.array([keys[i] for i in present], dtype=object), return_inverse=True
+            )
+            sums = np.zeros((len(labels), len(METRICS)))
+            np.add.at(sums, inverse, values[present])
+            groups[level] = {str(label): sums[j] for j, label in enumerate(labels)}
+        
+        return RiskRollupIndex(
+            topology, scenario_type, parent, node_totals, assets, groups, asset_nodes
+        )
+
+
+risk_rollups = RiskRollupStore()
+topology_store.subscribe(risk_rollups.invalidate)
+
+
+class RiskRollupService:
+    """Service for feeder, substation and territory risk rollups."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def get_network_rollup(
+        self,
+        node_id: UUID,
+        scenario_type: str = "BASE_CASE"
+    ) -> Dict[str, Any]:
+        """Risk totals for the feeder subtree below a network node."""
+        topology = get_topology(self.db)
+        if node_id not in topology.node_index:
+            raise ValueError(f"Node {node_id} not found")
+        
+        index = risk_rollups.get(self.db, scenario_type)
+        node = topology.node_index[node_id]
+        return {
+            **topology.node_summary(node),
+            "scenario_type": scenario_type,
+            **_format_metrics(index.node_totals[node])
+        }
+    
+    def get_feeder_rollups(
+        self,
+        scenario_type: str = "BASE_CASE",
+        limit: int = 100
+    ) -> Dict[str, Any]:
+        """
+        Risk totals per feeder, highest expected annual cost first.
+        
+        Feeders are the first nodes below each supply point in the feeder tree.
+        """
+        topology = get_topology(self.db)
+        index = risk_rollups.get(self.db, scenario_type)
+        parent = index.parent
+        heads = np.flatnonzero((parent >= 0) & (parent[np.maximum(parent, 0)] < 0))
+        heads = heads[np.argsort(-index.node_totals[heads, 0], kind="stable")][:limit]
+        
+        return {
+            "scenario_type": scenario_type,
+            "total": _format_metrics(index.total),
+            "feeders": [
+                {
+                    **topology.node_summary(int(i)),
+                    "source_node_id": topology.node_ids[int(parent[i])],
+                    **_format_metrics(index.node_totals[i])
+                }
+                for i in heads
+            ]
+        }
+    
+    def get_location_rollups(
+        self,
+        level: str,
+        key: Optional[str] = None,
+        scenario_type: str = "BASE_CASE",
+        limit: int = 100
+    ) -> Dict[str, Any]:
+        """Risk totals by substation_id or service_territory."""
+        if level not in LOCATION_LEVELS:
+            raise ValueError(f"Unknown rollup level: {level}")
+        
+        group = risk_rollups.get(self.db, scenario_type).groups[level]
+        if key is not None:
+            items = [(key, group[key])] if key in group else []
+        else:
+            items = sorted(group.items(), key=lambda item: -item[1][0])[:limit]
+        
+        return {
+            "level": level,
+            "scenario_type": scenario_type,
+            "rollups": [
+                {"key": k, **_format_metrics(values)} for k, values in items
+            ]
+        }
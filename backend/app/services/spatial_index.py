@@ -0,0 +1,504 @@
+"""
+Spatial Index Service
+
+In-process spatial index over network nodes and asset locations for map
+queries, independent of database spatial extensions.
+
+Points are projected to normalized Web Mercator coordinates and sorted by
+their Z-order (Morton) code. Every grid cell at every level of the quadtree
+is then a contiguous run of the sorted codes, so a bounding box becomes a
+handful of ``searchsorted`` ranges, and clusters for a zoom level are the
+runs of equal code prefixes. Clusters are computed once per zoom level and
+cached with the index, which is rebuilt when the topology or the asset
+tables change.
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import func
+from typing import List, Dict, Any, Optional, Tuple
+from uuid import UUID
+import threading
+
+import numpy as np
+
+from app import models
+from app.services.network_topology import get_topology
+
+
+KINDS = ("node", "asset")
+
+# Bits per axis of the Morton code (2^24 cells is ~2.4 m at the equator)
+CODE_BITS = 24
+# Clusters are cells of 1/8 tile (32 px on 256 px tiles)
+CLUSTER_LEVEL_OFFSET = 3
+MAX_CLUSTER_ZOOM = CODE_BITS - CLUSTER_LEVEL_OFFSET
+# A query box is covered by at most this many cells per axis
+MAX_QUERY_CELLS = 16
+MAX_MERCATOR_LAT = 85.05112878
+EARTH_RADIUS_KM = 6371.0088
+# Smallest first radius of a nearest-neighbour search
+MIN_NEAREST_RADIUS_KM = 0.01
+
+
+def _spread_bits(v: np.ndarray) -> np.ndarray:
+    """Interleave zeros between the low 32 bits of ``v``."""
+    v = v.astype(np.uint64) & np.uint64(0xFFFFFFFF)
+    for shift, mask in (
+        (16, 0x0000FFFF0000FFFF),
+        (8, 0x00FF00FF00FF00FF),
+        (4, 0x0F0F0F0F0F0F0F0F),
+        (2, 0x3333333333333333),
+        (1, 0x5555555555555555)
+    ):
+        v = (v | (v << np.uint64(shift))) & np.uint64(mask)
+    return v
+
+
+def _morton(cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+    return (_spread_bits(cx) | (_spread_bits(cy) << np.uint64(1))).astype(np.int64)
+
+
+def _project(lat: np.ndarray, lon: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Normalized Web Mercator coordinates in [0, 1)."""
+    lat = np.radians(np.clip(lat, -MAX_MERCATOR_LAT, MAX_MERCATOR_LAT))
+    x = (np.asarray(lon, dtype=np.float64) + 180.0) / 360.0
+    y = (1.0 - np.log(np.tan(lat) + 1.0 / np.cos(lat)) / np.pi) / 2.0
+    top = 1.0 - 2.0 ** -CODE_BITS
+    return np.clip(x, 0.0, top), np.clip(y, 0.0, top)
+
+
+def _haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    lat1, lon1, lat2, lon2 = (np.radians(v) for v in (lat1, lon1, lat2, lon2))
+    a = (
+        np.sin((lat2 - lat1) / 2) ** 2
+        + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+class SpatialIndex:
+    """Morton-ordered point index for one kind of map feature."""
+    
+    def __init__(
+        self,
+        kind: str,
+        ids: List[UUID],
+        names: List[str],
+        types: List[Optional[str]],
+        latitude: np.ndarray,
+        longitude: np.ndarray
+    ):
+        located = np.flatnonzero(np.isfinite(latitude) & np.isfinite(longitude))
+        x, y = _project(latitude[located], longitude[located])
+        scale = float(2 ** CODE_BITS)
+        codes = _morton((x * scale).astype(np.int64), (y * scale).astype(np.int64))
+        order = np.argsort(codes, kind="stable")
+        rows = located[order]
+        
+        self.kind = kind
+        self.codes = codes[order]
+        self.x = x[order]
+        self.y = y[order]
+        self.latitude = latitude[rows]
+        self.longitude = longitude[rows]
+        self.ids = [ids[i] for i in rows.tolist()]
+        self.names = [names[i] for i in rows.tolist()]
+        self.types = [types[i] for i in rows.tolist()]
+        # (min_lat, min_lon, max_lat, max_lon) of the located features
+        self.bounds = (
+            (
+                float(self.latitude.min()), float(self.longitude.min()),
+                float(self.latitude.max()), float(self.longitude.max())
+            ) if len(rows) else None
+        )
+        self._clusters: Dict[int, Dict[str, np.ndarray]] = {}
+        self._lock = threading.Lock()
+    
+    def __len__(self) -> int:
+        return len(self.codes)
+    
+    def item(self, i: int) -> Dict[str, Any]:
+        return {
+            "kind": self.kind,
+            "id": self.ids[i],
+            "name": self.names[i],
+            "type": self.types[i],
+            "latitude": float(self.latitude[i]),
+            "longitude": float(self.longitude[i])
+        }
+    
+    def box_candidates(
+        self,
+        codes: np.ndarray,
+        level: int,
+        x0: float,
+        y0: float,
+        x1: float,
+        y1: float
+    ) -> np.ndarray:
+        """
+        Positions in the sorted ``codes`` (Morton codes at ``level``) of the
+        cells overlapping a normalized box.
+        
+        The box is covered by at most ``MAX_QUERY_CELLS`` cells per axis at a
+        coarser level; each covering cell is one contiguous code range.
+        """
+        span = max(x1 - x0, y1 - y0, 2.0 ** -level)
+        cover = int(min(level, max(0, np.floor(np.log2(MAX_QUERY_CELLS / span)))))
+        scale = 2 ** cover
+        cx = np.arange(int(x0 * scale), int(x1 * scale) + 1, dtype=np.int64)
+        cy = np.arange(int(y0 * scale), int(y1 * scale) + 1, dtype=np.int64)
+        cells = np.sort(_morton(np.repeat(cx, len(cy)), np.tile(cy, len(cx))))
+        
+        shift = 2 * (level - cover)
+        lo = np.searchsorted(codes, cells << shift, side="left")
+        hi = np.searchsorted(codes, (cells + 1) << shift, side="left")
+        counts = hi - lo
+        offset = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+        return np.repeat(lo, counts) + offset
+    
+    def query_box(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        """Positions of the points inside a normalized box."""
+        candidates = self.box_candidates(self.codes, CODE_BITS, x0, y0, x1, y1)
+        inside = (
+            (self.x[candidates] >= x0) & (self.x[candidates] <= x1)
+            & (self.y[candidates] >= y0) & (self.y[candidates] <= y1)
+        )
+        return candidates[inside]
+    
+    def clusters(self, zoom: int) -> Dict[str, np.ndarray]:
+        """
+        Clusters for a zoom level: runs of points sharing a cell of
+        1/2^(zoom + 3) of the map, with their size and centroid.
+        """
+        with self._lock:
+            result = self._clusters.get(zoom)
+        if result is not None:
+            return result
+        
+        level = zoom + CLUSTER_LEVEL_OFFSET
+        cell = self.codes >> (2 * (CODE_BITS - level))
+        first = np.ones(len(cell), dtype=bool)
+        first[1:] = cell[1:] != cell[:-1]
+        starts = np.flatnonzero(first)
+        counts = np.diff(np.append(starts, len(cell)))
+        
+        def mean(values: np.ndarray) -> np.ndarray:
+            if not len(starts):
+                return np.empty(0)
+            return np.add.reduceat(values, starts) / counts
+        
+        result = {
+            "codes": cell[starts],
+            "first": starts,
+            "count": counts,
+            "x": mean(self.x),
+            "y": mean(self.y),
+            "latitude": mean(self.latitude),
+            "longitude": mean(self.longitude)
+        }
+        with self._lock:
+            self._clusters[zoom] = result
+        return result
+
+
+class SpatialIndexStore:
+    """
+    Process-wide spatial indexes, one per feature kind.
+    
+    Like RiskRollupStore, reads compare a cheap signature (topology version
+    plus counts and timestamps of the asset tables) and rebuild on mismatch.
+    """
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._indexes: Optional[Dict[str, SpatialIndex]] = None
+        self._signature: Optional[Tuple] = None
+    
+    def get(self, db: Session) -> Dict[str, SpatialIndex]:
+        topology = get_topology(db)
+        signature = (topology.version,) + self._read_signature(db)
+        with self._lock:
+            if self._indexes is not None and signature == self._signature:
+                return self._indexes
+        
+        indexes = {
+            "node": SpatialIndex(
+                "node", topology.node_ids, topology.node_names, topology.node_types,
+                np.where(topology.node_active, topology.node_latitude, np.nan),
+                topology.node_longitude
+            ),
+            "asset": self._build_asset_index(db)
+        }
+        with self._lock:
+            self._indexes = indexes
+            self._signature = signature
+        return indexes
+    
+    def _read_signature(self, db: Session) -> Tuple:
+        assets = db.query(
+            func.count(models.Asset.id),
+            func.max(models.Asset.created_at),
+            func.max(models.Asset.updated_at)
+        ).one()
+        locations = db.query(
+            func.count(models.AssetLocation.id),
+            func.max(models.AssetLocation.created_at)
+        ).one()
+        return tuple(assets) + tuple(locations)
+    
+    def _build_asset_index(self, db: Session) -> SpatialIndex:
+        """Assets are placed at the coordinates of their location."""
+        rows = db.query(
+            models.Asset.id,
+            models.Asset.name,
+            models.AssetType.category,
+            models.AssetLocation.latitude,
+            models.AssetLocation.longitude
+        ).join(
+            models.AssetLocation, models.AssetLocation.id == models.Asset.location_id
+        ).outerjoin(
+            models.AssetType, models.AssetType.id == models.Asset.asset_type_id
+        ).all()
+        return SpatialIndex(
+            "asset",
+            [r[0] for r in rows],
+            [r[1] for r in rows],
+            [r[2] for r in rows],
+            np.array([float(r[3]) if r[3] is not None else np.nan for r in rows], dtype=np.float64),
+            np.array([float(r[4]) if r[4] is not None else np.nan for r in rows], dtype=np.float64)
+        )
+
+
+spatial_indexes = SpatialIndexStore()
+
+
+class SpatialQueryService:
+    """Service for bounding box, radius, nearest and cluster map queries."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def _indexes(self, kinds: Optional[List[str]]) -> List[SpatialIndex]:
+        kinds = kinds or list(KINDS)
+        unknown = [k for k in kinds if k not in KINDS]
+        if unknown:
+            raise ValueError(f"Unknown map feature kind: {unknown[0]}")
+        indexes = spatial_indexes.get(self.db)
+        return [indexes[k] for k in kinds]
+    
+    def _box(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float
+    ) -> Tuple[float, float, float, float]:
+        """Normalized box; Mercator y grows southwards."""
+        x0, y1 = _project(np.array([min_lat]), np.array([min_lon]))
+        x1, y0 = _project(np.array([max_lat]), np.array([max_lon]))
+        return float(x0[0]), float(y0[0]), float(x1[0]), float(y1[0])
+    
+    def _boxes(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float
+    ) -> List[Tuple[float, float, float, float]]:
+        """
+        Normalized boxes covering a latitude/longitude box. A box crossing
+        the antimeridian (``min_lon`` east of ``max_lon``) is split in two.
+        """
+        if min_lat > max_lat:
+            raise ValueError("min_lat must not be greater than max_lat")
+        if min_lon > max_lon:
+            return [
+                self._box(min_lat, min_lon, max_lat, 180.0),
+                self._box(min_lat, -180.0, max_lat, max_lon)
+            ]
+        return [self._box(min_lat, min_lon, max_lat, max_lon)]
+    
+    def query_bbox(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float,
+        kinds: Optional[List[str]] = None,
+        limit: int = 5000
+    ) -> Dict[str, Any]:
+        """
+        Features inside a latitude/longitude box. ``min_lon`` greater than
+        ``max_lon`` selects the box across the antimeridian.
+        """
+        boxes = self._boxes(min_lat, min_lon, max_lat, max_lon)
+        items = []
+        total = 0
+        for index in self._indexes(kinds):
+            hits = np.concatenate([index.query_box(*box) for box in boxes])
+            total += len(hits)
+            items.extend(index.item(i) for i in hits[:max(limit - len(items), 0)].tolist())
+        return {"total": total, "truncated": total > len(items), "items": items}
+    
+    def query_radius(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        kinds: Optional[List[str]] = None,
+        limit: int = 5000
+    ) -> Dict[str, Any]:
+        """Features within ``radius_km`` of a point, nearest first."""
+        found = self._within(latitude, longitude, radius_km, self._indexes(kinds))
+        items = [
+            {**index.item(i), "distance_km": float(d)}
+            for d, index, i in found[:limit]
+        ]
+        return {"total": len(found), "truncated": len(found) > len(items), "items": items}
+    
+    def query_nearest(
+        self,
+        latitude: float,
+        longitude: float,
+        k: int = 10,
+        kinds: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        The ``k`` features nearest to a point.
+        
+        Searches the radius that would hold ``k`` features at the average
+        density over the features' bounding box and doubles it until ``k``
+        features fall inside, so the k nearest are exact.
+        """
+        indexes = self._indexes(kinds)
+        available = sum(len(index) for index in indexes)
+        k = min(k, available)
+        radius = 1.0
+        bounds = [index.bounds for index in indexes if index.bounds is not None]
+        if bounds:
+            min_lat, min_lon = min(b[0] for b in bounds), min(b[1] for b in bounds)
+            max_lat, max_lon = max(b[2] for b in bounds), max(b[3] for b in bounds)
+            km_per_degree = np.radians(EARTH_RADIUS_KM)
+            area = (
+                (max_lat - min_lat) * km_per_degree
+                * (max_lon - min_lon) * km_per_degree * np.cos(np.radians((min_lat + max_lat) / 2))
+            )
+            radius = max(float(np.sqrt(k * area / (np.pi * available))), MIN_NEAREST_RADIUS_KM)
+        found = []
+        while k > 0:
+            found = self._within(latitude, longitude, radius, indexes)
+            if len(found) >= k or radius > np.pi * EARTH_RADIUS_KM:
+                break
+            radius *= 2 if found else 8
+        items = [
+            {**index.item(i), "distance_km": float(d)}
+            for d, index, i in found[:k]
+        ]
+        return {"items": items}
+    
+    def _within(
+        self,
+        latitude: float,
+        longitude: float,
+        radius_km: float,
+        indexes: List[SpatialIndex]
+    ) -> List[Tuple[float, SpatialIndex, int]]:
+        """``(distance, index, position)`` of features within a radius, sorted."""
+        d_lat = np.degrees(radius_km / EARTH_RADIUS_KM)
+        cos_lat = max(np.cos(np.radians(min(abs(latitude) + d_lat, 90.0))), 1e-9)
+        d_lon = np.degrees(radius_km / EARTH_RADIUS_KM) / cos_lat
+        if d_lon >= 180.0:
+            west, east = -180.0, 180.0
+        else:
+            # Wrapped across the antimeridian, west ends up east of east
+            west = longitude - d_lon + (360.0 if longitude - d_lon < -180.0 else 0.0)
+            east = longitude + d_lon - (360.0 if longitude + d_lon > 180.0 else 0.0)
+        boxes = self._boxes(
+            max(latitude - d_lat, -90.0), west, min(latitude + d_lat, 90.0), east
+        )
+        found = []
+        for index in indexes:
+            hits = np.concatenate([index.query_box(*box) for box in boxes])
+            distance = _haversine_km(latitude, longitude, index.latitude[hits], index.longitude[hits])
+            inside = distance <= radius_km
+            found.extend(zip(distance[inside].tolist(), [index] * int(inside.sum()), hits[inside].tolist()))
+        found.sort(key=lambda f: f[0])
+        return found
+    
+    def query_clusters(
+        self,
+        min_lat: float,
+        min_lon: float,
+        max_lat: float,
+        max_lon: float,
+        zoom: int,
+        kinds: Optional[List[str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Server-side clusters for a map view at ``zoom``.
+        
+        Features of all requested kinds sharing a cluster cell are merged;
+        cells holding a single feature are returned as that feature. A view
+        across the antimeridian has ``min_lon`` greater than ``max_lon``.
+        """
+        if not 0 <= zoom <= MAX_CLUSTER_ZOOM:
+            raise ValueError(f"Zoom must be between 0 and {MAX_CLUSTER_ZOOM}")
+        boxes = self._boxes(min_lat, min_lon, max_lat, max_lon)
+        level = zoom + CLUSTER_LEVEL_OFFSET
+        
+        parts = []
+        for index in self._indexes(kinds):
+            clusters = index.clusters(zoom)
+            found = []
+            for box in boxes:
+                hits = index.box_candidates(clusters["codes"], level, *box)
+                x, y = clusters["x"][hits], clusters["y"][hits]
+                found.append(hits[(x >= box[0]) & (x <= box[2]) & (y >= box[1]) & (y <= box[3])])
+            parts.append((index, clusters, np.concatenate(found)))
+        
+        codes = np.concatenate([c["codes"][h] for _, c, h in parts])
+        counts = np.concatenate([c["count"][h] for _, c, h in parts]).astype(np.float64)
+        lat_sum = np.concatenate([c["latitude"][h] * c["count"][h] for _, c, h in parts])
+        lon_sum = np.concatenate([c["longitude"][h] * c["count"][h] for _, c, h in parts])
+        cells, slot = np.unique(codes, return_inverse=True)
+        total = np.bincount(slot, counts, minlength=len(cells))
+        latitude = np.bincount(slot, lat_sum, minlength=len(cells)) / np.maximum(total, 1)
+        longitude = np.bincount(slot, lon_sum, minlength=len(cells)) / np.maximum(total, 1)
+        by_kind = {
+            index.kind: np.bincount(
+                slot[offset:offset + len(h)], c["count"][h], minlength=len(cells)
+            )
+            for (index, c, h), offset in zip(
+                parts, np.cumsum([0] + [len(h) for _, _, h in parts[:-1]])
+            )
+        }
+        
+        # Lone features are returned as themselves
+        singles = {}
+        offset = 0
+        for index, c, h in parts:
+            lone = c["count"][h] == 1
+            for cell, first in zip(slot[offset:offset + len(h)][lone].tolist(), c["first"][h][lone].tolist()):
+                singles[cell] = index.item(first)
+            offset += len(h)
+        
+        clusters = []
+        points = []
+        for j in range(len(cells)):
+            if total[j] == 1 and j in singles:
+                points.append(singles[j])
+                continue
+            clusters.append({
+                "count": int(total[j]),
+                "latitude": float(latitude[j]),
+                "longitude": float(longitude[j]),
+                **{f"{kind}_count": int(values[j]) for kind, values in by_kind.items()}
+            })
+        
+        return {
+            "zoom": zoom,
+            "feature_count": int(total.sum()),
+            "clusters": clusters,
+            "points": points
+        }
@@ -0,0 +1,448 @@
+"""
+Storm Simulation Service
+
+Monte Carlo simulation of weather events that fail many assets at once.
+
+Failures are correlated through a one-factor Gaussian copula per group of
+assets sharing a climate zone and asset category: each trial draws a storm
+severity for every climate zone, and each group's factor mixes the zone
+severity with a group-specific term. Conditional on the factors, assets fail
+independently with probability
+
+    p_i(F) = Phi((Phi^-1(p_i) - sqrt(rho) * F) / sqrt(1 - rho))
+
+so the marginal per-storm probability of each asset stays ``p_i``. Failed
+assets take out their feeder subtree; customers that can be back-fed through
+a switching path or derived restoration path whose backup side is still
+energized are restored after the switching time, the rest wait for repair.
+
+Trials are simulated in chunks, fully vectorized within a chunk, and chunks
+are spread over a process pool.
+"""
+
+from sqlalchemy.orm import Session
+from typing import List, Dict, Any, Optional
+from concurrent.futures import ProcessPoolExecutor
+import os
+
+import numpy as np
+from scipy.special import ndtr, ndtri
+
+from app import models
+from app.services.reliability_projection import (
+    ReliabilityProjector, DEFAULT_SWITCHING_TIME_MIN
+)
+from app.services.restoration_paths import RestorationPathFinder
+
+
+# Per-storm failure probability cap, keeps the sampler away from p = 1
+MAX_EVENT_POF = 0.95
+UNKNOWN_ZONE = "UNKNOWN"
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+# Storm model of the current pool worker, set once by the initializer
+_worker_model: Optional[Dict[str, Any]] = None
+
+
+def _init_worker(model: Dict[str, Any]) -> None:
+    global _worker_model
+    _worker_model = model
+
+
+def _run_chunk(n_trials: int, seed: np.random.SeedSequence) -> Dict[str, np.ndarray]:
+    return simulate_trials(_worker_model, n_trials, seed)
+
+
+def _distinct_positions(
+    rng: np.random.Generator,
+    sizes: np.ndarray,
+    counts: np.ndarray
+) -> np.ndarray:
+    """
+    Uniformly random ``counts[c]`` distinct positions in ``range(sizes[c])``
+    for every cell ``c``, as keys ``c * stride + position``.
+    
+    Draws with replacement and tops up duplicates; with counts at most half
+    the size each top-up round at least halves what is missing.
+    """
+    stride = int(sizes.max()) if len(sizes) else 1
+    done = []
+    pending = np.empty(0, dtype=np.int64)
+    missing = counts
+    cells = np.arange(len(counts), dtype=np.int64)
+    while len(cells):
+        cell = np.repeat(cells, missing)
+        pending = np.sort(np.concatenate([pending, cell * stride + rng.integers(0, sizes[cell])]))
+        fresh = np.ones(len(pending), dtype=bool)
+        fresh[1:] = pending[1:] != pending[:-1]
+        pending = pending[fresh]
+        have = np.bincount(pending // stride, minlength=len(counts))
+        complete = have == counts
+        done.append(pending[complete[pending // stride]])
+        pending = pending[~complete[pending // stride]]
+        cells = cells[~complete[cells]]
+        missing = counts[cells] - have[cells]
+    return np.sort(np.concatenate(done)) if done else pending
+
+
+def _sample_failures(
+    model: Dict[str, Any],
+    n_trials: int,
+    rng: np.random.Generator
+) -> Dict[str, np.ndarray]:
+    """
+    Draw ``(trial, asset)`` pairs of failed assets.
+    
+    Within a group all conditional probabilities are bounded by the group's
+    largest, ``p_max(F)``. Candidates are drawn as a Binomial(n, p_max)
+    count of distinct group members and each is accepted with
+    ``p_i(F) / p_max(F)``, so the work scales with the number of failures
+    rather than trials x assets.
+    """
+    sqrt_rho = np.sqrt(model["rho"])
+    sqrt_idio = np.sqrt(1.0 - model["rho"])
+    kappa = model["kappa"]
+    group_zone = model["group_zone"]
+    group_size = model["group_size"]
+    n_groups = len(group_size)
+    
+    zone_factor = rng.standard_normal((n_trials, model["n_zones"]))
+    factor = (
+        np.sqrt(kappa) * zone_factor[:, group_zone]
+        + np.sqrt(1.0 - kappa) * rng.standard_normal((n_trials, n_groups))
+    )
+    p_max = ndtr((model["group_threshold"] - sqrt_rho * factor) / sqrt_idio)
+    counts = rng.binomial(group_size, p_max).ravel()
+    sizes = np.tile(group_size, n_trials)
+    
+    # Cells where most of the group is drawn pick the members left out instead
+    stride = int(group_size.max()) if n_groups else 1
+    flip = 2 * counts > sizes
+    keys = _distinct_positions(rng, sizes, np.where(flip, sizes - counts, counts))
+    flipped = flip[keys // stride]
+    full_cells = np.flatnonzero(flip)
+    full_sizes = sizes[full_cells]
+    offsets = np.repeat(np.cumsum(full_sizes) - full_sizes, full_sizes)
+    full_keys = (
+        np.repeat(full_cells, full_sizes) * stride
+        + np.arange(full_sizes.sum(), dtype=np.int64) - offsets
+    )
+    keys = np.concatenate([
+        keys[~flipped],
+        full_keys[~np.isin(full_keys, keys[flipped], assume_unique=True)]
+    ])
+    
+    cells = keys // stride
+    trial = cells // n_groups
+    group = cells % n_groups
+    asset = model["group_assets"][model["group_start"][group] + keys % stride]
+    
+    p_asset = ndtr((model["threshold"][asset] - sqrt_rho * factor[trial, group]) / sqrt_idio)
+    accept = rng.random(len(asset)) * p_max[trial, group] < p_asset
+    return {"trial": trial[accept], "asset": asset[accept]}
+
+
+def simulate_trials(
+    model: Dict[str, Any],
+    n_trials: int,
+    seed: np.random.SeedSequence
+) -> Dict[str, np.ndarray]:
+    """
+    Simulate ``n_trials`` storms; returns customers out, customer-hours
+    and failed asset count per trial.
+    """
+    rng = np.random.default_rng(seed)
+    failed = _sample_failures(model, n_trials, rng)
+    trial, asset = failed["trial"], failed["asset"]
+    
+    customers_out = np.zeros(n_trials)
+    customer_hours = np.zeros(n_trials)
+    assets_failed = np.bincount(trial, minlength=n_trials)
+    
+    repair = model["repair_hours"][asset]
+    node = model["node"][asset]
+    off_tree = model["tin"][np.maximum(node, 0)] < 0
+    off_tree |= node < 0
+    
+    # Assets outside the feeder tree only affect their own customers
+    direct = model["direct_customers"][asset[off_tree]]
+    customers_out += np.bincount(trial[off_tree], direct, minlength=n_trials)
+    customer_hours += np.bincount(
+        trial[off_tree], direct * repair[off_tree], minlength=n_trials
+    )
+    
+    trial, asset, node, repair = trial[~off_tree], asset[~off_tree], node[~off_tree], repair[~off_tree]
+    if not len(trial):
+        return {
+            "customers_out": customers_out,
+            "customer_hours": customer_hours,
+            "assets_failed": assets_failed
+        }
+    
+    # One failure record per (trial, node): a node and its feeding edge
+    # failing together block the subtree until both are repaired
+    tin, tout = model["tin"], model["tout"]
+    span = int(tout.max()) + 1
+    key = trial * span + tin[node]
+    order = np.argsort(key, kind="stable")
+    key, trial, node, asset, repair = key[order], trial[order], node[order], asset[order], repair[order]
+    first = np.flatnonzero(np.r_[True, key[1:] != key[:-1]])
+    own = np.maximum.reduceat(model["own_customers"][asset], first)
+    repair = np.maximum.reduceat(repair, first)
+    key, trial, node = key[first], trial[first], node[first]
+    end = trial * span + tout[node]
+    subtree = model["subtree_customers"][node]
+    
+    # Peel the failures into nesting layers: layer 0 are the topmost
+    # failures of each trial, layer L sits directly below layer L-1
+    m = len(key)
+    ancestor = np.full(m, -1, dtype=np.int64)
+    layers = []
+    remaining = np.arange(m)
+    while len(remaining):
+        covering = np.r_[-1, np.maximum.accumulate(end[remaining])[:-1]]
+        top = remaining[covering <= key[remaining]]
+        if layers:
+            above = layers[-1]
+            ancestor[top] = above[np.searchsorted(key[above], key[top], side="right") - 1]
+        layers.append(top)
+        remaining = remaining[covering > key[remaining]]
+    
+    # Switching restores the rest of a subtree unless the backup side is
+    # itself inside an interrupted subtree
+    top_key, top_end = key[layers[0]], end[layers[0]]
+    backup = model["option_backup"][node]
+    option_minutes = model["option_minutes"][node]
+    backup_tin = tin[np.maximum(backup, 0)]
+    probe = trial[:, None] * span + backup_tin
+    slot = np.searchsorted(top_key, probe, side="right") - 1
+    backup_out = (slot >= 0) & (top_end[np.maximum(slot, 0)] > probe) & (backup_tin >= 0)
+    usable = (backup >= 0) & ~backup_out
+    switch_hours = np.where(usable, option_minutes, np.inf).min(axis=1) / 60.0
+    rest_hours = np.minimum(switch_hours, repair)
+    
+    # Customers below a failure wait for every failure above them
+    exclusive = (subtree - own).astype(np.float64)
+    wait_rest = np.zeros(m)
+    wait_own = np.zeros(m)
+    for depth, layer in enumerate(layers):
+        if depth == 0:
+            wait_rest[layer] = rest_hours[layer]
+            wait_own[layer] = repair[layer]
+        else:
+            upstream = wait_rest[ancestor[layer]]
+            wait_rest[layer] = np.maximum(upstream, rest_hours[layer])
+            wait_own[layer] = np.maximum(upstream, repair[layer])
+            np.subtract.at(exclusive, ancestor[layer], subtree[layer])
+    
+    customers_out += np.bincount(trial[layers[0]], subtree[layers[0]], minlength=n_trials)
+    customer_hours += np.bincount(
+        trial, own * wait_own + exclusive * wait_rest, minlength=n_trials
+    )
+    return {
+        "customers_out": customers_out,
+        "customer_hours": customer_hours,
+        "assets_failed": assets_failed
+    }
+
+
+def _distribution(values: np.ndarray) -> Dict[str, Any]:
+    return {
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "max": float(values.max()),
+        "percentiles": {
+            f"p{p:g}": float(v) for p, v in zip(PERCENTILES, np.percentile(values, PERCENTILES))
+        }
+    }
+
+
+class StormSimulator:
+    """Service for correlated storm outage Monte Carlo simulation."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def simulate(
+        self,
+        n_trials: int = 10000,
+        scenario_type: str = "BASE_CASE",
+        severity_multiplier: float = 1.0,
+        category_multipliers: Optional[Dict[str, float]] = None,
+        climate_zones: Optional[List[str]] = None,
+        zone_correlation: float = 0.3,
+        category_correlation: float = 0.5,
+        chunk_size: int = 1000,
+        workers: Optional[int] = None,
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Distribution of customers out and customer-hours over storm trials.
+        
+        The per-storm failure probability of an asset is its annual POF
+        scaled by ``severity_multiplier`` and the multiplier for its asset
+        category. ``zone_correlation`` is the asset-level correlation within
+        a climate zone and category group; ``category_correlation`` couples
+        the groups of different categories in the same zone. Only assets in
+        ``climate_zones`` are exposed when given.
+        """
+        model = self.build_model(
+            scenario_type, severity_multiplier, category_multipliers or {},
+            climate_zones, zone_correlation, category_correlation
+        )
+        
+        if seed is None:
+            seed = int(np.random.SeedSequence().entropy % (2 ** 63))
+        chunks = [chunk_size] * (n_trials // chunk_size)
+        if n_trials % chunk_size:
+            chunks.append(n_trials % chunk_size)
+        seeds = np.random.SeedSequence(seed).spawn(len(chunks))
+        
+        workers = min(workers or os.cpu_count() or 1, len(chunks))
+        if workers > 1:
+            with ProcessPoolExecutor(
+                max_workers=workers, initializer=_init_worker, initargs=(model,)
+            ) as pool:
+                results = list(pool.map(_run_chunk, chunks, seeds))
+        else:
+            results = [simulate_trials(model, n, s) for n, s in zip(chunks, seeds)]
+        
+        customers_out = np.concatenate([r["customers_out"] for r in results])
+        customer_hours = np.concatenate([r["customer_hours"] for r in results])
+        assets_failed = np.concatenate([r["assets_failed"] for r in results])
+        
+        return {
+            "scenario_type": scenario_type,
+            "trials": n_trials,
+            "seed": seed,
+            "workers": workers,
+            "topology_version": model["topology_version"],
+            "assets_exposed": len(model["threshold"]),
+            "groups": len(model["group_size"]),
+            "customers_served": model["customers_served"],
+            "probability_of_interruption": float((customers_out > 0).mean()),
+            "customers_out": _distribution(customers_out),
+            "customer_hours": _distribution(customer_hours),
+            "assets_failed": _distribution(assets_failed.astype(np.float64))
+        }
+    
+    def build_model(
+        self,
+        scenario_type: str,
+        severity_multiplier: float,
+        category_multipliers: Dict[str, float],
+        climate_zones: Optional[List[str]],
+        zone_correlation: float,
+        category_correlation: float
+    ) -> Dict[str, Any]:
+        """Flatten fleet, topology and restoration options into plain arrays."""
+        projector = ReliabilityProjector(self.db)
+        fleet = projector.load_fleet(scenario_type)
+        topology = fleet["topology"]
+        
+        groups_by_asset = dict(
+            (asset_id, (zone or UNKNOWN_ZONE, category))
+            for asset_id, zone, category in self.db.query(
+                models.Asset.id,
+                models.AssetLocation.climate_zone,
+                models.AssetType.category
+            ).join(
+                models.AssetType, models.AssetType.id == models.Asset.asset_type_id
+            ).outerjoin(
+                models.AssetLocation, models.AssetLocation.id == models.Asset.location_id
+            ).filter(models.Asset.status == "IN_SERVICE").all()
+        )
+        zones = [groups_by_asset[a][0] for a in fleet["asset_ids"]]
+        categories = [groups_by_asset[a][1] for a in fleet["asset_ids"]]
+        
+        multiplier = np.array(
+            [category_multipliers.get(c, 1.0) for c in categories], dtype=np.float64
+        )
+        pof = np.clip(fleet["pof"] * severity_multiplier * multiplier, 0.0, MAX_EVENT_POF)
+        exposed = pof > 0
+        if climate_zones:
+            exposed &= np.isin(np.array(zones, dtype=object), climate_zones)
+        exposed = np.flatnonzero(exposed)
+        
+        group_labels = np.array(
+            [f"{zones[i]}\x00{categories[i]}" for i in exposed.tolist()], dtype=object
+        )
+        labels, group = np.unique(group_labels, return_inverse=True)
+        zone_labels, group_zone = np.unique(
+            np.array([label.split("\x00")[0] for label in labels], dtype=object),
+            return_inverse=True
+        )
+        group_assets = np.argsort(group, kind="stable")
+        group_size = np.bincount(group, minlength=len(labels))
+        threshold = ndtri(pof[exposed])
+        
+        order, parent, _ = topology.downstream_order()
+        tin, tout = topology.preorder_intervals(order, parent)
+        customers = fleet["customers"][exposed]
+        node = fleet["node"][exposed]
+        
+        return {
+            "topology_version": topology.version,
+            "customers_served": int(fleet["customers_served"]),
+            "rho": zone_correlation,
+            "kappa": category_correlation,
+            "n_zones": len(zone_labels),
+            "group_zone": group_zone.astype(np.int64),
+            "group_size": group_size.astype(np.int64),
+            "group_start": (np.cumsum(group_size) - group_size).astype(np.int64),
+            "group_assets": group_assets.astype(np.int64),
+            "group_threshold": (
+                np.maximum.reduceat(threshold[group_assets], np.cumsum(group_size) - group_size)
+                if len(labels) else np.empty(0)
+            ),
+            "threshold": threshold,
+            "repair_hours": fleet["outage_hours"][exposed],
+            "node": node,
+            "own_customers": fleet["own_customers"][exposed].astype(np.float64),
+            "direct_customers": customers,
+            "subtree_customers": fleet["subtree_customers"].astype(np.float64),
+            "tin": tin,
+            "tout": tout,
+            **self._restoration_options(topology)
+        }
+    
+    def _restoration_options(self, topology) -> Dict[str, np.ndarray]:
+        """
+        Padded per-node table of restoration options: the backup node each
+        option is fed from and its switching time in minutes.
+        """
+        n = topology.num_nodes
+        table = RestorationPathFinder(self.db).get_lookup_table(topology)
+        transfer = table["transfer_mva"]
+        derived_ok = table["capacity_mva"] >= transfer[:, None]
+        backups = [np.where(derived_ok, table["backup"], -1)]
+        minutes = [np.where(derived_ok, DEFAULT_SWITCHING_TIME_MIN, np.inf)]
+        
+        if len(topology.switch_ids):
+            source = topology.switch_source
+            capacity = np.where(
+                np.isnan(topology.switch_backup_capacity_mva), np.inf,
+                topology.switch_backup_capacity_mva
+            )
+            time_min = np.where(
+                np.isnan(topology.switch_time_min), DEFAULT_SWITCHING_TIME_MIN,
+                topology.switch_time_min
+            )
+            usable = np.flatnonzero(capacity >= transfer[source])
+            usable = usable[np.argsort(source[usable], kind="stable")]
+            owners = source[usable]
+            counts = np.bincount(owners, minlength=n)
+            slot = np.arange(len(usable)) - (np.cumsum(counts) - counts)[owners]
+            width = int(counts.max()) if len(usable) else 0
+            manual_backup = np.full((n, width), -1, dtype=np.int64)
+            manual_minutes = np.full((n, width), np.inf)
+            manual_backup[owners, slot] = topology.switch_target[usable]
+            manual_minutes[owners, slot] = time_min[usable]
+            backups.append(manual_backup)
+            minutes.append(manual_minutes)
+        
+        return {
+            "option_backup": np.hstack(backups).astype(np.int64),
+            "option_minutes": np.hstack(minutes)
+        }
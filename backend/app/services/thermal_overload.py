@@ -0,0 +1,368 @@
+"""
+Thermal Overload Service
+
+Batch comparison of monitored asset load (``MonitoringData.load_mva``) with
+the thermal and emergency ratings of the network edges the assets sit on.
+
+Load samples are streamed from the database in chunks of plain columns
+(asset, epoch seconds, MVA) ordered by asset and time, so no ORM objects
+are built and every chunk is processed with numpy:
+
+1. samples are averaged into fixed time buckets per asset
+2. each asset's buckets are compared with the ratings of its edges, giving
+   loading percentiles, hours above the thermal and emergency ratings and
+   the number of distinct days with an overload
+3. thermal aging is accumulated with the IEEE C57.91 aging acceleration
+   factor, whose mean over the period is the equivalent aging factor
+
+Edges overloaded on at least ``chronic_days`` days are chronic overloads.
+Recorded scans store one row per asset (its most loaded edge); for
+chronically overloaded assets the risk calculator adds the extra aging over
+the scanned period to the asset's age.
+"""
+
+from sqlalchemy.orm import Session
+from sqlalchemy import select, insert, func, extract, cast, Float
+from typing import List, Dict, Any, Optional
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from uuid import UUID
+from operator import itemgetter
+
+import numpy as np
+
+from app import models
+
+
+DEFAULT_CHUNK_SIZE = 100000
+DEFAULT_CHRONIC_DAYS = 5
+
+# Loading distribution bins (% of thermal rating)
+LOADING_BINS = (0, 50, 80, 90, 100, 110, 120, 150)
+LOADING_PERCENTILES = (50, 95, 99)
+# Largest loading percentage the thermal_stress columns hold; a rating near
+# zero or a bad load reading is stored at this value
+MAX_STORED_LOADING_PCT = 999999.99
+
+# IEEE C57.91 hot-spot model at rated ambient: the hot spot reaches the
+# 110 C reference at rated load
+AMBIENT_TEMP_C = 30.0
+RATED_HOT_SPOT_RISE_C = 80.0
+HOT_SPOT_EXPONENT = 1.6
+AGING_REFERENCE_CONSTANT = 15000.0
+# Loading beyond this is treated as a measurement error for aging
+MAX_AGING_LOADING = 2.0
+
+
+def _aging_acceleration(loading: np.ndarray) -> np.ndarray:
+    """IEEE C57.91 aging acceleration factor for per-unit loading."""
+    loading = np.clip(loading, 0.0, MAX_AGING_LOADING)
+    hot_spot_c = AMBIENT_TEMP_C + RATED_HOT_SPOT_RISE_C * np.power(loading, HOT_SPOT_EXPONENT)
+    return np.exp(
+        AGING_REFERENCE_CONSTANT / 383.0 - AGING_REFERENCE_CONSTANT / (hot_spot_c + 273.0)
+    )
+
+
+def _concat_ranges(starts: np.ndarray, lengths: np.ndarray) -> np.ndarray:
+    """Concatenation of ``arange(s, s + n)`` for every start and length."""
+    total = int(lengths.sum())
+    if total == 0:
+        return np.zeros(0, dtype=np.int64)
+    offsets = np.cumsum(lengths) - lengths
+    return np.repeat(starts - offsets, lengths) + np.arange(total)
+
+
+class ThermalOverloadScanner:
+    """Service for network-wide overload detection from monitored load."""
+    
+    def __init__(self, db: Session):
+        self.db = db
+    
+    def scan(
+        self,
+        start: Optional[datetime] = None,
+        end: Optional[datetime] = None,
+        bucket_minutes: int = 15,
+        chronic_days: int = DEFAULT_CHRONIC_DAYS,
+        limit: int = 100,
+        record: bool = False,
+        chunk_size: int = DEFAULT_CHUNK_SIZE
+    ) -> Dict[str, Any]:
+        """
+        Loading statistics for every rated edge with monitored load.
+        
+        Defaults to the year before ``end`` (now). Naive datetimes are taken
+        as UTC. With ``record`` the per-asset results are stored as thermal
+        stress inputs for the risk calculator.
+        """
+        end = end or datetime.now(timezone.utc)
+        start = start or end - timedelta(days=365)
+        if start.tzinfo is None:
+            start = start.replace(tzinfo=timezone.utc)
+        if end.tzinfo is None:
+            end = end.replace(tzinfo=timezone.utc)
+        if end <= start:
+            raise ValueError("Scan end must be after its start")
+        
+        self.bucket_seconds = bucket_minutes * 60
+        self.bucket_hours = bucket_minutes / 60.0
+        self.start_epoch = start.timestamp()
+        
+        self._load_edges()
+        self._reset_totals()
+        
+        rated = select(models.NetworkEdge.asset_id).where(
+            models.NetworkEdge.asset_id.isnot(None),
+            models.NetworkEdge.thermal_rating_mva > 0
+        )
+        # The dense rank numbers the assets in stream order, so asset runs are
+        # found on integers and the UUID is only read once per run
+        query = select(
+            func.dense_rank().over(order_by=models.MonitoringData.asset_id),
+            cast(extract("epoch", models.MonitoringData.timestamp), Float),
+            cast(models.MonitoringData.load_mva, Float),
+            models.MonitoringData.asset_id
+        ).where(
+            models.MonitoringData.asset_id.in_(rated),
+            models.MonitoringData.timestamp >= start,
+            models.MonitoringData.timestamp < end,
+            models.MonitoringData.load_mva.isnot(None)
+        ).order_by(
+            models.MonitoringData.asset_id, models.MonitoringData.timestamp
+        ).execution_options(yield_per=chunk_size)
+        
+        # Rows of the last asset in a chunk may continue in the next one
+        carry: List = []
+        samples = 0
+        for rows in self.db.execute(query).partitions():
+            rows = carry + rows
+            last = rows[-1][0]
+            split = len(rows) - 1
+            while split > 0 and rows[split - 1][0] == last:
+                split -= 1
+            carry = rows[split:]
+            if split:
+                self._scan_chunk(rows[:split])
+                samples += split
+        if carry:
+            self._scan_chunk(carry)
+            samples += len(carry)
+        
+        return self._summarize(start, end, bucket_minutes, chronic_days, limit, record, samples)
+    
+    def _load_edges(self) -> None:
+        """Rated edges that sit on an asset, grouped by asset."""
+        rows = self.db.query(
+            models.NetworkEdge.id,
+            models.NetworkEdge.asset_id,
+            models.NetworkEdge.thermal_rating_mva,
+            models.NetworkEdge.emergency_rating_mva
+        ).filter(
+            models.NetworkEdge.asset_id.isnot(None),
+            models.NetworkEdge.thermal_rating_mva > 0
+        ).all()
+        
+        self.asset_ids: List[UUID] = []
+        self.asset_index: Dict[UUID, int] = {}
+        edge_asset = []
+        for _, asset_id, _, _ in rows:
+            if asset_id not in self.asset_index:
+                self.asset_index[asset_id] = len(self.asset_ids)
+                self.asset_ids.append(asset_id)
+            edge_asset.append(self.asset_index[asset_id])
+        
+        self.edge_ids = [r[0] for r in rows]
+        self.edge_asset = np.array(edge_asset, dtype=np.int64)
+        self.edge_rating = np.array([float(r[2]) for r in rows])
+        self.edge_emergency = np.array(
+            [float(r[3]) if r[3] is not None else np.inf for r in rows]
+        )
+        
+        # Edges of asset ``a`` are edge_order[edge_offsets[a]:edge_offsets[a + 1]]
+        self.edge_order = np.argsort(self.edge_asset, kind="stable")
+        counts = np.bincount(self.edge_asset, minlength=len(self.asset_ids))
+        self.edge_offsets = np.zeros(len(self.asset_ids) + 1, dtype=np.int64)
+        np.cumsum(counts, out=self.edge_offsets[1:])
+    
+    def _reset_totals(self) -> None:
+        m = len(self.edge_ids)
+        self.buckets = np.zeros(m, dtype=np.int64)
+        self.hours_above = np.zeros(m)
+        self.hours_above_emergency = np.zeros(m)
+        self.overload_days = np.zeros(m, dtype=np.int64)
+        self.aging = np.zeros(m)
+        self.mean_loading = np.zeros(m)
+        self.peak_loading = np.zeros(m)
+        self.percentiles = np.zeros((m, len(LOADING_PERCENTILES)))
+        self.distribution = np.zeros(len(LOADING_BINS))
+    
+    def _scan_chunk(self, rows: List) -> None:
+        """Accumulate the statistics of the complete per-asset series in ``rows``."""
+        n_rows = len(rows)
+        rank = np.fromiter(map(itemgetter(0), rows), dtype=np.int64, count=n_rows)
+        epoch = np.fromiter(map(itemgetter(1), rows), dtype=np.float64, count=n_rows)
+        load = np.fromiter(map(itemgetter(2), rows), dtype=np.float64, count=n_rows)
+        
+        # Rows arrive ordered by asset, so map each run of rows once
+        run_starts = np.flatnonzero(np.r_[True, rank[1:] != rank[:-1]])
+        run_assets = np.array([self.asset_index[rows[i][3]] for i in run_starts.tolist()], dtype=np.int64)
+        asset = np.repeat(run_assets, np.diff(np.r_[run_starts, n_rows]))
+        
+        # Mean load per asset and time bucket
+        bucket = ((epoch - self.start_epoch) // self.bucket_seconds).astype(np.int64)
+        group_starts = np.flatnonzero(np.r_[
+            True, (asset[1:] != asset[:-1]) | (bucket[1:] != bucket[:-1])
+        ])
+        sizes = np.diff(np.r_[group_starts, len(load)])
+        g_asset = asset[group_starts]
+        g_bucket = bucket[group_starts]
+        g_load = np.add.reduceat(load, group_starts) / sizes
+        
+        # Buckets of each asset sorted by load, so percentiles are positions
+        asset_starts = np.flatnonzero(np.r_[True, g_asset[1:] != g_asset[:-1]])
+        asset_lengths = np.diff(np.r_[asset_starts, len(g_asset)])
+        assets = g_asset[asset_starts]
+        sorted_load = np.empty_like(g_load)
+        for a, b in zip(asset_starts.tolist(), (asset_starts + asset_lengths).tolist()):
+            sorted_load[a:b] = np.sort(g_load[a:b])
+        
+        # Pair every edge of these assets with its asset's buckets
+        edge_counts = self.edge_offsets[assets + 1] - self.edge_offsets[assets]
+        edges = self.edge_order[_concat_ranges(self.edge_offsets[assets], edge_counts)]
+        edge_start = np.repeat(asset_starts, edge_counts)
+        edge_length = np.repeat(asset_lengths, edge_counts)
+        local = np.repeat(np.arange(len(edges)), edge_length)
+        pair = _concat_ranges(edge_start, edge_length)
+        
+        rating = self.edge_rating[edges]
+        loading = g_load[pair] / rating[local]
+        above = loading > 1.0
+        above_emergency = g_load[pair] > self.edge_emergency[edges][local]
+        
+        n = len(edges)
+        self.buckets[edges] = edge_length
+        self.hours_above[edges] = np.bincount(local, weights=above, minlength=n) * self.bucket_hours
+        self.hours_above_emergency[edges] = (
+            np.bincount(local, weights=above_emergency, minlength=n) * self.bucket_hours
+        )
+        self.aging[edges] = np.bincount(local, weights=_aging_acceleration(loading), minlength=n)
+        self.mean_loading[edges] = np.bincount(local, weights=loading, minlength=n) / edge_length
+        self.peak_loading[edges] = sorted_load[edge_start + edge_length - 1] / rating
+        for j, q in enumerate(LOADING_PERCENTILES):
+            position = edge_start + np.floor(q / 100.0 * (edge_length - 1)).astype(np.int64)
+            self.percentiles[edges, j] = sorted_load[position] / rating
+        
+        # Distinct days with at least one bucket above rating
+        day = (g_bucket[pair] * self.bucket_seconds) // 86400
+        n_days = int(day.max()) + 1 if len(day) else 1
+        hit = np.unique(local[above] * n_days + day[above])
+        self.overload_days[edges] = np.bincount(hit // n_days, minlength=n)
+        
+        bins = np.searchsorted(np.array(LOADING_BINS[1:]), loading * 100.0, side="right")
+        self.distribution += np.bincount(bins, minlength=len(LOADING_BINS)) * self.bucket_hours
+    
+    def _summarize(
+        self,
+        start: datetime,
+        end: datetime,
+        bucket_minutes: int,
+        chronic_days: int,
+        limit: int,
+        record: bool,
+        samples: int
+    ) -> Dict[str, Any]:
+        observed = self.buckets > 0
+        chronic = observed & (self.overload_days >= chronic_days)
+        equivalent_aging = np.where(observed, self.aging / np.maximum(self.buckets, 1), 0.0)
+        
+        overloaded = np.flatnonzero(self.hours_above > 0)
+        overloaded = overloaded[np.lexsort((-self.peak_loading[overloaded], -self.hours_above[overloaded]))]
+        edges = []
+        for k in overloaded[:limit].tolist():
+            edges.append({
+                "edge_id": self.edge_ids[k],
+                "asset_id": self.asset_ids[self.edge_asset[k]],
+                "thermal_rating_mva": float(self.edge_rating[k]),
+                "emergency_rating_mva": float(self.edge_emergency[k]) if np.isfinite(self.edge_emergency[k]) else None,
+                "hours_observed": float(self.buckets[k] * self.bucket_hours),
+                "mean_loading_pct": float(self.mean_loading[k] * 100),
+                "peak_loading_pct": float(self.peak_loading[k] * 100),
+                **{
+                    f"p{q}_loading_pct": float(self.percentiles[k, j] * 100)
+                    for j, q in enumerate(LOADING_PERCENTILES)
+                },
+                "hours_above_rating": float(self.hours_above[k]),
+                "hours_above_emergency": float(self.hours_above_emergency[k]),
+                "overload_days": int(self.overload_days[k]),
+                "aging_acceleration": float(equivalent_aging[k]),
+                "chronic_overload": bool(chronic[k])
+            })
+        
+        distribution = []
+        for j, low in enumerate(LOADING_BINS):
+            high = LOADING_BINS[j + 1] if j + 1 < len(LOADING_BINS) else None
+            distribution.append({
+                "min_loading_pct": low,
+                "max_loading_pct": high,
+                "edge_hours": float(self.distribution[j])
+            })
+        
+        recorded = self._record(start, end, observed, chronic, equivalent_aging) if record else 0
+        
+        return {
+            "period_start": start,
+            "period_end": end,
+            "bucket_minutes": bucket_minutes,
+            "samples": samples,
+            "rated_edges": len(self.edge_ids),
+            "edges_with_data": int(observed.sum()),
+            "overloaded_edges": len(overloaded),
+            "emergency_overloaded_edges": int((self.hours_above_emergency > 0).sum()),
+            "chronic_overloads": int(chronic.sum()),
+            "loading_distribution": distribution,
+            "recorded_assets": recorded,
+            "edges": edges
+        }
+    
+    def _record(
+        self,
+        start: datetime,
+        end: datetime,
+        observed: np.ndarray,
+        chronic: np.ndarray,
+        equivalent_aging: np.ndarray
+    ) -> int:
+        """Store one thermal stress row per asset, from its most loaded edge."""
+        edges = np.flatnonzero(observed)
+        edges = edges[np.lexsort((-self.peak_loading[edges], -self.hours_above[edges], self.edge_asset[edges]))]
+        first = np.r_[True, self.edge_asset[edges][1:] != self.edge_asset[edges][:-1]]
+        
+        def decimal(value: float, places: int) -> Decimal:
+            return Decimal(str(round(float(value), places)))
+        
+        rows = []
+        for k in edges[first].tolist():
+            a = self.edge_asset[k]
+            asset_edges = self.edge_order[self.edge_offsets[a]:self.edge_offsets[a + 1]]
+            rows.append({
+                "asset_id": self.asset_ids[a],
+                "period_start": start,
+                "period_end": end,
+                "rating_mva": decimal(self.edge_rating[k], 3),
+                "peak_loading_pct": decimal(
+                    min(self.peak_loading[k] * 100, MAX_STORED_LOADING_PCT), 2
+                ),
+                "p95_loading_pct": decimal(
+                    min(self.percentiles[k, LOADING_PERCENTILES.index(95)] * 100, MAX_STORED_LOADING_PCT), 2
+                ),
+                "hours_above_rating": decimal(self.hours_above[k], 2),
+                "hours_above_emergency": decimal(self.hours_above_emergency[asset_edges].max(), 2),
+                "overload_days": int(self.overload_days[k]),
+                "aging_acceleration": decimal(equivalent_aging[asset_edges].max(), 4),
+                "chronic_overload": bool(chronic[asset_edges].any())
+            })
+        
+        for i in range(0, len(rows), DEFAULT_CHUNK_SIZE):
+            self.db.execute(insert(models.ThermalStress.__table__), rows[i:i + DEFAULT_CHUNK_SIZE])
+        self.db.commit()
+        return len(rows)
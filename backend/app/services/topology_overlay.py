@@ -0,0 +1,127 @@
+"""
+Topology Overlay
+
+Copy-on-write views of a NetworkTopology for planning what-ifs.
+
+``fork_topology`` returns a topology that shares every column and array of
+its base. Appended nodes and edges go to small per-fork tails, removed ids
+are masked in per-fork indexes, and numpy arrays are only copied when the
+fork first writes to them. The base, which may be a read-only shared
+snapshot, is never modified, and node and edge indices of the base stay
+valid in the fork, so results can be compared element by element.
+"""
+
+from typing import Any, Dict, Iterator, List, Optional, Set, Sequence, Tuple
+from itertools import chain
+from uuid import UUID
+
+import numpy as np
+
+from app.services.network_topology import NetworkTopology
+from app.services.topology_snapshot import UUID_COLUMNS, CATEGORY_COLUMNS, STRING_COLUMNS
+
+
+class OverlaySequence:
+    """Base sequence plus an appendable tail."""
+    
+    def __init__(self, base: Sequence[Any]):
+        self._base = base
+        self._base_len = len(base)
+        self._tail: List[Any] = []
+    
+    def __len__(self) -> int:
+        return self._base_len + len(self._tail)
+    
+    def __getitem__(self, i: int) -> Any:
+        if i < 0:
+            i += len(self)
+        if i < self._base_len:
+            return self._base[i]
+        return self._tail[i - self._base_len]
+    
+    def __iter__(self) -> Iterator[Any]:
+        return chain(self._base, self._tail)
+    
+    def append(self, value: Any) -> None:
+        self._tail.append(value)
+
+
+class OverlayIndex:
+    """Base id -> index mapping with per-overlay additions and removals."""
+    
+    def __init__(self, base: Any):
+        self._base = base
+        self._added: Dict[UUID, int] = {}
+        self._removed: Set[UUID] = set()
+    
+    def get(self, key: Any, default: Optional[int] = None) -> Optional[int]:
+        if key in self._added:
+            return self._added[key]
+        if key in self._removed:
+            return default
+        return self._base.get(key, default)
+    
+    def __getitem__(self, key: Any) -> int:
+        i = self.get(key)
+        if i is None:
+            raise KeyError(key)
+        return i
+    
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key) is not None
+    
+    def __setitem__(self, key: Any, value: int) -> None:
+        self._added[key] = value
+        self._removed.discard(key)
+    
+    def pop(self, key: Any) -> int:
+        if key in self._added:
+            return self._added.pop(key)
+        i = self[key]
+        self._removed.add(key)
+        return i
+    
+    def __len__(self) -> int:
+        return len(self._base) - len(self._removed) + len(self._added)
+    
+    def items(self) -> Iterator[Tuple[UUID, int]]:
+        for key, i in self._base.items():
+            if key not in self._removed and key not in self._added:
+                yield key, i
+        yield from self._added.items()
+
+
+def fork_topology(base: NetworkTopology, version: str) -> NetworkTopology:
+    """
+    Copy-on-write child of ``base`` that accepts the usual patch methods.
+    
+    Costs O(1) up front. The incrementally maintained feeder tree is not
+    carried over, so patches on the fork skip tree maintenance and tree
+    queries rebuild it for the fork on first use.
+    """
+    fork = NetworkTopology.__new__(NetworkTopology)
+    fork.__dict__.update(base.__dict__)
+    fork.version = version
+    fork.shared = False
+    
+    for attr in UUID_COLUMNS + CATEGORY_COLUMNS + STRING_COLUMNS + ("switch_automatic",):
+        setattr(fork, attr, OverlaySequence(getattr(base, attr)))
+    fork.node_index = OverlayIndex(base.node_index)
+    fork.edge_index = OverlayIndex(base.edge_index)
+    
+    fork._csr_cache = {}
+    fork._buffers = {}
+    fork._tree_parent = None
+    fork._tree_parent_edge = None
+    fork._subtree_customers = None
+    fork._subtree_load = None
+    fork._in_offsets = None
+    fork._in_refs = None
+    fork._in_delta = {}
+    return fork
+
+
+def own_arrays(topology: NetworkTopology, attrs: Sequence[str]) -> None:
+    """Give a fork private copies of arrays it is about to write in place."""
+    for attr in attrs:
+        setattr(topology, attr, np.array(getattr(topology, attr)))
@@ -0,0 +1,402 @@
+"""
+Shared Topology Snapshots
+
+Publishes a NetworkTopology as a directory of memory-mapped ``.npy`` files so
+that every API worker process attaches the same physical pages instead of
+building its own copy of the graph:
+
+- Numeric node/edge/switching arrays, CSR adjacency and feeder-tree
+  aggregates are written as-is
+- ID, name and label columns are encoded as fixed-width arrays and exposed
+  through read-only column views; ID lookups binary-search a sorted key array
+
+One process builds under an exclusive file lock and publishes by atomically
+replacing the ``CURRENT`` manifest; readers attach zero-copy under a shared
+lock. Superseded snapshots are unlinked once replaced; mappings held by
+workers stay valid until they switch.
+"""
+
+from typing import List, Dict, Any, Optional, Iterator, Tuple
+from uuid import UUID, uuid4
+from contextlib import contextmanager
+import fcntl
+import json
+import os
+import shutil
+
+import numpy as np
+
+from app.services.network_topology import NetworkTopology
+
+
+MANIFEST_NAME = "CURRENT"
+LOCK_NAME = ".lock"
+_LOW_MASK = (1 << 64) - 1
+
+# Plain numeric attributes copied verbatim into the snapshot
+NUMERIC_ARRAYS = (
+    "node_voltage_kv",
+    "node_latitude",
+    "node_longitude",
+    "node_active",
+    "node_customers",
+    "node_load_mw",
+    "edge_from",
+    "edge_to",
+    "edge_length_km",
+    "edge_impedance_r",
+    "edge_impedance_x",
+    "edge_thermal_rating_mva",
+    "edge_emergency_rating_mva",
+    "edge_active",
+    "switch_source",
+    "switch_target",
+    "switch_time_min",
+    "switch_backup_capacity_mva",
+    "switch_distance_km"
+)
+
+UUID_COLUMNS = ("node_ids", "node_asset_ids", "edge_ids", "edge_asset_ids", "switch_ids")
+CATEGORY_COLUMNS = ("node_types", "node_voltage_levels", "node_states", "edge_types")
+STRING_COLUMNS = ("node_names",)
+
+# Feeder-tree aggregates (Python lists while the topology is patchable)
+TREE_ARRAYS = (
+    ("_tree_parent", np.int64),
+    ("_tree_parent_edge", np.int64),
+    ("_subtree_customers", np.int64),
+    ("_subtree_load", np.float64)
+)
+
+CSR_KEYS = ((True, False), (True, True), (False, False), (False, True))
+
+
+def encode_uuids(values: List[Optional[UUID]]) -> np.ndarray:
+    """Encode UUIDs as ``(n, 2)`` uint64 words; the nil UUID stands for None."""
+    ints = [UUID(str(v)).int if v is not None else 0 for v in values]
+    words = np.zeros((len(ints), 2), dtype=np.uint64)
+    if ints:
+        words[:, 0] = [x >> 64 for x in ints]
+        words[:, 1] = [x & _LOW_MASK for x in ints]
+    return words
+
+
+class UUIDColumn:
+    """Read-only sequence of nullable UUIDs backed by ``(n, 2)`` uint64 words."""
+    
+    def __init__(self, words: np.ndarray):
+        self._words = words
+    
+    def __len__(self) -> int:
+        return len(self._words)
+    
+    def __getitem__(self, i: int) -> Optional[UUID]:
+        hi, lo = self._words[i].tolist()
+        if hi == 0 and lo == 0:
+            return None
+        return UUID(int=(hi << 64) | lo)
+    
+    def __iter__(self) -> Iterator[Optional[UUID]]:
+        for hi, lo in self._words.tolist():
+            yield UUID(int=(hi << 64) | lo) if hi or lo else None
+
+
+class CategoryColumn:
+    """Read-only sequence of nullable labels stored as integer codes."""
+    
+    def __init__(self, codes: np.ndarray, categories: List[str]):
+        self._codes = codes
+        self._categories = categories
+    
+    def __len__(self) -> int:
+        return len(self._codes)
+    
+    def __getitem__(self, i: int) -> Optional[str]:
+        code = int(self._codes[i])
+        return self._categories[code] if code >= 0 else None
+    
+    def __iter__(self) -> Iterator[Optional[str]]:
+        categories = self._categories
+        for code in self._codes.tolist():
+            yield categories[code] if code >= 0 else None
+
+
+class StringColumn:
+    """Read-only sequence of strings stored as one UTF-8 blob plus offsets."""
+    
+    def __init__(self, blob: np.ndarray, offsets: np.ndarray):
+        self._blob = blob
+        self._offsets = offsets
+    
+    def __len__(self) -> int:
+        return len(self._offsets) - 1
+    
+    def __getitem__(self, i: int) -> str:
+        start, end = self._offsets[i:i + 2].tolist()
+        return self._blob[start:end].tobytes().decode("utf-8")
+    
+    def __iter__(self) -> Iterator[str]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+class UUIDIndex:
+    """Read-only UUID -> index mapping over sorted uint64 key words."""
+    
+    def __init__(self, hi: np.ndarray, lo: np.ndarray, positions: np.ndarray):
+        self._hi = hi
+        self._lo = lo
+        self._positions = positions
+    
+    def __len__(self) -> int:
+        return len(self._positions)
+    
+    def get(self, key: Any, default: Optional[int] = None) -> Optional[int]:
+        try:
+            value = key.int if isinstance(key, UUID) else UUID(str(key)).int
+        except ValueError:
+            return default
+        hi = np.uint64(value >> 64)
+        lo = value & _LOW_MASK
+        start = int(np.searchsorted(self._hi, hi, side="left"))
+        end = int(np.searchsorted(self._hi, hi, side="right"))
+        for j in range(start, end):
+            if int(self._lo[j]) == lo:
+                return int(self._positions[j])
+        return default
+    
+    def __getitem__(self, key: Any) -> int:
+        i = self.get(key)
+        if i is None:
+            raise KeyError(key)
+        return i
+    
+    def __contains__(self, key: Any) -> bool:
+        return self.get(key) is not None
+    
+    def items(self) -> Iterator[Tuple[UUID, int]]:
+        for (hi, lo), i in zip(
+            np.stack([self._hi, self._lo], axis=1).tolist(), self._positions.tolist()
+        ):
+            yield UUID(int=(hi << 64) | lo), i
+
+
+def _encode_index(index: Dict[UUID, int]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    words = encode_uuids(list(index.keys()))
+    positions = np.fromiter(index.values(), dtype=np.int64, count=len(index))
+    order = np.lexsort((words[:, 1], words[:, 0]))
+    return words[order, 0], words[order, 1], positions[order]
+
+
+def _encode_categories(values: List[Optional[str]]) -> Tuple[np.ndarray, List[str]]:
+    categories = sorted({v for v in values if v is not None})
+    lookup = {c: i for i, c in enumerate(categories)}
+    codes = np.array(
+        [lookup[v] if v is not None else -1 for v in values], dtype=np.int32
+    )
+    return codes, categories
+
+
+def _encode_strings(values: List[Optional[str]]) -> Tuple[np.ndarray, np.ndarray]:
+    encoded = [(v or "").encode("utf-8") for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    blob = np.frombuffer(b"".join(encoded), dtype=np.uint8)
+    return blob, offsets
+
+
+def _snapshot_arrays(topology: NetworkTopology) -> Tuple[Dict[str, np.ndarray], Dict[str, Any]]:
+    """Flatten a topology into named arrays plus JSON metadata."""
+    arrays: Dict[str, np.ndarray] = {}
+    meta: Dict[str, Any] = {"version": topology.version, "categories": {}}
+    
+    for attr in NUMERIC_ARRAYS:
+        arrays[attr] = np.asarray(getattr(topology, attr))
+    for attr in UUID_COLUMNS:
+        arrays[attr] = encode_uuids(list(getattr(topology, attr)))
+    for attr in CATEGORY_COLUMNS:
+        arrays[attr], meta["categories"][attr] = _encode_categories(list(getattr(topology, attr)))
+    for attr in STRING_COLUMNS:
+        arrays[f"{attr}.blob"], arrays[f"{attr}.offsets"] = _encode_strings(list(getattr(topology, attr)))
+    arrays["switch_automatic"] = np.array(list(topology.switch_automatic), dtype=bool)
+    
+    for attr in ("node_index", "edge_index"):
+        hi, lo, positions = _encode_index(getattr(topology, attr))
+        arrays[f"{attr}.hi"], arrays[f"{attr}.lo"], arrays[f"{attr}.positions"] = hi, lo, positions
+    
+    # Customer lookup by asset, needed to patch nodes added later
+    assets = list(topology._customers_by_asset.keys())
+    arrays["customer_assets"] = encode_uuids(assets)
+    arrays["customer_counts"] = np.array(
+        [topology._customers_by_asset[a] for a in assets], dtype=np.int64
+    )
+    arrays["customer_load_mw"] = np.array(
+        [topology._load_by_asset.get(a, 0.0) for a in assets], dtype=np.float64
+    )
+    
+    topology._ensure_tree()
+    for attr, dtype in TREE_ARRAYS:
+        arrays[attr] = np.asarray(getattr(topology, attr), dtype=dtype)
+    # Fold incremental inserts back into a single incoming-edge index
+    counts = np.bincount(topology.edge_to, minlength=topology.num_nodes)
+    in_offsets = np.zeros(topology.num_nodes + 1, dtype=np.int64)
+    np.cumsum(counts, out=in_offsets[1:])
+    arrays["_in_offsets"] = in_offsets
+    arrays["_in_refs"] = np.argsort(topology.edge_to, kind="stable")
+    
+    for directed, include_switching in CSR_KEYS:
+        offsets, targets, refs = topology.adjacency(directed, include_switching)
+        prefix = f"csr.{int(directed)}{int(include_switching)}"
+        arrays[f"{prefix}.offsets"] = offsets
+        arrays[f"{prefix}.targets"] = targets
+        arrays[f"{prefix}.refs"] = refs
+    
+    return arrays, meta
+
+
+def publish_snapshot(topology: NetworkTopology, directory: str) -> str:
+    """
+    Write ``topology`` to a new snapshot directory and make it current.
+    
+    Must be called while holding ``snapshot_lock(directory, exclusive=True)``.
+    Returns the snapshot name.
+    """
+    arrays, meta = _snapshot_arrays(topology)
+    name = f"snapshot-{uuid4().hex}"
+    staging = os.path.join(directory, f".{name}")
+    os.makedirs(staging)
+    
+    meta["arrays"] = {}
+    for key, array in arrays.items():
+        np.save(os.path.join(staging, f"{key}.npy"), np.ascontiguousarray(array))
+        meta["arrays"][key] = list(array.shape)
+    with open(os.path.join(staging, "meta.json"), "w") as f:
+        json.dump(meta, f)
+    os.rename(staging, os.path.join(directory, name))
+    
+    manifest_tmp = os.path.join(directory, f".{MANIFEST_NAME}.{name}")
+    with open(manifest_tmp, "w") as f:
+        json.dump({"name": name, "version": topology.version}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(manifest_tmp, os.path.join(directory, MANIFEST_NAME))
+    
+    # Workers still mapping older snapshots keep their pages until they switch
+    for entry in os.listdir(directory):
+        if entry.startswith("snapshot-") and entry != name:
+            shutil.rmtree(os.path.join(directory, entry), ignore_errors=True)
+    
+    return name
+
+
+def read_manifest(directory: str) -> Optional[Dict[str, str]]:
+    """Return ``{"name", "version"}`` of the current snapshot, if any."""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def attach_snapshot(directory: str, name: str) -> NetworkTopology:
+    """
+    Map a published snapshot read-only and wrap it as a NetworkTopology.
+    
+    No array data is copied; the returned topology must be detached (see
+    ``detach_snapshot``) before it can be patched.
+    """
+    path = os.path.join(directory, name)
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    
+    arrays = {}
+    for key, shape in meta["arrays"].items():
+        # Empty files cannot be mapped
+        mmap_mode = "r" if int(np.prod(shape)) > 0 else None
+        arrays[key] = np.load(os.path.join(path, f"{key}.npy"), mmap_mode=mmap_mode)
+    
+    topology = NetworkTopology.__new__(NetworkTopology)
+    topology.version = meta["version"]
+    topology.shared = True
+    for attr in NUMERIC_ARRAYS:
+        setattr(topology, attr, arrays[attr])
+    for attr in UUID_COLUMNS:
+        setattr(topology, attr, UUIDColumn(arrays[attr]))
+    for attr in CATEGORY_COLUMNS:
+        setattr(topology, attr, CategoryColumn(arrays[attr], meta["categories"][attr]))
+    for attr in STRING_COLUMNS:
+        setattr(topology, attr, StringColumn(arrays[f"{attr}.blob"], arrays[f"{attr}.offsets"]))
+    topology.switch_automatic = arrays["switch_automatic"]
+    for attr in ("node_index", "edge_index"):
+        setattr(topology, attr, UUIDIndex(
+            arrays[f"{attr}.hi"], arrays[f"{attr}.lo"], arrays[f"{attr}.positions"]
+        ))
+    
+    topology._customer_arrays = (
+        arrays["customer_assets"], arrays["customer_counts"], arrays["customer_load_mw"]
+    )
+    topology._customers_by_asset = {}
+    topology._load_by_asset = {}
+    
+    for attr, _ in TREE_ARRAYS:
+        setattr(topology, attr, arrays[attr])
+    topology._in_offsets = arrays["_in_offsets"]
+    topology._in_refs = arrays["_in_refs"]
+    topology._in_delta = {}
+    
+    topology._csr_cache = {}
+    for directed, include_switching in CSR_KEYS:
+        prefix = f"csr.{int(directed)}{int(include_switching)}"
+        topology._csr_cache[(directed, include_switching)] = (
+            arrays[f"{prefix}.offsets"], arrays[f"{prefix}.targets"], arrays[f"{prefix}.refs"]
+        )
+    topology._buffers = {}
+    return topology
+
+
+def detach_snapshot(topology: NetworkTopology) -> NetworkTopology:
+    """Private, writable copy of an attached snapshot (needed before patching)."""
+    if not topology.shared:
+        return topology
+    
+    copy = NetworkTopology.__new__(NetworkTopology)
+    copy.version = topology.version
+    copy.shared = False
+    for attr in NUMERIC_ARRAYS:
+        setattr(copy, attr, np.array(getattr(topology, attr)))
+    for attr in UUID_COLUMNS + CATEGORY_COLUMNS + STRING_COLUMNS:
+        setattr(copy, attr, list(getattr(topology, attr)))
+    copy.switch_automatic = [bool(v) for v in topology.switch_automatic.tolist()]
+    copy.node_index = dict(topology.node_index.items())
+    copy.edge_index = dict(topology.edge_index.items())
+    
+    assets, counts, loads = topology._customer_arrays
+    asset_ids = list(UUIDColumn(assets))
+    copy._customers_by_asset = dict(zip(asset_ids, counts.tolist()))
+    copy._load_by_asset = dict(zip(asset_ids, loads.tolist()))
+    
+    for attr, _ in TREE_ARRAYS:
+        setattr(copy, attr, getattr(topology, attr).tolist())
+    copy._in_offsets = np.array(topology._in_offsets)
+    copy._in_refs = np.array(topology._in_refs)
+    copy._in_delta = {}
+    copy._csr_cache = {}
+    copy._buffers = {}
+    return copy
+
+
+@contextmanager
+def snapshot_lock(directory: str, exclusive: bool):
+    """
+    Inter-process lock on the snapshot directory.
+    
+    Readers attach under a shared lock; the builder publishes (and prunes old
+    snapshots) under an exclusive one.
+    """
+    os.makedirs(directory, exist_ok=True)
+    with open(os.path.join(directory, LOCK_NAME), "a") as f:
+        fcntl.flock(f.fileno(), fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
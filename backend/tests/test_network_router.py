@@ -0,0 +1,118 @@
+"""
+Regression tests for the status codes of the network analysis endpoints.
+
+The topology store is pointed at a two-node feeder built in memory and the
+database session is replaced by one whose queries find nothing, so the
+endpoints run without a database.
+"""
+
+from uuid import uuid4
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app.database import get_db
+from app.main import app
+from app.services.network_topology import NetworkTopology, topology_store
+
+
+class _EmptySession:
+    """Session whose queries return no rows."""
+    
+    def query(self, *entities):
+        return self
+    
+    def filter(self, *criteria):
+        return self
+    
+    def all(self):
+        return []
+    
+    def first(self):
+        return None
+
+
+@pytest.fixture
+def feeder(monkeypatch):
+    substation, load, asset = uuid4(), uuid4(), uuid4()
+    nodes = [
+        (substation, None, "SUBSTATION", "Substation", "12.47kV", None, None, None),
+        (load, asset, "LOAD", "Load", "12.47kV", None, None, None)
+    ]
+    edges = [(uuid4(), substation, load, None, "OVERHEAD", 1.0, 0.1, 0.3, 10.0, 12.0)]
+    # A fresh version keeps cached factorizations from leaking between tests
+    topology = NetworkTopology(f"test-{uuid4()}", nodes, edges, [], [(asset, 100, 0.5)])
+    monkeypatch.setattr(topology_store, "get", lambda db: topology)
+    return {"substation": substation, "load": load}
+
+
+@pytest.fixture
+def client(feeder):
+    app.dependency_overrides[get_db] = lambda: _EmptySession()
+    yield TestClient(app)
+    app.dependency_overrides.clear()
+
+
+@pytest.mark.parametrize("analysis_type, method", [
+    ("connectivity", "SUMMATION"),
+    ("switching_paths", "SUMMATION"),
+    ("load_flow", "DC")
+])
+def test_analyze_unknown_node_returns_404(client, analysis_type, method):
+    response = client.post("/api/v1/network/analyze", json={
+        "node_id": str(uuid4()),
+        "analysis_type": analysis_type,
+        "load_flow_method": method
+    })
+    
+    assert response.status_code == 404
+    assert "not found" in response.json()["detail"]
+
+
+def test_analyze_unknown_load_flow_method_returns_400(client, feeder):
+    response = client.post("/api/v1/network/analyze", json={
+        "node_id": str(feeder["substation"]),
+        "analysis_type": "load_flow",
+        "load_flow_method": "AC"
+    })
+    
+    assert response.status_code == 400
+    assert "AC" in response.json()["detail"]
+
+
+def test_analyze_unknown_analysis_type_returns_400(client, feeder):
+    response = client.post("/api/v1/network/analyze", json={
+        "node_id": str(feeder["substation"]),
+        "analysis_type": "reliability"
+    })
+    
+    assert response.status_code == 400
+
+
+def test_load_flow_unknown_node_returns_404(client):
+    response = client.post("/api/v1/network/load-flow", json={"node_id": str(uuid4())})
+    
+    assert response.status_code == 404
+    assert "not found" in response.json()["detail"]
+
+
+def test_load_flow_unknown_method_returns_400(client, feeder):
+    response = client.post("/api/v1/network/load-flow", json={
+        "node_id": str(feeder["substation"]),
+        "method": "AC"
+    })
+    
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize("method", ["RADIAL_SWEEP", "DC"])
+def test_load_flow_solves_known_node(client, feeder, method):
+    response = client.post("/api/v1/network/load-flow", json={
+        "node_id": str(feeder["substation"]),
+        "method": method
+    })
+    
+    assert response.status_code == 200
+    flows = response.json()["cases"][0]["branch_flows"]
+    assert len(flows) == 1
+    assert flows[0]["loading_percent"] > 0
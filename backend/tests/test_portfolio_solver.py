@@ -0,0 +1,137 @@
+"""
+Brute-force cross-checks of the portfolio solvers.
+
+Small random instances are solved by enumerating every selection, and the
+solvers must match the optimum (or, for the Lagrangian heuristic, return
+a feasible selection no better than it under a bound no lower than it).
+"""
+
+import numpy as np
+import pytest
+from scipy import sparse
+
+from app.services.portfolio_solver import (
+    solve_knapsack,
+    solve_knapsack_frontier,
+    solve_lagrangian,
+    solve_multiple_choice
+)
+
+
+SEEDS = range(40)
+
+
+def _selections(n: int) -> np.ndarray:
+    """Every 0-1 selection of ``n`` items, one per row."""
+    return ((np.arange(2 ** n)[:, None] >> np.arange(n)) & 1).astype(bool)
+
+
+def _brute_force(
+    values: np.ndarray,
+    usage: np.ndarray,
+    upper: np.ndarray,
+    fixed: np.ndarray,
+    groups: np.ndarray = None
+) -> float:
+    """Best value of a selection within ``usage @ x <= upper``, or -inf."""
+    x = _selections(len(values))
+    feasible = (x.astype(np.float64) @ usage.T <= upper + 1e-9).all(axis=1)
+    feasible &= x[:, fixed].all(axis=1)
+    if groups is not None:
+        one_hot = groups[:, None] == np.unique(groups)[None, :]
+        feasible &= (x.astype(np.int64) @ one_hot <= 1).all(axis=1)
+    if not feasible.any():
+        return -np.inf
+    return float((x[feasible].astype(np.float64) @ values).max())
+
+
+def _instance(seed: int, n: int = 12):
+    rng = np.random.default_rng(seed)
+    values = rng.integers(1, 1000, n).astype(np.float64)
+    costs = rng.integers(1, 500, n)
+    capacity = int(costs.sum() * rng.uniform(0.2, 0.7))
+    fixed = np.zeros(n, dtype=bool)
+    if seed % 3 == 0:
+        fixed[rng.choice(n, 2, replace=False)] = True
+    return rng, values, costs, capacity, fixed
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_knapsack_matches_brute_force(seed):
+    _, values, costs, capacity, fixed = _instance(seed)
+    expected = _brute_force(values, costs[None, :], np.array([capacity]), fixed)
+    if expected == -np.inf:
+        with pytest.raises(ValueError):
+            solve_knapsack(values, costs, capacity, fixed)
+        return
+    
+    result = solve_knapsack(values, costs, capacity, fixed)
+    
+    assert result["status"] == "OPTIMAL"
+    assert result["objective"] == pytest.approx(expected)
+    assert costs[result["selected"]].sum() <= capacity
+    assert result["selected"][fixed].all()
+    assert values[result["selected"]].sum() == pytest.approx(result["objective"])
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_knapsack_frontier_matches_each_capacity(seed):
+    _, values, costs, capacity, _ = _instance(seed)
+    capacities = np.array([capacity, capacity // 3, int(costs.sum()), 0])
+    
+    reports = solve_knapsack_frontier(values, costs, capacities)
+    
+    for point, report in zip(capacities.tolist(), reports):
+        expected = _brute_force(values, costs[None, :], np.array([point]), np.zeros(len(values), dtype=bool))
+        assert report["objective"] == pytest.approx(expected)
+        assert costs[report["selected"]].sum() <= point
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_multiple_choice_matches_brute_force(seed):
+    rng, values, costs, capacity, _ = _instance(seed)
+    groups = rng.integers(0, 5, len(values))
+    fixed = np.zeros(len(values), dtype=bool)
+    if seed % 3 == 0:
+        fixed[rng.integers(len(values))] = True
+    expected = _brute_force(values, costs[None, :], np.array([capacity]), fixed, groups)
+    if expected == -np.inf:
+        with pytest.raises(ValueError):
+            solve_multiple_choice(values, costs, groups, capacity, fixed)
+        return
+    
+    result = solve_multiple_choice(values, costs, groups, capacity, fixed)
+    
+    selected = result["selected"]
+    assert result["objective"] == pytest.approx(expected, rel=1e-6)
+    assert costs[selected].sum() <= capacity
+    assert np.bincount(groups[selected], minlength=5).max() <= 1
+    assert selected[fixed].all()
+
+
+@pytest.mark.parametrize("seed", SEEDS)
+def test_lagrangian_is_feasible_and_bracketed(seed):
+    rng, values, costs, capacity, _ = _instance(seed)
+    n = len(values)
+    groups = rng.integers(0, 6, n)
+    # Budget, a second resource and a minimum on a subset (negated row)
+    usage = np.vstack([
+        costs,
+        rng.integers(0, 10, n),
+        -np.where(rng.random(n) < 0.5, costs, 0)
+    ]).astype(np.float64)
+    upper = np.array([capacity, usage[1].sum() * 0.4, -0.1 * capacity])
+    fixed = np.zeros(n, dtype=bool)
+    expected = _brute_force(values, usage, upper, fixed, groups)
+    if expected == -np.inf:
+        with pytest.raises(ValueError):
+            solve_lagrangian(values, sparse.csr_matrix(usage), upper, groups, fixed)
+        return
+    
+    result = solve_lagrangian(values, sparse.csr_matrix(usage), upper, groups, fixed)
+    
+    selected = result["selected"]
+    assert (usage @ selected <= upper + 1e-6).all()
+    assert np.bincount(groups[selected], minlength=6).max() <= 1
+    assert result["objective"] <= expected + 1e-6
+    assert result["bound"] >= expected - 1e-6 * abs(expected)
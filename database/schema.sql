@@ -147,7 +147,7 @@ CREATE TABLE network_nodes (
     node_type VARCHAR(50) NOT NULL CHECK (node_type IN ('BUS', 'SUBSTATION', 'TAP_POINT', 'JUNCTION', 'LOAD_CENTER')),
     name VARCHAR(200) NOT NULL,
     voltage_level VARCHAR(20),
-    operational_state VARCHAR(20) DEFAULT 'ACTIVE' CHECK (operational_state IN ('ACTIVE', 'OUTAGE', 'MAINTENANCE', 'PLANNED')),
+    operational_state VARCHAR(20) DEFAULT 'ACTIVE' CHECK (operational_state IN ('ACTIVE', 'OPEN', 'OUTAGE', 'MAINTENANCE', 'PLANNED')), -- OPEN: normally-open tie point
     latitude DECIMAL(10,8),
     longitude DECIMAL(11,8),
     geom GEOMETRY(POINT, 4326),
@@ -199,6 +199,16 @@ CREATE INDEX idx_switching_paths_target ON switching_paths(target_node_id);
 
 COMMENT ON TABLE switching_paths IS 'Network-aware switching paths for restoration analysis';
 
+-- Planning what-if changes over the as-built network
+CREATE TABLE network_scenarios (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    name VARCHAR(200) NOT NULL,
+    description TEXT,
+    base_version VARCHAR(200), -- Topology version the changes were made against
+    changes JSONB NOT NULL, -- Added/removed nodes and edges
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
 -- ============================================================================
 -- LAYER 4: CONDITION ASSESSMENT TABLES
 -- ============================================================================
@@ -292,6 +302,25 @@ CREATE TABLE monitoring_data (
 CREATE INDEX idx_monitoring_data_asset_time ON monitoring_data(asset_id, timestamp);
 CREATE INDEX idx_monitoring_data_timestamp ON monitoring_data(timestamp);
 
+-- Thermal loading from monitored load against edge ratings (stress input to risk)
+CREATE TABLE thermal_stress (
+    id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
+    asset_id UUID NOT NULL REFERENCES assets(id),
+    period_start TIMESTAMP WITH TIME ZONE NOT NULL,
+    period_end TIMESTAMP WITH TIME ZONE NOT NULL,
+    rating_mva DECIMAL(8,3), -- Thermal rating of the most loaded edge
+    peak_loading_pct DECIMAL(8,2),
+    p95_loading_pct DECIMAL(8,2),
+    hours_above_rating DECIMAL(10,2),
+    hours_above_emergency DECIMAL(10,2),
+    overload_days INTEGER DEFAULT 0,
+    aging_acceleration DECIMAL(12,4), -- Equivalent aging factor (IEEE C57.91)
+    chronic_overload BOOLEAN DEFAULT FALSE,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_thermal_stress_asset ON thermal_stress(asset_id, period_end);
+
 -- ============================================================================
 -- LAYER 5: CUSTOMER & CONSEQUENCE TABLES (MONETIZED)
 -- ============================================================================
@@ -17,3 +17,68 @@ export async function fetchProjects() {
   if (!res.ok) throw new Error('Failed to fetch projects');
   return res.json();
 }
+
+export async function analyzeNetworkBatch(
+  nodeIds: string[],
+  analysisTypes: string[] = ['connectivity'],
+  maxDepth: number | null = 5
+) {
+  const res = await fetch(`${API_BASE}/network/analyze/batch`, {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({
+      node_ids: nodeIds,
+      analysis_types: analysisTypes,
+      max_depth: maxDepth,
+    }),
+  });
+  if (!res.ok) throw new Error('Failed to analyze network');
+  return res.json();
+}
+
+export interface MapBounds {
+  minLat: number;
+  minLon: number;
+  maxLat: number;
+  maxLon: number;
+}
+
+function mapBoundsParams(bounds: MapBounds) {
+  return new URLSearchParams({
+    min_lat: String(bounds.minLat),
+    min_lon: String(bounds.minLon),
+    max_lat: String(bounds.maxLat),
+    max_lon: String(bounds.maxLon),
+  });
+}
+
+export async function fetchMapClusters(bounds: MapBounds, zoom: number) {
+  const params = mapBoundsParams(bounds);
+  params.set('zoom', String(zoom));
+  const res = await fetch(`${API_BASE}/map/clusters?${params}`);
+  if (!res.ok) throw new Error('Failed to fetch map clusters');
+  return res.json();
+}
+
+export async function fetchMapFeatures(bounds: MapBounds, limit = 5000) {
+  const params = mapBoundsParams(bounds);
+  params.set('limit', String(limit));
+  const res = await fetch(`${API_BASE}/map/bbox?${params}`);
+  if (!res.ok) throw new Error('Failed to fetch map features');
+  return res.json();
+}
+
+export async function fetchNetworkGraph(
+  rootNodeId: string | null = null,
+  zoom = 4,
+  maxElements = 2000
+) {
+  const params = new URLSearchParams({
+    zoom: String(zoom),
+    max_elements: String(maxElements),
+  });
+  if (rootNodeId) params.set('root_node_id', rootNodeId);
+  const res = await fetch(`${API_BASE}/network/graph?${params}`);
+  if (!res.ok) throw new Error('Failed to fetch network graph');
+  return res.json();
+}